@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,63 @@ class Settings(BaseSettings):
     MONGO_URL: str = "mongodb://localhost:27017"
     KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
 
+    # Продюсер Kafka: по умолчанию не ждем подтверждения брокера в обработчике запроса
+    KAFKA_WAIT_FOR_ACK: bool = False
+    KAFKA_LINGER_MS: int = 5  # сколько продюсер ждет, чтобы собрать батч побольше
+    KAFKA_MAX_BATCH_SIZE: int = 64 * 1024  # байт на батч партиции
+    # Только кодеки, которые стоят у продюсера и консьюмера: gzip встроен, lz4 - в requirements
+    KAFKA_COMPRESSION_TYPE: Literal["gzip", "lz4"] | None = "lz4"
+    KAFKA_MAX_IN_FLIGHT: int = 10000  # максимум неподтвержденных отправок
+    # Формат тела событий (см. app/events.py). msgpack включать после обновления консьюмеров
+    EVENT_CONTENT_TYPE: Literal["application/json", "application/msgpack"] = "application/json"
+    # Сжатие каждого сообщения отдельно; обычно хватает KAFKA_COMPRESSION_TYPE на весь батч
+    EVENT_COMPRESSION: Literal["zlib"] | None = None
+
+    # Transactional outbox: события пишутся в Mongo в одной транзакции с данными
+    # (нужен replica set), а фоновая задача публикует их в Kafka
+    OUTBOX_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL: float = 1.0  # секунд между опросами, если никто не разбудил
+    OUTBOX_LEASE_SECONDS: int = 30  # на сколько реплика захватывает пачку
+    OUTBOX_RETENTION_SECONDS: int = 24 * 3600  # сколько хранить отправленные строки
+    OUTBOX_CHANGE_STREAM: bool = False  # будить relay по change stream
+    # Сколько секунд повторять транзакцию записи при TransientTransactionError и коммит при
+    # UnknownTransactionCommitResult (как session.with_transaction в драйвере)
+    MONGO_TRANSACTION_RETRY_SECONDS: float = 120.0
+
+    # Трассировка (OpenTelemetry): none - выключена, console - в stdout, otlp - в коллектор
+    TRACING_EXPORTER: Literal["none", "console", "otlp"] = "none"
+    TRACING_SAMPLE_RATE: float = 0.01  # доля записываемых трасс (1% - малые накладные расходы)
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+
+    # Пул соединений MongoDB (см. app/database.py). None - значение драйвера по умолчанию
+    MONGO_MAX_POOL_SIZE: int = 100  # соединений на сервер
+    MONGO_MIN_POOL_SIZE: int = 0  # держать открытыми даже без нагрузки
+    MONGO_MAX_IDLE_TIME_MS: int | None = None  # закрывать соединения, простаивающие дольше
+    # Сколько запрос ждет свободного соединения, прежде чем получить ошибку
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int | None = None
+    MONGO_CONNECT_TIMEOUT_MS: int = 20000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 30000
+    MONGO_TIMEOUT_MS: int | None = None  # общий таймаут каждой операции (timeoutMS)
+    MONGO_RETRY_WRITES: bool = True
+    MONGO_RETRY_READS: bool = True
+
+    # Write concern и read preference по маршрутам: имя обработчика -> значение, например
+    # MONGO_WRITE_CONCERN='{"create_book": 1}', MONGO_READ_PREFERENCE='{"get_books": "secondaryPreferred"}'.
+    # Read preference - только для GET: внутри транзакции Mongo читает с primary
+    MONGO_WRITE_CONCERN: dict[str, int | str] = {}
+    MONGO_READ_PREFERENCE: dict[str, str] = {}
+
+    # Списки и /export кодировать через orjson прямо из документов Mongo
+    # (app/serialization.py); выключено - to_jsonable и стандартный json
+    FAST_JSON_RESPONSES: bool = False
+
+    # Размер пачки курсора Mongo при потоковой выгрузке /export
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Максимум элементов в одном запросе POST /books/bulk и /authors/bulk
+    BULK_MAX_ITEMS: int = 10000
+
     # Говорим Pydantic, что можно читать из файла .env (если он есть)
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,10 +1,200 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+"""
+Клиент MongoDB и коллекции.
+
+При импорте соединений не создается: клиент открывает lifespan приложения (client.open())
+и он же закрывает. Размер пула, таймауты и повторы берутся из настроек (MONGO_*).
+Коллекции можно импортировать заранее - настоящая коллекция берется из открытого клиента
+при каждом обращении. Занятость пула считает MongoPoolStats по событиям драйвера:
+GET /admin/pools и метрика core_mongo_pool_connections.
+"""
+
+import threading
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ReadPreference
+from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
+from pymongo.write_concern import WriteConcern
 
 from app.config import settings  # Импортируем настройки
+from app.metrics import MONGO_POOL
+from app.tracing import TracedCollection
+
+DATABASE_NAME = "library_database"
+
+
+class MongoPoolStats(ConnectionPoolListener):
+    """
+    Соединения пула по всем серверам: открыто, занято запросами, сколько запросов ждут
+    свободного соединения и сколько не дождались (MONGO_WAIT_QUEUE_TIMEOUT_MS).
+    События приходят из потоков драйвера, поэтому счетчики под замком.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.checkout_timeouts = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def as_dict(self) -> dict:
+        max_size = settings.MONGO_MAX_POOL_SIZE
+        return {
+            "max_pool_size": max_size,
+            "open": self.open,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "peak_in_use": self.peak_in_use,
+            "checkout_timeouts": self.checkout_timeouts,
+            "utilization": round(self.in_use / max_size, 4) if max_size else None,
+        }
+
+
+def client_options() -> dict:
+    """Параметры пула и таймауты для AsyncIOMotorClient (None - значение драйвера по умолчанию)."""
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "timeoutMS": settings.MONGO_TIMEOUT_MS,
+        "retryWrites": settings.MONGO_RETRY_WRITES,
+        "retryReads": settings.MONGO_RETRY_READS,
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+
+class MongoClient:
+    """
+    AsyncIOMotorClient процесса. Остальные атрибуты (например, start_session)
+    берутся из открытого клиента.
+    """
+
+    def __init__(self):
+        self._client: AsyncIOMotorClient | None = None
+        self._collections: dict[str, AsyncIOMotorCollection] = {}
+        self.pool = MongoPoolStats()
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None
+
+    def open(self):
+        if self._client is None:
+            self.pool = MongoPoolStats()
+            self._client = AsyncIOMotorClient(
+                settings.MONGO_URL, event_listeners=[self.pool], **client_options()
+            )
+
+    def close(self):
+        client, self._client = self._client, None
+        self._collections = {}
+        if client is not None:
+            client.close()
+
+    def collection(self, name: str) -> AsyncIOMotorCollection:
+        if name not in self._collections:
+            self._collections[name] = self._opened()[DATABASE_NAME].get_collection(name)
+        return self._collections[name]
+
+    def pool_stats(self) -> dict:
+        return {"open": self.is_open, **self.pool.as_dict()}
+
+    def _opened(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            raise RuntimeError("MongoDB client is not open: call client.open() first (lifespan)")
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self._opened(), name)
+
+
+class LazyCollection:
+    """Коллекция открытого клиента: берется при каждом обращении, не при импорте."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(client.collection(self.name), attr)
+
+
+client = MongoClient()
+
+for state in ("open", "in_use", "waiting"):
+    MONGO_POOL.labels(state).set_function(lambda state=state: getattr(client.pool, state))
+
+# Определяем коллекции (каждый запрос к Mongo пишет спан, если трассировка включена)
+books_collection = TracedCollection(LazyCollection("books"))
+authors_collection = TracedCollection(LazyCollection("authors"))
+# События, ожидающие публикации в Kafka (transactional outbox)
+outbox_collection = TracedCollection(LazyCollection("outbox"))
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def write_concern_for(route: str) -> WriteConcern | None:
+    """Write concern маршрута из MONGO_WRITE_CONCERN (None - по умолчанию клиента)."""
+    w = settings.MONGO_WRITE_CONCERN.get(route)
+    return WriteConcern(w=w) if w is not None else None
 
-client = AsyncIOMotorClient(settings.MONGO_URL)
-db = client.library_database
 
-# Определяем коллекции
-books_collection = db.get_collection("books")
-authors_collection = db.get_collection("authors")
+def route_collection(collection: TracedCollection, route: str) -> TracedCollection:
+    """Коллекция маршрута: write concern и read preference берутся из настроек."""
+    options = {}
+    if (write_concern := write_concern_for(route)) is not None:
+        options["write_concern"] = write_concern
+    if (mode := settings.MONGO_READ_PREFERENCE.get(route)) is not None:
+        options["read_preference"] = READ_PREFERENCES[mode]
+    return collection.with_options(**options) if options else collection
@@ -0,0 +1,111 @@
+"""
+Конверт события Kafka: формат, сериализация и чтение.
+
+Файл общий для сервисов: одинаковые копии лежат в core_service/app/events.py и
+search_service/app/events.py и меняются только вместе.
+
+Конверт версии SCHEMA_VERSION:
+
+    {"schema_version": 1, "event": "book_created", "data": {...}, "produced_at": 1.7e9}
+
+Старые сообщения (версия 0) - тот же конверт, только без поля schema_version,
+и читаются они так же. Событие, чья версия новее SCHEMA_VERSION, консьюмер не применяет:
+оно уходит в DLQ, и после обновления консьюмера событие можно переиграть.
+
+Формат тела описывают заголовки сообщения:
+
+    content-type: application/json (если заголовка нет - тоже JSON) или application/msgpack
+    content-encoding: zlib, если тело дополнительно сжато
+
+Консьюмер читает все варианты одновременно, поэтому при выкатке сначала обновляются
+консьюмеры, затем продюсер переключается на msgpack (EVENT_CONTENT_TYPE).
+"""
+
+import zlib
+from collections.abc import Callable, Iterable
+
+import msgpack
+import orjson
+
+SCHEMA_VERSION = 1
+
+CONTENT_TYPE_HEADER = "content-type"
+CONTENT_ENCODING_HEADER = "content-encoding"
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ZLIB = "zlib"
+
+_DUMPS: dict[str, Callable[[dict], bytes]] = {JSON: orjson.dumps, MSGPACK: msgpack.packb}
+_LOADS: dict[str, Callable[[bytes], object]] = {JSON: orjson.loads, MSGPACK: msgpack.unpackb}
+
+
+class EventDecodeError(ValueError):
+    """Тело сообщения не читается: неизвестный формат, сжатие или битые данные."""
+
+
+class UnsupportedSchemaError(EventDecodeError):
+    """Сообщение прочитано, но версия конверта новее той, что понимает сервис."""
+
+    def __init__(self, message: dict):
+        super().__init__(f"unsupported schema_version {message.get('schema_version')!r}")
+        self.message = message
+
+
+def envelope(event_type: str, data: dict, produced_at: float) -> dict:
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "event": event_type,
+        "data": data,
+        "produced_at": produced_at,
+    }
+
+
+def serializer(content_type: str = JSON, compression: str | None = None):
+    """value_serializer для продюсера: dict -> bytes в выбранном формате."""
+    if content_type not in _DUMPS:
+        raise ValueError(f"unknown event content type {content_type!r}")
+    if compression not in (None, ZLIB):
+        raise ValueError(f"unknown event compression {compression!r}")
+    dumps = _DUMPS[content_type]
+    if compression is None:
+        return dumps
+    return lambda message: zlib.compress(dumps(message), 1)
+
+
+def content_headers(content_type: str = JSON, compression: str | None = None):
+    """Заголовки, по которым консьюмер поймет, как читать тело (пары (str, bytes))."""
+    headers = [(CONTENT_TYPE_HEADER, content_type.encode())]
+    if compression is not None:
+        headers.append((CONTENT_ENCODING_HEADER, compression.encode()))
+    return headers
+
+
+def decode_event(payload: bytes, headers: Iterable[tuple[str, bytes]] | None = None) -> dict:
+    """
+    Читает событие по заголовкам content-type/content-encoding.
+    Бросает EventDecodeError, если тело не читается, и UnsupportedSchemaError,
+    если версия конверта новее SCHEMA_VERSION.
+    """
+    meta = {key.lower(): value for key, value in headers or ()}
+    content_type = meta.get(CONTENT_TYPE_HEADER, JSON.encode()).decode("latin-1")
+    encoding = meta.get(CONTENT_ENCODING_HEADER, b"").decode("latin-1")
+
+    loads = _LOADS.get(content_type.split(";", 1)[0].strip())
+    if loads is None:
+        raise EventDecodeError(f"unknown content-type {content_type!r}")
+    if encoding not in ("", ZLIB):
+        raise EventDecodeError(f"unknown content-encoding {encoding!r}")
+    try:
+        if encoding == ZLIB:
+            payload = zlib.decompress(payload)
+        message = loads(payload)
+    except (ValueError, TypeError, zlib.error, msgpack.UnpackException) as exc:
+        raise EventDecodeError(f"malformed {content_type} payload: {exc}") from exc
+
+    if not isinstance(message, dict):
+        raise EventDecodeError(f"event must be an object, got {type(message).__name__}")
+    version = message.get("schema_version", 0)
+    if not isinstance(version, int) or version > SCHEMA_VERSION:
+        raise UnsupportedSchemaError(message)
+    return message
@@ -0,0 +1,96 @@
+"""
+Индексы коллекций и планы основных запросов.
+
+ensure_indexes при старте создает индексы, объявленные в app/models.py (повторный вызов
+ничего не меняет). explain_queries прогоняет explain() для запросов, которые делает
+сервис, и для каждого показывает, каким индексом он обслуживается. GET /admin/explain
+отдает эту сводку: collscan=true означает, что запросу не хватает индекса.
+"""
+
+from datetime import UTC, datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.database import authors_collection, books_collection, outbox_collection
+from app.models import AUTHOR_INDEXES, BOOK_INDEXES
+
+
+async def ensure_indexes():
+    for collection, indexes in (
+        (books_collection, BOOK_INDEXES),
+        (authors_collection, AUTHOR_INDEXES),
+    ):
+        try:
+            await collection.create_indexes(indexes)
+        except OperationFailure as exc:
+            # Индекс с тем же именем, но другими параметрами (создан вручную) - не трогаем
+            print(f"⚠️ Не удалось создать индексы коллекции {collection.name}: {exc}")
+
+
+def main_queries() -> list[tuple[str, object, dict, list | None, int]]:
+    """
+    (имя, коллекция, фильтр, сортировка, limit) для запросов из routers.py и outbox.py.
+    Значения в фильтрах условные: план зависит от формы запроса, не от конкретного id.
+    """
+    sample_id = ObjectId()
+    by_id = [("_id", ASCENDING)]
+    return [
+        ("books_page", books_collection, {"_id": {"$gt": sample_id}}, by_id, 100),
+        ("authors_page", authors_collection, {"_id": {"$gt": sample_id}}, by_id, 100),
+        ("books_by_author", books_collection, {"author_ids": str(sample_id)}, None, 0),
+        ("authors_by_book", authors_collection, {"book_ids": str(sample_id)}, None, 0),
+        ("books_by_title", books_collection, {"title": "Война и мир"}, None, 0),
+        (
+            "outbox_pending",
+            outbox_collection,
+            {
+                "sent_at": None,
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.now(UTC)}}],
+            },
+            by_id,
+            settings.OUTBOX_BATCH_SIZE,
+        ),
+    ]
+
+
+def plan_summary(explained: dict) -> dict:
+    """Стадии выигравшего плана, использованные индексы и счетчики из executionStats."""
+    winning = explained.get("queryPlanner", {}).get("winningPlan", {})
+    # Начиная с Mongo 7 (движок SBE) план лежит внутри queryPlan
+    winning = winning.get("queryPlan", winning)
+
+    stages, indexes = [], []
+    pending = [winning]
+    while pending:
+        stage = pending.pop()
+        stages.append(stage.get("stage"))
+        if stage.get("indexName"):
+            indexes.append(stage["indexName"])
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending.extend(stage.get("inputStages", []))
+
+    stats = explained.get("executionStats", {})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "time_ms": stats.get("executionTimeMillis"),
+    }
+
+
+async def explain_queries() -> dict:
+    queries = []
+    for name, collection, query, sort, limit in main_queries():
+        explained = await collection.find(query, sort=sort, limit=limit).explain()
+        queries.append({"name": name, "collection": collection.name, **plan_summary(explained)})
+    return {
+        "queries": queries,
+        "collscans": [query["name"] for query in queries if query["collscan"]],
+    }
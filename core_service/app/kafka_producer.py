@@ -1,8 +1,162 @@
+import asyncio
+import time
+from functools import partial
+
 from aiokafka import AIOKafkaProducer
+from opentelemetry.trace import SpanKind
+
+from app.config import settings
+from app.events import content_headers, envelope, serializer
+from app.metrics import KAFKA_EVENTS, KAFKA_IN_FLIGHT, KAFKA_PUBLISH_SECONDS
+from app.tracing import kafka_headers, span, trace_carrier
 
 # Глобальная переменная для хранения нашего продюсера
 producer: AIOKafkaProducer = None
 
+# Отправки, по которым еще не пришло подтверждение от брокера
+_pending: set[asyncio.Future] = set()
+# Ограничение на число неподтвержденных отправок (backpressure для обработчиков запросов)
+_slots: asyncio.Semaphore | None = None
+
+delivery_stats = {"queued": 0, "delivered": 0, "failed": 0}
+
+KAFKA_IN_FLIGHT.set_function(lambda: len(_pending))
+
+
+async def start_producer():
+    """
+    Создает и запускает продюсер (батчинг + сжатие).
+    linger_ms дает продюсеру немного подождать и собрать больше сообщений в один батч.
+    """
+    global producer, _slots
+    producer = AIOKafkaProducer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,  # Забираем из настроек
+        value_serializer=serializer(settings.EVENT_CONTENT_TYPE, settings.EVENT_COMPRESSION),
+        key_serializer=lambda k: k.encode("utf-8") if k is not None else None,
+        linger_ms=settings.KAFKA_LINGER_MS,
+        max_batch_size=settings.KAFKA_MAX_BATCH_SIZE,
+        compression_type=settings.KAFKA_COMPRESSION_TYPE,
+    )
+    _slots = asyncio.Semaphore(settings.KAFKA_MAX_IN_FLIGHT)
+    await producer.start()
+
+
+async def stop_producer():
+    """Дожидается неподтвержденных отправок и останавливает продюсер."""
+    if producer is None:
+        return
+    await flush_events()
+    await producer.stop()
+
+
+async def flush_events():
+    if _pending:
+        await asyncio.gather(*list(_pending), return_exceptions=True)
+
+
+def delivery_metrics() -> dict:
+    return {
+        **delivery_stats,
+        "in_flight": len(_pending),
+        "max_in_flight": settings.KAFKA_MAX_IN_FLIGHT,
+    }
+
+
+def event_message(event_type: str, data: dict) -> dict:
+    """
+    Тело события (конверт из app/events.py). produced_at (unix-время в секундах) - момент,
+    когда событие появилось в core_service: по нему search_service считает задержку
+    от записи до индексации.
+    """
+    return envelope(event_type, data, time.time())
+
+
+def message_headers(trace: dict[str, str] | None) -> list[tuple[str, bytes]]:
+    """Заголовки сообщения: формат тела (content-type) и traceparent события."""
+    body = content_headers(settings.EVENT_CONTENT_TYPE, settings.EVENT_COMPRESSION)
+    return body + kafka_headers(trace)
+
+
+def event_key(data: dict) -> str | None:
+    """Ключ сообщения - id документа: все события одной сущности попадают в одну партицию."""
+    doc_id = data.get("_id")
+    return str(doc_id) if doc_id is not None else None
+
+
+def _in_flight_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.KAFKA_MAX_IN_FLIGHT)
+    return _slots
+
+
+def _on_delivery(delivery: asyncio.Future, started: float):
+    _pending.discard(delivery)
+    _in_flight_slots().release()
+    # exception() у отмененного future сам бросает CancelledError, поэтому сначала cancelled()
+    if delivery.cancelled():
+        failure = "отправка отменена"
+    elif delivery.exception() is not None:
+        failure = repr(delivery.exception())
+    else:
+        failure = None
+    if failure is not None:
+        delivery_stats["failed"] += 1
+        KAFKA_EVENTS.labels("failed").inc()
+        print(f"❌ Событие не доставлено в Kafka: {failure}")
+    else:
+        delivery_stats["delivered"] += 1
+        KAFKA_EVENTS.labels("delivered").inc()
+        KAFKA_PUBLISH_SECONDS.observe(time.monotonic() - started)
+
+
+async def _enqueue(topic: str, message: dict, key: str | None, headers: list | None = None):
+    """
+    Кладет сообщение в буфер продюсера и сразу возвращается, не дожидаясь брокера.
+    Если неподтвержденных отправок уже KAFKA_MAX_IN_FLIGHT, ждем, пока освободится место.
+    """
+    slots = _in_flight_slots()
+    await slots.acquire()
+    started = time.monotonic()
+    try:
+        delivery = await producer.send(topic, message, key=key, headers=headers)
+    except Exception:
+        slots.release()
+        delivery_stats["failed"] += 1
+        KAFKA_EVENTS.labels("failed").inc()
+        raise
+    delivery_stats["queued"] += 1
+    _pending.add(delivery)
+    delivery.add_done_callback(partial(_on_delivery, started=started))
+
+
+async def send_batch_and_wait(batch: list[tuple[str, dict, str | None, dict | None]]):
+    """
+    Отправляет пачку (topic, message, key, trace) и ждет подтверждения всех сообщений.
+    trace - сохраненный traceparent события, он уходит в заголовки сообщения.
+    Без продюсера падает (send_event в этом случае молчит): вызывающий должен знать,
+    что ничего не ушло.
+    """
+    if producer is None:
+        raise RuntimeError("Kafka producer is not started")
+    started = time.monotonic()
+    try:
+        deliveries = [
+            await producer.send(topic, message, key=key, headers=message_headers(trace))
+            for topic, message, key, trace in batch
+        ]
+        await asyncio.gather(*deliveries)
+    except Exception:
+        KAFKA_EVENTS.labels("failed").inc(len(batch))
+        raise
+    _observe_acked(len(batch), time.monotonic() - started)
+
+
+def _observe_acked(count: int, seconds: float):
+    KAFKA_EVENTS.labels("delivered").inc(count)
+    for _ in range(count):
+        KAFKA_PUBLISH_SECONDS.observe(seconds)
+
 
 async def send_event(topic: str, event_type: str, data: dict):
     """
@@ -11,7 +165,39 @@ async def send_event(topic: str, event_type: str, data: dict):
     global producer
     if producer:
         # Формируем структуру сообщения (Event)
-        message = {"event": event_type, "data": data}
-        # Отправляем сообщение
-        await producer.send_and_wait(topic, message)
-        print(f"✅ Событие {event_type} отправлено в топик {topic}!")
+        message = event_message(event_type, data)
+        key = event_key(data)
+        with span(f"kafka publish {event_type}", kind=SpanKind.PRODUCER, topic=topic):
+            # Консьюмер продолжит трассу от этого спана
+            headers = message_headers(trace_carrier())
+            if settings.KAFKA_WAIT_FOR_ACK:
+                # Ждем подтверждения брокера прямо в обработчике запроса
+                started = time.monotonic()
+                await producer.send_and_wait(topic, message, key=key, headers=headers)
+                _observe_acked(1, time.monotonic() - started)
+                print(f"✅ Событие {event_type} отправлено в топик {topic}!")
+            else:
+                await _enqueue(topic, message, key, headers)
+
+
+async def send_events(topic: str, event_type: str, items: list[dict]):
+    """
+    Отправляет пачку событий одного типа.
+    Сначала кладем все сообщения в буфер продюсера (он сам собирает их в батчи),
+    потом разом ждем подтверждения от брокера (если включен KAFKA_WAIT_FOR_ACK).
+    """
+    global producer
+    if producer and items:
+        with span(
+            f"kafka publish {event_type}", kind=SpanKind.PRODUCER, topic=topic, count=len(items)
+        ):
+            trace = trace_carrier()
+            messages = [
+                (topic, event_message(event_type, data), event_key(data), trace) for data in items
+            ]
+            if settings.KAFKA_WAIT_FOR_ACK:
+                await send_batch_and_wait(messages)
+                print(f"✅ {len(items)} событий {event_type} отправлено в топик {topic}!")
+            else:
+                for _, msg, key, _ in messages:
+                    await _enqueue(topic, msg, key, message_headers(trace))
@@ -1,35 +1,52 @@
-import json
+import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 
-from aiokafka import AIOKafkaProducer
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-import app.kafka_producer as kafka_module  # Импортируем наш модуль
 from app.config import settings
 from app.database import client
+from app.indexes import ensure_indexes, explain_queries
+from app.kafka_producer import delivery_metrics, start_producer, stop_producer
+from app.metrics import OUTBOX_PENDING
+from app.outbox import ensure_outbox_indexes, pending_events, relay_outbox, watch_outbox
 from app.routers import router as library_router
+from app.tracing import setup_tracing, shutdown_tracing, trace_requests
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    client.open()
     print("🚀 Приложение запускается. MongoDB подключена.")
+    setup_tracing()
+    await ensure_indexes()
 
     # Инициализируем и запускаем Kafka Producer
     print("🚀 Подключение к Kafka...")
-    kafka_module.producer = AIOKafkaProducer(
-        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,  # Забираем из настроек
-        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
-    )
-    await kafka_module.producer.start()
+    await start_producer()
+
+    # Фоновые задачи outbox: relay публикует события, change stream (опционально) его будит
+    background_tasks = []
+    if settings.OUTBOX_ENABLED:
+        await ensure_outbox_indexes()
+        background_tasks.append(asyncio.create_task(relay_outbox()))
+        if settings.OUTBOX_CHANGE_STREAM:
+            background_tasks.append(asyncio.create_task(watch_outbox()))
 
     yield
 
     # Корректно всё тушим при остановке сервера
+    for task in background_tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
     print("🛑 Отключение от Kafka...")
-    await kafka_module.producer.stop()
+    await stop_producer()
     print("🛑 Закрытие соединения с MongoDB...")
     client.close()
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -46,9 +63,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Спан и заголовок Server-Timing на каждый запрос
+app.middleware("http")(trace_requests)
+
 app.include_router(library_router)
 
 
 @app.get("/")
 async def root():
     return {"message": "Core Service работает!"}
+
+
+@app.get("/kafka/stats")
+async def kafka_stats():
+    # Статистика доставки событий: сколько в очереди, доставлено, потеряно
+    return delivery_metrics()
+
+
+@app.get("/admin/explain")
+async def explain():
+    # Планы основных запросов; collscans - запросы, которым не хватает индекса
+    return await explain_queries()
+
+
+@app.get("/admin/pools")
+async def pools():
+    # Занятость пула соединений MongoDB: in_use / max_pool_size, ожидающие и таймауты
+    return client.pool_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Метрики в формате Prometheus; размер очереди outbox считаем в момент опроса
+    if settings.OUTBOX_ENABLED:
+        OUTBOX_PENDING.set(await pending_events())
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,35 @@
+"""
+Метрики Prometheus для core_service (отдаются на GET /metrics).
+
+Задержку публикации считаем от передачи сообщения продюсеру до подтверждения брокера,
+глубину очереди - как число неподтвержденных отправок и неотправленных строк outbox.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Публикация в Kafka обычно укладывается в миллисекунды, но под нагрузкой растет до секунд
+PUBLISH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+KAFKA_PUBLISH_SECONDS = Histogram(
+    "core_kafka_publish_seconds",
+    "Время от отправки события в продюсер до подтверждения брокера",
+    buckets=PUBLISH_BUCKETS,
+)
+KAFKA_EVENTS = Counter(
+    "core_kafka_events",
+    "События, отправленные в Kafka, по результату доставки",
+    ["result"],
+)
+KAFKA_IN_FLIGHT = Gauge(
+    "core_kafka_in_flight",
+    "Отправки в Kafka, по которым еще нет подтверждения брокера",
+)
+OUTBOX_PENDING = Gauge(
+    "core_outbox_pending",
+    "Строки outbox, которые еще не опубликованы в Kafka",
+)
+MONGO_POOL = Gauge(
+    "core_mongo_pool_connections",
+    "Соединения пула MongoDB: открытые, занятые запросами и ожидающие свободного",
+    ["state"],
+)
@@ -2,6 +2,7 @@ from typing import Annotated
 
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic.functional_validators import BeforeValidator
+from pymongo import ASCENDING, IndexModel
 
 # Магия Pydantic V2: хелпер, который конвертирует ObjectId в строку для JSON
 PyObjectId = Annotated[str, BeforeValidator(str)]
@@ -16,9 +17,16 @@ class AuthorBase(BaseModel):
 
 class AuthorDB(AuthorBase):
     id: PyObjectId | None = Field(alias="_id", default=None)
+    # Растет при каждом изменении; по нему search_service отбрасывает устаревшие события
+    version: int = 1
     model_config = ConfigDict(populate_by_name=True)
 
 
+class AuthorUpdate(BaseModel):
+    # Книги автора меняются через книги (PATCH /books/{id})
+    name: str | None = None
+
+
 # --- КНИГИ ---
 class BookBase(BaseModel):
     title: str
@@ -29,4 +37,44 @@ class BookBase(BaseModel):
 
 class BookDB(BookBase):
     id: PyObjectId | None = Field(alias="_id", default=None)
+    version: int = 1
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class BookUpdate(BaseModel):
+    # Только переданные поля попадают в изменение и в событие book_updated
+    title: str | None = None
+    description: str | None = None
+    author_ids: list[PyObjectId] | None = None
+
+
+# --- МАССОВОЕ СОЗДАНИЕ ---
+class BulkItemResult(BaseModel):
+    # Позиция элемента во входном списке
+    index: int
+    id: PyObjectId | None = Field(alias="_id", default=None)
+    status: str  # "created" или "error"
+    error: str | None = None
     model_config = ConfigDict(populate_by_name=True)
+
+
+class BulkResult(BaseModel):
+    inserted: int
+    failed: int
+    results: list[BulkItemResult]
+
+
+# --- ИНДЕКСЫ ---
+# Создаются при старте (app/indexes.py); если индекс уже есть, create_indexes ничего не делает.
+# Keyset-пагинация (?after=) идет по _id: ObjectId начинается со времени создания документа,
+# так что встроенный индекс _id и служит индексом по дате создания.
+BOOK_INDEXES = [
+    # Мультиключевой: книги автора ({"author_ids": id}) при удалении автора
+    IndexModel([("author_ids", ASCENDING)], name="author_ids"),
+    # Точный поиск и сортировка по названию (полнотекстовый поиск - в search_service)
+    IndexModel([("title", ASCENDING)], name="title"),
+]
+AUTHOR_INDEXES = [
+    # Мультиключевой: авторы книги ({"book_ids": id}) при удалении книги
+    IndexModel([("book_ids", ASCENDING)], name="book_ids"),
+]
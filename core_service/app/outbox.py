@@ -0,0 +1,213 @@
+"""
+Transactional outbox: событие пишется в коллекцию outbox в той же транзакции Mongo,
+что и сама книга/автор. Фоновая задача relay_outbox пачками публикует события в Kafka.
+
+Так запись стоит одну локальную транзакцию, Kafka не тормозит HTTP-запросы,
+и событие не теряется, если процесс упал между записью в Mongo и отправкой.
+Доставка at-least-once: после падения между отправкой и пометкой sent_at
+событие уйдет повторно (консьюмер индексирует по _id, повтор безопасен).
+"""
+
+import asyncio
+import contextlib
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+from typing import TypeVar
+
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from app.config import settings
+from app.database import client, outbox_collection, write_concern_for
+from app.kafka_producer import event_key, event_message, send_batch_and_wait
+from app.tracing import trace_carrier
+
+# Уникальный id этого процесса: им помечаем "захваченные" строки outbox,
+# чтобы несколько реплик core_service не отправляли одно и то же
+RELAY_ID = uuid.uuid4().hex
+
+T = TypeVar("T")
+
+# Будильник для relay: выставляется после коммита транзакции или из change stream
+_wakeup: asyncio.Event | None = None
+
+
+def _wakeup_event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+def notify():
+    """Разбудить relay, не дожидаясь следующего опроса."""
+    _wakeup_event().set()
+
+
+def _has_label(exc: BaseException, label: str) -> bool:
+    return isinstance(exc, PyMongoError) and exc.has_error_label(label)
+
+
+async def _commit(session: AsyncIOMotorClientSession, deadline: float):
+    # UnknownTransactionCommitResult: неизвестно, применился ли коммит; повтор безопасен
+    while True:
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as exc:
+            if not _has_label(exc, "UnknownTransactionCommitResult"):
+                raise
+            if time.monotonic() >= deadline:
+                raise
+
+
+async def in_transaction(
+    route: str, work: Callable[[AsyncIOMotorClientSession | None], Awaitable[T]]
+) -> T:
+    """
+    Выполняет work(session) в транзакции, если outbox включен; иначе work(None)
+    (тогда запись идет без транзакции, события отправляются напрямую в Kafka).
+    Write concern транзакции берется из MONGO_WRITE_CONCERN для маршрута route.
+
+    Повторы устроены как session.with_transaction в драйвере: при
+    TransientTransactionError (выборы primary, конфликт записи) транзакция выполняется
+    заново, при UnknownTransactionCommitResult повторяется коммит. Повторы идут не
+    дольше MONGO_TRANSACTION_RETRY_SECONDS. Поэтому work может выполниться несколько
+    раз и не должна иметь побочных эффектов вне сессии.
+    """
+    if not settings.OUTBOX_ENABLED:
+        return await work(None)
+    write_concern = write_concern_for(route)
+    deadline = time.monotonic() + settings.MONGO_TRANSACTION_RETRY_SECONDS
+    async with await client.start_session() as session:
+        while True:
+            session.start_transaction(write_concern=write_concern)
+            try:
+                result = await work(session)
+            except BaseException as exc:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                if _has_label(exc, "TransientTransactionError") and time.monotonic() < deadline:
+                    continue
+                raise
+            try:
+                await _commit(session, deadline)
+            except PyMongoError as exc:
+                if _has_label(exc, "TransientTransactionError") and time.monotonic() < deadline:
+                    continue
+                raise
+            break
+    notify()
+    return result
+
+
+def _outbox_row(topic: str, event_type: str, data: dict) -> dict:
+    return {
+        "topic": topic,
+        "key": event_key(data),
+        "message": event_message(event_type, data),
+        # traceparent запроса, в котором появилось событие: relay положит его в заголовки Kafka
+        "trace": trace_carrier(),
+        "created_at": datetime.now(UTC),
+        "sent_at": None,
+        "lease_owner": None,
+        "lease_until": None,
+    }
+
+
+async def add_event(topic: str, event_type: str, data: dict, session: AsyncIOMotorClientSession):
+    await outbox_collection.insert_one(_outbox_row(topic, event_type, data), session=session)
+
+
+async def add_events(
+    topic: str, event_type: str, items: list[dict], session: AsyncIOMotorClientSession
+):
+    if items:
+        rows = [_outbox_row(topic, event_type, data) for data in items]
+        await outbox_collection.insert_many(rows, session=session)
+
+
+async def ensure_outbox_indexes():
+    # Индекс по sent_at обслуживает выборку неотправленных (sent_at: null),
+    # а TTL удаляет отправленные строки через OUTBOX_RETENTION_SECONDS
+    await outbox_collection.create_index(
+        [("sent_at", ASCENDING)],
+        name="sent_at_ttl",
+        expireAfterSeconds=settings.OUTBOX_RETENTION_SECONDS,
+    )
+
+
+async def pending_events() -> int:
+    """Сколько событий еще ждут публикации (обслуживается индексом sent_at_ttl)."""
+    return await outbox_collection.count_documents({"sent_at": None})
+
+
+async def _claim_batch() -> list[dict]:
+    """Захватывает пачку неотправленных строк в аренду на OUTBOX_LEASE_SECONDS."""
+    now = datetime.now(UTC)
+    available = {
+        "sent_at": None,
+        "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+    }
+    candidates = await outbox_collection.find(
+        available, {"_id": 1}, sort=[("_id", ASCENDING)], limit=settings.OUTBOX_BATCH_SIZE
+    ).to_list(settings.OUTBOX_BATCH_SIZE)
+    if not candidates:
+        return []
+
+    ids = [row["_id"] for row in candidates]
+    lease = {
+        "lease_owner": RELAY_ID,
+        "lease_until": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+    }
+    await outbox_collection.update_many({**available, "_id": {"$in": ids}}, {"$set": lease})
+
+    # Другая реплика могла успеть забрать часть строк - отправляем только свои
+    return await outbox_collection.find(
+        {"_id": {"$in": ids}, "lease_owner": RELAY_ID, "sent_at": None},
+        sort=[("_id", ASCENDING)],
+    ).to_list(len(ids))
+
+
+async def relay_batch() -> int:
+    """Отправляет в Kafka одну пачку из outbox и помечает строки отправленными."""
+    rows = await _claim_batch()
+    if not rows:
+        return 0
+
+    await send_batch_and_wait(
+        [(row["topic"], row["message"], row["key"], row.get("trace")) for row in rows]
+    )
+    await outbox_collection.update_many(
+        {"_id": {"$in": [row["_id"] for row in rows]}},
+        {"$set": {"sent_at": datetime.now(UTC), "lease_until": None}},
+    )
+    print(f"📤 Outbox: отправлено событий: {len(rows)}")
+    return len(rows)
+
+
+async def relay_outbox():
+    """Фоновая задача: публикует неотправленные события, пока приложение работает."""
+    wakeup = _wakeup_event()
+    while True:
+        wakeup.clear()
+        try:
+            sent = await relay_batch()
+        except Exception as exc:
+            print(f"❌ Outbox relay: {exc!r}")
+            sent = 0
+
+        if sent < settings.OUTBOX_BATCH_SIZE:
+            # Очередь разобрана: ждем новых записей или следующего опроса
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL)
+
+
+async def watch_outbox():
+    """Будит relay по change stream, как только в outbox появилась новая строка (в т.ч. от других реплик)."""
+    async with outbox_collection.watch([{"$match": {"operationType": "insert"}}]) as stream:
+        async for _ in stream:
+            notify()
@@ -1,12 +1,290 @@
+import asyncio
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+
 from bson import ObjectId
-from fastapi import APIRouter, status
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorCollection
+from pydantic import BaseModel
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 
-from app.database import authors_collection, books_collection
-from app.kafka_producer import send_event
-from app.models import AuthorBase, AuthorDB, BookBase, BookDB
+from app.config import settings
+from app.database import authors_collection, books_collection, route_collection
+from app.kafka_producer import send_event, send_events
+from app.models import (
+    AuthorBase,
+    AuthorDB,
+    AuthorUpdate,
+    BookBase,
+    BookDB,
+    BookUpdate,
+    BulkItemResult,
+    BulkResult,
+)
+from app.outbox import add_event, add_events, in_transaction
+from app.serialization import documents_response, ndjson_line
 
 router = APIRouter(tags=["Library"])
 
+EVENTS_TOPIC = "library.events"
+
+# Сколько документов максимум отдаем за одну страницу
+MAX_PAGE_SIZE = 1000
+
+
+def keyset_filter(after: str | None) -> dict:
+    """
+    Фильтр для keyset-пагинации по _id: следующая страница начинается
+    сразу после последнего _id предыдущей.
+    """
+    if after is None:
+        return {}
+    if not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+    return {"_id": {"$gt": ObjectId(after)}}
+
+
+def projection_for(fields: str | None, model: type[BaseModel]) -> dict | None:
+    """
+    Проекция Mongo из параметра ?fields=title,author_ids (_id возвращается всегда).
+    Разрешены только поля модели.
+    """
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(model.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return dict.fromkeys(requested, 1)
+
+
+async def list_page(
+    collection: AsyncIOMotorCollection,
+    model: type[BaseModel],
+    after: str | None,
+    limit: int,
+    fields: str | None,
+) -> JSONResponse:
+    # Документы отдаем как есть, без валидации Pydantic-моделью на каждую строку
+    documents = await collection.find(
+        keyset_filter(after), projection_for(fields, model), sort=[("_id", 1)], limit=limit
+    ).to_list(limit)
+    return documents_response(documents)
+
+
+def export_ndjson(
+    collection: AsyncIOMotorCollection,
+    model: type[BaseModel],
+    after: str | None,
+    fields: str | None,
+) -> StreamingResponse:
+    """
+    Выгрузка всей коллекции в формате NDJSON (один документ на строку).
+    Motor-курсор читается пачками по EXPORT_BATCH_SIZE, в памяти не держим больше одной пачки.
+    """
+    cursor = collection.find(
+        keyset_filter(after),
+        projection_for(fields, model),
+        sort=[("_id", 1)],
+        batch_size=settings.EXPORT_BATCH_SIZE,
+    )
+
+    async def lines():
+        chunk = []
+        async for doc in cursor:
+            chunk.append(ndjson_line(doc))
+            if len(chunk) >= settings.EXPORT_BATCH_SIZE:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def check_bulk_size(items: list):
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BULK_MAX_ITEMS} items per request",
+        )
+
+
+async def publish_event(event_type: str, data: dict, session: AsyncIOMotorClientSession | None):
+    """При включенном outbox событие пишется в той же транзакции, иначе сразу уходит в Kafka."""
+    if session is not None:
+        await add_event(EVENTS_TOPIC, event_type, data, session)
+    else:
+        await send_event(topic=EVENTS_TOPIC, event_type=event_type, data=data)
+
+
+async def publish_events(
+    event_type: str, items: list[dict], session: AsyncIOMotorClientSession | None
+):
+    if session is not None:
+        await add_events(EVENTS_TOPIC, event_type, items, session)
+    else:
+        await send_events(topic=EVENTS_TOPIC, event_type=event_type, items=items)
+
+
+async def run_steps(
+    session: AsyncIOMotorClientSession | None, *steps: Callable[[], Awaitable[None]]
+):
+    """
+    Независимые шаги записи (обратные ссылки, публикация события). Без транзакции идут
+    параллельно; в транзакции - по очереди, так как сессия Mongo не допускает
+    одновременных операций.
+    """
+    if session is None:
+        await asyncio.gather(*(step() for step in steps))
+    else:
+        for step in steps:
+            await step()
+
+
+async def insert_many_unordered(
+    collection: AsyncIOMotorCollection,
+    documents: list[dict],
+    session: AsyncIOMotorClientSession | None,
+) -> dict[int, str]:
+    """
+    Вставляет документы одним insert_many(ordered=False): ошибка в одном документе
+    не останавливает вставку остальных. _id генерируем заранее, чтобы сразу знать их.
+    Возвращает ошибки по позициям в списке documents.
+    Внутри транзакции частичная вставка невозможна - там BulkWriteError пробрасывается.
+    """
+    for doc in documents:
+        doc["_id"] = ObjectId()
+    try:
+        await collection.insert_many(documents, ordered=False, session=session)
+    except BulkWriteError as exc:
+        if session is not None:
+            raise
+        return {err["index"]: err["errmsg"] for err in exc.details.get("writeErrors", [])}
+    return {}
+
+
+def bulk_result(size: int, documents: dict[int, dict], errors: dict[int, str]) -> BulkResult:
+    results = [
+        BulkItemResult(index=i, status="error", error=errors[i])
+        if i in errors
+        else BulkItemResult(index=i, _id=documents[i]["_id"], status="created")
+        for i in range(size)
+    ]
+    return BulkResult(inserted=size - len(errors), failed=len(errors), results=results)
+
+
+# Следующая версия документа. Документы, созданные до появления версий, считаются версией 1
+NEXT_VERSION = {"$add": [{"$ifNull": ["$version", 1]}, 1]}
+
+
+def object_id_or_404(value: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=404, detail="Not found")
+    return ObjectId(value)
+
+
+def versioned_set(fields: dict) -> list[dict]:
+    """
+    Pipeline-апдейт: выставляет поля и увеличивает version на 1.
+    Значения оборачиваются в $literal, чтобы строки вида "$x" не читались как выражения.
+    """
+    values = {field: {"$literal": value} for field, value in fields.items()}
+    return [{"$set": {**values, "version": NEXT_VERSION}}]
+
+
+def array_with(field: str, value: str) -> dict:
+    """Выражение pipeline: массив field плюс value (без дублей, порядок сохраняется)."""
+    current = {"$ifNull": [f"${field}", []]}
+    return {"$cond": [{"$in": [value, current]}, current, {"$concatArrays": [current, [value]]}]}
+
+
+def array_with_all(field: str, values: list[str]) -> dict:
+    """Выражение pipeline: массив field плюс те из values, которых в нем еще нет."""
+    current = {"$ifNull": [f"${field}", []]}
+    missing = {"$filter": {"input": values, "cond": {"$not": [{"$in": ["$$this", current]}]}}}
+    return {"$concatArrays": [current, missing]}
+
+
+def array_without(field: str, value: str) -> dict:
+    return {
+        "$filter": {"input": {"$ifNull": [f"${field}", []]}, "cond": {"$ne": ["$$this", value]}}
+    }
+
+
+async def update_versioned(
+    collection: AsyncIOMotorCollection,
+    doc_id: ObjectId,
+    changes: dict,
+    session: AsyncIOMotorClientSession | None,
+) -> tuple[dict, dict]:
+    """Применяет changes к одному документу; возвращает пару (до, после). Нет документа - 404."""
+    before = await collection.find_one_and_update(
+        {"_id": doc_id},
+        versioned_set(changes),
+        return_document=ReturnDocument.BEFORE,
+        session=session,
+    )
+    if before is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    after = {**before, **changes, "version": before.get("version", 1) + 1}
+    return before, after
+
+
+async def update_related(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    field: str,
+    expression: dict,
+    event_type: str,
+    session: AsyncIOMotorClientSession | None,
+):
+    """
+    Обновляет обратные ссылки (book_ids авторов или author_ids книг), увеличивая version,
+    и публикует по каждому затронутому документу событие *_updated, где есть новое значение поля.
+    """
+    related = await collection.find(query, {"_id": 1}, session=session).to_list(None)
+    if not related:
+        return
+    ids = [doc["_id"] for doc in related]
+    await collection.update_many(
+        {"_id": {"$in": ids}},
+        [{"$set": {field: expression, "version": NEXT_VERSION}}],
+        session=session,
+    )
+    await publish_related(collection, ids, field, event_type, session)
+
+
+async def publish_related(
+    collection: AsyncIOMotorCollection,
+    ids: list[ObjectId],
+    field: str,
+    event_type: str,
+    session: AsyncIOMotorClientSession | None,
+):
+    """Публикует event_type по документам ids: новая версия и новое значение field."""
+    updated = await collection.find(
+        {"_id": {"$in": ids}}, {field: 1, "version": 1}, session=session
+    ).to_list(None)
+    await publish_events(
+        event_type,
+        [
+            {"_id": str(doc["_id"]), "version": doc["version"], field: doc.get(field, [])}
+            for doc in updated
+        ],
+        session,
+    )
+
+
+def changes_from(update: BaseModel) -> dict:
+    changes = update.model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    return changes
+
+
 # ==========================================
 # ✍️ АВТОРЫ
 # ==========================================
@@ -14,24 +292,109 @@ router = APIRouter(tags=["Library"])
 
 @router.post("/authors/", response_model=AuthorDB, status_code=status.HTTP_201_CREATED)
 async def create_author(author: AuthorBase):
-    author_dict = author.model_dump()
-    new_author = await authors_collection.insert_one(author_dict)
-    created_author = await authors_collection.find_one({"_id": new_author.inserted_id})
+    authors = route_collection(authors_collection, "create_author")
+    author_dict = {**author.model_dump(), "version": 1}
+
+    async def write(session):
+        new_author = await authors.insert_one(author_dict, session=session)
+        # Ответ собираем из вставленного документа: перечитывать его из Mongo незачем
+        created_author = {**author_dict, "_id": new_author.inserted_id}
+
+        # Подготавливаем данные для Кафки (превращаем ObjectId в строку)
+        event_data = {**created_author, "_id": str(created_author["_id"])}
 
-    # Подготавливаем данные для Кафки (превращаем ObjectId в строку)
-    event_data = {**created_author, "_id": str(created_author["_id"])}
+        # Публикуем событие в топик 'library.events' (через outbox или напрямую)
+        await publish_event("author_created", event_data, session)
+        return created_author
 
-    # Отправляем событие в топик 'library.events'
-    await send_event(topic="library.events", event_type="author_created", data=event_data)
+    return await in_transaction("create_author", write)
 
-    return created_author
+
+@router.post("/authors/bulk", response_model=BulkResult)
+async def create_authors_bulk(authors: list[AuthorBase]):
+    check_bulk_size(authors)
+    collection = route_collection(authors_collection, "create_authors_bulk")
+    documents = [{**author.model_dump(), "version": 1} for author in authors]
+
+    async def write(session):
+        errors = await insert_many_unordered(collection, documents, session)
+        created = [doc for i, doc in enumerate(documents) if i not in errors]
+        await publish_events(
+            "author_created", [{**doc, "_id": str(doc["_id"])} for doc in created], session
+        )
+        return errors
+
+    try:
+        errors = await in_transaction("create_authors_bulk", write)
+    except BulkWriteError as exc:
+        # Транзакция откатилась целиком - не создан никто
+        errors = dict.fromkeys(range(len(documents)), f"Transaction aborted: {exc}")
+
+    return bulk_result(len(documents), dict(enumerate(documents)), errors)
+
+
+@router.patch("/authors/{author_id}", response_model=AuthorDB)
+async def update_author(author_id: str, update: AuthorUpdate):
+    doc_id = object_id_or_404(author_id)
+    changes = changes_from(update)
+    authors = route_collection(authors_collection, "update_author")
+
+    async def write(session):
+        _, updated = await update_versioned(authors, doc_id, changes, session)
+        # В событии только измененные поля и новая версия
+        await publish_event(
+            "author_updated", {"_id": author_id, "version": updated["version"], **changes}, session
+        )
+        return updated
+
+    return await in_transaction("update_author", write)
+
+
+@router.delete("/authors/{author_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_author(author_id: str):
+    doc_id = object_id_or_404(author_id)
+    authors = route_collection(authors_collection, "delete_author")
+    books = route_collection(books_collection, "delete_author")
+
+    async def write(session):
+        deleted = await authors.find_one_and_delete({"_id": doc_id}, session=session)
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+
+        # Убираем автора из всех его книг (каждая книга получает book_updated)
+        await update_related(
+            books,
+            {"author_ids": author_id},
+            "author_ids",
+            array_without("author_ids", author_id),
+            "book_updated",
+            session,
+        )
+        await publish_event(
+            "author_deleted",
+            {"_id": author_id, "version": deleted.get("version", 1) + 1},
+            session,
+        )
+
+    await in_transaction("delete_author", write)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.get("/authors/", response_model=list[AuthorDB])
-async def get_authors():
-    # Достаем всех авторов (для пет-проекта пока без пагинации)
-    authors = await authors_collection.find().to_list(100)
-    return authors
+async def get_authors(
+    after: str | None = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = None,
+):
+    # Страница авторов, отсортированная по _id (курсор - _id последнего автора)
+    authors = route_collection(authors_collection, "get_authors")
+    return await list_page(authors, AuthorBase, after, limit, fields)
+
+
+@router.get("/authors/export")
+async def export_authors(after: str | None = None, fields: str | None = None):
+    authors = route_collection(authors_collection, "export_authors")
+    return export_ndjson(authors, AuthorBase, after, fields)
 
 
 # ==========================================
@@ -41,27 +404,185 @@ async def get_authors():
 
 @router.post("/books/", response_model=BookDB, status_code=status.HTTP_201_CREATED)
 async def create_book(book: BookBase):
-    book_dict = book.model_dump()
-    new_book = await books_collection.insert_one(book_dict)
-    created_book = await books_collection.find_one({"_id": new_book.inserted_id})
-
-    if book.author_ids:
-        author_object_ids = [ObjectId(aid) for aid in book.author_ids]
-        await authors_collection.update_many(
-            {"_id": {"$in": author_object_ids}},
-            {"$addToSet": {"book_ids": str(new_book.inserted_id)}},
+    books = route_collection(books_collection, "create_book")
+    authors = route_collection(authors_collection, "create_book")
+    book_dict = {**book.model_dump(), "version": 1}
+
+    async def write(session):
+        new_book = await books.insert_one(book_dict, session=session)
+        # Ответ и событие собираем из вставленного документа, без повторного чтения
+        created_book = {**book_dict, "_id": new_book.inserted_id}
+        event_data = {**created_book, "_id": str(new_book.inserted_id)}
+
+        async def link_authors():
+            if book.author_ids:
+                # Авторы получают новую версию и author_updated, как в update_book
+                await update_related(
+                    authors,
+                    {"_id": {"$in": [ObjectId(aid) for aid in book.author_ids]}},
+                    "book_ids",
+                    array_with("book_ids", event_data["_id"]),
+                    "author_updated",
+                    session,
+                )
+
+        async def publish():
+            await publish_event("book_created", event_data, session)
+
+        await run_steps(session, link_authors, publish)
+        return created_book
+
+    return await in_transaction("create_book", write)
+
+
+@router.post("/books/bulk", response_model=BulkResult)
+async def create_books_bulk(books: list[BookBase]):
+    check_bulk_size(books)
+
+    # Книги с некорректными author_ids даже не пытаемся вставлять
+    errors = {
+        i: "Invalid author id"
+        for i, book in enumerate(books)
+        if not all(ObjectId.is_valid(aid) for aid in book.author_ids)
+    }
+    positions = [i for i in range(len(books)) if i not in errors]
+    documents = [{**books[i].model_dump(), "version": 1} for i in positions]
+
+    collection = route_collection(books_collection, "create_books_bulk")
+    authors = route_collection(authors_collection, "create_books_bulk")
+
+    async def write(session):
+        insert_errors = await insert_many_unordered(collection, documents, session)
+        created = [doc for j, doc in enumerate(documents) if j not in insert_errors]
+
+        # Обратные ссылки: одна операция на автора со всеми его новыми книгами
+        book_ids_by_author = defaultdict(list)
+        for doc in created:
+            for aid in doc["author_ids"]:
+                book_ids_by_author[aid].append(str(doc["_id"]))
+
+        async def link_authors():
+            if book_ids_by_author:
+                await authors.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": ObjectId(aid)},
+                            [
+                                {
+                                    "$set": {
+                                        "book_ids": array_with_all("book_ids", ids),
+                                        "version": NEXT_VERSION,
+                                    }
+                                }
+                            ],
+                        )
+                        for aid, ids in book_ids_by_author.items()
+                    ],
+                    ordered=False,
+                    session=session,
+                )
+                author_ids = [ObjectId(aid) for aid in book_ids_by_author]
+                await publish_related(authors, author_ids, "book_ids", "author_updated", session)
+
+        async def publish():
+            await publish_events(
+                "book_created", [{**doc, "_id": str(doc["_id"])} for doc in created], session
+            )
+
+        await run_steps(session, link_authors, publish)
+        return insert_errors
+
+    try:
+        insert_errors = await in_transaction("create_books_bulk", write)
+        errors.update({positions[j]: msg for j, msg in insert_errors.items()})
+    except BulkWriteError as exc:
+        # Транзакция откатилась целиком - не создана ни одна книга
+        errors.update(dict.fromkeys(positions, f"Transaction aborted: {exc}"))
+
+    return bulk_result(len(books), dict(zip(positions, documents, strict=True)), errors)
+
+
+@router.patch("/books/{book_id}", response_model=BookDB)
+async def update_book(book_id: str, update: BookUpdate):
+    doc_id = object_id_or_404(book_id)
+    changes = changes_from(update)
+    if not all(ObjectId.is_valid(aid) for aid in changes.get("author_ids", [])):
+        raise HTTPException(status_code=400, detail="Invalid author id")
+
+    books = route_collection(books_collection, "update_book")
+    authors = route_collection(authors_collection, "update_book")
+
+    async def write(session):
+        before, updated = await update_versioned(books, doc_id, changes, session)
+
+        if "author_ids" in changes:
+            old_ids = set(before.get("author_ids", []))
+            new_ids = set(changes["author_ids"])
+            if new_ids - old_ids:
+                await update_related(
+                    authors,
+                    {"_id": {"$in": [ObjectId(aid) for aid in new_ids - old_ids]}},
+                    "book_ids",
+                    array_with("book_ids", book_id),
+                    "author_updated",
+                    session,
+                )
+            if old_ids - new_ids:
+                await update_related(
+                    authors,
+                    {"_id": {"$in": [ObjectId(aid) for aid in old_ids - new_ids]}},
+                    "book_ids",
+                    array_without("book_ids", book_id),
+                    "author_updated",
+                    session,
+                )
+
+        await publish_event(
+            "book_updated", {"_id": book_id, "version": updated["version"], **changes}, session
         )
+        return updated
+
+    return await in_transaction("update_book", write)
 
-    # Подготавливаем данные для Кафки
-    event_data = {**created_book, "_id": str(created_book["_id"])}
 
-    # Отправляем событие
-    await send_event(topic="library.events", event_type="book_created", data=event_data)
+@router.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_book(book_id: str):
+    doc_id = object_id_or_404(book_id)
+    books = route_collection(books_collection, "delete_book")
+    authors = route_collection(authors_collection, "delete_book")
 
-    return created_book
+    async def write(session):
+        deleted = await books.find_one_and_delete({"_id": doc_id}, session=session)
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+        await update_related(
+            authors,
+            {"book_ids": book_id},
+            "book_ids",
+            array_without("book_ids", book_id),
+            "author_updated",
+            session,
+        )
+        await publish_event(
+            "book_deleted", {"_id": book_id, "version": deleted.get("version", 1) + 1}, session
+        )
+
+    await in_transaction("delete_book", write)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.get("/books/", response_model=list[BookDB])
-async def get_books():
-    books = await books_collection.find().to_list(100)
-    return books
+async def get_books(
+    after: str | None = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = None,
+):
+    books = route_collection(books_collection, "get_books")
+    return await list_page(books, BookBase, after, limit, fields)
+
+
+@router.get("/books/export")
+async def export_books(after: str | None = None, fields: str | None = None):
+    books = route_collection(books_collection, "export_books")
+    return export_ndjson(books, BookBase, after, fields)
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+
+def to_jsonable(value):
+    """
+    Превращает документ из Mongo в JSON-совместимую структуру без создания Pydantic-моделей:
+    ObjectId -> str, datetime -> ISO-строка, вложенные списки/словари обходятся рекурсивно.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_default(value):
+    # orjson сам пишет dict/list/str/числа/datetime, сюда попадают только остальные типы
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    """Документ из Mongo сразу в JSON-байты (orjson): без промежуточной копии to_jsonable."""
+    return orjson.dumps(value, default=_encode_default)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON-ответ через orjson; ObjectId и datetime кодируются на лету."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def documents_response(documents: list[dict]) -> JSONResponse:
+    """
+    Страница документов без Pydantic-моделей: через orjson, если включен
+    FAST_JSON_RESPONSES, иначе to_jsonable и стандартный json.
+    """
+    if settings.FAST_JSON_RESPONSES:
+        return MongoJSONResponse(documents)
+    return JSONResponse([to_jsonable(doc) for doc in documents])
+
+
+def ndjson_line(doc: dict) -> bytes:
+    """Строка выгрузки /export (без перевода строки), тем же путем, что и documents_response."""
+    if settings.FAST_JSON_RESPONSES:
+        return dumps(doc)
+    return json.dumps(to_jsonable(doc), ensure_ascii=False).encode()
@@ -0,0 +1,191 @@
+"""
+Трассировка (OpenTelemetry): HTTP-запросы, вызовы Mongo и публикация событий в Kafka.
+
+Контекст трассы (W3C traceparent) уходит в заголовках сообщения Kafka, поэтому
+search_service продолжает ту же трассу: от POST /books/ до момента, когда книга
+проиндексирована, получается одна трасса.
+
+По умолчанию трассировка выключена (TRACING_EXPORTER=none): работает no-op трейсер,
+накладные расходы - один вызов функции на спан. При включении сэмплируется доля
+TRACING_SAMPLE_RATE трасс; решение принимается один раз в корне и наследуется
+по всей цепочке, в том числе через Kafka.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from starlette.requests import Request
+
+from app.config import settings
+
+SERVICE_NAME = "core_service"
+
+_propagator = TraceContextTextMapPropagator()
+_provider: TracerProvider | None = None
+_tracer: trace.Tracer = trace.NoOpTracer()
+
+
+def _configured_exporter() -> SpanExporter | None:
+    if settings.TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if settings.TRACING_EXPORTER == "otlp":
+        # Необязательная зависимость: pip install opentelemetry-exporter-otlp-proto-http
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as exc:
+            raise RuntimeError(
+                "TRACING_EXPORTER=otlp requires opentelemetry-exporter-otlp-proto-http"
+            ) from exc
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    return None
+
+
+def setup_tracing(
+    exporter: SpanExporter | None = None, sample_rate: float | None = None, batch: bool = True
+):
+    """
+    Включает трассировку. Без аргументов экспортер берется из TRACING_EXPORTER;
+    тесты передают InMemorySpanExporter и batch=False, чтобы спаны появлялись сразу.
+    """
+    global _provider, _tracer
+    exporter = exporter or _configured_exporter()
+    if exporter is None:
+        return
+    rate = settings.TRACING_SAMPLE_RATE if sample_rate is None else sample_rate
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(rate)),
+    )
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _provider.add_span_processor(processor)
+    _tracer = _provider.get_tracer(SERVICE_NAME)
+
+
+def shutdown_tracing():
+    """Отправляет накопленные спаны и возвращает no-op трейсер."""
+    global _provider, _tracer
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = None
+    _tracer = trace.NoOpTracer()
+
+
+@contextmanager
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, context=None, **attributes):
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    with _tracer.start_as_current_span(
+        name, context=context, kind=kind, attributes=attributes
+    ) as current:
+        yield current
+
+
+def trace_carrier() -> dict[str, str]:
+    """traceparent текущего спана (пустой словарь, если трасса не пишется)."""
+    carrier: dict[str, str] = {}
+    _propagator.inject(carrier)
+    return carrier
+
+
+def kafka_headers(carrier: dict[str, str] | None) -> list[tuple[str, bytes]]:
+    """Заголовки сообщения Kafka из carrier (aiokafka ждет пары (str, bytes))."""
+    return [(key, value.encode("utf-8")) for key, value in (carrier or {}).items()]
+
+
+async def trace_requests(request: Request, call_next):
+    """
+    HTTP-middleware: спан на каждый запрос (продолжает входящий traceparent)
+    и заголовок Server-Timing: время обработки, которое ставим и без трассировки.
+    """
+    started = time.perf_counter()
+    context = _propagator.extract(dict(request.headers))
+    with span(
+        f"{request.method} {request.url.path}",
+        kind=SpanKind.SERVER,
+        context=context,
+        **{"http.method": request.method, "http.target": request.url.path},
+    ) as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None and current.is_recording():
+            current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.route", route.path)
+        current.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            current.set_status(Status(StatusCode.ERROR))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    response.headers["Server-Timing"] = f"app;dur={elapsed_ms:.1f}"
+    return response
+
+
+class TracedCursor:
+    """Обертка над курсором Motor: to_list пишет спан, остальное проксируется без изменений."""
+
+    def __init__(self, cursor, collection: str, operation: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __aiter__(self):
+        return self._cursor.__aiter__()
+
+    async def to_list(self, length=None):
+        with span(
+            f"mongo {self._operation}",
+            kind=SpanKind.CLIENT,
+            **{"db.system": "mongodb", "db.mongodb.collection": self._collection},
+        ):
+            return await self._cursor.to_list(length)
+
+
+class TracedCollection:
+    """
+    Обертка над AsyncIOMotorCollection: каждый вызов, который нужно дождаться
+    (insert_one, find_one_and_update, bulk_write, ...), пишет спан "mongo <операция>".
+    find/aggregate возвращают курсор, чей to_list тоже попадает в трассу.
+    """
+
+    CURSOR_METHODS = frozenset({"find", "aggregate"})
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+        if name in self.CURSOR_METHODS:
+            return lambda *args, **kwargs: TracedCursor(attr(*args, **kwargs), self.name, name)
+        if name.startswith(("insert", "find_one", "update", "delete", "replace", "bulk_", "count")):
+            return self._traced(name, attr)
+        return attr
+
+    def with_options(self, **kwargs) -> "TracedCollection":
+        return TracedCollection(self._collection.with_options(**kwargs))
+
+    def _traced(self, operation: str, method):
+        async def call(*args, **kwargs):
+            with span(
+                f"mongo {operation}",
+                kind=SpanKind.CLIENT,
+                **{"db.system": "mongodb", "db.mongodb.collection": self.name},
+            ):
+                return await method(*args, **kwargs)
+
+        return call
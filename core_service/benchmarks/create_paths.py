@@ -0,0 +1,169 @@
+"""
+Микробенчмарк POST /books/: старый путь создания книги против нового.
+
+    before: insert_one -> find_one (перечитать вставленное) -> update_many авторов -> событие
+    after:  insert_one -> (update_many авторов || событие), ответ из вставленного документа
+
+Каждый путь проходит через настоящий обработчик create_book, вызванный через ASGI.
+MongoDB и Kafka заменены заглушками из benchmarks/fakes.py, где каждый вызов ждет
+--mongo-latency-ms или --kafka-latency-ms. Старый путь получается подменой двух мест:
+коллекция книг перечитывает документ после insert_one, шаги после вставки идут
+по очереди.
+
+Без outbox событие уходит в Kafka из обработчика (при --wait-for-ack обработчик ждет
+брокера), и в новом пути шаги после вставки идут параллельно. При outbox событие
+пишется в той же транзакции, где сессия Mongo не допускает одновременных операций,
+и выигрыш дает только отказ от перечитывания. По умолчанию запросы идут по одному:
+при высокой конкурентности время ответа определяет очередь к циклу событий, не сам путь.
+
+    cd core_service
+    python -m benchmarks.create_paths --requests 1000 --no-outbox --wait-for-ack
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+from contextlib import ExitStack
+from functools import partial
+from unittest.mock import patch
+
+from benchmarks.fakes import FakeMongo, FakeProducer
+from benchmarks.load import PATCHED_COLLECTIONS
+from benchmarks.report import compare, latency_summary, save
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.kafka_producer import flush_events, start_producer, stop_producer
+from app.main import app
+from app.routers import run_steps
+from app.tracing import TracedCollection
+
+
+class ReadAfterWrite:
+    """Коллекция книг старого пути: после insert_one документ перечитывается из Mongo."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name: str):
+        return getattr(self._collection, name)
+
+    async def insert_one(self, document: dict, **kwargs):
+        result = await self._collection.insert_one(document, **kwargs)
+        await self._collection.find_one({"_id": result.inserted_id}, session=kwargs.get("session"))
+        return result
+
+
+async def sequential_steps(session, *steps):
+    # Старый путь: обратные ссылки и событие по очереди, даже без транзакции
+    for step in steps:
+        await step()
+
+
+# Путь -> (обертка коллекции книг, run_steps)
+PATHS = {
+    "before": (ReadAfterWrite, sequential_steps),
+    "after": (lambda collection: collection, run_steps),
+}
+
+
+async def create_books(client: AsyncClient, author_ids: list[str], requests: int, concurrency: int):
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+    book = {"title": "Book", "description": "Desc", "author_ids": author_ids}
+
+    async def one():
+        async with slots:
+            started = time.perf_counter()
+            response = await client.post("/books/", json=book)
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--authors", type=int, default=2, help="авторов у каждой книги")
+    parser.add_argument("--mongo-latency-ms", type=float, default=1.0)
+    parser.add_argument("--kafka-latency-ms", type=float, default=2.0)
+    parser.add_argument(
+        "--outbox", action=argparse.BooleanOptionalAction, default=settings.OUTBOX_ENABLED
+    )
+    parser.add_argument(
+        "--wait-for-ack",
+        action=argparse.BooleanOptionalAction,
+        default=settings.KAFKA_WAIT_FOR_ACK,
+    )
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    results = {}
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(settings, "OUTBOX_ENABLED", args.outbox))
+        stack.enter_context(patch.object(settings, "KAFKA_WAIT_FOR_ACK", args.wait_for_ack))
+        stack.enter_context(
+            patch(
+                "app.kafka_producer.AIOKafkaProducer",
+                partial(FakeProducer, latency_ms=args.kafka_latency_ms),
+            )
+        )
+        # Сервис печатает строку на каждое событие: в выводе прогона они не нужны
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+        await start_producer()
+
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, (wrap_books, steps) in PATHS.items():
+                # У каждого пути свои коллекции: массивы book_ids авторов растут одинаково
+                mongo = FakeMongo(args.mongo_latency_ms)
+                collections = {
+                    collection: TracedCollection(mongo.collection(collection))
+                    for collection in ("books", "authors", "outbox")
+                }
+                authors = await mongo.collection("authors").insert_many(
+                    [{"name": f"A{i}", "book_ids": []} for i in range(args.authors)]
+                )
+                author_ids = [str(author_id) for author_id in authors.inserted_ids]
+                with ExitStack() as path:
+                    for module, names in PATCHED_COLLECTIONS.items():
+                        for collection in names:
+                            path.enter_context(
+                                patch(f"{module}.{collection}_collection", collections[collection])
+                            )
+                    path.enter_context(
+                        patch("app.routers.books_collection", wrap_books(collections["books"]))
+                    )
+                    path.enter_context(patch("app.routers.run_steps", steps))
+                    path.enter_context(patch("app.outbox.client", mongo))
+                    # Прогрев: первые запросы не меряем
+                    await create_books(client, author_ids, 100, args.concurrency)
+                    results[name] = await create_books(
+                        client, author_ids, args.requests, args.concurrency
+                    )
+
+        await flush_events()
+        await stop_producer()
+
+    for name, step in results.items():
+        print(
+            f"{name:<7} p50 {step['p50_ms']:6.2f} ms  p95 {step['p95_ms']:6.2f} ms"
+            f"  p99 {step['p99_ms']:6.2f} ms  {step['per_second']:>8} req/s"
+        )
+
+    if args.out:
+        save(args.out, "core_service.create_paths", vars(args), results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,416 @@
+"""
+Заглушки MongoDB и Kafka для нагрузочного прогона (benchmarks/load.py).
+
+FakeCollection понимает ровно те запросы, которые делает сервис (routers.py, outbox.py):
+равенство, $in, $gt/$lt, $or, апдейты $set/$addToSet и pipeline-апдейты, выражения
+из versioned_set/array_with/array_without. Документы лежат в словаре по _id; поля,
+для которых вызван create_index(es), индексируются (по значению и по элементам массива),
+так что поиск по ним не перебирает всю коллекцию - как и в настоящей Mongo.
+
+Каждый вызов, который нужно дождаться, стоит latency_ms (имитация сети и сервера).
+Транзакции здесь только для вида: сессия ничего не изолирует и не откатывает.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+
+async def _pause(latency_ms: float):
+    await asyncio.sleep(latency_ms / 1000)
+
+
+def _keys(value) -> list:
+    # Ключи индекса для значения поля: элементы массива (мультиключевой индекс) или само значение
+    if isinstance(value, list):
+        return value or [None]
+    return [value]
+
+
+def _compare(value, operator: str, operand) -> bool:
+    if operator == "$in":
+        return any(item in operand for item in _keys(value))
+    if operator == "$ne":
+        return operand not in _keys(value)
+    if value is None or operand is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise NotImplementedError(f"FakeCollection: оператор {operator} не поддерживается")
+
+
+def prepare(query: dict) -> dict:
+    """Списки $in превращаются в множества: проверка документа не перебирает весь список."""
+    prepared = {}
+    for field, condition in query.items():
+        if field == "$or":
+            condition = [prepare(branch) for branch in condition]
+        elif isinstance(condition, dict) and "$in" in condition:
+            condition = {**condition, "$in": set(condition["$in"])}
+        prepared[field] = condition
+    return prepared
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if isinstance(condition, dict) and condition and next(iter(condition)).startswith("$"):
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif condition not in _keys(value) and condition != value:
+            return False
+    return True
+
+
+def evaluate(expression, doc: dict, variables: dict | None = None):
+    """Выражение агрегации: поля "$field", переменная "$$this" и операторы, которые есть в routers.py."""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        return (variables or {})[expression[2:]]
+    if isinstance(expression, str) and expression.startswith("$"):
+        return doc.get(expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, doc, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) != 1 or not next(iter(expression)).startswith("$"):
+        return {key: evaluate(value, doc, variables) for key, value in expression.items()}
+
+    operator, args = next(iter(expression.items()))
+    if operator == "$literal":
+        return args
+    if operator == "$filter":
+        items = evaluate(args["input"], doc, variables) or []
+        return [
+            item
+            for item in items
+            if evaluate(args["cond"], doc, {**(variables or {}), "this": item})
+        ]
+    values = [evaluate(arg, doc, variables) for arg in args]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$ifNull":
+        return next((value for value in values if value is not None), None)
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$in":
+        return values[0] in values[1]
+    if operator == "$concatArrays":
+        return [item for value in values for item in value]
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$ne":
+        return values[0] != values[1]
+    raise NotImplementedError(f"FakeCollection: выражение {operator} не поддерживается")
+
+
+def apply_update(doc: dict, update: dict | list) -> dict:
+    """Новая версия документа (исходный словарь не меняется)."""
+    updated = dict(doc)
+    if isinstance(update, list):
+        for stage in update:
+            (operator, fields), *_ = stage.items()
+            if operator not in ("$set", "$addFields"):
+                raise NotImplementedError(f"FakeCollection: стадия {operator} не поддерживается")
+            updated.update({field: evaluate(expr, updated) for field, expr in fields.items()})
+        return updated
+
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == "$set":
+                updated[field] = value
+            elif operator == "$inc":
+                updated[field] = updated.get(field, 0) + value
+            elif operator == "$addToSet":
+                current = list(updated.get(field) or [])
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                current.extend(item for item in items if item not in current)
+                updated[field] = current
+            else:
+                raise NotImplementedError(f"FakeCollection: {operator} не поддерживается")
+    return updated
+
+
+def project(doc: dict, projection: dict | None) -> dict:
+    if not projection:
+        return dict(doc)
+    if any(projection.values()):
+        fields = {field for field, keep in projection.items() if keep}
+        if projection.get("_id", 1):
+            fields.add("_id")
+        return {field: value for field, value in doc.items() if field in fields}
+    return {field: value for field, value in doc.items() if field not in projection}
+
+
+class FakeCursor:
+    def __init__(self, documents: list[dict], latency_ms: float):
+        self._documents = documents
+        self._latency_ms = latency_ms
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        await _pause(self._latency_ms)
+        return self._documents[:length] if length else self._documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await _pause(self._latency_ms)
+        for doc in self._documents:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, name: str, latency_ms: float):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.documents: dict[Any, dict] = {}
+        # поле -> значение -> _id документов (порядок вставки)
+        self.indexes: dict[str, defaultdict[Any, dict]] = {}
+
+    def with_options(self, **kwargs) -> "FakeCollection":
+        return self
+
+    # --- Индексы ---
+
+    async def create_index(self, keys, **kwargs) -> str:
+        field = keys[0][0] if isinstance(keys, list) else keys
+        if field not in self.indexes:
+            self.indexes[field] = defaultdict(dict)
+            for doc_id, doc in self.documents.items():
+                self._index_field(field, doc_id, doc.get(field), add=True)
+        return kwargs.get("name", field)
+
+    async def create_indexes(self, indexes: list) -> list[str]:
+        return [await self.create_index(list(index.document["key"].items())) for index in indexes]
+
+    def _index_field(self, field: str, doc_id, value, add: bool):
+        for key in _keys(value):
+            ids = self.indexes[field][key]
+            if add:
+                ids[doc_id] = None
+            else:
+                ids.pop(doc_id, None)
+
+    def _store(self, doc_id, old: dict | None, new: dict | None):
+        for field in self.indexes:
+            if old is not None:
+                self._index_field(field, doc_id, old.get(field), add=False)
+            if new is not None:
+                self._index_field(field, doc_id, new.get(field), add=True)
+        if new is None:
+            del self.documents[doc_id]
+        else:
+            self.documents[doc_id] = new
+
+    def _candidates(self, query: dict):
+        """_id документов, среди которых искать: по _id или индексированному полю, иначе все."""
+        for field, condition in query.items():
+            if field != "_id" and field not in self.indexes:
+                continue
+            operator = isinstance(condition, dict) and next(iter(condition), "").startswith("$")
+            if operator and set(condition) != {"$in"}:
+                continue
+            keys = condition["$in"] if operator else [condition]
+            if field == "_id":
+                return [key for key in keys if key in self.documents]
+            found = {}
+            for key in keys:
+                found.update(self.indexes[field].get(key, {}))
+            return list(found)
+        return list(self.documents)
+
+    def _find(self, query: dict | None, sort=None, limit: int = 0) -> list[dict]:
+        query = prepare(query or {})
+        found = [
+            doc
+            for doc_id in self._candidates(query)
+            if matches(doc := self.documents[doc_id], query)
+        ]
+        for field, direction in reversed(sort or []):
+            found.sort(key=lambda doc, field=field: doc.get(field), reverse=direction < 0)
+        return found[:limit] if limit else found
+
+    # --- Чтение ---
+
+    def find(self, query=None, projection=None, sort=None, limit=0, session=None, **kwargs):
+        found = self._find(query, sort, limit)
+        return FakeCursor([project(doc, projection) for doc in found], self.latency_ms)
+
+    async def find_one(self, query=None, projection=None, session=None, **kwargs):
+        await _pause(self.latency_ms)
+        found = self._find(query, limit=1)
+        return project(found[0], projection) if found else None
+
+    async def count_documents(self, query, session=None, **kwargs) -> int:
+        await _pause(self.latency_ms)
+        return len(self._find(query))
+
+    # --- Запись ---
+
+    def _insert(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error: _id {doc['_id']}")
+        self._store(doc["_id"], None, dict(doc))
+
+    async def insert_one(self, doc: dict, session=None, **kwargs) -> InsertOneResult:
+        await _pause(self.latency_ms)
+        self._insert(doc)
+        return InsertOneResult(doc["_id"], True)
+
+    async def insert_many(
+        self, docs: list[dict], ordered: bool = True, session=None, **kwargs
+    ) -> InsertManyResult:
+        await _pause(self.latency_ms)
+        errors = []
+        for position, doc in enumerate(docs):
+            try:
+                self._insert(doc)
+            except DuplicateKeyError as exc:
+                errors.append({"index": position, "code": 11000, "errmsg": str(exc)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+        return InsertManyResult([doc["_id"] for doc in docs], True)
+
+    def _update(self, query: dict, update, many: bool) -> int:
+        found = self._find(query, limit=0 if many else 1)
+        for doc in found:
+            self._store(doc["_id"], doc, apply_update(doc, update))
+        return len(found)
+
+    async def update_one(self, query, update, session=None, **kwargs) -> UpdateResult:
+        await _pause(self.latency_ms)
+        count = self._update(query, update, many=False)
+        return UpdateResult({"n": count, "nModified": count}, True)
+
+    async def update_many(self, query, update, session=None, **kwargs) -> UpdateResult:
+        await _pause(self.latency_ms)
+        count = self._update(query, update, many=True)
+        return UpdateResult({"n": count, "nModified": count}, True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, session=None, **kwargs):
+        await _pause(self.latency_ms)
+        # UpdateOne/UpdateMany - единственные операции, которые сервис отправляет пачкой
+        modified = sum(
+            self._update(request._filter, request._doc, many=type(request).__name__ == "UpdateMany")
+            for request in requests
+        )
+        return BulkWriteResult({"nMatched": modified, "nModified": modified}, True)
+
+    async def find_one_and_update(
+        self, query, update, projection=None, return_document=False, session=None, **kwargs
+    ):
+        await _pause(self.latency_ms)
+        found = self._find(query, kwargs.get("sort"), limit=1)
+        if not found:
+            return None
+        before = found[0]
+        after = apply_update(before, update)
+        self._store(before["_id"], before, after)
+        # ReturnDocument.BEFORE - False, ReturnDocument.AFTER - True
+        return project(after if return_document else before, projection)
+
+    async def find_one_and_delete(self, query, projection=None, session=None, **kwargs):
+        await _pause(self.latency_ms)
+        found = self._find(query, kwargs.get("sort"), limit=1)
+        if not found:
+            return None
+        self._store(found[0]["_id"], found[0], None)
+        return project(found[0], projection)
+
+    async def delete_many(self, query, session=None, **kwargs) -> DeleteResult:
+        await _pause(self.latency_ms)
+        found = self._find(query)
+        for doc in found:
+            self._store(doc["_id"], doc, None)
+        return DeleteResult({"n": len(found)}, True)
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    in_transaction = False
+
+    def start_transaction(self, **kwargs) -> "FakeSession":
+        return self
+
+    async def commit_transaction(self):
+        pass
+
+    async def abort_transaction(self):
+        pass
+
+
+class FakeMongo:
+    """Вместо AsyncIOMotorClient: коллекции в памяти и сессии-пустышки."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.collections: dict[str, FakeCollection] = {}
+
+    def collection(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, self.latency_ms)
+        return self.collections[name]
+
+    async def start_session(self) -> FakeSession:
+        await _pause(self.latency_ms)
+        return FakeSession()
+
+
+class FakeProducer:
+    """
+    Вместо AIOKafkaProducer: сериализует сообщения так же, как настоящий продюсер,
+    и складывает их в messages. Подтверждение брокера приходит через latency_ms.
+    """
+
+    def __init__(self, *, value_serializer, key_serializer, latency_ms: float = 0.0, **config):
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+        self.latency_ms = latency_ms
+        # (topic, key, value, headers) в порядке отправки
+        self.messages: list[tuple[str, bytes | None, bytes, list]] = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def send(self, topic: str, value, key=None, headers=None) -> asyncio.Future:
+        self.messages.append(
+            (topic, self.key_serializer(key), self.value_serializer(value), headers or [])
+        )
+        loop = asyncio.get_running_loop()
+        delivery = loop.create_future()
+        loop.call_later(self.latency_ms / 1000, delivery.set_result, len(self.messages) - 1)
+        return delivery
+
+    async def send_and_wait(self, topic: str, value, key=None, headers=None):
+        return await (await self.send(topic, value, key=key, headers=headers))
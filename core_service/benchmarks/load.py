@@ -0,0 +1,219 @@
+"""
+Нагрузочный прогон core_service без MongoDB и Kafka: приложение вызывается через ASGI,
+вместо Mongo и Kafka - заглушки в памяти (benchmarks/fakes.py), задержка на запрос задается.
+
+Создает синтетический каталог (авторы пачками, книги по одной, затем изменения части книг)
+и считает записи в секунду и p50/p95/p99 по каждому шагу; при включенном outbox - еще
+и скорость переноса событий в Kafka (relay). Пиковый RSS и все числа сохраняются в JSON
+(--out), --baseline показывает разницу между этим и прошлым прогоном. --events-out сохраняет отправленные
+в Kafka сообщения: search_service/benchmarks/load.py прогоняет их через консьюмер.
+
+    cd core_service
+    python -m benchmarks.load --books 10000 --mongo-latency-ms 0.5 --kafka-latency-ms 2 \\
+        --out load-core.json --events-out events.jsonl
+    python -m benchmarks.load --books 10000 --no-outbox --baseline load-core.json
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import random
+import time
+from contextlib import ExitStack
+from functools import partial
+from unittest.mock import patch
+
+from benchmarks.fakes import FakeMongo, FakeProducer
+from benchmarks.report import compare, latency_summary, peak_rss_mib, save
+from httpx import ASGITransport, AsyncClient
+
+from app import kafka_producer
+from app.config import settings
+from app.indexes import ensure_indexes
+from app.kafka_producer import flush_events, start_producer, stop_producer
+from app.main import app
+from app.outbox import ensure_outbox_indexes, relay_batch
+from app.tracing import TracedCollection
+
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+AUTHORS_PER_REQUEST = 100
+# Модули, которые импортировали коллекции из app.database, и какие именно
+PATCHED_COLLECTIONS = {
+    "app.routers": ("books", "authors"),
+    "app.indexes": ("books", "authors", "outbox"),
+    "app.outbox": ("outbox",),
+}
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)
+    )
+
+
+async def timed(calls: list, concurrency: int) -> dict:
+    """Выполняет запросы (фабрики корутин) не более concurrency одновременно."""
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(call):
+        async with slots:
+            started = time.perf_counter()
+            response = await call()
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            return response
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(one(call) for call in calls))
+    return {"responses": responses, **latency_summary(latencies, time.perf_counter() - started)}
+
+
+async def write_catalog(client: AsyncClient, args, rng: random.Random) -> dict:
+    results = {}
+
+    names = [_words(rng, 2) for _ in range(args.authors)]
+    chunks = [
+        names[start : start + AUTHORS_PER_REQUEST]
+        for start in range(0, len(names), AUTHORS_PER_REQUEST)
+    ]
+    step = await timed(
+        [
+            partial(client.post, "/authors/bulk", json=[{"name": name} for name in chunk])
+            for chunk in chunks
+        ],
+        args.concurrency,
+    )
+    author_ids = [
+        item["_id"] for response in step.pop("responses") for item in response.json()["results"]
+    ]
+    results["create_authors_bulk"] = {**step, "documents": len(author_ids)}
+
+    books = [
+        {
+            "title": _words(rng, rng.randint(2, 5)),
+            "description": _words(rng, rng.randint(15, 40)),
+            "author_ids": rng.sample(author_ids, k=min(len(author_ids), rng.randint(1, 3))),
+        }
+        for _ in range(args.books)
+    ]
+    step = await timed(
+        [partial(client.post, "/books/", json=book) for book in books], args.concurrency
+    )
+    book_ids = [response.json()["_id"] for response in step.pop("responses")]
+    results["create_book"] = step
+
+    updated = rng.sample(book_ids, k=int(len(book_ids) * args.updates))
+    step = await timed(
+        [
+            partial(client.patch, f"/books/{book_id}", json={"title": _words(rng, 3)})
+            for book_id in updated
+        ],
+        args.concurrency,
+    )
+    step.pop("responses")
+    results["update_book"] = step
+    return results
+
+
+async def drain_outbox() -> dict:
+    """Отправляет все накопленные в outbox события и считает, сколько в секунду."""
+    sent = 0
+    started = time.perf_counter()
+    while batch := await relay_batch():
+        sent += batch
+    elapsed = time.perf_counter() - started
+    return {"count": sent, "per_second": round(sent / elapsed, 1) if elapsed else None}
+
+
+def export_events(path: str, messages: list):
+    with open(path, "w") as file:
+        for topic, key, value, headers in messages:
+            record = {
+                "topic": topic,
+                "key": key.decode() if key is not None else None,
+                "value": base64.b64encode(value).decode("ascii"),
+                "headers": [[name, base64.b64encode(raw).decode("ascii")] for name, raw in headers],
+            }
+            file.write(json.dumps(record) + "\n")
+    print(f"📦 Сообщений сохранено в {path}: {len(messages)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--updates", type=float, default=0.2, help="доля книг, которые меняются")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.5)
+    parser.add_argument("--kafka-latency-ms", type=float, default=2.0)
+    parser.add_argument(
+        "--outbox", action=argparse.BooleanOptionalAction, default=settings.OUTBOX_ENABLED
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--events-out", help="куда сохранить сообщения Kafka (JSON Lines)")
+    args = parser.parse_args()
+
+    mongo = FakeMongo(args.mongo_latency_ms)
+    collections = {
+        name: TracedCollection(mongo.collection(name)) for name in ("books", "authors", "outbox")
+    }
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(settings, "OUTBOX_ENABLED", args.outbox))
+        for module, names in PATCHED_COLLECTIONS.items():
+            for name in names:
+                stack.enter_context(patch(f"{module}.{name}_collection", collections[name]))
+        stack.enter_context(patch("app.outbox.client", mongo))
+        stack.enter_context(
+            patch(
+                "app.kafka_producer.AIOKafkaProducer",
+                partial(FakeProducer, latency_ms=args.kafka_latency_ms),
+            )
+        )
+        # Сервис печатает строку на каждое событие и пачку: в выводе прогона они не нужны
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        # Как при старте приложения: индексы коллекций и outbox, продюсер Kafka
+        await ensure_indexes()
+        await ensure_outbox_indexes()
+        await start_producer()
+        producer = kafka_producer.producer
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = await write_catalog(client, args, random.Random(args.seed))
+        if args.outbox:
+            results["outbox_relay"] = await drain_outbox()
+        await flush_events()
+        await stop_producer()
+
+    results["events"] = len(producer.messages)
+    results["peak_rss_mib"] = peak_rss_mib()
+
+    for name, step in results.items():
+        if isinstance(step, dict) and "p50_ms" in step:
+            print(
+                f"{name:<20} {step['count']:>7}  {step['per_second']:>8} req/s"
+                f"  p50 {step['p50_ms']:7.2f} ms  p95 {step['p95_ms']:7.2f} ms"
+                f"  p99 {step['p99_ms']:7.2f} ms"
+            )
+    if "outbox_relay" in results:
+        relay = results["outbox_relay"]
+        print(f"{'outbox_relay':<20} {relay['count']:>7}  {relay['per_second']:>8} events/s")
+    print(f"events produced: {results['events']}, peak RSS {results['peak_rss_mib']} MiB")
+
+    if args.events_out:
+        export_events(args.events_out, producer.messages)
+    if args.out:
+        save(args.out, "core_service.load", vars(args), results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Результаты нагрузочных прогонов: перцентили, пиковый RSS, сохранение в JSON
+и сравнение, прошлый прогон против текущего (--baseline).
+"""
+
+import json
+import resource
+import statistics
+import subprocess
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+
+def latency_summary(latencies: list[float], elapsed: float) -> dict:
+    """Число запросов, пропускная способность (в секунду) и p50/p95/p99 в миллисекундах."""
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "count": len(latencies),
+        "per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+    }
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, int | float) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def save(path: str, benchmark: str, params: dict, results: dict):
+    run = {
+        "benchmark": benchmark,
+        "finished_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": params,
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(run, indent=2, ensure_ascii=False) + "\n")
+    print(f"💾 Результаты сохранены в {path}")
+
+
+def compare(results: dict, baseline_path: str):
+    """Печатает каждое число: значение в сохраненном прогоне, текущее и изменение в процентах."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    before = _flatten(baseline["results"])
+    print(f"Сравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    for key, value in _flatten(results).items():
+        if key not in before:
+            continue
+        old = before[key]
+        change = f"{(value - old) / old * 100:+7.1f} %" if old else "      -"
+        print(f"  {key:<36} {old:>12} -> {value:<12} {change}")
@@ -0,0 +1,151 @@
+"""
+Доля сериализации во времени запроса GET /books/ для страниц по 1000 документов.
+
+Три пути построения ответа из одних и тех же документов Mongo:
+
+    pydantic - response_model=list[BookDB]: модель на каждый документ, затем json
+    json     - to_jsonable и стандартный json (FAST_JSON_RESPONSES=false)
+    orjson   - документы сразу в orjson, ObjectId кодируется на лету (FAST_JSON_RESPONSES=true)
+
+Для каждого пути меряется построение ответа отдельно и весь запрос через ASGI
+(коллекция - FakeCollection из benchmarks/fakes.py, задержка --mongo-latency-ms),
+доля сериализации - медиана первого к медиане второго. MongoDB и Kafka не нужны.
+
+    cd core_service
+    python -m benchmarks.serialization --page 1000 --requests 200 --out serialization.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from benchmarks.fakes import FakeCollection
+from benchmarks.report import compare, latency_summary, save
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+from pydantic import TypeAdapter
+
+from app.config import settings
+from app.main import app
+from app.models import BookDB
+from app.serialization import documents_response
+from app.tracing import TracedCollection
+
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+BOOK_PAGE = TypeAdapter(list[BookDB])
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)
+    )
+
+
+def books(count: int, rng: random.Random) -> list[dict]:
+    authors = [ObjectId() for _ in range(max(count // 10, 1))]
+    return [
+        {
+            "_id": ObjectId(),
+            "title": _words(rng, rng.randint(2, 5)),
+            "description": _words(rng, rng.randint(15, 40)),
+            "author_ids": rng.sample(authors, k=min(len(authors), rng.randint(1, 3))),
+            "version": rng.randint(1, 5),
+        }
+        for _ in range(count)
+    ]
+
+
+def pydantic_response(documents: list[dict]) -> JSONResponse:
+    # Так ответ строил FastAPI по response_model: валидация моделью и дамп в режиме json
+    content = BOOK_PAGE.dump_python(
+        BOOK_PAGE.validate_python(documents), mode="json", by_alias=True
+    )
+    return JSONResponse(content)
+
+
+# Путь -> (функция построения ответа, значение FAST_JSON_RESPONSES)
+PATHS = {
+    "pydantic": (pydantic_response, False),
+    "json": (documents_response, False),
+    "orjson": (documents_response, True),
+}
+
+
+def serialize_ms(build, documents: list[dict], repeat: int) -> float:
+    """Медиана времени построения ответа, включая тело, в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build(documents)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def request_ms(client: AsyncClient, page: int, requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        response = await client.get("/books/", params={"limit": page})
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        response.raise_for_status()
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page", type=int, default=1000, help="документов на странице")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    fake = FakeCollection("books", args.mongo_latency_ms)
+    documents = books(args.page, random.Random(args.seed))
+    await fake.insert_many(documents)
+    collection = TracedCollection(fake)
+    page = sorted(documents, key=lambda doc: doc["_id"])
+    sizes = set()
+
+    results = {}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, (build, fast) in PATHS.items():
+            with (
+                patch.object(settings, "FAST_JSON_RESPONSES", fast),
+                patch("app.routers.books_collection", collection),
+                patch("app.routers.documents_response", build),
+            ):
+                sizes.add(len(json.loads(build(page).body)))
+                serialize = serialize_ms(build, page, repeat=max(args.requests // 4, 5))
+                request = await request_ms(client, args.page, args.requests)
+            results[name] = {
+                "serialize_ms": round(serialize, 3),
+                "request": request,
+                "serialization_share": round(serialize / request["p50_ms"], 3),
+            }
+    assert sizes == {args.page}, "все пути должны отдавать страницу целиком"
+
+    for name, step in results.items():
+        request = step["request"]
+        print(
+            f"{name:<9} serialize {step['serialize_ms']:7.2f} ms"
+            f"  request p50 {request['p50_ms']:7.2f} ms  p95 {request['p95_ms']:7.2f} ms"
+            f"  {request['per_second']:>7} req/s  share {step['serialization_share']:.0%}"
+        )
+
+    if args.out:
+        save(args.out, "core_service.serialization", vars(args), results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,7 +8,11 @@ from httpx import ASGITransport, AsyncClient
 def mock_books_collection():
     col = MagicMock()
     col.insert_one = AsyncMock()
+    col.insert_many = AsyncMock()
+    col.bulk_write = AsyncMock()
     col.find_one = AsyncMock()
+    col.find_one_and_update = AsyncMock()
+    col.find_one_and_delete = AsyncMock()
     cursor = MagicMock()
     cursor.to_list = AsyncMock(return_value=[])
     col.find = MagicMock(return_value=cursor)
@@ -20,7 +24,11 @@ def mock_books_collection():
 def mock_authors_collection():
     col = MagicMock()
     col.insert_one = AsyncMock()
+    col.insert_many = AsyncMock()
+    col.bulk_write = AsyncMock()
     col.find_one = AsyncMock()
+    col.find_one_and_update = AsyncMock()
+    col.find_one_and_delete = AsyncMock()
     cursor = MagicMock()
     cursor.to_list = AsyncMock(return_value=[])
     col.find = MagicMock(return_value=cursor)
@@ -28,6 +36,42 @@ def mock_authors_collection():
     return col
 
 
+@pytest.fixture
+def mock_outbox_collection():
+    col = MagicMock()
+    col.insert_one = AsyncMock()
+    col.insert_many = AsyncMock()
+    col.update_many = AsyncMock()
+    col.create_index = AsyncMock()
+    col.count_documents = AsyncMock(return_value=0)
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[])
+    col.find = MagicMock(return_value=cursor)
+    return col
+
+
+@pytest.fixture
+def mock_mongo_session():
+    session = MagicMock()
+    session.__aenter__.return_value = session
+    session.commit_transaction = AsyncMock()
+    session.abort_transaction = AsyncMock()
+    return session
+
+
+@pytest.fixture
+def mock_mongo_client(mock_mongo_session):
+    mongo = MagicMock()
+    mongo.start_session = AsyncMock(return_value=mock_mongo_session)
+    return mongo
+
+
+@pytest.fixture
+def outbox_enabled():
+    # Роуты по умолчанию тестируем с прямой отправкой в Kafka; тесты outbox переопределяют фикстуру
+    return False
+
+
 @pytest.fixture
 def mock_kafka_producer():
     producer = MagicMock()
@@ -36,12 +80,23 @@ def mock_kafka_producer():
 
 
 @pytest.fixture
-async def client(mock_books_collection, mock_authors_collection, mock_kafka_producer):
+async def client(
+    mock_books_collection,
+    mock_authors_collection,
+    mock_kafka_producer,
+    mock_outbox_collection,
+    mock_mongo_client,
+    outbox_enabled,
+):
     with (
+        patch("app.outbox.settings.OUTBOX_ENABLED", outbox_enabled),
+        patch("app.outbox.outbox_collection", mock_outbox_collection),
+        patch("app.outbox.client", mock_mongo_client),
         patch("app.routers.books_collection", mock_books_collection),
         patch("app.routers.authors_collection", mock_authors_collection),
         patch("app.kafka_producer.producer", mock_kafka_producer),
         patch("app.routers.send_event", new_callable=AsyncMock) as mock_send,
+        patch("app.routers.send_events", new_callable=AsyncMock) as mock_send_many,
     ):
         from app.main import app
 
@@ -49,4 +104,5 @@ async def client(mock_books_collection, mock_authors_collection, mock_kafka_prod
             transport=ASGITransport(app=app), base_url="http://test"
         ) as ac:
             ac.mock_send_event = mock_send
+            ac.mock_send_events = mock_send_many
             yield ac
@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.routers import NEXT_VERSION, array_with_all
+
+
+async def test_bulk_create_authors(client, mock_authors_collection):
+    resp = await client.post("/authors/bulk", json=[{"name": "Tolstoy"}, {"name": "Pushkin"}])
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["inserted"] == 2
+    assert data["failed"] == 0
+    assert [r["status"] for r in data["results"]] == ["created", "created"]
+
+    mock_authors_collection.insert_many.assert_called_once()
+    documents = mock_authors_collection.insert_many.call_args.args[0]
+    assert mock_authors_collection.insert_many.call_args.kwargs["ordered"] is False
+    assert [r["_id"] for r in data["results"]] == [str(doc["_id"]) for doc in documents]
+
+    mock_authors_collection.insert_one.assert_not_called()
+    call = client.mock_send_events.call_args.kwargs
+    assert call["event_type"] == "author_created"
+    assert [item["name"] for item in call["items"]] == ["Tolstoy", "Pushkin"]
+
+
+async def test_bulk_create_books_groups_author_backrefs(
+    client, mock_books_collection, mock_authors_collection
+):
+    a1, a2 = str(ObjectId()), str(ObjectId())
+    payload = [
+        {"title": "B1", "description": "D", "author_ids": [a1]},
+        {"title": "B2", "description": "D", "author_ids": [a1, a2]},
+        {"title": "B3", "description": "D", "author_ids": []},
+    ]
+
+    mock_authors_collection.find.return_value.to_list.return_value = [
+        {"_id": ObjectId(a1), "version": 3, "book_ids": ["b"]},
+        {"_id": ObjectId(a2), "version": 2, "book_ids": ["b"]},
+    ]
+
+    resp = await client.post("/books/bulk", json=payload)
+
+    assert resp.status_code == 200
+    assert resp.json()["inserted"] == 3
+    book_ids = [str(doc["_id"]) for doc in mock_books_collection.insert_many.call_args.args[0]]
+
+    mock_authors_collection.bulk_write.assert_called_once()
+    operations = mock_authors_collection.bulk_write.call_args.args[0]
+    updates = {op._filter["_id"]: op._doc[0]["$set"] for op in operations}
+    assert updates == {
+        ObjectId(a1): {
+            "book_ids": array_with_all("book_ids", book_ids[:2]),
+            "version": NEXT_VERSION,
+        },
+        ObjectId(a2): {
+            "book_ids": array_with_all("book_ids", [book_ids[1]]),
+            "version": NEXT_VERSION,
+        },
+    }
+    mock_authors_collection.update_many.assert_not_called()
+
+    events = {
+        c.kwargs["event_type"]: c.kwargs["items"] for c in client.mock_send_events.call_args_list
+    }
+    assert len(events["book_created"]) == 3
+    # Every linked author gets a new version and author_updated
+    assert [(item["_id"], item["version"]) for item in events["author_updated"]] == [
+        (a1, 3),
+        (a2, 2),
+    ]
+
+
+async def test_bulk_create_books_reports_per_item_errors(
+    client, mock_books_collection, mock_authors_collection
+):
+    mock_books_collection.insert_many.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]}
+    )
+    payload = [
+        {"title": "Bad author", "description": "D", "author_ids": ["not-an-id"]},
+        {"title": "Ok", "description": "D"},
+        {"title": "Duplicate", "description": "D"},
+    ]
+
+    resp = await client.post("/books/bulk", json=payload)
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["inserted"] == 1
+    assert data["failed"] == 2
+    assert [(r["index"], r["status"]) for r in data["results"]] == [
+        (0, "error"),
+        (1, "created"),
+        (2, "error"),
+    ]
+    assert data["results"][2]["error"] == "duplicate key"
+
+    # The invalid book never reaches Mongo, the duplicate is not published
+    inserted = mock_books_collection.insert_many.call_args.args[0]
+    assert [doc["title"] for doc in inserted] == ["Ok", "Duplicate"]
+    items = client.mock_send_events.call_args.kwargs["items"]
+    assert [item["title"] for item in items] == ["Ok"]
+    mock_authors_collection.bulk_write.assert_not_called()
+
+
+async def test_bulk_create_rejects_oversized_batch(client, mock_authors_collection):
+    with patch("app.routers.settings.BULK_MAX_ITEMS", 2):
+        resp = await client.post("/authors/bulk", json=[{"name": "A"}] * 3)
+
+    assert resp.status_code == 413
+    mock_authors_collection.insert_many.assert_not_called()
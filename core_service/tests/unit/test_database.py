@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo.monitoring import ConnectionCheckOutFailedReason
+
+from app.database import MongoClient, MongoPoolStats, books_collection, client_options
+
+
+def test_no_client_created_at_import():
+    from app.database import client
+
+    assert not client.is_open
+    with pytest.raises(RuntimeError):
+        client.start_session()
+
+
+def test_open_passes_pool_options():
+    mongo = MongoClient()
+    with (
+        patch("app.database.settings.MONGO_MAX_POOL_SIZE", 25),
+        patch("app.database.settings.MONGO_WAIT_QUEUE_TIMEOUT_MS", 500),
+        patch("app.database.AsyncIOMotorClient") as motor_client,
+    ):
+        mongo.open()
+        mongo.open()
+
+    motor_client.assert_called_once()
+    options = motor_client.call_args.kwargs
+    assert options["maxPoolSize"] == 25
+    assert options["waitQueueTimeoutMS"] == 500
+    assert options["event_listeners"] == [mongo.pool]
+    # Не заданные в настройках значения драйвер выбирает сам
+    assert "timeoutMS" not in options
+
+    mongo.close()
+    motor_client.return_value.close.assert_called_once()
+    assert not mongo.is_open
+
+
+def test_client_options_skip_unset_values():
+    with patch("app.database.settings.MONGO_MAX_IDLE_TIME_MS", None):
+        assert "maxIdleTimeMS" not in client_options()
+
+
+def test_collections_resolve_through_open_client():
+    fake = MagicMock()
+    with (
+        patch("app.database.client._client", fake),
+        patch("app.database.client._collections", {}),
+    ):
+        books_collection.find({})
+        books_collection.find({})
+
+    fake["library_database"].get_collection.assert_called_once_with("books")
+    fake["library_database"].get_collection.return_value.find.assert_called_with({})
+
+
+def test_pool_stats_counts_checkouts():
+    stats = MongoPoolStats()
+    event = SimpleNamespace(reason=None)
+    for _ in range(3):
+        stats.connection_created(event)
+        stats.connection_check_out_started(event)
+        stats.connection_checked_out(event)
+    stats.connection_checked_in(event)
+    stats.connection_check_out_started(event)
+    stats.connection_check_out_failed(
+        SimpleNamespace(reason=ConnectionCheckOutFailedReason.TIMEOUT)
+    )
+
+    with patch("app.database.settings.MONGO_MAX_POOL_SIZE", 10):
+        summary = stats.as_dict()
+    assert summary["open"] == 3
+    assert summary["in_use"] == 2
+    assert summary["peak_in_use"] == 3
+    assert summary["waiting"] == 0
+    assert summary["checkout_timeouts"] == 1
+    assert summary["utilization"] == 0.2
+
+
+async def test_pools_endpoint(client):
+    resp = await client.get("/admin/pools")
+    assert resp.status_code == 200
+    assert resp.json()["max_pool_size"] > 0
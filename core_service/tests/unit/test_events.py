@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from app.events import (
+    MSGPACK,
+    SCHEMA_VERSION,
+    content_headers,
+    decode_event,
+    envelope,
+    serializer,
+)
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "application/msgpack"])
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_serialized_event_decodes_with_its_headers(content_type, compression):
+    message = envelope("book_created", {"_id": "b1", "title": "Война и мир", "year": 1869}, 1.5)
+
+    payload = serializer(content_type, compression)(message)
+
+    assert decode_event(payload, content_headers(content_type, compression)) == message
+
+
+def test_msgpack_is_smaller_than_json():
+    message = envelope("book_created", {"_id": "b1", "author_ids": ["a1", "a2"], "year": 1869}, 1.5)
+
+    assert len(serializer(MSGPACK)(message)) < len(json.dumps(message).encode())
+
+
+def test_envelope_carries_schema_version():
+    assert envelope("author_deleted", {"_id": "a1"}, 2.0)["schema_version"] == SCHEMA_VERSION
+
+
+def test_unknown_format_is_rejected_at_startup():
+    with pytest.raises(ValueError):
+        serializer("application/xml")
+    with pytest.raises(ValueError):
+        serializer("application/json", "brotli")
@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.indexes import ensure_indexes, plan_summary
+from app.models import AUTHOR_INDEXES, BOOK_INDEXES
+
+IXSCAN_PLAN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "LIMIT",
+            "inputStage": {
+                "stage": "FETCH",
+                "inputStage": {"stage": "IXSCAN", "indexName": "_id_"},
+            },
+        }
+    },
+    "executionStats": {
+        "nReturned": 100,
+        "totalKeysExamined": 100,
+        "totalDocsExamined": 100,
+        "executionTimeMillis": 1,
+    },
+}
+COLLSCAN_PLAN = {
+    "queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}},
+    "executionStats": {"nReturned": 1, "totalKeysExamined": 0, "totalDocsExamined": 50000},
+}
+
+
+def _collection(name, explained=None):
+    col = MagicMock()
+    col.name = name
+    col.create_indexes = AsyncMock()
+    cursor = MagicMock()
+    cursor.explain = AsyncMock(return_value=explained or IXSCAN_PLAN)
+    col.find = MagicMock(return_value=cursor)
+    return col
+
+
+async def test_ensure_indexes_creates_declared_indexes():
+    books, authors = _collection("books"), _collection("authors")
+    with (
+        patch("app.indexes.books_collection", books),
+        patch("app.indexes.authors_collection", authors),
+    ):
+        await ensure_indexes()
+
+    books.create_indexes.assert_awaited_once_with(BOOK_INDEXES)
+    authors.create_indexes.assert_awaited_once_with(AUTHOR_INDEXES)
+    assert {"author_ids", "title"} <= {index.document["name"] for index in BOOK_INDEXES}
+    assert [index.document["key"] for index in AUTHOR_INDEXES] == [{"book_ids": 1}]
+
+
+async def test_ensure_indexes_survives_conflicting_index():
+    books, authors = _collection("books"), _collection("authors")
+    books.create_indexes.side_effect = OperationFailure("IndexOptionsConflict", code=85)
+    with (
+        patch("app.indexes.books_collection", books),
+        patch("app.indexes.authors_collection", authors),
+    ):
+        await ensure_indexes()
+
+    authors.create_indexes.assert_awaited_once()
+
+
+@pytest.mark.parametrize(
+    ("explained", "expected"),
+    [
+        (IXSCAN_PLAN, {"stages": ["LIMIT", "FETCH", "IXSCAN"], "indexes": ["_id_"]}),
+        (COLLSCAN_PLAN, {"stages": ["COLLSCAN"], "indexes": [], "collscan": True}),
+    ],
+)
+def test_plan_summary(explained, expected):
+    summary = plan_summary(explained)
+
+    assert summary.items() >= expected.items()
+    assert summary["collscan"] is ("COLLSCAN" in expected["stages"])
+
+
+async def test_explain_endpoint_flags_collscans(client):
+    books = _collection("books", COLLSCAN_PLAN)
+    with (
+        patch("app.indexes.books_collection", books),
+        patch("app.indexes.authors_collection", _collection("authors")),
+        patch("app.indexes.outbox_collection", _collection("outbox")),
+    ):
+        resp = await client.get("/admin/explain")
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["collscans"] == ["books_page", "books_by_author", "books_by_title"]
+    by_name = {query["name"]: query for query in body["queries"]}
+    assert by_name["authors_by_book"]["indexes"] == ["_id_"]
+    assert by_name["outbox_pending"]["collection"] == "outbox"
+    assert by_name["books_by_author"]["docs_examined"] == 50000
@@ -1,16 +1,63 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
-from app.kafka_producer import send_event
+import pytest
+
+import app.kafka_producer as kafka_module
+from app.kafka_producer import (
+    delivery_metrics,
+    event_message,
+    flush_events,
+    message_headers,
+    send_event,
+    send_events,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_delivery_tracking():
+    kafka_module._pending.clear()
+    kafka_module._slots = None
+    kafka_module.delivery_stats.update(queued=0, delivered=0, failed=0)
+    yield
+    kafka_module._pending.clear()
+    kafka_module._slots = None
+
+
+def _producer_with_manual_acks():
+    """Producer whose send() returns futures the test resolves itself."""
+    producer = MagicMock()
+    producer.deliveries = []
+
+    async def send(topic, message, key=None, headers=None):
+        delivery = asyncio.get_running_loop().create_future()
+        producer.deliveries.append((delivery, message, key))
+        return delivery
+
+    producer.send = AsyncMock(side_effect=send)
+    producer.send_and_wait = AsyncMock()
+    return producer
 
 
 async def test_send_event_with_producer():
     mock_producer = AsyncMock()
-    with patch("app.kafka_producer.producer", mock_producer):
+    with (
+        patch("app.kafka_producer.producer", mock_producer),
+        patch("app.kafka_producer.settings.KAFKA_WAIT_FOR_ACK", True),
+    ):
         await send_event("library.events", "book_created", {"title": "Test"})
 
     mock_producer.send_and_wait.assert_called_once_with(
         "library.events",
-        {"event": "book_created", "data": {"title": "Test"}},
+        {
+            "schema_version": 1,
+            "event": "book_created",
+            "data": {"title": "Test"},
+            "produced_at": ANY,
+        },
+        key=None,
+        # Tracing is off: only the body format, no traceparent header
+        headers=[("content-type", b"application/json")],
     )
 
 
@@ -18,3 +65,171 @@ async def test_send_event_without_producer():
     with patch("app.kafka_producer.producer", None):
         # Should not raise
         await send_event("library.events", "book_created", {"title": "Test"})
+
+
+async def test_send_event_keys_by_document_id():
+    mock_producer = _producer_with_manual_acks()
+    with patch("app.kafka_producer.producer", mock_producer):
+        await send_event("library.events", "book_created", {"_id": "b1", "title": "Test"})
+
+    _, _, key = mock_producer.deliveries[0]
+    assert key == "b1"
+
+
+async def test_send_event_does_not_wait_for_ack():
+    mock_producer = _producer_with_manual_acks()
+    with patch("app.kafka_producer.producer", mock_producer):
+        await send_event("library.events", "book_created", {"_id": "b1"})
+
+        # Returned before the broker acknowledged anything
+        assert delivery_metrics()["in_flight"] == 1
+        mock_producer.send_and_wait.assert_not_called()
+
+        delivery, _, _ = mock_producer.deliveries[0]
+        delivery.set_result(None)
+        await flush_events()
+
+    metrics = delivery_metrics()
+    assert metrics["in_flight"] == 0
+    assert metrics["queued"] == 1
+    assert metrics["delivered"] == 1
+
+
+async def test_failed_delivery_is_counted():
+    mock_producer = _producer_with_manual_acks()
+    with patch("app.kafka_producer.producer", mock_producer):
+        await send_event("library.events", "book_created", {"_id": "b1"})
+        delivery, _, _ = mock_producer.deliveries[0]
+        delivery.set_exception(RuntimeError("broker unavailable"))
+        await flush_events()
+
+    assert delivery_metrics()["failed"] == 1
+    assert delivery_metrics()["in_flight"] == 0
+
+
+async def test_cancelled_delivery_is_counted_as_failed():
+    loop = asyncio.get_running_loop()
+    callback_errors = []
+    default_handler = loop.get_exception_handler()
+    loop.set_exception_handler(lambda _, context: callback_errors.append(context))
+    mock_producer = _producer_with_manual_acks()
+    try:
+        with patch("app.kafka_producer.producer", mock_producer):
+            await send_event("library.events", "book_created", {"_id": "b1"})
+            delivery, _, _ = mock_producer.deliveries[0]
+            delivery.cancel()
+            await flush_events()
+            await asyncio.sleep(0)
+    finally:
+        loop.set_exception_handler(default_handler)
+
+    assert callback_errors == []
+    assert delivery_metrics()["failed"] == 1
+    assert delivery_metrics()["in_flight"] == 0
+
+
+async def test_send_event_applies_backpressure():
+    mock_producer = _producer_with_manual_acks()
+    with (
+        patch("app.kafka_producer.producer", mock_producer),
+        patch("app.kafka_producer.settings.KAFKA_MAX_IN_FLIGHT", 1),
+    ):
+        await send_event("library.events", "book_created", {"_id": "b1"})
+        blocked = asyncio.create_task(send_event("library.events", "book_created", {"_id": "b2"}))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert len(mock_producer.deliveries) == 1
+
+        # Ack for the first message frees a slot for the second one
+        mock_producer.deliveries[0][0].set_result(None)
+        await asyncio.wait_for(blocked, timeout=1)
+        assert len(mock_producer.deliveries) == 2
+        mock_producer.deliveries[1][0].set_result(None)
+        await flush_events()
+
+
+async def test_send_events_waits_for_all_deliveries():
+    mock_producer = AsyncMock()
+    delivered = []
+
+    async def send(topic, message, key=None, headers=None):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        delivered.append(message)
+        return future
+
+    mock_producer.send.side_effect = send
+    with (
+        patch("app.kafka_producer.producer", mock_producer),
+        patch("app.kafka_producer.settings.KAFKA_WAIT_FOR_ACK", True),
+    ):
+        await send_events("library.events", "book_created", [{"title": "A"}, {"title": "B"}])
+
+    assert delivered == [
+        {"schema_version": 1, "event": "book_created", "data": {"title": "A"}, "produced_at": ANY},
+        {"schema_version": 1, "event": "book_created", "data": {"title": "B"}, "produced_at": ANY},
+    ]
+    mock_producer.send_and_wait.assert_not_called()
+
+
+async def test_send_events_enqueues_without_waiting():
+    mock_producer = _producer_with_manual_acks()
+    with patch("app.kafka_producer.producer", mock_producer):
+        await send_events("library.events", "author_created", [{"_id": "a1"}, {"_id": "a2"}])
+
+    assert [key for _, _, key in mock_producer.deliveries] == ["a1", "a2"]
+    assert delivery_metrics()["in_flight"] == 2
+
+
+async def test_send_events_without_producer():
+    with patch("app.kafka_producer.producer", None):
+        # Should not raise
+        await send_events("library.events", "book_created", [{"title": "Test"}])
+
+
+def _sample(name, labels=None):
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+def test_event_message_carries_producer_timestamp():
+    with patch("app.kafka_producer.time.time", return_value=1700000000.5):
+        message = event_message("book_created", {"_id": "b1"})
+    assert message == {
+        "schema_version": 1,
+        "event": "book_created",
+        "data": {"_id": "b1"},
+        "produced_at": 1700000000.5,
+    }
+
+
+def test_message_headers_describe_configured_format():
+    with (
+        patch("app.kafka_producer.settings.EVENT_CONTENT_TYPE", "application/msgpack"),
+        patch("app.kafka_producer.settings.EVENT_COMPRESSION", "zlib"),
+    ):
+        headers = message_headers({"traceparent": "00-abc-def-01"})
+
+    assert headers == [
+        ("content-type", b"application/msgpack"),
+        ("content-encoding", b"zlib"),
+        ("traceparent", b"00-abc-def-01"),
+    ]
+
+
+async def test_delivery_records_publish_latency_and_in_flight_gauge():
+    mock_producer = _producer_with_manual_acks()
+    observed = _sample("core_kafka_publish_seconds_count")
+    delivered = _sample("core_kafka_events_total", {"result": "delivered"})
+
+    with patch("app.kafka_producer.producer", mock_producer):
+        await send_event("library.events", "book_created", {"_id": "b1"})
+        assert _sample("core_kafka_in_flight") == 1
+
+        mock_producer.deliveries[0][0].set_result(None)
+        await flush_events()
+
+    assert _sample("core_kafka_in_flight") == 0
+    assert _sample("core_kafka_publish_seconds_count") == observed + 1
+    assert _sample("core_kafka_events_total", {"result": "delivered"}) == delivered + 1
@@ -0,0 +1,238 @@
+import asyncio
+from unittest.mock import ANY, AsyncMock, patch
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from app import outbox
+
+
+@pytest.fixture
+def outbox_enabled():
+    return True
+
+
+# --- Writes go through the outbox ---
+
+
+async def test_create_author_writes_outbox_in_same_transaction(
+    client, mock_authors_collection, mock_outbox_collection, mock_mongo_session
+):
+    author_id = ObjectId()
+    mock_authors_collection.insert_one.return_value.inserted_id = author_id
+
+    resp = await client.post("/authors/", json={"name": "Tolstoy"})
+
+    assert resp.status_code == 201
+    mock_mongo_session.start_transaction.assert_called_once()
+    assert mock_authors_collection.insert_one.call_args.kwargs["session"] is mock_mongo_session
+
+    row = mock_outbox_collection.insert_one.call_args.args[0]
+    assert mock_outbox_collection.insert_one.call_args.kwargs["session"] is mock_mongo_session
+    assert row["topic"] == "library.events"
+    assert row["key"] == str(author_id)
+    assert row["message"] == {
+        "schema_version": 1,
+        "event": "author_created",
+        "data": {"_id": str(author_id), "name": "Tolstoy", "book_ids": [], "version": 1},
+        "produced_at": ANY,
+    }
+    assert row["sent_at"] is None
+    client.mock_send_event.assert_not_called()
+
+
+async def test_create_book_backrefs_share_transaction(
+    client, mock_books_collection, mock_authors_collection, mock_mongo_session
+):
+    book_id, author_id = ObjectId(), ObjectId()
+    mock_books_collection.insert_one.return_value.inserted_id = book_id
+    mock_authors_collection.find.return_value.to_list.return_value = [
+        {"_id": author_id, "version": 2}
+    ]
+
+    resp = await client.post(
+        "/books/", json={"title": "Book", "description": "Desc", "author_ids": [str(author_id)]}
+    )
+
+    assert resp.status_code == 201
+    assert mock_authors_collection.update_many.call_args.kwargs["session"] is mock_mongo_session
+
+
+async def test_create_uses_route_write_concern_for_transaction(
+    client, mock_authors_collection, mock_mongo_session
+):
+    mock_authors_collection.with_options.return_value = mock_authors_collection
+    with patch("app.database.settings.MONGO_WRITE_CONCERN", {"create_author": "majority"}):
+        resp = await client.post("/authors/", json={"name": "Tolstoy"})
+
+    assert resp.status_code == 201
+    write_concern = mock_mongo_session.start_transaction.call_args.kwargs["write_concern"]
+    assert write_concern.document == {"w": "majority"}
+
+
+async def test_bulk_create_writes_outbox_rows(client, mock_outbox_collection):
+    resp = await client.post("/authors/bulk", json=[{"name": "A"}, {"name": "B"}])
+
+    assert resp.status_code == 200
+    rows = mock_outbox_collection.insert_many.call_args.args[0]
+    assert [row["message"]["data"]["name"] for row in rows] == ["A", "B"]
+    client.mock_send_events.assert_not_called()
+
+
+async def test_bulk_create_reports_aborted_transaction(
+    client, mock_authors_collection, mock_outbox_collection
+):
+    mock_authors_collection.insert_many.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}]}
+    )
+
+    resp = await client.post("/authors/bulk", json=[{"name": "A"}, {"name": "B"}])
+
+    data = resp.json()
+    assert data["inserted"] == 0
+    assert data["failed"] == 2
+    mock_outbox_collection.insert_many.assert_not_called()
+
+
+async def test_create_retries_transaction_on_transient_error(
+    client, mock_authors_collection, mock_outbox_collection, mock_mongo_session
+):
+    # Например, конфликт записи или смена primary посреди транзакции
+    conflict = OperationFailure(
+        "WriteConflict", 112, {"errorLabels": ["TransientTransactionError"]}
+    )
+    mock_authors_collection.insert_one.side_effect = [
+        conflict,
+        mock_authors_collection.insert_one.return_value,
+    ]
+
+    resp = await client.post("/authors/", json={"name": "Tolstoy"})
+
+    assert resp.status_code == 201
+    assert mock_mongo_session.start_transaction.call_count == 2
+    mock_mongo_session.abort_transaction.assert_awaited_once()
+    mock_mongo_session.commit_transaction.assert_awaited_once()
+    mock_outbox_collection.insert_one.assert_called_once()
+
+
+async def test_create_retries_commit_with_unknown_result(
+    client, mock_authors_collection, mock_mongo_session
+):
+    mock_mongo_session.commit_transaction.side_effect = [
+        OperationFailure("timed out", 50, {"errorLabels": ["UnknownTransactionCommitResult"]}),
+        None,
+    ]
+
+    resp = await client.post("/authors/", json={"name": "Tolstoy"})
+
+    assert resp.status_code == 201
+    # Транзакция не повторяется, повторяется только коммит
+    mock_mongo_session.start_transaction.assert_called_once()
+    assert mock_mongo_session.commit_transaction.await_count == 2
+    mock_authors_collection.insert_one.assert_called_once()
+
+
+# --- Relay ---
+
+
+def _outbox_rows(n):
+    return [
+        {
+            "_id": ObjectId(),
+            "topic": "library.events",
+            "key": f"b{i}",
+            "message": {"event": "book_created", "data": {"_id": f"b{i}"}},
+        }
+        for i in range(n)
+    ]
+
+
+async def test_relay_batch_publishes_and_marks_sent(mock_outbox_collection):
+    rows = _outbox_rows(2)
+    # 1st find: candidate ids, 2nd find: rows leased by this relay
+    mock_outbox_collection.find.return_value.to_list.side_effect = [
+        [{"_id": row["_id"]} for row in rows],
+        rows,
+    ]
+
+    with (
+        patch("app.outbox.outbox_collection", mock_outbox_collection),
+        patch("app.outbox.send_batch_and_wait", new_callable=AsyncMock) as mock_send,
+    ):
+        sent = await outbox.relay_batch()
+
+    assert sent == 2
+    mock_send.assert_called_once_with(
+        [("library.events", row["message"], row["key"], None) for row in rows]
+    )
+    lease_call, sent_call = mock_outbox_collection.update_many.call_args_list
+    assert lease_call.args[1]["$set"]["lease_owner"] == outbox.RELAY_ID
+    assert sent_call.args[0] == {"_id": {"$in": [row["_id"] for row in rows]}}
+    assert sent_call.args[1]["$set"]["sent_at"] is not None
+
+
+async def test_relay_batch_keeps_rows_when_kafka_fails(mock_outbox_collection):
+    rows = _outbox_rows(1)
+    mock_outbox_collection.find.return_value.to_list.side_effect = [
+        [{"_id": rows[0]["_id"]}],
+        rows,
+    ]
+
+    with (
+        patch("app.outbox.outbox_collection", mock_outbox_collection),
+        patch("app.outbox.send_batch_and_wait", AsyncMock(side_effect=RuntimeError("down"))),
+        pytest.raises(RuntimeError),
+    ):
+        await outbox.relay_batch()
+
+    # Only the lease was written; the row is still unsent and will be retried
+    assert mock_outbox_collection.update_many.call_count == 1
+
+
+async def test_relay_batch_with_empty_outbox(mock_outbox_collection):
+    with (
+        patch("app.outbox.outbox_collection", mock_outbox_collection),
+        patch("app.outbox.send_batch_and_wait", new_callable=AsyncMock) as mock_send,
+    ):
+        assert await outbox.relay_batch() == 0
+
+    mock_send.assert_not_called()
+    mock_outbox_collection.update_many.assert_not_called()
+
+
+async def test_relay_wakes_up_on_notify():
+    calls = []
+
+    async def fake_relay_batch():
+        calls.append(asyncio.get_running_loop().time())
+        return 0
+
+    with (
+        patch("app.outbox._wakeup", None),
+        patch("app.outbox.relay_batch", side_effect=fake_relay_batch),
+        patch("app.outbox.settings.OUTBOX_POLL_INTERVAL", 10),
+    ):
+        task = asyncio.create_task(outbox.relay_outbox())
+        await asyncio.sleep(0.01)
+        assert len(calls) == 1
+
+        outbox.notify()
+        await asyncio.sleep(0.01)
+        assert len(calls) == 2
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+
+async def test_metrics_report_outbox_backlog(client, mock_outbox_collection):
+    mock_outbox_collection.count_documents.return_value = 42
+
+    resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "core_outbox_pending 42.0" in resp.text
+    assert "core_kafka_publish_seconds_bucket" in resp.text
+    mock_outbox_collection.count_documents.assert_called_once_with({"sent_at": None})
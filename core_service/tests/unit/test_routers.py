@@ -1,5 +1,11 @@
+import asyncio
+import json
+from unittest.mock import patch
+
 from bson import ObjectId
 
+from app.routers import NEXT_VERSION, array_with
+
 
 async def test_root(client):
     resp = await client.get("/")
@@ -13,11 +19,6 @@ async def test_root(client):
 async def test_create_author(client, mock_authors_collection):
     author_id = ObjectId()
     mock_authors_collection.insert_one.return_value.inserted_id = author_id
-    mock_authors_collection.find_one.return_value = {
-        "_id": author_id,
-        "name": "Tolstoy",
-        "book_ids": [],
-    }
 
     resp = await client.post("/authors/", json={"name": "Tolstoy"})
     assert resp.status_code == 201
@@ -25,17 +26,14 @@ async def test_create_author(client, mock_authors_collection):
     assert data["name"] == "Tolstoy"
     assert data["_id"] == str(author_id)
     mock_authors_collection.insert_one.assert_called_once()
+    # The response is built from the inserted document: no read-after-write
+    mock_authors_collection.find_one.assert_not_called()
     client.mock_send_event.assert_called_once()
 
 
 async def test_create_author_kafka_event_payload(client, mock_authors_collection):
     author_id = ObjectId()
     mock_authors_collection.insert_one.return_value.inserted_id = author_id
-    mock_authors_collection.find_one.return_value = {
-        "_id": author_id,
-        "name": "Pushkin",
-        "book_ids": [],
-    }
 
     await client.post("/authors/", json={"name": "Pushkin"})
     call_kwargs = client.mock_send_event.call_args
@@ -66,12 +64,6 @@ async def test_get_authors(client, mock_authors_collection):
 async def test_create_book_no_authors(client, mock_books_collection, mock_authors_collection):
     book_id = ObjectId()
     mock_books_collection.insert_one.return_value.inserted_id = book_id
-    mock_books_collection.find_one.return_value = {
-        "_id": book_id,
-        "title": "War and Peace",
-        "description": "Novel",
-        "author_ids": [],
-    }
 
     resp = await client.post(
         "/books/",
@@ -88,12 +80,10 @@ async def test_create_book_with_authors_updates_many_to_many(
     book_id = ObjectId()
     author_id = ObjectId()
     mock_books_collection.insert_one.return_value.inserted_id = book_id
-    mock_books_collection.find_one.return_value = {
-        "_id": book_id,
-        "title": "Book",
-        "description": "Desc",
-        "author_ids": [str(author_id)],
-    }
+    mock_authors_collection.find.return_value.to_list.side_effect = [
+        [{"_id": author_id}],
+        [{"_id": author_id, "version": 3, "book_ids": [str(book_id)]}],
+    ]
 
     resp = await client.post(
         "/books/",
@@ -106,8 +96,18 @@ async def test_create_book_with_authors_updates_many_to_many(
     assert resp.status_code == 201
     mock_authors_collection.update_many.assert_called_once()
     call_args = mock_authors_collection.update_many.call_args[0]
-    assert author_id in call_args[0]["_id"]["$in"]
-    assert call_args[1] == {"$addToSet": {"book_ids": str(book_id)}}
+    assert call_args[0] == {"_id": {"$in": [author_id]}}
+    assert call_args[1] == [
+        {"$set": {"book_ids": array_with("book_ids", str(book_id)), "version": NEXT_VERSION}}
+    ]
+
+    # The author gets a new version, so the search index takes the change
+    events = {
+        c.kwargs["event_type"]: c.kwargs["items"] for c in client.mock_send_events.call_args_list
+    }
+    assert events["author_updated"] == [
+        {"_id": str(author_id), "version": 3, "book_ids": [str(book_id)]}
+    ]
 
 
 async def test_create_book_with_multiple_authors(
@@ -116,12 +116,10 @@ async def test_create_book_with_multiple_authors(
     book_id = ObjectId()
     a1, a2 = ObjectId(), ObjectId()
     mock_books_collection.insert_one.return_value.inserted_id = book_id
-    mock_books_collection.find_one.return_value = {
-        "_id": book_id,
-        "title": "Co-authored",
-        "description": "Desc",
-        "author_ids": [str(a1), str(a2)],
-    }
+    mock_authors_collection.find.return_value.to_list.return_value = [
+        {"_id": a1, "version": 2},
+        {"_id": a2, "version": 2},
+    ]
 
     resp = await client.post(
         "/books/",
@@ -136,15 +134,63 @@ async def test_create_book_with_multiple_authors(
     assert len(call_args[0]["_id"]["$in"]) == 2
 
 
+async def test_create_book_links_authors_while_publishing(
+    client, mock_books_collection, mock_authors_collection
+):
+    # Without the outbox the back-reference update and the event are independent
+    author_id = ObjectId()
+    mock_books_collection.insert_one.return_value.inserted_id = ObjectId()
+    mock_authors_collection.find.return_value.to_list.return_value = [
+        {"_id": author_id, "version": 2}
+    ]
+    both_started = asyncio.Event()
+    started = []
+
+    async def step(name):
+        started.append(name)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+
+    async def update_many(*args, **kwargs):
+        await step("update_many")
+
+    async def send_event(**kwargs):
+        await step("send_event")
+
+    mock_authors_collection.update_many.side_effect = update_many
+    client.mock_send_event.side_effect = send_event
+
+    resp = await client.post(
+        "/books/", json={"title": "Book", "description": "Desc", "author_ids": [str(author_id)]}
+    )
+
+    assert resp.status_code == 201
+    assert sorted(started) == ["send_event", "update_many"]
+    mock_books_collection.find_one.assert_not_called()
+
+
+def test_route_collection_applies_configured_options(mock_books_collection):
+    from pymongo import ReadPreference
+
+    from app.database import route_collection
+
+    with (
+        patch("app.database.settings.MONGO_WRITE_CONCERN", {"create_book": 1}),
+        patch("app.database.settings.MONGO_READ_PREFERENCE", {"get_books": "secondaryPreferred"}),
+    ):
+        assert route_collection(mock_books_collection, "update_book") is mock_books_collection
+        route_collection(mock_books_collection, "create_book")
+        route_collection(mock_books_collection, "get_books")
+
+    (_, create), (_, get) = mock_books_collection.with_options.call_args_list
+    assert create["write_concern"].document == {"w": 1}
+    assert get == {"read_preference": ReadPreference.SECONDARY_PREFERRED}
+
+
 async def test_create_book_sends_kafka_event(client, mock_books_collection):
     book_id = ObjectId()
     mock_books_collection.insert_one.return_value.inserted_id = book_id
-    mock_books_collection.find_one.return_value = {
-        "_id": book_id,
-        "title": "Test",
-        "description": "Desc",
-        "author_ids": [],
-    }
 
     await client.post(
         "/books/", json={"title": "Test", "description": "Desc", "author_ids": []}
@@ -168,3 +214,109 @@ async def test_get_books(client, mock_books_collection):
     resp = await client.get("/books/")
     assert resp.status_code == 200
     assert len(resp.json()) == 2
+
+
+async def test_get_books_fast_json_path(client, mock_books_collection):
+    book_id, author_id = ObjectId(), ObjectId()
+    mock_books_collection.find.return_value.to_list.return_value = [
+        {"_id": book_id, "title": "Book 1", "description": "D1", "author_ids": [author_id]},
+    ]
+    with patch("app.serialization.settings.FAST_JSON_RESPONSES", True):
+        resp = await client.get("/books/")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    book = resp.json()[0]
+    assert book["_id"] == str(book_id)
+    assert book["author_ids"] == [str(author_id)]
+
+
+# --- Pagination ---
+
+
+async def test_get_books_first_page_sorted_by_id(client, mock_books_collection):
+    resp = await client.get("/books/", params={"limit": 50})
+    assert resp.status_code == 200
+    call = mock_books_collection.find.call_args
+    assert call.args[0] == {}
+    assert call.kwargs == {"sort": [("_id", 1)], "limit": 50}
+    mock_books_collection.find.return_value.to_list.assert_called_once_with(50)
+
+
+async def test_get_books_after_cursor(client, mock_books_collection):
+    last_id = ObjectId()
+    resp = await client.get("/books/", params={"after": str(last_id)})
+    assert resp.status_code == 200
+    assert mock_books_collection.find.call_args.args[0] == {"_id": {"$gt": last_id}}
+
+
+async def test_get_authors_after_cursor(client, mock_authors_collection):
+    last_id = ObjectId()
+    resp = await client.get("/authors/", params={"after": str(last_id), "limit": 10})
+    assert resp.status_code == 200
+    assert mock_authors_collection.find.call_args.args[0] == {"_id": {"$gt": last_id}}
+
+
+async def test_get_books_invalid_cursor(client):
+    resp = await client.get("/books/", params={"after": "not-an-id"})
+    assert resp.status_code == 400
+
+
+async def test_get_books_limit_is_capped(client):
+    resp = await client.get("/books/", params={"limit": 5000})
+    assert resp.status_code == 422
+
+
+async def test_get_books_with_projection(client, mock_books_collection):
+    book_id = ObjectId()
+    mock_books_collection.find.return_value.to_list.return_value = [
+        {"_id": book_id, "title": "Book 1"},
+    ]
+    resp = await client.get("/books/", params={"fields": "title"})
+    assert resp.status_code == 200
+    assert resp.json() == [{"_id": str(book_id), "title": "Book 1"}]
+    assert mock_books_collection.find.call_args.args[1] == {"title": 1}
+
+
+async def test_get_books_unknown_projection_field(client):
+    resp = await client.get("/books/", params={"fields": "title,password"})
+    assert resp.status_code == 400
+
+
+# --- NDJSON export ---
+
+
+async def test_export_books_streams_ndjson(client, mock_books_collection):
+    ids = [ObjectId(), ObjectId(), ObjectId()]
+    cursor = mock_books_collection.find.return_value
+    cursor.__aiter__.return_value = [
+        {"_id": oid, "title": f"Book {n}", "author_ids": [str(ObjectId())]}
+        for n, oid in enumerate(ids)
+    ]
+
+    with patch("app.routers.settings.EXPORT_BATCH_SIZE", 2):
+        resp = await client.get("/books/export")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["_id"] for line in lines] == [str(oid) for oid in ids]
+    assert mock_books_collection.find.call_args.kwargs == {"sort": [("_id", 1)], "batch_size": 2}
+
+
+async def test_export_authors_resumes_after_cursor(client, mock_authors_collection):
+    last_id = ObjectId()
+    mock_authors_collection.find.return_value.__aiter__.return_value = []
+
+    resp = await client.get(
+        "/authors/export", params={"after": str(last_id), "fields": "name"}
+    )
+
+    assert resp.status_code == 200
+    assert resp.text == ""
+    call = mock_authors_collection.find.call_args
+    assert call.args == ({"_id": {"$gt": last_id}}, {"name": 1})
+
+
+async def test_export_rejects_invalid_cursor(client):
+    resp = await client.get("/books/export", params={"after": "nope"})
+    assert resp.status_code == 400
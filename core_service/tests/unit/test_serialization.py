@@ -0,0 +1,55 @@
+import json
+from datetime import UTC, datetime
+from unittest.mock import patch
+
+import pytest
+from bson import ObjectId
+
+from app.serialization import documents_response, dumps, ndjson_line, to_jsonable
+
+
+def test_to_jsonable_converts_nested_objectids():
+    oid, nested = ObjectId(), ObjectId()
+    doc = {"_id": oid, "author_ids": [nested], "meta": {"ref": nested}}
+    assert to_jsonable(doc) == {
+        "_id": str(oid),
+        "author_ids": [str(nested)],
+        "meta": {"ref": str(nested)},
+    }
+
+
+def test_to_jsonable_formats_datetimes():
+    ts = datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)
+    assert to_jsonable({"created_at": ts}) == {"created_at": "2024-01-02T03:04:05+00:00"}
+
+
+def test_to_jsonable_keeps_plain_values():
+    doc = {"title": "Book", "pages": 10, "tags": ["a", "b"], "draft": None}
+    assert to_jsonable(doc) == doc
+
+
+def test_dumps_matches_to_jsonable():
+    doc = {
+        "_id": ObjectId(),
+        "title": "Война и мир",
+        "author_ids": [ObjectId(), ObjectId()],
+        "meta": {"ref": ObjectId(), "created_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)},
+        "version": 3,
+    }
+    assert json.loads(dumps(doc)) == to_jsonable(doc)
+
+
+def test_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        dumps({"value": {1, 2}})
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_documents_response_and_ndjson_line_agree_on_both_paths(fast):
+    doc = {"_id": ObjectId(), "title": "Книга", "author_ids": [ObjectId()]}
+    with patch("app.serialization.settings.FAST_JSON_RESPONSES", fast):
+        response = documents_response([doc])
+        line = ndjson_line(doc)
+
+    assert json.loads(response.body) == [to_jsonable(doc)]
+    assert json.loads(line) == to_jsonable(doc)
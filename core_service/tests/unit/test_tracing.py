@@ -0,0 +1,103 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app import outbox
+from app.kafka_producer import send_event
+from app.tracing import (
+    TracedCollection,
+    kafka_headers,
+    setup_tracing,
+    shutdown_tracing,
+    span,
+    trace_carrier,
+)
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemorySpanExporter()
+    setup_tracing(exporter, sample_rate=1.0, batch=False)
+    yield exporter
+    shutdown_tracing()
+
+
+def test_tracing_is_off_by_default():
+    with span("noop") as current:
+        assert not current.is_recording()
+    assert trace_carrier() == {}
+
+
+def test_sample_rate_zero_records_nothing():
+    exporter = InMemorySpanExporter()
+    setup_tracing(exporter, sample_rate=0.0, batch=False)
+    try:
+        with span("dropped"):
+            # The "not sampled" decision still travels downstream so the consumer skips it too
+            assert trace_carrier()["traceparent"].endswith("-00")
+    finally:
+        shutdown_tracing()
+    assert exporter.get_finished_spans() == ()
+
+
+async def test_send_event_puts_traceparent_into_kafka_headers(spans):
+    producer = MagicMock()
+    producer.send_and_wait = AsyncMock()
+
+    with (
+        patch("app.kafka_producer.producer", producer),
+        patch("app.kafka_producer.settings.KAFKA_WAIT_FOR_ACK", True),
+    ):
+        await send_event("library.events", "book_created", {"_id": "b1"})
+
+    (publish,) = spans.get_finished_spans()
+    assert publish.name == "kafka publish book_created"
+    headers = dict(producer.send_and_wait.call_args.kwargs["headers"])
+    trace_id = f"{publish.context.trace_id:032x}"
+    span_id = f"{publish.context.span_id:016x}"
+    assert headers["traceparent"] == f"00-{trace_id}-{span_id}-01".encode()
+
+
+async def test_outbox_row_keeps_trace_context_for_the_relay(spans):
+    with span("POST /books/"):
+        row = outbox._outbox_row("library.events", "book_created", {"_id": "b1"})
+
+    assert row["trace"]["traceparent"].startswith("00-")
+    assert kafka_headers(row["trace"]) == [("traceparent", row["trace"]["traceparent"].encode())]
+
+
+async def test_traced_collection_records_mongo_calls(spans):
+    raw = MagicMock()
+    raw.name = "books"
+    raw.insert_one = AsyncMock(return_value="inserted")
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{"_id": 1}])
+    raw.find = MagicMock(return_value=cursor)
+    collection = TracedCollection(raw)
+
+    assert await collection.insert_one({"title": "A"}) == "inserted"
+    assert await collection.find({}, limit=1).to_list(1) == [{"_id": 1}]
+
+    names = [s.name for s in spans.get_finished_spans()]
+    assert names == ["mongo insert_one", "mongo find"]
+    assert spans.get_finished_spans()[0].attributes["db.mongodb.collection"] == "books"
+    raw.insert_one.assert_called_once_with({"title": "A"})
+    raw.find.assert_called_once_with({}, limit=1)
+
+
+async def test_middleware_continues_incoming_trace_and_adds_server_timing(client, spans):
+    resp = await client.get("/", headers={"traceparent": TRACEPARENT})
+
+    assert resp.headers["Server-Timing"].startswith("app;dur=")
+    (server,) = spans.get_finished_spans()
+    assert server.name == "GET /"
+    assert f"{server.context.trace_id:032x}" == "0af7651916cd43dd8448eb211c80319c"
+    assert server.attributes["http.status_code"] == 200
+
+
+async def test_server_timing_is_set_with_tracing_off(client):
+    resp = await client.get("/")
+    assert resp.headers["Server-Timing"].startswith("app;dur=")
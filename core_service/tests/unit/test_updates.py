@@ -0,0 +1,145 @@
+from bson import ObjectId
+
+
+async def test_update_author_emits_changed_fields_with_version(client, mock_authors_collection):
+    author_id = ObjectId()
+    mock_authors_collection.find_one_and_update.return_value = {
+        "_id": author_id,
+        "name": "Old",
+        "book_ids": [],
+        "version": 3,
+    }
+
+    resp = await client.patch(f"/authors/{author_id}", json={"name": "New"})
+
+    assert resp.status_code == 200
+    assert resp.json()["name"] == "New"
+    assert resp.json()["version"] == 4
+
+    # One pipeline update: new fields plus version + 1
+    pipeline = mock_authors_collection.find_one_and_update.call_args.args[1]
+    assert pipeline[0]["$set"]["name"] == {"$literal": "New"}
+    assert "version" in pipeline[0]["$set"]
+
+    call = client.mock_send_event.call_args.kwargs
+    assert call["event_type"] == "author_updated"
+    assert call["data"] == {"_id": str(author_id), "version": 4, "name": "New"}
+
+
+async def test_update_author_not_found(client, mock_authors_collection):
+    mock_authors_collection.find_one_and_update.return_value = None
+
+    resp = await client.patch(f"/authors/{ObjectId()}", json={"name": "New"})
+
+    assert resp.status_code == 404
+    client.mock_send_event.assert_not_called()
+
+
+async def test_update_rejects_empty_patch_and_bad_id(client):
+    assert (await client.patch(f"/authors/{ObjectId()}", json={})).status_code == 400
+    assert (await client.patch("/authors/not-an-id", json={"name": "X"})).status_code == 404
+
+
+async def test_update_book_moves_author_backrefs(
+    client, mock_books_collection, mock_authors_collection
+):
+    book_id = ObjectId()
+    old_author, kept_author, new_author = (str(ObjectId()) for _ in range(3))
+    mock_books_collection.find_one_and_update.return_value = {
+        "_id": book_id,
+        "title": "T",
+        "description": "D",
+        "author_ids": [old_author, kept_author],
+    }
+    related = [{"_id": ObjectId(new_author), "book_ids": [str(book_id)], "version": 2}]
+    mock_authors_collection.find.return_value.to_list.return_value = related
+
+    resp = await client.patch(f"/books/{book_id}", json={"author_ids": [kept_author, new_author]})
+
+    assert resp.status_code == 200
+    # Legacy document without a version becomes version 2
+    assert resp.json()["version"] == 2
+
+    # The added and the removed author are both updated, the kept one is untouched
+    queried = [c.args[0] for c in mock_authors_collection.find.call_args_list]
+    assert {"_id": {"$in": [ObjectId(new_author)]}} in queried
+    assert {"_id": {"$in": [ObjectId(old_author)]}} in queried
+    assert mock_authors_collection.update_many.call_count == 2
+
+    assert client.mock_send_events.call_args_list[0].kwargs["event_type"] == "author_updated"
+    book_event = client.mock_send_event.call_args.kwargs
+    assert book_event["event_type"] == "book_updated"
+    assert book_event["data"] == {
+        "_id": str(book_id),
+        "version": 2,
+        "author_ids": [kept_author, new_author],
+    }
+
+
+async def test_update_book_rejects_invalid_author_id(client, mock_books_collection):
+    resp = await client.patch(f"/books/{ObjectId()}", json={"author_ids": ["nope"]})
+
+    assert resp.status_code == 400
+    mock_books_collection.find_one_and_update.assert_not_called()
+
+
+async def test_delete_book_emits_event_and_cleans_authors(
+    client, mock_books_collection, mock_authors_collection
+):
+    book_id = ObjectId()
+    author_id = ObjectId()
+    mock_books_collection.find_one_and_delete.return_value = {
+        "_id": book_id,
+        "title": "T",
+        "author_ids": [str(author_id)],
+        "version": 5,
+    }
+    mock_authors_collection.find.return_value.to_list.return_value = [
+        {"_id": author_id, "book_ids": [], "version": 3}
+    ]
+
+    resp = await client.delete(f"/books/{book_id}")
+
+    assert resp.status_code == 204
+    assert mock_authors_collection.find.call_args_list[0].args[0] == {"book_ids": str(book_id)}
+    author_events = client.mock_send_events.call_args.kwargs
+    assert author_events["event_type"] == "author_updated"
+    assert author_events["items"] == [{"_id": str(author_id), "version": 3, "book_ids": []}]
+
+    call = client.mock_send_event.call_args.kwargs
+    assert call["event_type"] == "book_deleted"
+    assert call["data"] == {"_id": str(book_id), "version": 6}
+
+
+async def test_delete_author_without_books(client, mock_authors_collection, mock_books_collection):
+    author_id = ObjectId()
+    mock_authors_collection.find_one_and_delete.return_value = {"_id": author_id, "name": "A"}
+
+    resp = await client.delete(f"/authors/{author_id}")
+
+    assert resp.status_code == 204
+    mock_books_collection.update_many.assert_not_called()
+    client.mock_send_events.assert_not_called()
+    call = client.mock_send_event.call_args.kwargs
+    assert call["event_type"] == "author_deleted"
+    assert call["data"] == {"_id": str(author_id), "version": 2}
+
+
+async def test_delete_missing_book(client, mock_books_collection):
+    mock_books_collection.find_one_and_delete.return_value = None
+
+    resp = await client.delete(f"/books/{ObjectId()}")
+
+    assert resp.status_code == 404
+    client.mock_send_event.assert_not_called()
+
+
+async def test_create_starts_at_version_one(client, mock_authors_collection):
+    author_id = ObjectId()
+    mock_authors_collection.insert_one.return_value.inserted_id = author_id
+
+    resp = await client.post("/authors/", json={"name": "Tolstoy"})
+
+    assert mock_authors_collection.insert_one.call_args.args[0]["version"] == 1
+    assert resp.json()["version"] == 1
+    assert client.mock_send_event.call_args.kwargs["data"]["version"] == 1
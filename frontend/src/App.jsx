@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from "react";
-import { fetchAuthors as apiFetchAuthors, fetchBooks as apiFetchBooks, reindex } from "./api";
+import { fetchAuthors as apiFetchAuthors, fetchBooks as apiFetchBooks, fetchReindexStatus, reindex } from "./api";
 import SearchTab from "./components/SearchTab";
 import BooksTab from "./components/BooksTab";
 import AuthorsTab from "./components/AuthorsTab";
@@ -45,8 +45,14 @@ function App() {
   const handleReindex = async () => {
     setReindexing(true);
     try {
-      const res = await reindex();
-      alert(`Reindex complete: ${res.data.indexed.books} books, ${res.data.indexed.authors} authors`);
+      let { data: job } = await reindex();
+      // Reindex runs in the background, poll its status until it finishes
+      while (job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        ({ data: job } = await fetchReindexStatus());
+      }
+      if (job.status !== "completed") throw new Error(job.error);
+      alert(`Reindex complete: ${job.indexed.books} books, ${job.indexed.authors} authors`);
     } catch (e) {
       console.error(e);
       alert("Reindex failed");
@@ -21,4 +21,17 @@ export const createBook = (title, description, authorIds) =>
 export const searchAll = (query) =>
   axios.get(`${SEARCH_API}/search/all/`, { params: { query } });
 
+// Identifies this tab to /suggest/, so the server can drop superseded keystrokes
+const CLIENT_ID = crypto.randomUUID();
+
+export const fetchSuggestions = (prefix, signal) =>
+  axios.get(`${SEARCH_API}/suggest/`, {
+    params: { prefix },
+    headers: { "X-Client-Id": CLIENT_ID },
+    signal,
+  });
+
 export const reindex = () => axios.post(`${SEARCH_API}/reindex/`);
+
+export const fetchReindexStatus = () =>
+  axios.get(`${SEARCH_API}/reindex/status`);
@@ -1,9 +1,27 @@
-import { useState } from "react";
-import { searchAll } from "../api";
+import { useEffect, useState } from "react";
+import { fetchSuggestions, searchAll } from "../api";
 
 export default function SearchTab({ getBookTitle }) {
   const [query, setQuery] = useState("");
   const [results, setResults] = useState({ books: [], authors: [] });
+  const [suggestions, setSuggestions] = useState([]);
+
+  useEffect(() => {
+    if (!query.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    // Abort the previous keystroke's request; the server drops it as well
+    const controller = new AbortController();
+    fetchSuggestions(query, controller.signal)
+      .then((res) => {
+        if (res.status !== 200) return;
+        const { books, authors } = res.data;
+        setSuggestions([...books, ...authors].map((s) => s.text));
+      })
+      .catch(() => {});
+    return () => controller.abort();
+  }, [query]);
 
   const handleSearch = async (e) => {
     e.preventDefault();
@@ -27,9 +45,16 @@ export default function SearchTab({ getBookTitle }) {
           value={query}
           onChange={(e) => setQuery(e.target.value)}
           placeholder="Search by title, description, or author name..."
+          list="search-suggestions"
+          autoComplete="off"
           required
           className="flex-1 rounded-lg border border-gray-300 px-4 py-2.5 text-sm focus:border-emerald-500 focus:ring-2 focus:ring-emerald-200 outline-none transition"
         />
+        <datalist id="search-suggestions">
+          {suggestions.map((text) => (
+            <option key={text} value={text} />
+          ))}
+        </datalist>
         <button
           type="submit"
           className="rounded-lg bg-emerald-600 px-5 py-2.5 text-sm font-medium text-white hover:bg-emerald-700 transition"
@@ -0,0 +1,457 @@
+"""Search backends behind /search/, /search/all/ and /suggest/.
+
+``SEARCH_BACKEND`` picks one at startup:
+
+- ``elasticsearch``: the production path; queries go to the aliases (app/indices.py).
+- ``memory``: ``MemoryBackend`` answers the same requests from in-process inverted
+  indexes (app/memory_index.py), fed by the same Kafka events through the consumer.
+  It needs no Elasticsearch, so it doubles as an embedded backend for development and
+  as a fallback. Every API process holds a full copy; see ``kafka_consumer.consumer_group``.
+
+The endpoints only talk to ``search_backend``; caching, coalescing and response headers
+stay in app/main.py and work the same for both.
+"""
+
+import asyncio
+import shutil
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from elasticsearch import ConnectionTimeout, NotFoundError
+
+from app.config import settings
+from app.database import es_client
+from app.indices import SUGGEST_FIELDS, ensure_indices
+from app.memory_index import InvertedIndex, field_values, word_spans
+from app.queries import (
+    PIT_SORT,
+    SEARCH_FIELDS,
+    decode_cursor,
+    document,
+    encode_cursor,
+    hits,
+    msearch_body,
+    result_size,
+    search_request,
+    split_msearch,
+)
+from app.suggest import split_suggestions, suggest_body
+
+
+class CursorExpiredError(Exception):
+    """The point in time behind a pagination cursor is gone; paging has to start over."""
+
+
+class SearchBackend(ABC):
+    name: str
+
+    @abstractmethod
+    async def start(self):
+        """Called once at startup, before the consumer starts."""
+
+    @abstractmethod
+    async def close(self):
+        """Called once at shutdown, after the consumer has stopped."""
+
+    @abstractmethod
+    async def ping(self) -> bool: ...
+
+    @abstractmethod
+    async def search(
+        self,
+        index: str,
+        query: str,
+        size: int,
+        includes: list[str] | None = None,
+        excludes: list[str] | None = None,
+        highlight: bool = False,
+    ) -> dict | None:
+        """``{"documents", "total"}`` of one index, or None if the index does not exist."""
+
+    @abstractmethod
+    async def page(
+        self,
+        index: str,
+        query: str,
+        size: int,
+        includes: list[str] | None = None,
+        excludes: list[str] | None = None,
+        highlight: bool = False,
+        cursor: str | None = None,
+    ) -> dict:
+        """
+        One page: ``{"documents", "total", "next_cursor"}``; ``next_cursor`` is None on the
+        last page. Raises ValueError for a malformed cursor and CursorExpiredError for a
+        cursor that can no longer be continued.
+        """
+
+    @abstractmethod
+    async def search_all(self, query: str, indices: tuple[str, ...]) -> dict[str, list[dict]]:
+        """Top documents of every index; a missing index comes back empty."""
+
+    @abstractmethod
+    async def suggest(
+        self, prefix: str, indices: tuple[str, ...], size: int
+    ) -> dict[str, list[dict]]:
+        """Completion options ``{"text", "_id"}`` per index. Raises TimeoutError past SUGGEST_TIMEOUT_MS."""
+
+
+class ElasticsearchBackend(SearchBackend):
+    name = "elasticsearch"
+
+    async def start(self):
+        await es_client.open()
+        await ensure_indices()
+
+    async def close(self):
+        await es_client.close()
+
+    async def ping(self) -> bool:
+        return await es_client.ping()
+
+    async def search(self, index, query, size, includes=None, excludes=None, highlight=False):
+        request = search_request(query, size, includes, excludes, highlight)
+        try:
+            result = await es_client.search(index=index, **request)
+        except NotFoundError:
+            return None
+        return {"documents": hits(result), "total": result["hits"].get("total")}
+
+    async def page(
+        self, index, query, size, includes=None, excludes=None, highlight=False, cursor=None
+    ):
+        request = search_request(query, size, includes, excludes, highlight)
+        if cursor:
+            pit_id, search_after = decode_cursor(cursor)
+        else:
+            try:
+                pit = await es_client.open_point_in_time(
+                    index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE
+                )
+            except NotFoundError:
+                return {"documents": [], "total": None, "next_cursor": None}
+            pit_id, search_after = pit["id"], None
+
+        page_request = {
+            **request,
+            "pit": {"id": pit_id, "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE},
+            "sort": PIT_SORT,
+        }
+        if search_after is not None:
+            page_request["search_after"] = search_after
+        try:
+            result = await es_client.search(**page_request)
+        except NotFoundError:
+            raise CursorExpiredError from None
+
+        page = result["hits"]["hits"]
+        pit_id = result.get("pit_id", pit_id)
+        next_cursor = None
+        if len(page) == size:
+            next_cursor = encode_cursor(pit_id, page[-1]["sort"])
+        else:
+            await es_client.close_point_in_time(id=pit_id)
+        return {
+            "documents": [document(hit) for hit in page],
+            "total": result["hits"].get("total"),
+            "next_cursor": next_cursor,
+        }
+
+    async def _search_index(self, query: str, index: str) -> list[dict]:
+        found = await self.search(index, query, result_size(index))
+        return found["documents"] if found is not None else []
+
+    async def search_all(self, query, indices):
+        if settings.SEARCH_ALL_STRATEGY == "msearch":
+            response = await es_client.msearch(searches=msearch_body(query, indices))
+            return split_msearch(indices, response)
+        found = await asyncio.gather(*(self._search_index(query, index) for index in indices))
+        return dict(zip(indices, found, strict=True))
+
+    async def suggest(self, prefix, indices, size):
+        try:
+            response = await es_client.options(
+                request_timeout=settings.SUGGEST_TIMEOUT_MS / 1000
+            ).msearch(searches=suggest_body(prefix, indices, size))
+        except ConnectionTimeout:
+            raise TimeoutError from None
+        return split_suggestions(indices, response)
+
+
+# Cursors of the memory backend carry this instead of a point-in-time id
+MEMORY_CURSOR = "memory"
+
+
+class MemoryBackend(SearchBackend):
+    """
+    Inverted indexes in this process, one per alias, built from the same events the
+    consumer sends to Elasticsearch and with the same rules: versions only move forward,
+    updates are partial, books carry ``authors`` with their authors' names.
+
+    Differences from Elasticsearch: ``_source`` filtering is by top-level field; paging
+    continues from the last hit on the live index (there is no point in time), so a
+    cursor never expires but a page can shift if documents change in between.
+
+    With ``snapshot_dir`` the indexes survive restarts: ``save`` writes a snapshot and
+    the consumer commits its offsets right after, so on restart ``load`` plus the
+    committed offsets give back exactly the state before.
+    """
+
+    name = "memory"
+
+    def __init__(self, snapshot_dir: str | None = None):
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.indices: dict[str, InvertedIndex] = {}
+        self.books_by_author: dict[str, set[str]] = {}
+        self.restored = False  # a snapshot was loaded: no need to read the topic from the start
+        self.saved_at = time.monotonic()
+
+    async def start(self):
+        if self.snapshot_dir is not None:
+            self.load()
+
+    async def close(self):
+        # The last snapshot is taken by the consumer on its way out, together with its offsets
+        pass
+
+    async def ping(self) -> bool:
+        return True
+
+    def _index(self, name: str) -> InvertedIndex:
+        if name not in self.indices:
+            suggest_field = SUGGEST_FIELDS.get(name)
+            # "title.suggest" -> the title itself
+            self.indices[name] = InvertedIndex(suggest_field and suggest_field.split(".")[0])
+        return self.indices[name]
+
+    # --- Events ---
+
+    def apply(self, events: list[dict], index_of: dict[str, str]) -> int:
+        """Apply consumer events (``index_of``: event type -> alias); returns how many changed something."""
+        applied = 0
+        for event in events:
+            event_type = event.get("event")
+            alias = index_of.get(event_type)
+            if alias is None:
+                continue
+            data = dict(event.get("data") or {})
+            doc_id = str(data.pop("_id", None))
+            index = self._index(alias)
+            current = index.get(doc_id)
+            action = event_type.rsplit("_", 1)[-1]
+
+            if action == "deleted":
+                if current is None:
+                    continue
+                index.delete(doc_id)
+                if alias == "books":
+                    self._link_authors(doc_id, current.get("author_ids") or [], [])
+                applied += 1
+                continue
+
+            # Repeated or out-of-order event: the same check as the external version in ES
+            version = data.get("version")
+            known = (current or {}).get("version")
+            if version is not None and known is not None and known >= version:
+                continue
+            if action == "updated":
+                if current is None:
+                    continue
+                data = {**current, **data}
+            self._put(alias, doc_id, data, current)
+            applied += 1
+        return applied
+
+    def _put(self, alias: str, doc_id: str, source: dict, current: dict | None):
+        index = self._index(alias)
+        if alias == "books":
+            author_ids = [str(aid) for aid in source.get("author_ids") or []]
+            self._link_authors(doc_id, (current or {}).get("author_ids") or [], author_ids)
+            source = {**source, "authors": self._authors_of(author_ids)}
+        index.put(doc_id, source)
+
+        if alias == "authors":
+            # Books store their authors' names: re-index the books of a renamed author
+            books = self._index("books")
+            for book_id in sorted(self.books_by_author.get(doc_id, ())):
+                book = books.get(book_id)
+                if book is not None:
+                    author_ids = [str(aid) for aid in book.get("author_ids") or []]
+                    books.put(book_id, {**book, "authors": self._authors_of(author_ids)})
+
+    def _authors_of(self, author_ids: list[str]) -> list[dict]:
+        authors = self._index("authors")
+        return [
+            {"id": aid, "name": author["name"]}
+            for aid in author_ids
+            if (author := authors.get(aid)) is not None and author.get("name") is not None
+        ]
+
+    def _link_authors(self, book_id: str, old: list, new: list):
+        for aid in old:
+            self.books_by_author.get(str(aid), set()).discard(book_id)
+        for aid in new:
+            self.books_by_author.setdefault(str(aid), set()).add(book_id)
+
+    # --- Queries ---
+
+    def _ranked(self, index: InvertedIndex, query: str, size: int, after=None):
+        weights = index.expand(query)
+        slots, scores = index.score(weights)
+        return index.top(slots, scores, size, after), len(slots), weights
+
+    @staticmethod
+    def _total(matched: int) -> dict:
+        if matched > settings.SEARCH_TRACK_TOTAL_HITS:
+            return {"value": settings.SEARCH_TRACK_TOTAL_HITS, "relation": "gte"}
+        return {"value": matched, "relation": "eq"}
+
+    def _documents(self, index, ranked, weights, includes, excludes, highlight) -> list[dict]:
+        documents = []
+        for slot, _ in ranked:
+            source = index.sources[slot]
+            doc = {
+                key: value
+                for key, value in source.items()
+                if (not includes or key in includes) and key not in (excludes or ())
+            }
+            if highlight:
+                fragments = _highlight(source, weights)
+                if fragments:
+                    doc["_highlight"] = fragments
+            documents.append(doc)
+        return documents
+
+    async def search(self, index, query, size, includes=None, excludes=None, highlight=False):
+        if index not in self.indices:
+            return None
+        found = self.indices[index]
+        ranked, matched, weights = self._ranked(found, query, size)
+        return {
+            "documents": self._documents(found, ranked, weights, includes, excludes, highlight),
+            "total": self._total(matched),
+        }
+
+    async def page(
+        self, index, query, size, includes=None, excludes=None, highlight=False, cursor=None
+    ):
+        after = None
+        if cursor:
+            kind, after = decode_cursor(cursor)
+            if kind != MEMORY_CURSOR or len(after) != 2:
+                raise ValueError("Invalid cursor")
+        if index not in self.indices:
+            return {"documents": [], "total": None, "next_cursor": None}
+
+        found = self.indices[index]
+        ranked, matched, weights = self._ranked(found, query, size, after)
+        next_cursor = None
+        if len(ranked) == size:
+            last_slot, last_score = ranked[-1]
+            next_cursor = encode_cursor(MEMORY_CURSOR, [last_score, last_slot])
+        return {
+            "documents": self._documents(found, ranked, weights, includes, excludes, highlight),
+            "total": self._total(matched),
+            "next_cursor": next_cursor,
+        }
+
+    async def search_all(self, query, indices):
+        results = {}
+        for index in indices:
+            found = await self.search(index, query, result_size(index))
+            results[index] = found["documents"] if found is not None else []
+        return results
+
+    async def suggest(self, prefix, indices, size):
+        return {
+            index: self.indices[index].suggest(prefix, size) if index in self.indices else []
+            for index in indices
+        }
+
+    # --- Snapshot ---
+
+    def save_due(self) -> bool:
+        return (
+            self.snapshot_dir is not None
+            and time.monotonic() - self.saved_at >= settings.MEMORY_SNAPSHOT_INTERVAL_SECONDS
+        )
+
+    def save(self):
+        """
+        Write every index into a new generation directory, then switch ``CURRENT`` to it
+        with an atomic rename: a crash mid-save leaves the previous snapshot intact.
+        """
+        generation = f"gen-{time.time_ns()}"
+        target = self.snapshot_dir / generation
+        for name, index in self.indices.items():
+            index.save(target / name)
+        target.mkdir(parents=True, exist_ok=True)
+        pointer = self.snapshot_dir / "CURRENT.tmp"
+        pointer.write_text(generation)
+        pointer.replace(self.snapshot_dir / "CURRENT")
+
+        for old in self.snapshot_dir.glob("gen-*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+        self.saved_at = time.monotonic()
+        print(f"💾 Memory index snapshot saved to {target} ({self.stats()})")
+
+    def load(self):
+        pointer = self.snapshot_dir / "CURRENT"
+        if not pointer.exists():
+            print(f"📭 No memory index snapshot in {self.snapshot_dir}, building from events")
+            return
+        source = self.snapshot_dir / pointer.read_text().strip()
+        self.indices = {}
+        for directory in sorted(path for path in source.iterdir() if path.is_dir()):
+            suggest_field = SUGGEST_FIELDS.get(directory.name)
+            self.indices[directory.name] = InvertedIndex.load(
+                directory, suggest_field and suggest_field.split(".")[0]
+            )
+        self.books_by_author = {}
+        books = self.indices.get("books")
+        for book_id in books.slot_of if books is not None else ():
+            self._link_authors(book_id, [], books.get(book_id).get("author_ids") or [])
+        self.restored = True
+        self.saved_at = time.monotonic()
+        print(f"📦 Memory index snapshot loaded from {source} ({self.stats()})")
+
+    def stats(self) -> dict[str, int]:
+        return {name: len(index) for name, index in self.indices.items()}
+
+
+def _highlight(source: dict, terms: dict[str, float]) -> dict[str, list[str]]:
+    """``<em>``-wrapped matches per searchable field, cut to SEARCH_HIGHLIGHT_FRAGMENT_SIZE."""
+    fragments = {}
+    for field in SEARCH_FIELDS:
+        found = [marked for value in field_values(source, field) if (marked := _mark(value, terms))]
+        if found:
+            fragments[field] = found
+    return fragments
+
+
+def _mark(text: str, terms: dict[str, float]) -> str | None:
+    matches = [(start, end) for start, end, word in word_spans(text) if word in terms]
+    if not matches:
+        return None
+    # A long value is cut to a fragment that starts a little before the first match
+    size = settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE
+    start = max(matches[0][0] - size // 4, 0) if len(text) > size else 0
+    end = start + size
+    parts, position = [], start
+    for match_start, match_end in matches:
+        if match_end > end:
+            break
+        parts.append(text[position:match_start])
+        parts.append(f"<em>{text[match_start:match_end]}</em>")
+        position = match_end
+    parts.append(text[position:end])
+    return "".join(parts)
+
+
+search_backend: SearchBackend = (
+    MemoryBackend(settings.MEMORY_SNAPSHOT_DIR)
+    if settings.SEARCH_BACKEND == "memory"
+    else ElasticsearchBackend()
+)
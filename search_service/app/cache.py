@@ -0,0 +1,146 @@
+"""Query result cache for the search endpoints.
+
+Entries are keyed on the normalized query, the indices it touches and any paging
+parameters. The Kafka consumer invalidates every entry of an index as soon as it
+writes to that index, so a cached page is never older than the last indexed event
+(plus the TTL as a safety net). When the consumer runs in another process, the
+invalidation reaches this cache through ``app.cache_sync``.
+
+``QueryCache`` talks to a ``CacheBackend``; ``LocalCacheBackend`` keeps everything in
+process. A shared backend (e.g. Redis) only has to implement the same five methods.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+from app.config import settings
+
+CacheKey = tuple
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: CacheKey) -> Any | None: ...
+
+    @abstractmethod
+    async def set(self, key: CacheKey, value: Any, indices: tuple[str, ...], ttl: float): ...
+
+    @abstractmethod
+    async def invalidate(self, index: str) -> int:
+        """Drop every entry that depends on ``index``; return how many were dropped."""
+
+    @abstractmethod
+    async def clear(self): ...
+
+    @abstractmethod
+    def size(self) -> int: ...
+
+
+class LocalCacheBackend(CacheBackend):
+    """In-process LRU with per-entry TTL and an index -> keys map for invalidation."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: OrderedDict[CacheKey, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._keys_by_index: dict[str, set[CacheKey]] = {}
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, indices, ttl):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, indices)
+        for index in indices:
+            self._keys_by_index.setdefault(index, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    async def invalidate(self, index):
+        keys = self._keys_by_index.pop(index, set())
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    async def clear(self):
+        self._entries.clear()
+        self._keys_by_index.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        _, _, indices = self._entries.pop(key, (None, None, ()))
+        for index in indices:
+            keys = self._keys_by_index.get(index)
+            if keys is not None:
+                keys.discard(key)
+
+
+class QueryCache:
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, indices: tuple[str, ...], **params) -> CacheKey:
+        """Case- and whitespace-insensitive key; extra params (paging etc.) are order-independent."""
+        normalized = " ".join(query.lower().split())
+        return (normalized, tuple(indices), tuple(sorted(params.items())))
+
+    async def get(self, key: CacheKey) -> Any | None:
+        if not self.enabled:
+            return None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: CacheKey, value: Any):
+        if self.enabled:
+            await self.backend.set(key, value, key[1], self.ttl)
+
+    async def invalidate(self, indices):
+        for index in indices:
+            self.invalidations += await self.backend.invalidate(index)
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidated_entries": self.invalidations,
+            "evictions": getattr(self.backend, "evictions", 0),
+        }
+
+
+query_cache = QueryCache(
+    LocalCacheBackend(settings.SEARCH_CACHE_MAX_ENTRIES),
+    ttl=settings.SEARCH_CACHE_TTL_SECONDS,
+    enabled=settings.SEARCH_CACHE_ENABLED,
+)
@@ -0,0 +1,144 @@
+"""Query cache invalidation across processes.
+
+The query cache lives in each API process, but the index is written wherever the
+consumer runs: in a separate ``python -m app.consumer`` (CONSUMER_IN_PROCESS=false)
+or in just one of several API replicas that split the partitions between them. After
+every write the consumer publishes the touched indices to
+SEARCH_CACHE_INVALIDATION_TOPIC, and every API process follows that topic and drops
+its own entries for them.
+
+With the topic unset, invalidation stays in the process that indexed, which is only
+right for a single API process running its own consumer; ``main.lifespan`` turns the
+cache off when the consumer runs elsewhere.
+
+Elasticsearch shows a write only after the next refresh (INDEX_REFRESH_INTERVAL), and a
+search in between caches the old results again. ``invalidate_written`` therefore drops
+the indices once more when that refresh has happened.
+"""
+
+import asyncio
+import re
+import uuid
+from collections.abc import Iterable
+
+import orjson
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+from app.cache import query_cache
+from app.config import settings
+
+# A process skips its own broadcasts: it dropped those entries before sending them
+SOURCE_ID = uuid.uuid4().hex
+
+# Only processes that run the consumer broadcast (enable_broadcast); the producer is
+# created on the first invalidation, like the DLQ one
+broadcasting = False
+producer: AIOKafkaProducer | None = None
+# Second invalidations waiting for the refresh; stop_broadcast_producer waits for them
+delayed: set[asyncio.Task] = set()
+
+TIME_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def enable_broadcast():
+    global broadcasting
+    # The memory index, and with it the cache, is the indexing process's own
+    broadcasting = (
+        settings.SEARCH_CACHE_INVALIDATION_TOPIC is not None and settings.SEARCH_BACKEND != "memory"
+    )
+
+
+def disable_broadcast():
+    global broadcasting
+    broadcasting = False
+
+
+async def _get_producer() -> AIOKafkaProducer:
+    global producer
+    if producer is None:
+        new_producer = AIOKafkaProducer(
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS, value_serializer=orjson.dumps
+        )
+        await new_producer.start()
+        producer = new_producer
+    return producer
+
+
+async def stop_broadcast_producer():
+    global producer
+    await asyncio.gather(*delayed, return_exceptions=True)
+    if producer is not None:
+        await producer.stop()
+        producer = None
+
+
+async def invalidate(indices: Iterable[str]):
+    """Drop this process's entries for ``indices`` and tell the other processes to do the same."""
+    indices = sorted(indices)
+    if not indices:
+        return
+    await query_cache.invalidate(indices)
+    if broadcasting:
+        # An error here fails the flush before the commit, so the batch comes again
+        sender = await _get_producer()
+        await sender.send_and_wait(
+            settings.SEARCH_CACHE_INVALIDATION_TOPIC, {"source": SOURCE_ID, "indices": indices}
+        )
+
+
+def _refresh_delay() -> float:
+    """Seconds until a write is searchable; 0 for the memory index and for "-1" (no refresh)."""
+    if settings.SEARCH_BACKEND == "memory":
+        return 0.0
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s|m|h)", settings.INDEX_REFRESH_INTERVAL)
+    if match is None:
+        return 0.0
+    return float(match.group(1)) * TIME_UNITS[match.group(2)]
+
+
+async def _invalidate_later(indices: list[str], delay: float):
+    await asyncio.sleep(delay)
+    try:
+        await invalidate(indices)
+    except Exception as exc:
+        # The batch is already committed: the entries expire with SEARCH_CACHE_TTL_SECONDS
+        print(f"⚠️ Delayed invalidation of {indices} failed: {exc!r}")
+
+
+async def invalidate_written(indices: Iterable[str]):
+    """``invalidate`` after a write, and again once the next refresh has made it searchable."""
+    indices = sorted(indices)
+    await invalidate(indices)
+    delay = _refresh_delay()
+    if indices and delay:
+        task = asyncio.create_task(_invalidate_later(indices, delay))
+        delayed.add(task)
+        task.add_done_callback(delayed.discard)
+
+
+async def apply_invalidation(payload: bytes):
+    message = orjson.loads(payload)
+    if message.get("source") != SOURCE_ID:
+        await query_cache.invalidate(message["indices"])
+
+
+async def watch_invalidations():
+    """
+    Follow SEARCH_CACHE_INVALIDATION_TOPIC and apply every broadcast to this process's
+    cache. No consumer group: each process reads every message, from the end of the topic.
+    """
+    consumer = AIOKafkaConsumer(
+        settings.SEARCH_CACHE_INVALIDATION_TOPIC,
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        group_id=None,
+        auto_offset_reset="latest",
+        enable_auto_commit=False,
+    )
+    await consumer.start()
+    try:
+        # Whatever was broadcast while this process was not listening is lost: start clean
+        await query_cache.clear()
+        async for message in consumer:
+            await apply_invalidation(message.value)
+    finally:
+        await consumer.stop()
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,94 @@ class Settings(BaseSettings):
     KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
     CORE_API_URL: str = "http://localhost:8000"
 
+    # Батчевая индексация: копим события через getmany и отправляем одним _bulk
+    CONSUMER_BATCH_ENABLED: bool = True
+    CONSUMER_BATCH_SIZE: int = 500  # сбрасываем батч, как только набрали N документов...
+    CONSUMER_BATCH_TIMEOUT_MS: int = 200  # ...или прошло T миллисекунд
+    # Сколько _bulk одного батча отправлять параллельно (события делятся по id документа)
+    CONSUMER_WORKERS: int = 4
+    # Запускать консьюмер внутри API. False - консьюмер работает отдельно: python -m app.consumer
+    CONSUMER_IN_PROCESS: bool = True
+    # Повторы при временных ошибках Эластика (429/503/таймауты): число попыток и паузы в секундах
+    CONSUMER_RETRY_MAX_ATTEMPTS: int = 5
+    CONSUMER_RETRY_BASE_DELAY: float = 0.5
+    CONSUMER_RETRY_MAX_DELAY: float = 30.0
+    # Порт, на котором отдельный процесс консьюмера (python -m app.consumer) отдает /metrics
+    CONSUMER_METRICS_PORT: int = 9100
+    # /health/ready: при лаге больше N сообщений в какой-либо партиции статус degraded
+    HEALTH_MAX_LAG: int = 1000
+    HEALTH_LAG_CACHE_SECONDS: float = 5.0  # как часто реально спрашивать офсеты у Kafka
+    # Трассировка (OpenTelemetry): none - выключена, console - в stdout, otlp - в коллектор
+    TRACING_EXPORTER: Literal["none", "console", "otlp"] = "none"
+    TRACING_SAMPLE_RATE: float = 0.01  # доля записываемых трасс (1% - малые накладные расходы)
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    # Кэш id -> имя автора для денормализации книг (поле authors)
+    AUTHOR_NAMES_CACHE_SIZE: int = 100_000
+
+    # Пулы соединений (см. app/database.py). Эластик: keep-alive соединений на узел
+    # (у клиента по умолчанию 10), таймаут запроса и повторы на другом узле
+    ES_MAX_CONNECTIONS: int = 32
+    ES_REQUEST_TIMEOUT: float = 10.0  # /suggest/ задает свой, SUGGEST_TIMEOUT_MS
+    ES_MAX_RETRIES: int = 3
+    ES_RETRY_ON_TIMEOUT: bool = False
+    # HTTP-клиент core_service: размер пула, сколько держать простаивающих соединений и
+    # сколько секунд, таймаут подключения (чтения - REINDEX_HTTP_TIMEOUT), повторы подключения
+    CORE_HTTP_MAX_CONNECTIONS: int = 20
+    CORE_HTTP_MAX_KEEPALIVE: int = 10
+    CORE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    CORE_HTTP_CONNECT_TIMEOUT: float = 5.0
+    CORE_HTTP_RETRIES: int = 2
+
+    # Потоковый /reindex/: размер страницы из core_service и число параллельных _bulk
+    REINDEX_PAGE_SIZE: int = 1000
+    REINDEX_MAX_IN_FLIGHT: int = 4
+    REINDEX_HTTP_TIMEOUT: float = 30.0
+    # Доигрывать события из Kafka, пришедшие пока строился новый индекс
+    REINDEX_REPLAY_EVENTS: bool = True
+    # Таймаут forcemerge и ожидания реплик нового индекса перед переключением алиасов, секунды
+    REINDEX_FINALIZE_TIMEOUT: float = 3600.0
+
+    # Настройки "боевого" индекса (на время заливки: refresh -1 и 0 реплик)
+    INDEX_REFRESH_INTERVAL: str = "1s"
+    INDEX_NUMBER_OF_REPLICAS: int = 1
+
+    # Кэш результатов поиска (сбрасывается консьюмером при записи в индекс)
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_MAX_ENTRIES: int = 10000
+    SEARCH_CACHE_TTL_SECONDS: float = 60.0
+    # Топик, через который консьюмер сообщает всем процессам API, какие индексы изменились
+    # (app/cache_sync.py). None - сброс только в своем процессе: тогда при
+    # CONSUMER_IN_PROCESS=false кэш выключается, а реплик API должно быть не больше одной
+    SEARCH_CACHE_INVALIDATION_TOPIC: str | None = "library.search.invalidations"
+
+    # Отдавать результаты поиска через orjson как есть, без jsonable_encoder (app/responses.py)
+    FAST_JSON_RESPONSES: bool = False
+
+    # /search/all/: какие индексы опрашивать и как (один _msearch или параллельные search)
+    SEARCH_ALL_INDICES: list[str] = ["books", "authors"]
+    SEARCH_ALL_STRATEGY: Literal["msearch", "gather"] = "msearch"
+    # Частичное совпадение: по edge-ngram подполям (ngram) или через *query* (wildcard)
+    SEARCH_MATCH_MODE: Literal["ngram", "wildcard"] = "ngram"
+    # Сколько документов отдавать из каждого индекса (по умолчанию как в Elasticsearch)
+    SEARCH_DEFAULT_SIZE: int = 10
+    SEARCH_SIZE_PER_INDEX: dict[str, int] = {}
+    # /search/: верхняя граница size, до скольких считать total, постраничный обход через PIT
+    SEARCH_MAX_SIZE: int = 100
+    SEARCH_TRACK_TOTAL_HITS: int = 10000
+    SEARCH_PIT_KEEP_ALIVE: str = "1m"
+    SEARCH_HIGHLIGHT_FRAGMENT_SIZE: int = 150
+
+    # /suggest/: сколько подсказок по умолчанию и сколько ждем Elasticsearch
+    SUGGEST_DEFAULT_SIZE: int = 5
+    SUGGEST_TIMEOUT_MS: int = 100
+
+    # Где искать: в Эластике или в индексе в памяти процесса API (app/memory_index.py).
+    # memory работает только с CONSUMER_IN_PROCESS=true: индекс наполняет встроенный консьюмер
+    SEARCH_BACKEND: Literal["elasticsearch", "memory"] = "elasticsearch"
+    # Каталог снимков индекса в памяти (None - без снимков, после рестарта топик читается с начала)
+    MEMORY_SNAPSHOT_DIR: str | None = None
+    MEMORY_SNAPSHOT_INTERVAL_SECONDS: float = 60.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -0,0 +1,69 @@
+"""
+Консьюмер как отдельный процесс: python -m app.consumer
+
+API и индексация масштабируются независимо: для API ставим CONSUMER_IN_PROCESS=false,
+консьюмеров запускаем столько, сколько нужно (docker compose up --scale search-consumer=N).
+
+Как делится работа:
+- Процессы состоят в группе search_group, Kafka раздает им партиции library.events
+  (по умолчанию RangePartitionAssignor). Процессов больше, чем партиций, быть не должно:
+  лишние простаивают. Число партиций топика - потолок параллелизма между процессами.
+- core_service пишет события, ключ которых = id документа, поэтому события одного
+  документа лежат в одной партиции и читаются одним процессом по порядку.
+- Внутри процесса батч делится между CONSUMER_WORKERS воркерами по id документа
+  (kafka_consumer.shard_of): разные документы индексируются параллельно, порядок
+  событий одного документа сохраняется.
+- Перед ребалансом прочитанное, но не проиндексированное дописывается и коммитится
+  (kafka_consumer.FlushOnRevoke), так что новый владелец партиции не получает дублей.
+
+Кэш поиска живет в процессах API. После записи консьюмер публикует затронутые
+индексы в SEARCH_CACHE_INVALIDATION_TOPIC, и каждый процесс API сбрасывает по ним
+свой кэш (app/cache_sync.py).
+"""
+
+import asyncio
+import signal
+
+from prometheus_client import start_http_server
+
+from app import cache_sync
+from app.config import settings
+from app.database import es_client
+from app.indices import ensure_indices
+from app.kafka_consumer import consume_events
+from app.retry import supervise
+from app.tracing import setup_tracing, shutdown_tracing
+
+
+async def main():
+    if settings.SEARCH_BACKEND == "memory":
+        raise SystemExit(
+            "SEARCH_BACKEND=memory: индекс живет в процессе API, отдельный консьюмер ему не нужен"
+        )
+    setup_tracing()
+    await es_client.open()
+    await ensure_indices()
+    # Метрики этого процесса (размеры _bulk, задержки, время запросов к Эластику) для Prometheus
+    start_http_server(settings.CONSUMER_METRICS_PORT)
+    # Кэш поиска живет в процессах API: о записанных индексах сообщаем им через Kafka
+    cache_sync.enable_broadcast()
+
+    # SIGTERM от Docker/Kubernetes: отменяем задачу, консьюмер дописывает батч и выходит из группы
+    # Упавший консьюмер (например, Эластик долго недоступен) перезапускается с паузой
+    task = asyncio.create_task(supervise("Консьюмер", consume_events))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+
+    try:
+        await task
+    except asyncio.CancelledError:
+        print("🛑 Консьюмер остановлен")
+    finally:
+        cache_sync.disable_broadcast()
+        await es_client.close()
+        shutdown_tracing()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,136 @@
+"""
+Сетевые клиенты процесса: Elasticsearch и HTTP-клиент core_service.
+
+При импорте соединений не создается: es_client открывает ElasticsearchBackend.start()
+(или python -m app.consumer), core_client - lifespan API. Пулы keep-alive соединений
+ограничены по размеру, таймауты и повторы берутся из настроек (ES_*, CORE_HTTP_*).
+Занятость пулов: GET /pools/stats и метрика search_pool_in_flight.
+"""
+
+import httpx
 from elasticsearch import AsyncElasticsearch
 
 from app.config import settings
+from app.metrics import POOL_IN_FLIGHT, InstrumentedTransport
+
+
+class ElasticsearchClient:
+    """
+    AsyncElasticsearch процесса. Остальные атрибуты (search, bulk, indices...)
+    берутся из открытого клиента.
+    """
+
+    def __init__(self):
+        self._client: AsyncElasticsearch | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None
+
+    async def open(self):
+        if self._client is None:
+            # Транспорт замеряет время каждого запроса (метрика search_es_request_seconds)
+            self._client = AsyncElasticsearch(
+                settings.ELASTIC_URL,
+                transport_class=InstrumentedTransport,
+                connections_per_node=settings.ES_MAX_CONNECTIONS,
+                request_timeout=settings.ES_REQUEST_TIMEOUT,
+                max_retries=settings.ES_MAX_RETRIES,
+                retry_on_timeout=settings.ES_RETRY_ON_TIMEOUT,
+            )
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+    def pool_stats(self) -> dict:
+        stats = {"open": self.is_open, "max_connections_per_node": settings.ES_MAX_CONNECTIONS}
+        if self._client is None:
+            return stats
+        transport = self._client.transport
+        nodes = len(transport.node_pool.all())
+        capacity = settings.ES_MAX_CONNECTIONS * nodes
+        return {
+            **stats,
+            "nodes": nodes,
+            "in_flight": transport.in_flight,
+            "peak_in_flight": transport.peak_in_flight,
+            "utilization": round(transport.in_flight / capacity, 4) if capacity else None,
+        }
+
+    def _opened(self) -> AsyncElasticsearch:
+        if self._client is None:
+            raise RuntimeError("Elasticsearch client is not open: call es_client.open() first")
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self._opened(), name)
+
+
+class CoreClient:
+    """
+    Общий httpx.AsyncClient для запросов к core_service (потоковый /reindex/).
+    Повторы (CORE_HTTP_RETRIES) - только при ошибках установки соединения.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None
+
+    async def open(self):
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=settings.CORE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CORE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.CORE_HTTP_KEEPALIVE_EXPIRY,
+            )
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.REINDEX_HTTP_TIMEOUT, connect=settings.CORE_HTTP_CONNECT_TIMEOUT
+                ),
+                transport=httpx.AsyncHTTPTransport(
+                    limits=limits, retries=settings.CORE_HTTP_RETRIES
+                ),
+            )
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        # Без stream ответ прочитан целиком и соединение вернулось в пул к выходу из get
+        client = self._opened()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        POOL_IN_FLIGHT.labels("core_api").inc()
+        try:
+            return await client.get(url, **kwargs)
+        finally:
+            self.in_flight -= 1
+            POOL_IN_FLIGHT.labels("core_api").dec()
+
+    def pool_stats(self) -> dict:
+        max_connections = settings.CORE_HTTP_MAX_CONNECTIONS
+        return {
+            "open": self.is_open,
+            "max_connections": max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": round(self.in_flight / max_connections, 4),
+        }
+
+    def _opened(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("core_service client is not open: call core_client.open() first")
+        return self._client
+
 
-es_client = AsyncElasticsearch(settings.ELASTIC_URL)  # Берем из настроек
+es_client = ElasticsearchClient()
+core_client = CoreClient()
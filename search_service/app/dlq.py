@@ -0,0 +1,178 @@
+"""
+Dead-letter queue для событий, которые не удалось применить к индексу.
+
+Сюда попадают события, в которых "ядовитые" документы (Эластик отверг сам документ,
+повтор не поможет) и события, временные ошибки по которым не прошли за
+CONSUMER_RETRY_MAX_ATTEMPTS попыток. Каждое сообщение хранит исходное событие,
+описание ошибки и топик, из которого событие пришло. Основной поток при этом
+идет дальше: один плохой документ не останавливает индексацию.
+
+Повторная отправка после исправления причины:
+
+    python -m app.dlq replay [--limit N]
+
+События возвращаются в исходный топик и проходят обычный путь. Это безопасно:
+устаревшие версии консьюмер пропускает.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+from datetime import UTC, datetime
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+from app.config import settings
+
+DLQ_TOPIC = "library.events.dlq"
+
+# Продюсер создается при первой отправке: пока ошибок нет, DLQ не нужен
+producer: AIOKafkaProducer | None = None
+
+dlq_stats = {"sent": 0, "replayed": 0}
+
+
+def _make_producer() -> AIOKafkaProducer:
+    return AIOKafkaProducer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        # Нечитаемые сообщения возвращаются исходными байтами (см. replayed_message)
+        value_serializer=lambda v: v if isinstance(v, bytes) else json.dumps(v).encode("utf-8"),
+        key_serializer=lambda k: k.encode("utf-8") if k is not None else None,
+    )
+
+
+async def _get_producer() -> AIOKafkaProducer:
+    global producer
+    if producer is None:
+        new_producer = _make_producer()
+        await new_producer.start()
+        producer = new_producer
+    return producer
+
+
+async def stop_dlq_producer():
+    global producer
+    if producer is not None:
+        await producer.stop()
+        producer = None
+
+
+def _event_key(event: dict) -> str | None:
+    doc_id = (event.get("data") or {}).get("_id")
+    return str(doc_id) if doc_id is not None else None
+
+
+def dead_letter(event: dict, error: dict, attempts: int, source_topic: str) -> dict:
+    """Сообщение для DLQ: исходное событие плюс причина, по которой применить событие не вышло."""
+    return {
+        "event": event,
+        "error": {
+            "type": (error.get("error") or {}).get("type") or error.get("type"),
+            "reason": (error.get("error") or {}).get("reason") or error.get("reason"),
+            "status": error.get("status"),
+            "index": error.get("_index"),
+        },
+        "attempts": attempts,
+        "source_topic": source_topic,
+        "failed_at": datetime.now(UTC).isoformat(),
+    }
+
+
+def replayed_message(event: dict) -> tuple[dict | bytes, list[tuple[str, bytes]] | None]:
+    """
+    Что вернуть в исходный топик: событие как JSON. Если консьюмер не смог прочитать
+    сообщение (kafka_consumer._undecodable), возвращаются исходные байты и заголовки.
+    """
+    if "payload" in event and "event" not in event:
+        headers = [(key, value.encode("latin-1")) for key, value in event["headers"].items()]
+        return base64.b64decode(event["payload"]), headers
+    return event, None
+
+
+async def send_to_dlq(failures: list[tuple[dict, dict]], attempts: int, source_topic: str):
+    """
+    Отправляет пары (событие, ошибка) в DLQ и ждет подтверждения брокера:
+    офсеты исходных сообщений коммитятся только после этого.
+    """
+    if not failures:
+        return
+    dlq_producer = await _get_producer()
+    deliveries = [
+        await dlq_producer.send(
+            DLQ_TOPIC,
+            dead_letter(event, error, attempts, source_topic),
+            key=_event_key(event),
+        )
+        for event, error in failures
+    ]
+    await asyncio.gather(*deliveries)
+    dlq_stats["sent"] += len(failures)
+    print(f"☠️ В {DLQ_TOPIC} отправлено событий: {len(failures)}")
+
+
+async def replay(limit: int | None = None, idle_timeout_ms: int = 1000) -> int:
+    """
+    Возвращает события из DLQ в исходные топики. Читаем группой search_dlq_replay,
+    офсеты коммитим после отправки каждой пачки: повторный запуск продолжит ровно там,
+    где остановился предыдущий.
+    Останавливаемся, когда DLQ пуст (нет сообщений idle_timeout_ms) или отправлено limit событий.
+    """
+    consumer = AIOKafkaConsumer(
+        DLQ_TOPIC,
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        group_id="search_dlq_replay",
+        value_deserializer=lambda m: json.loads(m.decode("utf-8")),
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+    )
+    replay_producer = _make_producer()
+    await consumer.start()
+    await replay_producer.start()
+    replayed = 0
+    try:
+        while limit is None or replayed < limit:
+            max_records = settings.CONSUMER_BATCH_SIZE
+            if limit is not None:
+                max_records = min(max_records, limit - replayed)
+            records = await consumer.getmany(timeout_ms=idle_timeout_ms, max_records=max_records)
+            letters = [msg.value for messages in records.values() for msg in messages]
+            if not letters:
+                break
+
+            deliveries = []
+            for letter in letters:
+                value, headers = replayed_message(letter["event"])
+                deliveries.append(
+                    await replay_producer.send(
+                        letter["source_topic"],
+                        value,
+                        key=_event_key(letter["event"]),
+                        headers=headers,
+                    )
+                )
+            await asyncio.gather(*deliveries)
+            await consumer.commit()
+            replayed += len(letters)
+            dlq_stats["replayed"] += len(letters)
+    finally:
+        await replay_producer.stop()
+        await consumer.stop()
+
+    print(f"🔁 Из {DLQ_TOPIC} возвращено событий: {replayed}")
+    return replayed
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m app.dlq")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_cmd = commands.add_parser("replay", help="вернуть события из DLQ в исходные топики")
+    replay_cmd.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        asyncio.run(replay(limit=args.limit))
+
+
+if __name__ == "__main__":
+    main()
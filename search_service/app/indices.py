@@ -0,0 +1,189 @@
+"""Index definitions and alias management for blue/green reindexing.
+
+Queries and the Kafka consumer always address the aliases (``books``, ``authors``).
+Each alias points at exactly one versioned index (``books_v1``, ``books_v2``, ...);
+a reindex builds the next version and swaps the alias in a single atomic call.
+"""
+
+import re
+
+from elasticsearch import NotFoundError
+
+from app.config import settings
+from app.database import es_client
+
+# Analyzer behind the ``.ngram`` subfields: every word is indexed together with its
+# prefixes, so "tols" finds "Tolstoy" with a plain term lookup instead of a wildcard scan
+ANALYSIS = {
+    "filter": {
+        "prefix_ngram": {"type": "edge_ngram", "min_gram": 2, "max_gram": 20},
+    },
+    "analyzer": {
+        "prefix_ngram": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase", "asciifolding", "prefix_ngram"],
+        },
+        # Query words are matched whole against the indexed prefixes
+        "prefix_search": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase", "asciifolding"],
+        },
+    },
+}
+
+NGRAM_SUBFIELD = {
+    "ngram": {"type": "text", "analyzer": "prefix_ngram", "search_analyzer": "prefix_search"}
+}
+
+
+# Completion subfield for /suggest/: an in-memory FST, so prefix lookups stay in the ms range
+SUGGEST_SUBFIELD = {"suggest": {"type": "completion"}}
+
+
+def _text_field(suggest: bool = False) -> dict:
+    fields = {**NGRAM_SUBFIELD, **SUGGEST_SUBFIELD} if suggest else NGRAM_SUBFIELD
+    return {"type": "text", "fields": fields}
+
+
+INDEX_MAPPINGS = {
+    "books": {
+        "properties": {
+            "title": _text_field(suggest=True),
+            "description": _text_field(),
+            "author_ids": {"type": "keyword"},
+            # Version of the source document; partial updates only apply newer versions
+            "version": {"type": "long"},
+            # Denormalized by the consumer, so books are found by author name in one query
+            "authors": {
+                "properties": {
+                    "id": {"type": "keyword"},
+                    "name": _text_field(),
+                }
+            },
+        }
+    },
+    "authors": {
+        "properties": {
+            "name": _text_field(suggest=True),
+            "book_ids": {"type": "keyword"},
+            "version": {"type": "long"},
+        }
+    },
+}
+
+# Completion field each alias is suggested from
+SUGGEST_FIELDS = {"books": "title.suggest", "authors": "name.suggest"}
+
+# Settings for an index that is being bulk loaded: no refreshes, no replicas to copy to
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+
+def live_settings() -> dict:
+    return {
+        "refresh_interval": settings.INDEX_REFRESH_INTERVAL,
+        "number_of_replicas": settings.INDEX_NUMBER_OF_REPLICAS,
+    }
+
+
+def template_name(alias: str) -> str:
+    return f"{alias}_template"
+
+
+async def ensure_templates():
+    """
+    Install (or update) the index template of every alias.
+
+    The template covers ``{alias}_v*``, so each new version gets the current analysis
+    and mappings. Existing versions keep theirs until the next reindex.
+    """
+    for alias, mappings in INDEX_MAPPINGS.items():
+        await es_client.indices.put_index_template(
+            name=template_name(alias),
+            index_patterns=[f"{alias}_v*"],
+            template={"settings": {"analysis": ANALYSIS}, "mappings": mappings},
+        )
+
+
+def versioned_name(alias: str, version: int) -> str:
+    return f"{alias}_v{version}"
+
+
+async def aliased_index(alias: str) -> str | None:
+    """Concrete index the alias currently points to (None if there is no such alias)."""
+    try:
+        response = await es_client.indices.get_alias(name=alias)
+    except NotFoundError:
+        return None
+    return next(iter(response), None)
+
+
+async def next_version(alias: str) -> int:
+    """One above the highest existing ``{alias}_v{n}``, including leftovers of failed builds."""
+    existing = await es_client.indices.get(index=f"{alias}_v*")
+    pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+    versions = [int(m.group(1)) for name in existing if (m := pattern.match(name))]
+    return max(versions, default=0) + 1
+
+
+async def create_index(alias: str, version: int, bulk_load: bool = False) -> str:
+    """Create ``{alias}_v{version}``; analysis and mappings come from the alias template."""
+    name = versioned_name(alias, version)
+    await es_client.indices.create(
+        index=name,
+        settings=BULK_LOAD_SETTINGS if bulk_load else live_settings(),
+    )
+    return name
+
+
+async def ensure_indices():
+    """Install the templates and make sure every alias exists (``{alias}_v1`` on a fresh cluster)."""
+    await ensure_templates()
+    for alias in INDEX_MAPPINGS:
+        if await es_client.indices.exists(index=alias):
+            continue
+        name = await create_index(alias, await next_version(alias))
+        await es_client.indices.put_alias(index=name, name=alias)
+        print(f"🗂️ Created index {name} behind alias '{alias}'")
+
+
+async def finalize_index(name: str):
+    """
+    Switch a bulk-loaded index back to live settings, compact it and wait until its
+    replicas are allocated, so the alias never lands on an index without them.
+    """
+    await es_client.indices.put_settings(index=name, settings=live_settings())
+    await es_client.indices.refresh(index=name)
+    # Both take far longer than ES_REQUEST_TIMEOUT on a large index
+    slow_client = es_client.options(request_timeout=settings.REINDEX_FINALIZE_TIMEOUT)
+    await slow_client.indices.forcemerge(index=name, max_num_segments=1)
+    health = await slow_client.cluster.health(
+        index=name,
+        wait_for_status="green",
+        timeout=f"{int(settings.REINDEX_FINALIZE_TIMEOUT)}s",
+    )
+    if health.get("timed_out"):
+        raise TimeoutError(f"Replicas of {name} were not allocated: status {health.get('status')}")
+
+
+async def swap_aliases(targets: dict[str, str]) -> list[str]:
+    """
+    Atomically point each alias at its new index.
+
+    Returns the indices that were previously behind the aliases. A legacy concrete
+    index that carries the alias name itself is removed in the same call.
+    """
+    actions = []
+    previous = []
+    for alias, new_index in targets.items():
+        old_index = await aliased_index(alias)
+        if old_index is not None:
+            actions.append({"remove": {"index": old_index, "alias": alias}})
+            previous.append(old_index)
+        elif await es_client.indices.exists(index=alias):
+            actions.append({"remove_index": {"index": alias}})
+        actions.append({"add": {"index": new_index, "alias": alias}})
+
+    await es_client.indices.update_aliases(actions=actions)
+    return previous
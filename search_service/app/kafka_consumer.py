@@ -1,42 +1,629 @@
-import json
+import asyncio
+import base64
+import socket
+import zlib
+from collections import OrderedDict
+from typing import Any
 
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener
+from elasticsearch import ApiError, ConflictError, NotFoundError
 
+from app import cache_sync
+from app.backends import search_backend
 from app.config import settings
 from app.database import es_client
+from app.dlq import send_to_dlq, stop_dlq_producer
+from app.events import EventDecodeError, UnsupportedSchemaError, decode_event
+from app.metrics import BULK_SIZE, observe_indexed
+from app.retry import AdaptiveLimit, backoff_delay, is_transient, is_transient_item, retry_transient
+from app.tracing import consume_spans
 
+EVENTS_TOPIC = "library.events"
+CONSUMER_GROUP = "search_group"
 
-async def consume_events():
-    consumer = AIOKafkaConsumer(
-        "library.events",
-        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,  # Берем из настроек
-        group_id="search_group",
-        value_deserializer=lambda m: json.loads(m.decode("utf-8")),
+
+def consumer_group() -> str:
+    """
+    Группа консьюмера. Эластик общий, поэтому процессы search_group делят партиции между собой.
+    Индекс в памяти свой в каждом процессе API: ему нужны все партиции, отсюда отдельная группа.
+    """
+    if settings.SEARCH_BACKEND == "memory":
+        return f"{CONSUMER_GROUP}-memory-{socket.gethostname()}"
+    return CONSUMER_GROUP
+
+
+# Какие события индексируем и в какой индекс (таблицу) Эластика они попадают
+INDEXED_EVENTS = {
+    "book_created": "books",
+    "book_updated": "books",
+    "book_deleted": "books",
+    "author_created": "authors",
+    "author_updated": "authors",
+    "author_deleted": "authors",
+}
+
+# Ошибки, которые означают, что событие устарело или пришло повторно: это не сбой
+STALE_EVENT_ERRORS = {"version_conflict_engine_exception", "document_missing_exception"}
+
+# Частичное обновление: применяем только поля из события и только если его версия новее.
+# (_update не поддерживает внешние версии, поэтому версию сравниваем сами по полю version)
+APPLY_CHANGES_SCRIPT = """
+if (ctx._source.version != null && ctx._source.version >= params.version) {
+  ctx.op = 'noop';
+} else {
+  for (entry in params.changes.entrySet()) { ctx._source[entry.getKey()] = entry.getValue(); }
+  ctx._source.version = params.version;
+}
+"""
+
+# Удаление тоже скриптом и по полю version, а не по _version Эластика: _version растет и
+# от записей, не меняющих version (например, имена авторов из update_book_authors)
+DELETE_IF_NEWER_SCRIPT = """
+if (params.version == null || ctx._source.version == null || ctx._source.version < params.version) {
+  ctx.op = 'delete';
+} else {
+  ctx.op = 'noop';
+}
+"""
+
+# Painless-скрипт для _update_by_query: проставляет книге свежие имена ее авторов.
+# params.names - словарь id -> name для авторов из пришедших событий
+UPDATE_AUTHOR_NAMES_SCRIPT = """
+if (ctx._source.authors == null) { ctx._source.authors = []; }
+Set known = new HashSet();
+for (a in ctx._source.authors) {
+  if (params.names.containsKey(a.id)) { a.name = params.names[a.id]; }
+  known.add(a.id);
+}
+for (id in ctx._source.author_ids) {
+  if (!known.contains(id) && params.names.containsKey(id)) {
+    ctx._source.authors.add(['id': id, 'name': params.names[id]]);
+  }
+}
+"""
+
+
+class AuthorNames:
+    """
+    Локальный LRU-кэш id автора -> имя, для денормализации книг без походов в core_service.
+    Пополняется событиями авторов; промахи добираются одним mget из индекса authors.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._names: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self):
+        return len(self._names)
+
+    def get(self, author_id: str) -> str | None:
+        name = self._names.get(author_id)
+        if name is not None:
+            self._names.move_to_end(author_id)
+        return name
+
+    def put(self, author_id: str, name: str):
+        self._names[author_id] = name
+        self._names.move_to_end(author_id)
+        while len(self._names) > self.max_entries:
+            self._names.popitem(last=False)
+
+    def remember(self, events: list[dict]) -> dict[str, str]:
+        """Запоминает имена из событий авторов; возвращает их (id -> name)."""
+        names = {}
+        for event in events:
+            if event.get("event") not in ("author_created", "author_updated"):
+                continue
+            data = event.get("data") or {}
+            if data.get("_id") is not None and data.get("name") is not None:
+                names[str(data["_id"])] = data["name"]
+                self.put(str(data["_id"]), data["name"])
+        return names
+
+    async def resolve(self, author_ids: set[str]) -> dict[str, str]:
+        names = {aid: name for aid in author_ids if (name := self.get(aid)) is not None}
+        missing = sorted(author_ids - names.keys())
+        if missing:
+            try:
+                response = await es_client.mget(index="authors", ids=missing, source=["name"])
+            except NotFoundError:
+                return names
+            for doc in response["docs"]:
+                if doc.get("found"):
+                    names[doc["_id"]] = doc["_source"]["name"]
+                    self.put(doc["_id"], doc["_source"]["name"])
+        return names
+
+
+author_names = AuthorNames(settings.AUTHOR_NAMES_CACHE_SIZE)
+
+
+def _sets_author_ids(event: dict) -> bool:
+    """Нужно ли пересобрать поле authors: это новая книга (есть авторы) или изменение author_ids."""
+    data = event.get("data") or {}
+    if event.get("event") == "book_created":
+        return bool(data.get("author_ids"))
+    return event.get("event") == "book_updated" and "author_ids" in data
+
+
+async def enrich_books(events: list[dict]) -> list[dict]:
+    """
+    Добавляет в данные книги поле authors = [{"id", "name"}] (исходные события не меняет).
+    Авторы, которых пока нет ни в кэше, ни в индексе, добавятся позже из их собственного события.
+    """
+    author_ids = {
+        str(aid)
+        for event in events
+        if _sets_author_ids(event)
+        for aid in event["data"]["author_ids"]
+    }
+    if not any(_sets_author_ids(event) for event in events):
+        return events
+
+    names = await author_names.resolve(author_ids) if author_ids else {}
+    enriched = []
+    for event in events:
+        data = event.get("data") or {}
+        if _sets_author_ids(event):
+            authors = [
+                {"id": str(aid), "name": names[str(aid)]}
+                for aid in data["author_ids"]
+                if str(aid) in names
+            ]
+            event = {**event, "data": {**data, "authors": authors}}
+        enriched.append(event)
+    return enriched
+
+
+async def update_book_authors(names: dict[str, str], books_index: str = "books"):
+    """Проставляет новые имена авторов во все уже проиндексированные книги этих авторов."""
+    if not names:
+        return
+    try:
+        response = await es_client.update_by_query(
+            index=books_index,
+            query={"terms": {"author_ids": list(names)}},
+            script={
+                "source": UPDATE_AUTHOR_NAMES_SCRIPT,
+                "lang": "painless",
+                "params": {"names": names},
+            },
+            conflicts="proceed",
+        )
+    except NotFoundError:
+        return
+    if response.get("updated"):
+        print(f"👥 Имена авторов обновлены в книгах: {response['updated']}")
+
+
+def document_actions(event_type: str, index_name: str, data: dict) -> list[dict]:
+    """
+    Операции _bulk для одного события.
+    - *_created: index, версия внешняя (повтор или старое событие отклоняется как конфликт)
+    - *_updated: update скриптом, только измененные поля, если версия события новее
+    - *_deleted: update скриптом, который удаляет документ, если версия события новее
+      (удаление не сотрет документ, записанный более новым событием)
+    """
+    # Забираем _id из копии словаря, чтобы использовать его как ID документа в Эластике
+    document = dict(data)
+    doc_id = document.pop("_id", None)
+    meta = {"_index": index_name, "_id": doc_id}
+    action = event_type.rsplit("_", 1)[-1]
+
+    if action == "updated":
+        version = document.pop("version", None)
+        script = {
+            "source": APPLY_CHANGES_SCRIPT,
+            "lang": "painless",
+            "params": {"changes": document, "version": version},
+        }
+        return [{"update": {**meta, "retry_on_conflict": 3}}, {"script": script}]
+    if action == "deleted":
+        script = {
+            "source": DELETE_IF_NEWER_SCRIPT,
+            "lang": "painless",
+            "params": {"version": document.get("version")},
+        }
+        return [{"update": {**meta, "retry_on_conflict": 3}}, {"script": script}]
+
+    if document.get("version") is not None:
+        meta.update(version=document["version"], version_type="external")
+    return [{"index": meta}, document]
+
+
+def build_actions(events: list[dict], indices: dict[str, str] | None = None) -> list[dict]:
+    """
+    Превращает список событий в тело запроса _bulk.
+    Неизвестные события пропускаются. indices позволяет писать вместо алиаса
+    в конкретный индекс (например, books -> books_v2 во время переиндексации).
+    """
+    indices = indices or {}
+    operations = []
+    for event in events:
+        event_type = event.get("event")
+        index_name = INDEXED_EVENTS.get(event_type)
+        if index_name is None:
+            continue
+        index_name = indices.get(index_name, index_name)
+        operations.extend(document_actions(event_type, index_name, event.get("data") or {}))
+    return operations
+
+
+def touched_indices(events: list[dict]) -> set[str]:
+    """
+    Алиасы, в которые попадут события (нужны, чтобы сбросить кэш поиска).
+    Событие автора меняет и книги: в них хранятся имена авторов.
+    """
+    touched = {INDEXED_EVENTS[e.get("event")] for e in events if e.get("event") in INDEXED_EVENTS}
+    if "authors" in touched:
+        touched.add("books")
+    return touched
+
+
+async def index_batch(events: list[dict], indices: dict[str, str] | None = None) -> list[dict]:
+    """
+    Индексирует пачку событий одним запросом _bulk.
+    Возвращает список ошибок по отдельным документам (пустой, если всё прошло успешно);
+    в поле event каждой ошибки лежит исходное событие.
+    """
+    new_names = author_names.remember(events)
+    # Одно известное событие - одна операция, поэтому i-й элемент ответа относится к i-му событию
+    applied_events = [event for event in events if event.get("event") in INDEXED_EVENTS]
+    operations = build_actions(await enrich_books(applied_events), indices)
+    if not operations:
+        return []
+
+    BULK_SIZE.observe(len(applied_events))
+    response = await es_client.bulk(operations=operations)
+
+    errors = []
+    stale = 0
+    indexed = applied_events
+    if response.get("errors"):
+        indexed = []
+        for event, item in zip(applied_events, response["items"], strict=False):
+            # Каждый элемент выглядит как {"index": {"_id": ..., "status": ..., "error": ...}}
+            result = next(iter(item.values()))
+            if "error" not in result:
+                indexed.append(event)
+            elif result["error"].get("type") in STALE_EVENT_ERRORS:
+                stale += 1
+            else:
+                errors.append({**result, "event": event})
+                print(
+                    f"❌ Ошибка индексации {result.get('_id')} в {result.get('_index')}: "
+                    f"{result['error']}"
+                )
+
+    # Задержка от записи в core_service до индексации (для событий, которые реально применились)
+    observe_indexed(indexed, INDEXED_EVENTS)
+    print(
+        f"✅ Батч из {len(applied_events)} событий применен, устаревших: {stale}, ошибок: {len(errors)}"
     )
 
-    await consumer.start()
+    # Книги, проиндексированные раньше своих авторов, получают имена здесь
+    await update_book_authors(new_names, (indices or {}).get("books", "books"))
+    return errors
+
+
+# Текущий размер одного _bulk: уменьшается, когда Эластик отвечает 429, и растет обратно
+bulk_limit = AdaptiveLimit(settings.CONSUMER_BATCH_SIZE)
+
+
+def _api_error(exc: ApiError) -> dict:
+    """Ошибка запроса целиком в том же виде, что и ошибка документа в ответе _bulk."""
+    return {"status": exc.meta.status, "error": {"type": exc.error, "reason": exc.message}}
+
+
+async def index_resilient(events: list[dict]) -> list[dict]:
+    """
+    index_batch, который переживает перегрузку Эластика и плохие документы.
+    - Запрос целиком упал из-за временной ошибки: пауза (backoff), _bulk вдвое меньше, повтор.
+      Если попытки кончились, ошибка пробрасывается: офсеты не коммитятся,
+      консьюмер перезапускается и перечитывает пачку.
+    - Запрос целиком отклонен (например, 400): делим пачку пополам, пока не найдем
+      событие, из-за которого это происходит; такое событие отправляем в DLQ.
+    - Временная ошибка отдельного документа: повторяем только эти события,
+      после CONSUMER_RETRY_MAX_ATTEMPTS попыток они уходят в DLQ.
+    - Прочие ошибки документа (ядовитые сообщения) сразу уходят в DLQ.
+    Возвращает ошибки, отправленные в DLQ. Порядок событий одного документа сохраняется.
+    """
+    max_attempts = settings.CONSUMER_RETRY_MAX_ATTEMPTS
+    pending = list(events)
+    dead: list[dict] = []
+    isolate: int | None = None  # размер пачки, пока ищем ядовитое событие
+    attempt = 1
+    while pending:
+        size = isolate or bulk_limit.value
+        chunk, rest = pending[:size], pending[size:]
+        try:
+            errors = await index_batch(chunk)
+        except ApiError as exc:
+            if is_transient(exc):
+                if attempt >= max_attempts:
+                    raise
+                print(f"⏳ Эластик не принял _bulk: {exc!r}, размер _bulk: {bulk_limit.shrink()}")
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+            elif len(chunk) > 1:
+                isolate = len(chunk) // 2
+            else:
+                failed = {**_api_error(exc), "event": chunk[0]}
+                await send_to_dlq([(chunk[0], failed)], attempt, EVENTS_TOPIC)
+                dead.append(failed)
+                pending = rest
+                isolate = None
+            continue
+        except Exception as exc:
+            if not is_transient(exc) or attempt >= max_attempts:
+                raise
+            print(f"⏳ Эластик недоступен: {exc!r}, размер _bulk: {bulk_limit.shrink()}")
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        retry = [error for error in errors if is_transient_item(error)]
+        poison = [error for error in errors if not is_transient_item(error)]
+        if retry and attempt >= max_attempts:
+            poison, retry = poison + retry, []
+        if poison:
+            await send_to_dlq([(error["event"], error) for error in poison], attempt, EVENTS_TOPIC)
+            dead.extend(poison)
+
+        if retry:
+            bulk_limit.shrink()
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            pending = [error["event"] for error in retry] + rest
+        else:
+            bulk_limit.grow()
+            attempt = 1
+            pending = rest
+            # Эта часть прошла: дальше снова полные _bulk, пока запрос опять не отклонят
+            isolate = None
+    return dead
+
+
+def _undecodable(msg, exc: EventDecodeError) -> tuple[dict, dict]:
+    """Пара (событие, ошибка) для DLQ. Нечитаемое тело сохраняем как есть, в base64."""
+    if isinstance(exc, UnsupportedSchemaError):
+        event = exc.message
+    else:
+        raw = msg.value if isinstance(msg.value, bytes) else b""
+        event = {
+            "payload": base64.b64encode(raw).decode("ascii"),
+            "headers": {key: value.decode("latin-1") for key, value in msg.headers or ()},
+        }
+    return event, {"type": "event_decode_error", "reason": str(exc)}
+
+
+async def decode_messages(messages: list) -> list[tuple[Any, dict]]:
+    """
+    Пары (сообщение, событие) для прочитанных сообщений: формат тела задан заголовками,
+    см. app/events.py. Нечитаемые и слишком новые события уходят в DLQ.
+    """
+    decoded, failures = [], []
+    for msg in messages:
+        try:
+            decoded.append((msg, decode_event(msg.value, msg.headers)))
+        except EventDecodeError as exc:
+            print(f"☠️ Не удалось прочитать сообщение {msg.partition}:{msg.offset}: {exc}")
+            failures.append(_undecodable(msg, exc))
+    if failures:
+        await send_to_dlq(failures, 1, EVENTS_TOPIC)
+    return decoded
+
+
+async def _index_one(event: dict, index_name: str):
+    event_type = event["event"]
+    if not event_type.endswith("_created"):
+        # Изменения и удаления применяются так же, как в батчевом режиме
+        await index_resilient([event])
+        return
+
+    new_names = author_names.remember([event])
+    data = (await enrich_books([event]))[0]["data"]
+    # Забираем _id из словаря, чтобы использовать его как ID документа в Эластике
+    doc_id = data.pop("_id", None)
+    versioning = {}
+    if data.get("version") is not None:
+        versioning = {"version": data["version"], "version_type": "external"}
+
+    # Сохраняем документ
     try:
-        print("🎧 Консьюмер запущен, слушаем топик 'library.events'...")
-        # Бесконечный цикл чтения сообщений
-        async for msg in consumer:
-            event = msg.value
-            event_type = event.get("event")
-            data = event.get("data")
+        await retry_transient(
+            es_client.index, index=index_name, id=doc_id, document=data, **versioning
+        )
+        print(f"✅ Документ {doc_id} сохранен в индекс {index_name}!")
+    except ConflictError:
+        print(f"↩️ Документ {doc_id} уже есть в индексе {index_name} (повтор события)")
+    except ApiError as exc:
+        if is_transient(exc):
+            raise
+        await send_to_dlq([(event, _api_error(exc))], 1, EVENTS_TOPIC)
+    await update_book_authors(new_names)
+
+
+async def apply_events(events: list[dict]):
+    """Применяет события к поиску: _bulk в Эластик или индекс в памяти (SEARCH_BACKEND)."""
+    if settings.SEARCH_BACKEND == "memory":
+        search_backend.apply(events, INDEXED_EVENTS)
+        observe_indexed(events, INDEXED_EVENTS)
+    else:
+        await index_sharded(events)
+
+
+async def commit_offsets(consumer: AIOKafkaConsumer, final: bool = False):
+    """
+    Коммит прочитанных офсетов. Индекс в памяти переживает рестарт только в виде снимка,
+    поэтому в режиме memory офсеты коммитятся сразу после снимка и только тогда
+    (раз в MEMORY_SNAPSHOT_INTERVAL_SECONDS; при остановке - всегда).
+    """
+    if settings.SEARCH_BACKEND != "memory":
+        await consumer.commit()
+    elif search_backend.snapshot_dir is not None and (final or search_backend.save_due()):
+        search_backend.save()
+        await consumer.commit()
+
+
+async def _consume_one_by_one(consumer: AIOKafkaConsumer):
+    # Бесконечный цикл чтения сообщений
+    async for msg in consumer:
+        decoded = await decode_messages([msg])
+        if not decoded:
+            continue
+        event = decoded[0][1]
+        event_type = event.get("event")
+
+        print(f"📥 Получено событие: {event_type}")
+
+        # Индексируем данные в Elasticsearch
+        index_name = INDEXED_EVENTS.get(event_type)
+        if index_name is None:
+            continue
+
+        # Трасса продолжается от события в core_service (traceparent в заголовках)
+        with consume_spans(decoded):
+            if settings.SEARCH_BACKEND == "memory":
+                await apply_events([event])
+            else:
+                await _index_one(event, index_name)
+        await cache_sync.invalidate_written(touched_indices([event]))
+        if settings.SEARCH_BACKEND == "memory":
+            await commit_offsets(consumer)
+
+
+def shard_of(event: dict, workers: int) -> int:
+    """
+    Номер воркера для события: по id документа. События одного документа попадают
+    к одному воркеру в исходном порядке, разные документы обрабатываются параллельно.
+    """
+    doc_id = str((event.get("data") or {}).get("_id"))
+    return zlib.crc32(doc_id.encode("utf-8")) % workers
+
 
-            print(f"📥 Получено событие: {event_type}")
+async def index_sharded(events: list[dict]) -> list[dict]:
+    """
+    Делит пачку между CONSUMER_WORKERS воркерами и отправляет их _bulk одновременно.
+    Одновременно к Эластику уходит максимум CONSUMER_WORKERS запросов.
+    """
+    workers = max(settings.CONSUMER_WORKERS, 1)
+    # Автор и его книга могут попасть к разным воркерам: имена запоминаем до раздачи,
+    # иначе книга проиндексируется без имени, а update_by_query автора ее еще не найдет
+    author_names.remember(events)
+    shards: list[list[dict]] = [[] for _ in range(workers)]
+    for event in events:
+        shards[shard_of(event, workers)].append(event)
 
-            # Индексируем данные в Elasticsearch
-            if event_type in ["book_created", "author_created"]:
-                # Определяем индекс (таблицу) в Эластике
-                index_name = "books" if "book" in event_type else "authors"
+    results = await asyncio.gather(*(index_resilient(shard) for shard in shards if shard))
+    return [error for errors in results for error in errors]
 
-                # Забираем _id из словаря, чтобы использовать его как ID документа в Эластике
-                doc_id = data.pop("_id", None)
 
-                # Сохраняем документ
-                await es_client.index(index=index_name, id=doc_id, document=data)
-                print(f"✅ Документ {doc_id} сохранен в индекс {index_name}!")
+class BatchProcessor:
+    """
+    Сообщения, полученные из Kafka, но еще не проиндексированные, и их запись (_bulk + commit).
+    Сбрасывать может и основной цикл, и ребаланс: lock не дает сделать это одновременно.
+    """
+
+    def __init__(self, consumer: AIOKafkaConsumer):
+        self.consumer = consumer
+        self.buffer = []
+        self._lock = asyncio.Lock()
+
+    async def flush(self):
+        async with self._lock:
+            if not self.buffer:
+                return
+            batch, self.buffer = self.buffer, []
+
+            print(f"📥 Получено событий: {len(batch)}")
+            decoded = await decode_messages(batch)
+            events = [event for _, event in decoded]
+            with consume_spans(decoded):
+                await apply_events(events)
+            await cache_sync.invalidate_written(touched_indices(events))
+
+            # Коммитим офсеты только после того, как _bulk отработал
+            await commit_offsets(self.consumer)
+
+
+class FlushOnRevoke(ConsumerRebalanceListener):
+    """Перед тем как партиции уйдут другому процессу, дописываем и коммитим все, что успели прочитать."""
+
+    def __init__(self, processor: BatchProcessor):
+        self.processor = processor
+        self.rewound = False
+
+    async def on_partitions_revoked(self, revoked):
+        if revoked:
+            await self.processor.flush()
+
+    async def on_partitions_assigned(self, assigned):
+        print(f"🧩 Назначены партиции: {sorted(tp.partition for tp in assigned)}")
+        # Индекс в памяти без снимка строится заново: офсеты группы (если остались) ему не подходят
+        memory = settings.SEARCH_BACKEND == "memory"
+        if memory and assigned and not search_backend.restored and not self.rewound:
+            await self.processor.consumer.seek_to_beginning(*assigned)
+            self.rewound = True
+
+
+async def _consume_batches(consumer: AIOKafkaConsumer, processor: BatchProcessor):
+    loop = asyncio.get_running_loop()
+    max_size = settings.CONSUMER_BATCH_SIZE
+    max_wait = settings.CONSUMER_BATCH_TIMEOUT_MS / 1000
+
+    while True:
+        # Копим сообщения, пока не наберем max_size или не истечет max_wait
+        deadline = loop.time() + max_wait
+        while len(processor.buffer) < max_size:
+            remaining_ms = int((deadline - loop.time()) * 1000)
+            if remaining_ms <= 0:
+                break
+            records = await consumer.getmany(
+                timeout_ms=remaining_ms, max_records=max_size - len(processor.buffer)
+            )
+            for messages in records.values():
+                processor.buffer.extend(messages)
+
+        await processor.flush()
+
+
+async def consume_events():
+    batch_mode = settings.CONSUMER_BATCH_ENABLED
+    memory = settings.SEARCH_BACKEND == "memory"
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,  # Берем из настроек
+        group_id=consumer_group(),
+        # value не десериализуем здесь: формат тела задан заголовками, см. decode_messages
+        # В батчевом режиме офсеты коммитим вручную после успешного _bulk,
+        # в режиме memory - вместе со снимком индекса (commit_offsets)
+        enable_auto_commit=not batch_mode and not memory,
+        # Новая группа индекса в памяти читает топик с начала
+        auto_offset_reset="earliest" if memory else "latest",
+    )
+
+    processor = BatchProcessor(consumer)
+    # Ребаланс нужен батчевому режиму: там есть прочитанное, но еще не закоммиченное.
+    # Индексу в памяти - чтобы при старте без снимка перемотать партиции в начало
+    listener = FlushOnRevoke(processor) if batch_mode or memory else None
+    consumer.subscribe([EVENTS_TOPIC], listener=listener)
+
+    await consumer.start()
+    try:
+        print(f"🎧 Консьюмер запущен, слушаем топик '{EVENTS_TOPIC}'...")
+        if batch_mode:
+            await _consume_batches(consumer, processor)
+        else:
+            await _consume_one_by_one(consumer)
 
     finally:
-        # Корректно завершаем работу, если приложение останавливается
-        await consumer.stop()
+        # Корректно завершаем работу, если приложение останавливается:
+        # сначала дописываем то, что уже прочитали, потом выходим из группы
+        try:
+            await processor.flush()
+            if memory:
+                await commit_offsets(consumer, final=True)
+        finally:
+            await consumer.stop()
+            await stop_dlq_producer()
+            await cache_sync.stop_broadcast_producer()
@@ -1,30 +1,76 @@
 import asyncio
 from contextlib import asynccontextmanager
 
-import httpx
-from elasticsearch import NotFoundError
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+from app import cache_sync
+from app.backends import CursorExpiredError, search_backend
+from app.cache import query_cache
 from app.config import settings
-from app.database import es_client
-from app.kafka_consumer import consume_events
+from app.database import core_client, es_client
+from app.indices import SUGGEST_FIELDS
+from app.kafka_consumer import EVENTS_TOPIC, consume_events, consumer_group
+from app.metrics import LagMonitor
+from app.queries import result_size
+from app.reindex import is_running, job_status, start_reindex
+from app.responses import json_response
+from app.retry import supervise
+from app.suggest import SupersededError, coalescer
+from app.tracing import setup_tracing, shutdown_tracing, trace_requests
 
 consumer_task = None
+invalidation_task = None
+lag_monitor = LagMonitor(EVENTS_TOPIC, consumer_group())
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global consumer_task
+    global consumer_task, invalidation_task
     print("Starting Search Service...")
+    setup_tracing()
 
-    consumer_task = asyncio.create_task(consume_events())
+    # Elasticsearch: client, index templates and aliases; memory: the last snapshot, if any
+    await search_backend.start()
+    # Pooled keep-alive client for Core Service (used by /reindex/)
+    await core_client.open()
+    # With CONSUMER_IN_PROCESS=false indexing runs separately (python -m app.consumer).
+    # supervise() restarts the consumer if it crashes instead of letting it die silently.
+    if settings.CONSUMER_IN_PROCESS:
+        cache_sync.enable_broadcast()
+        consumer_task = asyncio.create_task(supervise("Consumer", consume_events))
+    elif search_backend.name == "memory":
+        print("⚠️ SEARCH_BACKEND=memory without CONSUMER_IN_PROCESS: nothing will be indexed")
+    # Writes made by other processes reach this cache through the invalidation topic;
+    # the memory index is this process's own, so there is nothing to hear about
+    if query_cache.enabled and search_backend.name != "memory":
+        if settings.SEARCH_CACHE_INVALIDATION_TOPIC is not None:
+            invalidation_task = asyncio.create_task(
+                supervise("Cache invalidation", cache_sync.watch_invalidations)
+            )
+        elif not settings.CONSUMER_IN_PROCESS:
+            query_cache.enabled = False
+            print(
+                "⚠️ Query cache disabled: the consumer runs elsewhere and there is no invalidation topic"
+            )
 
     yield
 
     print("Stopping Search Service...")
-    consumer_task.cancel()
-    await es_client.close()
+    if consumer_task is not None:
+        # Let the consumer flush (and, in memory mode, snapshot) before the backend closes
+        consumer_task.cancel()
+        await asyncio.gather(consumer_task, return_exceptions=True)
+    cache_sync.disable_broadcast()
+    if invalidation_task is not None:
+        invalidation_task.cancel()
+        await asyncio.gather(invalidation_task, return_exceptions=True)
+        invalidation_task = None
+    await lag_monitor.stop()
+    await core_client.close()
+    await search_backend.close()
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -39,100 +85,217 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Relation", "X-Next-Cursor"],
 )
 
+# A span and a Server-Timing header for every request
+app.middleware("http")(trace_requests)
+
 
 @app.get("/")
 async def root():
     return {"message": "Search Service is ready!"}
 
 
+def _split(value: str | None) -> list[str] | None:
+    return [part.strip() for part in value.split(",") if part.strip()] if value else None
+
+
+def _set_total(response: Response, total: dict | None):
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total["value"])
+        response.headers["X-Total-Relation"] = total["relation"]  # "gte" once the cap is hit
+
+
+async def _search_page(response: Response, index: str, cursor: str | None, **request):
+    """One page of a paginated search; the next page's cursor goes to X-Next-Cursor."""
+    try:
+        page = await search_backend.page(index, cursor=cursor, **request)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+    except CursorExpiredError:
+        raise HTTPException(
+            status_code=410, detail="Cursor expired, start again without it"
+        ) from None
+
+    _set_total(response, page["total"])
+    if page["next_cursor"] is not None:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return json_response(page["documents"], response)
+
+
 @app.get("/search/")
-async def search(query: str, index: str = "books"):
-    es_query = {
-        "bool": {
-            "should": [
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["title", "description", "name"],
-                        "fuzziness": "AUTO",
-                    }
-                },
-                {
-                    "query_string": {
-                        "query": f"*{query}*",
-                        "fields": ["title", "description", "name"],
-                    }
-                },
-            ],
-            "minimum_should_match": 1,
-        }
+async def search(
+    response: Response,
+    query: str,
+    index: str = "books",
+    size: int | None = Query(None, ge=1, le=settings.SEARCH_MAX_SIZE),
+    fields: str | None = None,
+    exclude: str | None = None,
+    highlight: bool = False,
+    paginate: bool = False,
+    cursor: str | None = None,
+):
+    """
+    Search one index.
+
+    ``fields``/``exclude`` are comma-separated _source filters. With ``paginate=true``
+    the results come from a point in time and ``X-Next-Cursor`` carries the cursor for
+    the next page (pass it back as ``cursor``). Totals are in ``X-Total-Count``.
+    """
+    size = size or result_size(index)
+    request = {
+        "query": query,
+        "size": size,
+        "includes": _split(fields),
+        "excludes": _split(exclude),
+        "highlight": highlight,
     }
+    if paginate or cursor:
+        return await _search_page(response, index, cursor, **request)
 
-    try:
-        response = await es_client.search(index=index, query=es_query)
-        documents = [hit["_source"] for hit in response["hits"]["hits"]]
-        return documents
-    except NotFoundError:
-        return []
+    cache_key = query_cache.make_key(
+        query, (index,), size=size, fields=fields, exclude=exclude, highlight=highlight
+    )
+    cached = await query_cache.get(cache_key)
+    if cached is None:
+        cached = await search_backend.search(index, **request)
+        if cached is None:
+            return []
+        await query_cache.set(cache_key, cached)
+
+    _set_total(response, cached["total"])
+    return json_response(cached["documents"], response)
 
 
 @app.get("/search/all/")
 async def search_all(query: str):
-    es_query = {
-        "bool": {
-            "should": [
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["title", "description", "name"],
-                        "fuzziness": "AUTO",
-                    }
-                },
-                {
-                    "query_string": {
-                        "query": f"*{query}*",
-                        "fields": ["title", "description", "name"],
-                    }
-                },
-            ],
-            "minimum_should_match": 1,
-        }
-    }
+    """Search every configured index at once; a missing index just comes back empty."""
+    search_indices = tuple(settings.SEARCH_ALL_INDICES)
+    cache_key = query_cache.make_key(query, search_indices)
+    cached = await query_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached)
+
+    results = await search_backend.search_all(query, search_indices)
+    await query_cache.set(cache_key, results)
+    return json_response(results)
 
-    results = {"books": [], "authors": []}
 
-    for index in ("books", "authors"):
-        try:
-            response = await es_client.search(index=index, query=es_query)
-            results[index] = [hit["_source"] for hit in response["hits"]["hits"]]
-        except NotFoundError:
-            pass
+@app.get("/suggest/")
+async def suggest(
+    prefix: str = Query(min_length=1),
+    index: str | None = None,
+    size: int = Query(settings.SUGGEST_DEFAULT_SIZE, ge=1, le=20),
+    x_client_id: str | None = Header(None),
+):
+    """
+    Typeahead: top ``size`` completions per index (or for ``index`` only).
+
+    Clients that send ``X-Client-Id`` get their superseded keystrokes dropped:
+    the older request is cancelled and answers 204.
+    """
+    suggest_indices = (index,) if index else tuple(SUGGEST_FIELDS)
+    if any(name not in SUGGEST_FIELDS for name in suggest_indices):
+        raise HTTPException(status_code=400, detail=f"No suggestions for index '{index}'")
+
+    cache_key = query_cache.make_key(prefix, suggest_indices, suggest=True, size=size)
+    cached = await query_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached)
+
+    lookup = search_backend.suggest(prefix, suggest_indices, size)
+    try:
+        if x_client_id:
+            suggestions = await coalescer.run(x_client_id, lookup)
+        else:
+            suggestions = await lookup
+    except SupersededError:
+        return Response(status_code=204)
+    except TimeoutError:
+        return [] if index else {name: [] for name in suggest_indices}
 
-    return results
+    result = suggestions[index] if index else suggestions
+    await query_cache.set(cache_key, result)
+    return json_response(result)
 
 
-@app.post("/reindex/")
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and size of the search result cache."""
+    return query_cache.stats()
+
+
+@app.get("/pools/stats")
+async def pool_stats():
+    """Connection pools of the Elasticsearch and Core Service clients: size, requests in flight."""
+    return {"elasticsearch": es_client.pool_stats(), "core_api": core_client.pool_stats()}
+
+
+async def _consumer_lag() -> dict[int, int] | None:
+    """Per-partition lag of the search consumer group, or None if Kafka can't be asked."""
+    try:
+        return await lag_monitor.measure()
+    except Exception as exc:
+        print(f"⚠️ Could not read consumer lag: {exc!r}")
+        return None
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics; consumer lag is refreshed on every scrape."""
+    await _consumer_lag()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """
+    Readiness with index freshness.
+
+    ``unavailable`` (503) when the search backend (Elasticsearch) does not answer. ``degraded`` (200: search
+    still works, results are stale) when a partition lags more than HEALTH_MAX_LAG
+    messages or the lag can't be read. ``ready`` otherwise.
+    """
+    backend_up = await search_backend.ping()
+    lag = await _consumer_lag()
+    max_lag = max(lag.values(), default=0) if lag is not None else None
+
+    if not backend_up:
+        status = "unavailable"
+        response.status_code = 503
+    elif max_lag is None or max_lag > settings.HEALTH_MAX_LAG:
+        status = "degraded"
+    else:
+        status = "ready"
+
+    return {
+        "status": status,
+        "backend": search_backend.name,
+        "elasticsearch": backend_up if search_backend.name == "elasticsearch" else None,
+        "consumer_lag": {
+            "max": max_lag,
+            "total": sum(lag.values()) if lag is not None else None,
+            "partitions": lag,
+            "threshold": settings.HEALTH_MAX_LAG,
+        },
+    }
+
+
+@app.post("/reindex/", status_code=202)
 async def reindex():
-    """Fetch all books and authors from Core Service and index them into Elasticsearch."""
-    indexed = {"books": 0, "authors": 0}
-
-    async with httpx.AsyncClient() as client:
-        # Reindex books
-        resp = await client.get(f"{settings.CORE_API_URL}/books/")
-        if resp.status_code == 200:
-            for book in resp.json():
-                doc_id = book.pop("_id", None) or book.pop("id", None)
-                await es_client.index(index="books", id=doc_id, document=book)
-                indexed["books"] += 1
-
-        # Reindex authors
-        resp = await client.get(f"{settings.CORE_API_URL}/authors/")
-        if resp.status_code == 200:
-            for author in resp.json():
-                doc_id = author.pop("_id", None) or author.pop("id", None)
-                await es_client.index(index="authors", id=doc_id, document=author)
-                indexed["authors"] += 1
-
-    return {"message": "Reindex complete", "indexed": indexed}
+    """Start a background job that streams all books and authors from Core Service into Elasticsearch."""
+    if search_backend.name != "elasticsearch":
+        raise HTTPException(status_code=400, detail="Reindex needs SEARCH_BACKEND=elasticsearch")
+    if is_running():
+        raise HTTPException(status_code=409, detail=job_status())
+    return start_reindex()
+
+
+@app.get("/reindex/status")
+async def reindex_status():
+    """Progress and throughput of the current (or last) reindex job."""
+    status = job_status()
+    if status is None:
+        raise HTTPException(status_code=404, detail="No reindex job has been started")
+    return status
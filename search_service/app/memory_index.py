@@ -0,0 +1,435 @@
+"""In-process inverted index with BM25 ranking, behind the ``memory`` search backend.
+
+One ``InvertedIndex`` per alias (``books``, ``authors``). Every term of the searchable
+fields (``queries.SEARCH_FIELDS``) has an array-backed posting list of (slot, term
+frequency); a query is scored for all candidate documents at once with NumPy, BM25 over
+the searchable text of a document taken as one field. Query words also match terms
+within ``fuzziness: AUTO`` edits and terms they are a prefix of. Both are looked up
+in a ``TermTrie`` over the vocabulary, like the fuzzy and edge-ngram clauses of
+``queries.build_query``.
+
+An update or a delete leaves a dead slot behind (like a deleted document in a Lucene
+segment); ``compact`` rewrites the postings without them once they pile up.
+
+``save`` writes the postings as .npy files and ``load`` maps them with
+``mmap_mode="r"``: a restart re-reads the documents but does not re-tokenize them,
+and posting pages are paged in as queries touch them.
+"""
+
+import math
+import re
+import unicodedata
+from array import array
+from collections.abc import Iterator
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from app.queries import SEARCH_FIELDS
+
+# BM25 parameters, Lucene defaults
+K1 = 1.2
+B = 0.75
+
+# Query term weights: the word itself, a fuzzy match, a longer word it is a prefix of
+EXACT_WEIGHT = 1.0
+FUZZY_WEIGHT = 0.5
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 2  # min_gram of the prefix_ngram analyzer
+MAX_EXPANSIONS = 50  # like max_expansions of an Elasticsearch fuzzy/prefix query
+
+# Compact once dead slots are this share of all slots
+COMPACT_DEAD_RATIO = 0.5
+
+_WORD = re.compile(r"\w+")
+_END = ""  # trie key of the term that ends at a node (real keys are single characters)
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip diacritics, like the ``lowercase`` + ``asciifolding`` filters."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD.findall(normalize(text))
+
+
+def word_spans(text: str) -> Iterator[tuple[int, int, str]]:
+    """(start, end, term) of every word of ``text``, for highlighting."""
+    for match in _WORD.finditer(text):
+        yield match.start(), match.end(), normalize(match.group())
+
+
+def field_values(doc: dict, path: str) -> list[str]:
+    """String values under a dotted path; lists (``authors``) are walked through."""
+    values = [doc]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, list):
+                found.extend(value)
+            elif value is not None:
+                found.append(value)
+        values = found
+    return [value for value in values if isinstance(value, str)]
+
+
+def fuzzy_edits(word: str) -> int:
+    """Edits allowed by ``fuzziness: AUTO``."""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+class PostingList:
+    """
+    Slots and term frequencies of one term. New postings go to ``array.array`` (compact,
+    amortized O(1) append); a search reads them as NumPy arrays without copying.
+    """
+
+    __slots__ = ("slots", "tfs")
+
+    def __init__(self, slots: np.ndarray | None = None, tfs: np.ndarray | None = None):
+        # A list loaded from a snapshot holds read-only maps until its first append
+        self.slots = array("i") if slots is None else slots
+        self.tfs = array("f") if tfs is None else tfs
+
+    def __len__(self):
+        return len(self.slots)
+
+    def append(self, slot: int, tf: int):
+        if isinstance(self.slots, np.ndarray):
+            self.slots = array("i", self.slots.tobytes())
+            self.tfs = array("f", self.tfs.tobytes())
+        self.slots.append(slot)
+        self.tfs.append(tf)
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        # Views over the buffers: the caller must not keep them across an append
+        return np.frombuffer(self.slots, np.int32), np.frombuffer(self.tfs, np.float32)
+
+
+class TermTrie:
+    """
+    Path-compressed character trie: sorted prefix expansion and Levenshtein lookup
+    without a vocabulary scan. A node maps the first character of each outgoing edge to
+    ``[label, child]``; the term ending at a node is stored under ``_END``.
+    """
+
+    def __init__(self):
+        self.root: dict = {}
+        self.size = 0
+
+    def add(self, term: str):
+        node, position = self.root, 0
+        while position < len(term):
+            edge = node.get(term[position])
+            if edge is None:
+                node[term[position]] = [term[position:], {_END: term}]
+                self.size += 1
+                return
+            label, child = edge
+            common = 0
+            rest = term[position:]
+            while common < len(label) and common < len(rest) and label[common] == rest[common]:
+                common += 1
+            if common < len(label):
+                # Split the edge where the new term leaves it
+                middle = {label[common]: [label[common:], child]}
+                edge[0], edge[1] = label[:common], middle
+                child = middle
+            node, position = child, position + common
+        if _END not in node:
+            node[_END] = term
+            self.size += 1
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        """Terms starting with ``prefix``, lazily, in lexicographic order."""
+        node, position = self.root, 0
+        while position < len(prefix):
+            edge = node.get(prefix[position])
+            if edge is None:
+                return
+            label, child = edge
+            rest = prefix[position:]
+            if label.startswith(rest):
+                node = child
+                break
+            if not rest.startswith(label):
+                return
+            node, position = child, position + len(label)
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if _END in node:
+                yield node[_END]
+            pending.extend(node[key][1] for key in sorted(node, reverse=True) if key != _END)
+
+    def with_prefix(self, prefix: str, limit: int) -> list[str]:
+        return list(islice(self.iter_prefix(prefix), limit))
+
+    def within(self, word: str, max_edits: int) -> dict[str, int]:
+        """Terms at most ``max_edits`` Levenshtein edits from ``word`` -> their distance."""
+        found = {}
+        columns = len(word) + 1
+        limit = max_edits + 1  # any distance above max_edits is as good as this one
+        pending = [(self.root, [min(column, limit) for column in range(columns)], 0)]
+        while pending:
+            node, row, depth = pending.pop()
+            for key, edge in node.items():
+                if key == _END:
+                    continue
+                label, child = edge
+                current, reached = row, depth
+                for char in label:
+                    reached += 1
+                    previous, current = current, [limit] * columns
+                    current[0] = min(reached, limit)
+                    best = current[0]
+                    # Only cells within max_edits of the diagonal can stay under the limit
+                    for column in range(max(1, reached - max_edits), min(columns, reached + limit)):
+                        # min() of substitution, deletion, insertion and limit, inlined (hot loop)
+                        cost = previous[column - 1] + (word[column - 1] != char)
+                        if previous[column] < cost:
+                            cost = previous[column] + 1
+                        if current[column - 1] < cost:
+                            cost = current[column - 1] + 1
+                        if cost > limit:
+                            cost = limit
+                        current[column] = cost
+                        if cost < best:
+                            best = cost
+                    # Every longer term is at least ``best`` edits away: prune the branch
+                    if best > max_edits:
+                        break
+                else:
+                    if _END in child and current[-1] <= max_edits:
+                        found[child[_END]] = current[-1]
+                    pending.append((child, current, reached))
+        return found
+
+
+class InvertedIndex:
+    """Documents of one alias, their postings, a term trie and a completion trie."""
+
+    def __init__(self, suggest_field: str | None = None):
+        self.suggest_field = suggest_field
+        self.sources: list[dict | None] = []  # slot -> _source (None once dead)
+        self.ids: list[str | None] = []
+        self.slot_of: dict[str, int] = {}
+        self.postings: dict[str, PostingList] = {}
+        self.terms = TermTrie()
+        self.lengths = np.empty(16, dtype=np.float32)  # searchable tokens per slot
+        self.live = np.zeros(16, dtype=bool)
+        self.total_length = 0.0
+        # Completion input (normalized suggest field value) -> ids of the documents with it
+        self.completions: dict[str, set[str]] = {}
+        self.completion_trie = TermTrie()
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    @property
+    def dead(self) -> int:
+        return len(self.sources) - len(self.slot_of)
+
+    def get(self, doc_id: str) -> dict | None:
+        slot = self.slot_of.get(doc_id)
+        return None if slot is None else self.sources[slot]
+
+    def put(self, doc_id: str, source: dict):
+        """Index a new version of the document: the old slot dies, the document gets a new one."""
+        self._remove(doc_id)
+        slot = len(self.sources)
+        self.sources.append(source)
+        self.ids.append(doc_id)
+        self.slot_of[doc_id] = slot
+
+        counts: dict[str, int] = {}
+        for field in SEARCH_FIELDS:
+            for value in field_values(source, field):
+                for token in tokenize(value):
+                    counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = PostingList()
+                self.terms.add(term)
+            postings.append(slot, tf)
+
+        if slot == len(self.lengths):
+            self.lengths = np.concatenate([self.lengths, np.empty(slot, np.float32)])
+            self.live = np.concatenate([self.live, np.zeros(slot, bool)])
+        self.lengths[slot] = sum(counts.values())
+        self.live[slot] = True
+        self.total_length += self.lengths[slot]
+
+        for value in field_values(source, self.suggest_field) if self.suggest_field else ():
+            key = normalize(value)
+            self.completions.setdefault(key, set()).add(doc_id)
+            self.completion_trie.add(key)
+        self._compact_if_sparse()
+
+    def delete(self, doc_id: str):
+        self._remove(doc_id)
+        self._compact_if_sparse()
+
+    def _compact_if_sparse(self):
+        if len(self.sources) > 1000 and self.dead > COMPACT_DEAD_RATIO * len(self.sources):
+            self.compact()
+
+    def _remove(self, doc_id: str):
+        slot = self.slot_of.pop(doc_id, None)
+        if slot is None:
+            return
+        source = self.sources[slot]
+        for value in field_values(source, self.suggest_field) if self.suggest_field else ():
+            key = normalize(value)
+            self.completions.get(key, set()).discard(doc_id)
+            if not self.completions.get(key, True):
+                del self.completions[key]
+        self.sources[slot] = None
+        self.ids[slot] = None
+        self.live[slot] = False
+        self.total_length -= self.lengths[slot]
+
+    def compact(self):
+        """Re-index the live documents into fresh slots, dropping postings of dead ones."""
+        live = [
+            (doc_id, self.sources[slot])
+            for doc_id, slot in sorted(self.slot_of.items(), key=lambda item: item[1])
+        ]
+        self.__init__(self.suggest_field)
+        for doc_id, source in live:
+            self.put(doc_id, source)
+
+    # --- Search ---
+
+    def expand(self, query: str) -> dict[str, float]:
+        """Index terms a query stands for, with their weights (see EXACT/FUZZY/PREFIX_WEIGHT)."""
+        weights: dict[str, float] = {}
+        for word in tokenize(query):
+            for term, edits in self.terms.within(word, fuzzy_edits(word)).items():
+                weight = EXACT_WEIGHT if edits == 0 else FUZZY_WEIGHT
+                weights[term] = weights.get(term, 0.0) + weight
+            if len(word) >= MIN_PREFIX_LENGTH:
+                for term in self.terms.with_prefix(word, MAX_EXPANSIONS):
+                    weights[term] = weights.get(term, 0.0) + PREFIX_WEIGHT
+        return weights
+
+    def score(self, weights: dict[str, float]) -> tuple[np.ndarray, np.ndarray]:
+        """BM25 of every matching live slot: (slots, scores), ordered by slot."""
+        docs = len(self.slot_of)
+        if not docs or not weights:
+            return np.empty(0, np.int32), np.empty(0, np.float64)
+        average_length = self.total_length / docs or 1.0
+
+        all_slots, all_scores = [], []
+        for term, weight in weights.items():
+            postings = self.postings.get(term)
+            if postings is None or not len(postings):
+                continue
+            slots, tfs = postings.arrays()
+            alive = self.live[slots]
+            slots, tfs = slots[alive], tfs[alive]
+            if not len(slots):
+                continue
+            idf = math.log(1 + (docs - len(slots) + 0.5) / (len(slots) + 0.5))
+            norm = tfs + K1 * (1 - B + B * self.lengths[slots] / average_length)
+            all_slots.append(slots)
+            all_scores.append(weight * idf * tfs * (K1 + 1) / norm)
+        if not all_slots:
+            return np.empty(0, np.int32), np.empty(0, np.float64)
+
+        # Sum the contributions of every term per slot
+        slots, inverse = np.unique(np.concatenate(all_slots), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores).astype(np.float64))
+        return slots, scores
+
+    def top(
+        self,
+        slots: np.ndarray,
+        scores: np.ndarray,
+        size: int,
+        after: tuple[float, int] | None = None,
+    ) -> list[tuple[int, float]]:
+        """Best ``size`` (slot, score) by score, then slot; ``after`` is the last pair of the previous page."""
+        if after is not None:
+            score, slot = after
+            keep = (scores < score) | ((scores == score) & (slots > slot))
+            slots, scores = slots[keep], scores[keep]
+        if len(slots) > size:
+            # Everything scoring at least the size-th best, ties included, then exact order
+            threshold = np.partition(scores, len(scores) - size)[len(scores) - size]
+            keep = scores >= threshold
+            slots, scores = slots[keep], scores[keep]
+        order = np.lexsort((slots, -scores))[:size]
+        return [(int(slots[i]), float(scores[i])) for i in order]
+
+    def suggest(self, prefix: str, size: int) -> list[dict]:
+        """Completion options ``{"text", "_id"}`` whose suggest field starts with ``prefix``."""
+        options = []
+        # Inputs of deleted documents stay in the trie with no documents behind them
+        for key in self.completion_trie.iter_prefix(normalize(prefix)):
+            for doc_id in sorted(self.completions.get(key, ())):
+                values = field_values(self.get(doc_id), self.suggest_field)
+                text = next((value for value in values if normalize(value) == key), key)
+                options.append({"text": text, "_id": doc_id})
+                if len(options) == size:
+                    return options
+        return options
+
+    # --- Snapshot ---
+
+    def save(self, directory: Path):
+        """Write the live documents and their postings; compacts first, so slots are dense."""
+        if self.dead:
+            self.compact()
+        directory.mkdir(parents=True, exist_ok=True)
+        terms = [term for term, postings in self.postings.items() if len(postings)]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[term]) for term in terms])
+        arrays = [self.postings[term].arrays() for term in terms]
+        np.save(directory / "offsets.npy", offsets)
+        np.save(
+            directory / "slots.npy",
+            np.concatenate([s for s, _ in arrays] or [np.empty(0, np.int32)]),
+        )
+        np.save(
+            directory / "tfs.npy",
+            np.concatenate([t for _, t in arrays] or [np.empty(0, np.float32)]),
+        )
+        np.save(directory / "lengths.npy", self.lengths[: len(self.sources)])
+        (directory / "terms.json").write_bytes(orjson.dumps(terms))
+        (directory / "documents.json").write_bytes(orjson.dumps([self.ids, self.sources]))
+
+    @classmethod
+    def load(cls, directory: Path, suggest_field: str | None = None) -> "InvertedIndex":
+        index = cls(suggest_field)
+        offsets = np.load(directory / "offsets.npy")
+        slots = np.load(directory / "slots.npy", mmap_mode="r")
+        tfs = np.load(directory / "tfs.npy", mmap_mode="r")
+        for n, term in enumerate(orjson.loads((directory / "terms.json").read_bytes())):
+            start, end = offsets[n], offsets[n + 1]
+            index.postings[term] = PostingList(slots[start:end], tfs[start:end])
+            index.terms.add(term)
+
+        index.ids, index.sources = orjson.loads((directory / "documents.json").read_bytes())
+        lengths = np.load(directory / "lengths.npy")
+        index.lengths = np.concatenate([lengths, np.empty(max(len(lengths), 16), np.float32)])
+        index.live = np.zeros(len(index.lengths), dtype=bool)
+        index.live[: len(lengths)] = True
+        index.total_length = float(lengths.sum())
+        for slot, (doc_id, source) in enumerate(zip(index.ids, index.sources, strict=True)):
+            index.slot_of[doc_id] = slot
+            for value in field_values(source, suggest_field) if suggest_field else ():
+                key = normalize(value)
+                index.completions.setdefault(key, set()).add(doc_id)
+                index.completion_trie.add(key)
+        return index
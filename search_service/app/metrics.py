@@ -0,0 +1,149 @@
+"""Prometheus metrics for search_service (served on GET /metrics).
+
+Freshness is tracked twice: consumer lag (messages in library.events the search_group
+has not committed yet, per partition) and end-to-end latency (``produced_at`` stamped
+by core_service -> the moment the event's _bulk was acknowledged by Elasticsearch).
+Every Elasticsearch request is timed (and traced) by ``InstrumentedTransport``, which
+also counts the requests in flight: together with ``ES_MAX_CONNECTIONS`` that is how
+busy the connection pool is (see ``app/database.py``).
+"""
+
+import time
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from aiokafka.admin import AIOKafkaAdminClient
+from elastic_transport import AsyncTransport
+from opentelemetry.trace import SpanKind
+from prometheus_client import Gauge, Histogram
+
+from app.config import settings
+from app.tracing import span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ES_REQUEST_SECONDS = Histogram(
+    "search_es_request_seconds",
+    "Elasticsearch request latency by API endpoint",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+EVENT_LATENCY_SECONDS = Histogram(
+    "search_event_latency_seconds",
+    "Time from the event being produced in core_service to it being indexed",
+    ["index"],
+    buckets=LATENCY_BUCKETS,
+)
+BULK_SIZE = Histogram(
+    "search_bulk_size",
+    "Number of events per _bulk request sent by the consumer",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+POOL_IN_FLIGHT = Gauge(
+    "search_pool_in_flight",
+    "Requests in flight on a pooled client (elasticsearch, core_api)",
+    ["client"],
+)
+CONSUMER_LAG = Gauge(
+    "search_consumer_lag",
+    "Messages in the events topic not yet committed by the consumer group",
+    ["partition"],
+)
+
+
+def endpoint_of(target: str) -> str:
+    """``/books/_search?size=10`` -> ``_search``; index-level admin calls fall back to ``index``."""
+    path = target.split("?", 1)[0]
+    for segment in reversed(path.strip("/").split("/")):
+        if segment.startswith("_"):
+            return segment
+    return "index"
+
+
+class InstrumentedTransport(AsyncTransport):
+    """AsyncTransport that records the latency of every request, including failed ones."""
+
+    in_flight = 0
+    peak_in_flight = 0
+
+    async def perform_request(self, method, target, **kwargs):
+        endpoint = endpoint_of(target)
+        started = time.perf_counter()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        POOL_IN_FLIGHT.labels("elasticsearch").inc()
+        try:
+            with span(
+                f"elasticsearch {endpoint}",
+                kind=SpanKind.CLIENT,
+                **{"db.system": "elasticsearch", "http.method": method, "url.path": target},
+            ):
+                return await super().perform_request(method, target, **kwargs)
+        finally:
+            self.in_flight -= 1
+            POOL_IN_FLIGHT.labels("elasticsearch").dec()
+            ES_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+
+
+def observe_indexed(events: list[dict], index_of: dict[str, str]):
+    """Record end-to-end latency for events that carry core_service's ``produced_at``."""
+    now = time.time()
+    for event in events:
+        produced_at = event.get("produced_at")
+        if produced_at is not None:
+            index = index_of.get(event.get("event"), "unknown")
+            EVENT_LATENCY_SECONDS.labels(index).observe(max(now - produced_at, 0.0))
+
+
+class LagMonitor:
+    """
+    Consumer lag read from Kafka itself (committed offsets of the group vs. end offsets),
+    so the API reports it correctly even when the consumer runs as a separate process.
+    """
+
+    def __init__(self, topic: str, group_id: str):
+        self.topic = topic
+        self.group_id = group_id
+        self.lag: dict[int, int] | None = None
+        self.measured_at: float | None = None
+        self._admin: AIOKafkaAdminClient | None = None
+        self._offsets: AIOKafkaConsumer | None = None
+
+    async def _start(self):
+        admin = AIOKafkaAdminClient(bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
+        offsets = AIOKafkaConsumer(bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
+        await admin.start()
+        await offsets.start()
+        self._admin, self._offsets = admin, offsets
+
+    async def stop(self):
+        if self._admin is not None:
+            await self._admin.close()
+            await self._offsets.stop()
+            self._admin = self._offsets = None
+
+    async def measure(self) -> dict[int, int]:
+        """Refresh per-partition lag; results younger than HEALTH_LAG_CACHE_SECONDS are reused."""
+        now = time.monotonic()
+        if self.lag is not None and now - self.measured_at < settings.HEALTH_LAG_CACHE_SECONDS:
+            return self.lag
+        if self._admin is None:
+            await self._start()
+
+        await self._offsets.topics()  # refresh metadata
+        partitions = [
+            TopicPartition(self.topic, p)
+            for p in sorted(self._offsets.partitions_for_topic(self.topic) or ())
+        ]
+        end_offsets = await self._offsets.end_offsets(partitions) if partitions else {}
+        committed = await self._admin.list_consumer_group_offsets(self.group_id)
+
+        lag = {}
+        for tp in partitions:
+            position = committed.get(tp)
+            # A partition the group never committed is lagging by everything in it
+            start = position.offset if position is not None and position.offset >= 0 else 0
+            lag[tp.partition] = max(end_offsets[tp] - start, 0)
+            CONSUMER_LAG.labels(str(tp.partition)).set(lag[tp.partition])
+
+        self.lag, self.measured_at = lag, now
+        return lag
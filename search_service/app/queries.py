@@ -0,0 +1,133 @@
+"""Query DSL shared by the search endpoints."""
+
+import base64
+import json
+
+from app.config import settings
+
+SEARCH_FIELDS = ["title", "description", "name", "authors.name"]
+
+
+NGRAM_FIELDS = [f"{field}.ngram" for field in SEARCH_FIELDS]
+
+
+def build_query(query: str, mode: str | None = None) -> dict:
+    """
+    Fuzzy full-text match plus a partial-word clause over every searchable field.
+
+    ``wildcard`` mode uses ``*query*`` (a term scan whose cost grows with the index);
+    ``ngram`` mode matches the query words against the edge-ngram subfields instead.
+    """
+    mode = mode or settings.SEARCH_MATCH_MODE
+    if mode == "ngram":
+        partial = {"multi_match": {"query": query, "fields": NGRAM_FIELDS, "operator": "and"}}
+    else:
+        partial = {"query_string": {"query": f"*{query}*", "fields": SEARCH_FIELDS}}
+
+    return {
+        "bool": {
+            "should": [
+                {
+                    "multi_match": {
+                        "query": query,
+                        "fields": SEARCH_FIELDS,
+                        "fuzziness": "AUTO",
+                    }
+                },
+                partial,
+            ],
+            "minimum_should_match": 1,
+        }
+    }
+
+
+def result_size(index: str) -> int:
+    return settings.SEARCH_SIZE_PER_INDEX.get(index, settings.SEARCH_DEFAULT_SIZE)
+
+
+def msearch_body(query: str, indices: tuple[str, ...]) -> list[dict]:
+    """One header/body pair per index, so a single _msearch request covers all of them."""
+    es_query = build_query(query)
+    searches = []
+    for index in indices:
+        searches.append({"index": index})
+        searches.append({"query": es_query, "size": result_size(index)})
+    return searches
+
+
+def search_request(
+    query: str,
+    size: int,
+    includes: list[str] | None = None,
+    excludes: list[str] | None = None,
+    highlight: bool = False,
+) -> dict:
+    """Body of a single-index search: size, capped hit total, _source filtering, highlighting."""
+    request = {
+        "query": build_query(query),
+        "size": size,
+        "track_total_hits": settings.SEARCH_TRACK_TOTAL_HITS,
+    }
+    source = {}
+    if includes:
+        source["includes"] = includes
+    if excludes:
+        source["excludes"] = excludes
+    if source:
+        request["source"] = source
+    if highlight:
+        request["highlight"] = {
+            "fields": {field: {} for field in SEARCH_FIELDS},
+            "require_field_match": False,
+            "fragment_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+        }
+    return request
+
+
+def document(hit: dict) -> dict:
+    """The stored document, plus ``_highlight`` fragments when highlighting was requested."""
+    doc = dict(hit.get("_source") or {})
+    if "highlight" in hit:
+        doc["_highlight"] = hit["highlight"]
+    return doc
+
+
+def hits(response: dict) -> list[dict]:
+    return [document(hit) for hit in response["hits"]["hits"]]
+
+
+# Deterministic order inside a point in time: relevance, then the cheap PIT tie-breaker
+PIT_SORT = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+
+
+def encode_cursor(pit_id: str, sort: list) -> str:
+    payload = json.dumps({"pit": pit_id, "after": sort}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, list]:
+    """Raises ValueError for anything that is not a cursor issued by ``encode_cursor``."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return payload["pit"], payload["after"]
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def split_msearch(indices: tuple[str, ...], response: dict) -> dict[str, list[dict]]:
+    """
+    Map _msearch responses back to their indices.
+
+    A failed sub-search (typically index_not_found_exception) yields an empty list
+    for that index instead of failing the whole request.
+    """
+    results = {}
+    for index, item in zip(indices, response["responses"], strict=True):
+        if "error" in item:
+            error_type = item["error"].get("type", "unknown")
+            if error_type != "index_not_found_exception":
+                print(f"⚠️ Search in '{index}' failed: {error_type}")
+            results[index] = []
+        else:
+            results[index] = hits(item)
+    return results
@@ -0,0 +1,262 @@
+"""Background blue/green reindex pipeline.
+
+Every run builds a fresh versioned index per alias (``books_v{n}``) with bulk-load
+settings, streams Core Service into it, replays Kafka events that arrived meanwhile,
+restores live settings, force-merges, and only then swaps the aliases atomically.
+Search keeps hitting the previous version until the swap.
+"""
+
+import asyncio
+import time
+import uuid
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+
+from app import indices
+from app.cache import query_cache
+from app.config import settings
+from app.database import CoreClient, core_client, es_client
+from app.events import EventDecodeError, decode_event
+from app.kafka_consumer import EVENTS_TOPIC, index_batch
+from app.retry import backoff_delay, is_transient_item
+
+# Which Core Service endpoint feeds which alias, and the event each row is replayed as.
+# Authors go first so that books are indexed with their author names already known.
+SOURCES = (
+    ("authors", "/authors/", "author_created"),
+    ("books", "/books/", "book_created"),
+)
+
+# Status of the current (or last finished) reindex job
+current_job: dict | None = None
+_job_task: asyncio.Task | None = None
+
+
+def job_status() -> dict | None:
+    """Return a snapshot of the current job with its throughput."""
+    if current_job is None:
+        return None
+    finished = current_job["finished_at"] or time.time()
+    elapsed = max(finished - current_job["started_at"], 1e-6)
+    total = sum(current_job["indexed"].values())
+    return {
+        **current_job,
+        "indexed": dict(current_job["indexed"]),
+        "targets": dict(current_job["targets"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(total / elapsed, 1),
+    }
+
+
+def is_running() -> bool:
+    return current_job is not None and current_job["status"] == "running"
+
+
+def start_reindex() -> dict:
+    """Create a new job and schedule it on the event loop."""
+    global current_job, _job_task
+    current_job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "running",
+        "phase": "preparing",
+        "started_at": time.time(),
+        "finished_at": None,
+        "targets": {},
+        "indexed": {alias: 0 for alias, _, _ in SOURCES},
+        "replayed": 0,
+        "errors": 0,
+        "error": None,
+    }
+    _job_task = asyncio.create_task(run_reindex(current_job))
+    return job_status()
+
+
+def _decoded(msg) -> dict | None:
+    """The event of a message; unreadable ones are skipped (the consumer dead-letters them)."""
+    try:
+        return decode_event(msg.value, msg.headers)
+    except EventDecodeError:
+        return None
+
+
+class EventReplayer:
+    """
+    Re-applies library.events published while a new index version is being built.
+
+    Offsets are snapshotted before Core Service is read; every ``replay`` call
+    indexes everything between the last snapshot and the current end of the topic.
+    """
+
+    def __init__(self):
+        self.consumer = AIOKafkaConsumer(
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+            enable_auto_commit=False,
+        )
+        self.partitions: list[TopicPartition] = []
+        self.offsets: dict[TopicPartition, int] = {}
+
+    async def start(self):
+        await self.consumer.start()
+        await self.consumer.topics()  # refresh metadata
+        partitions = self.consumer.partitions_for_topic(EVENTS_TOPIC) or set()
+        self.partitions = [TopicPartition(EVENTS_TOPIC, p) for p in sorted(partitions)]
+        if self.partitions:
+            self.consumer.assign(self.partitions)
+            self.offsets = await self.consumer.end_offsets(self.partitions)
+
+    async def stop(self):
+        await self.consumer.stop()
+
+    async def replay(self, targets: dict[str, str]) -> int:
+        if not self.partitions:
+            return 0
+
+        end_offsets = await self.consumer.end_offsets(self.partitions)
+        pending = {tp for tp in self.partitions if self.offsets[tp] < end_offsets[tp]}
+        for tp in pending:
+            self.consumer.seek(tp, self.offsets[tp])
+
+        replayed = 0
+        while pending:
+            records = await self.consumer.getmany(
+                *pending, timeout_ms=1000, max_records=settings.REINDEX_PAGE_SIZE
+            )
+            events = []
+            for tp, messages in records.items():
+                events.extend(
+                    event
+                    for m in messages
+                    if m.offset < end_offsets[tp] and (event := _decoded(m)) is not None
+                )
+            for tp in list(pending):
+                if await self.consumer.position(tp) >= end_offsets[tp]:
+                    pending.discard(tp)
+
+            await index_batch(events, targets)
+            replayed += len(events)
+
+        self.offsets = end_offsets
+        return replayed
+
+
+async def fetch_pages(http: CoreClient, path: str, page_size: int):
+    """Yield pages from a keyset-paginated Core Service endpoint until it runs dry."""
+    after = None
+    while True:
+        params = {"limit": page_size}
+        if after is not None:
+            params["after"] = after
+        resp = await http.get(f"{settings.CORE_API_URL}{path}", params=params)
+        resp.raise_for_status()
+        page = resp.json()
+        if not page:
+            return
+
+        yield page
+
+        if len(page) < page_size:
+            return
+        after = page[-1].get("_id") or page[-1].get("id")
+
+
+async def load_index(http: CoreClient, job: dict, alias: str, path: str, event_type: str):
+    """Stream one source into its new index, keeping a bounded number of _bulk requests in flight."""
+    in_flight = asyncio.Semaphore(settings.REINDEX_MAX_IN_FLIGHT)
+    tasks: set[asyncio.Task] = set()
+    failures: list[BaseException] = []
+
+    def finished(task: asyncio.Task):
+        tasks.discard(task)
+        # A failed _bulk page must fail the job, or the aliases swap onto an incomplete index
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+
+    async def send(page: list[dict]):
+        try:
+            events = [{"event": event_type, "data": doc} for doc in page]
+            errors = await index_batch(events, job["targets"])
+            # Documents rejected for overload (429) are sent again, like in index_resilient
+            attempt = 1
+            while attempt < settings.CONSUMER_RETRY_MAX_ATTEMPTS and any(
+                is_transient_item(error) for error in errors
+            ):
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                retry = [error["event"] for error in errors if is_transient_item(error)]
+                errors = [error for error in errors if not is_transient_item(error)]
+                errors += await index_batch(retry, job["targets"])
+            job["indexed"][alias] += len(page) - len(errors)
+            job["errors"] += len(errors)
+        finally:
+            in_flight.release()
+
+    try:
+        async for page in fetch_pages(http, path, settings.REINDEX_PAGE_SIZE):
+            if failures:
+                break
+            # Backpressure: don't fetch further than REINDEX_MAX_IN_FLIGHT pages ahead of ES
+            await in_flight.acquire()
+            task = asyncio.create_task(send(page))
+            tasks.add(task)
+            task.add_done_callback(finished)
+    finally:
+        # Let the requests already sent finish; their errors are collected by finished()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if failures:
+        raise failures[0]
+
+
+async def _replay(replayer: EventReplayer | None, job: dict):
+    if replayer is not None:
+        job["replayed"] += await replayer.replay(job["targets"])
+
+
+async def run_reindex(job: dict):
+    replayer = EventReplayer() if settings.REINDEX_REPLAY_EVENTS else None
+    try:
+        if replayer is not None:
+            await replayer.start()
+
+        for alias, _, _ in SOURCES:
+            version = await indices.next_version(alias)
+            job["targets"][alias] = await indices.create_index(alias, version, bulk_load=True)
+
+        job["phase"] = "loading"
+        for alias, path, event_type in SOURCES:
+            await load_index(core_client, job, alias, path, event_type)
+
+        # An index with missing documents must not replace the complete one
+        if job["errors"]:
+            raise RuntimeError(f"{job['errors']} documents were not indexed")
+
+        job["phase"] = "replaying"
+        await _replay(replayer, job)
+
+        job["phase"] = "finalizing"
+        for new_index in job["targets"].values():
+            await indices.finalize_index(new_index)
+
+        job["phase"] = "swapping"
+        previous = await indices.swap_aliases(job["targets"])
+
+        # Events that reached the old index between the replay and the swap
+        await _replay(replayer, job)
+        await query_cache.clear()
+
+        for old_index in previous:
+            await es_client.indices.delete(index=old_index, ignore_unavailable=True)
+
+        job["status"] = "completed"
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = repr(exc)
+        print(f"❌ Reindex {job['job_id']} failed in phase '{job['phase']}': {exc!r}")
+        if job["phase"] != "swapping":
+            for new_index in job["targets"].values():
+                await es_client.indices.delete(index=new_index, ignore_unavailable=True)
+    finally:
+        job["phase"] = "done"
+        job["finished_at"] = time.time()
+        if replayer is not None:
+            await replayer.stop()
+        print(f"🔁 Reindex {job['job_id']}: {job['status']}, indexed {job['indexed']}")
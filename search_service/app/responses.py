@@ -0,0 +1,36 @@
+"""Fast JSON responses for the search endpoints (FAST_JSON_RESPONSES).
+
+Search results are plain dicts straight from Elasticsearch (or the memory index), so
+the default path, where FastAPI runs ``jsonable_encoder`` over every hit and then
+``json.dumps``, copies each document once for nothing. With the setting on, endpoints
+hand the documents to orjson as they are.
+"""
+
+from typing import Any
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def json_response(content: Any, response: Response | None = None) -> Any:
+    """
+    ``content`` as a ready FastJSONResponse when FAST_JSON_RESPONSES is on, carrying
+    the headers the endpoint already set on ``response``; otherwise ``content`` itself
+    for FastAPI to encode.
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return content
+    fast = FastJSONResponse(content)
+    if response is not None:
+        fast.raw_headers.extend(response.raw_headers)
+    return fast
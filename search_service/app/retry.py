@@ -0,0 +1,110 @@
+"""
+Классификация ошибок Эластика, повторы через экспоненциально растущие паузы и перезапуск фоновых задач.
+
+Временные ошибки (429, 502-504, таймауты, обрыв соединения) повторяем: кластер
+перегружен или недоступен, и через какое-то время запрос пройдет. Остальные ошибки
+(например, mapper_parsing_exception на кривом документе) повтор не исправит.
+"""
+
+import asyncio
+import random
+from collections.abc import Awaitable, Callable
+
+from elasticsearch import ApiError, TransportError
+
+from app.config import settings
+
+# HTTP-статусы, при которых Эластик просит прийти позже
+TRANSIENT_STATUSES = {429, 502, 503, 504}
+# Ошибки отдельных документов в ответе _bulk, которые тоже лечатся повтором
+TRANSIENT_ITEM_ERRORS = {"es_rejected_execution_exception", "circuit_breaking_exception"}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Ошибка запроса целиком: таймаут, обрыв соединения или статус из TRANSIENT_STATUSES."""
+    if isinstance(exc, TransportError):
+        return True
+    if isinstance(exc, ApiError):
+        return exc.meta.status in TRANSIENT_STATUSES
+    return False
+
+
+def is_transient_item(result: dict) -> bool:
+    """Ошибка одного документа из ответа _bulk."""
+    if result.get("status") in TRANSIENT_STATUSES:
+        return True
+    return (result.get("error") or {}).get("type") in TRANSIENT_ITEM_ERRORS
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Пауза перед попыткой номер attempt (первая - 1): экспонента от CONSUMER_RETRY_BASE_DELAY,
+    ограниченная CONSUMER_RETRY_MAX_DELAY. Половина паузы случайная, чтобы воркеры
+    и процессы не били в кластер одновременно.
+    """
+    delay = min(
+        settings.CONSUMER_RETRY_MAX_DELAY, settings.CONSUMER_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def retry_transient(call: Callable[..., Awaitable], *args, **kwargs):
+    """
+    Вызывает call(*args, **kwargs); при временных ошибках повторяет,
+    всего до CONSUMER_RETRY_MAX_ATTEMPTS попыток.
+    """
+    attempt = 1
+    while True:
+        try:
+            return await call(*args, **kwargs)
+        except Exception as exc:
+            if not is_transient(exc) or attempt >= settings.CONSUMER_RETRY_MAX_ATTEMPTS:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"⏳ Временная ошибка Эластика: {exc!r}, повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class AdaptiveLimit:
+    """
+    Размер одного _bulk: вдвое меньше после каждого отказа по перегрузке,
+    вдвое больше после каждого успешного запроса (но не больше maximum).
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.value = self.maximum
+
+    def shrink(self) -> int:
+        self.value = max(self.minimum, self.value // 2)
+        return self.value
+
+    def grow(self) -> int:
+        self.value = min(self.maximum, self.value * 2)
+        return self.value
+
+
+async def supervise(name: str, factory: Callable[[], Awaitable[None]]):
+    """
+    Запускает фоновую задачу и перезапускает после падения, выдерживая такие же паузы, как при повторах.
+    Задача, которая завершилась сама, не перезапускается; отмена проходит насквозь.
+    Счетчик попыток обнуляется, если задача до падения проработала дольше CONSUMER_RETRY_MAX_DELAY.
+    """
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        started = loop.time()
+        try:
+            await factory()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if loop.time() - started > settings.CONSUMER_RETRY_MAX_DELAY:
+                attempt = 0
+            attempt += 1
+            delay = backoff_delay(attempt)
+            print(f"💥 {name} упал: {exc!r}. Перезапуск через {delay:.1f} с (попытка {attempt})")
+            await asyncio.sleep(delay)
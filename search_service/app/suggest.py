@@ -0,0 +1,81 @@
+"""Typeahead suggestions from the completion subfields.
+
+Every index is asked through one ``_msearch`` with a completion suggester per
+index. ``RequestCoalescer`` cancels a client's previous in-flight lookup as soon
+as the next keystroke arrives, so only the latest prefix reaches the user.
+"""
+
+import asyncio
+from collections.abc import Awaitable
+
+from app.indices import SUGGEST_FIELDS
+
+
+class SupersededError(Exception):
+    """A newer request from the same client replaced this one."""
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._latest: dict[str, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._latest)
+
+    async def run(self, client_id: str, work: Awaitable):
+        """Run ``work`` for ``client_id``, cancelling whatever that client is still waiting for."""
+        previous = self._latest.get(client_id)
+        if previous is not None:
+            previous.cancel()
+
+        task = asyncio.ensure_future(work)
+        self._latest[client_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # The task was cancelled by a newer request, not by our own caller
+            if task.cancelled() and self._latest.get(client_id) is not task:
+                raise SupersededError from None
+            raise
+        finally:
+            if self._latest.get(client_id) is task:
+                del self._latest[client_id]
+
+
+def suggest_body(prefix: str, indices: tuple[str, ...], size: int) -> list[dict]:
+    searches = []
+    for index in indices:
+        searches.append({"index": index})
+        searches.append(
+            {
+                "size": 0,
+                "_source": False,
+                "suggest": {
+                    "suggestions": {
+                        "prefix": prefix,
+                        "completion": {
+                            "field": SUGGEST_FIELDS[index],
+                            "size": size,
+                            "skip_duplicates": True,
+                        },
+                    }
+                },
+            }
+        )
+    return searches
+
+
+def split_suggestions(indices: tuple[str, ...], response: dict) -> dict[str, list[dict]]:
+    """Options per index; an index that failed (e.g. does not exist yet) has none."""
+    results = {}
+    for index, item in zip(indices, response["responses"], strict=True):
+        entries = item.get("suggest", {}).get("suggestions", []) if "error" not in item else []
+        results[index] = [
+            {"text": option["text"], "_id": option["_id"]}
+            for entry in entries
+            for option in entry["options"]
+        ]
+    return results
+
+
+coalescer = RequestCoalescer()
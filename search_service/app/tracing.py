@@ -0,0 +1,169 @@
+"""Tracing (OpenTelemetry) for the search API, the consumer and Elasticsearch calls.
+
+core_service puts the W3C ``traceparent`` of the write into the Kafka message headers;
+the consumer continues that trace with one CONSUMER span per message, so a single
+trace covers POST /books/ -> Kafka -> _bulk. The _bulk itself runs under a batch span
+linked to every message it contains.
+
+Tracing is off by default (TRACING_EXPORTER=none) and costs a no-op call per span.
+When enabled, TRACING_SAMPLE_RATE of root traces are recorded; messages inherit the
+decision made in core_service.
+"""
+
+import time
+from collections.abc import Iterable
+from contextlib import contextmanager
+from typing import Any
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import Link, SpanKind, Status, StatusCode
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from starlette.requests import Request
+
+from app.config import settings
+
+SERVICE_NAME = "search_service"
+
+_propagator = TraceContextTextMapPropagator()
+_provider: TracerProvider | None = None
+_tracer: trace.Tracer = trace.NoOpTracer()
+
+
+def _configured_exporter() -> SpanExporter | None:
+    if settings.TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if settings.TRACING_EXPORTER == "otlp":
+        # Optional dependency: pip install opentelemetry-exporter-otlp-proto-http
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as exc:
+            raise RuntimeError(
+                "TRACING_EXPORTER=otlp requires opentelemetry-exporter-otlp-proto-http"
+            ) from exc
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    return None
+
+
+def setup_tracing(
+    exporter: SpanExporter | None = None, sample_rate: float | None = None, batch: bool = True
+):
+    """Enable tracing; tests pass an InMemorySpanExporter with ``batch=False``."""
+    global _provider, _tracer
+    exporter = exporter or _configured_exporter()
+    if exporter is None:
+        return
+    rate = settings.TRACING_SAMPLE_RATE if sample_rate is None else sample_rate
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(rate)),
+    )
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _provider.add_span_processor(processor)
+    _tracer = _provider.get_tracer(SERVICE_NAME)
+
+
+def shutdown_tracing():
+    """Flush pending spans and fall back to the no-op tracer."""
+    global _provider, _tracer
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = None
+    _tracer = trace.NoOpTracer()
+
+
+@contextmanager
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, context=None, **attributes):
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    with _tracer.start_as_current_span(
+        name, context=context, kind=kind, attributes=attributes
+    ) as current:
+        yield current
+
+
+def context_from_headers(headers: Iterable[tuple[str, bytes]] | None):
+    """Trace context from Kafka record headers (None-safe, ignores undecodable values)."""
+    carrier = {}
+    for key, value in headers or ():
+        if isinstance(value, bytes):
+            carrier[key] = value.decode("utf-8", errors="replace")
+    return _propagator.extract(carrier)
+
+
+@contextmanager
+def consume_spans(records: list[tuple[Any, dict]]):
+    """
+    A CONSUMER span per (message, decoded event) whose message carries a trace context,
+    continuing the trace started in core_service, plus a batch span (current while
+    indexing) linked to them.
+    """
+    started = []
+    links = []
+    for msg, event in records:
+        context = context_from_headers(getattr(msg, "headers", None))
+        parent = trace.get_current_span(context).get_span_context()
+        if not parent.is_valid:
+            continue
+        links.append(Link(parent))
+        started.append(
+            _tracer.start_span(
+                f"index {event.get('event')}",
+                context=context,
+                kind=SpanKind.CONSUMER,
+                attributes={
+                    "messaging.kafka.partition": msg.partition,
+                    "messaging.offset": msg.offset,
+                },
+            )
+        )
+
+    try:
+        with _tracer.start_as_current_span(
+            "consume batch",
+            kind=SpanKind.CONSUMER,
+            links=links,
+            attributes={"messaging.batch.message_count": len(records)},
+        ) as batch:
+            yield batch
+    except Exception as exc:
+        for message_span in started:
+            message_span.record_exception(exc)
+            message_span.set_status(Status(StatusCode.ERROR))
+        raise
+    finally:
+        for message_span in started:
+            message_span.end()
+
+
+async def trace_requests(request: Request, call_next):
+    """
+    HTTP middleware: a span per request (continuing an incoming traceparent) and a
+    Server-Timing header, which is set even with tracing off.
+    """
+    started = time.perf_counter()
+    context = _propagator.extract(dict(request.headers))
+    with span(
+        f"{request.method} {request.url.path}",
+        kind=SpanKind.SERVER,
+        context=context,
+        **{"http.method": request.method, "http.target": request.url.path},
+    ) as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None and current.is_recording():
+            current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.route", route.path)
+        current.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            current.set_status(Status(StatusCode.ERROR))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    response.headers["Server-Timing"] = f"app;dur={elapsed_ms:.1f}"
+    return response
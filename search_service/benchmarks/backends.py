@@ -0,0 +1,202 @@
+"""Compare the search backends: query latency, memory and restart time.
+
+Builds the same synthetic books corpus in ``MemoryBackend`` (and, with
+``--elasticsearch``, in a throwaway index behind a running ELASTIC_URL) and fires the
+same mix of full-word, typo and prefix queries plus completion lookups at each.
+For the memory backend it also reports the heap taken by the indexes (tracemalloc,
+NumPy arrays included), the snapshot size on disk and how long a save and a
+load from the snapshot take.
+
+    cd search_service
+    python -m benchmarks.backends --docs 100000 --queries 2000
+    python -m benchmarks.backends --docs 100000 --queries 2000 --elasticsearch
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from elasticsearch import AsyncElasticsearch
+
+from app.backends import MemoryBackend
+from app.config import settings
+from app.indices import ANALYSIS, INDEX_MAPPINGS
+from app.kafka_consumer import INDEXED_EVENTS
+from app.queries import build_query
+
+BENCH_INDEX = "bench_backends"
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice("aeiou") + word[position + 1 :]
+
+
+def corpus(docs: int, queries: int, seed: int) -> tuple[list[dict], list[str], list[str]]:
+    """book_created events, search queries (word / typo / prefix) and completion prefixes."""
+    rng = random.Random(seed)
+    events, words, titles = [], [], []
+    for n in range(docs):
+        title = " ".join(_word(rng) for _ in range(rng.randint(2, 5)))
+        description = " ".join(_word(rng) for _ in range(rng.randint(15, 40)))
+        events.append(
+            {
+                "event": "book_created",
+                "data": {"_id": f"{n:024x}", "title": title, "description": description},
+            }
+        )
+        words.append(rng.choice(title.split()))
+        titles.append(title)
+
+    search_queries = []
+    for word in rng.choices(words, k=queries):
+        kind = rng.randrange(3)
+        if kind == 1 and len(word) > 5:
+            word = _typo(rng, word)
+        elif kind == 2:
+            word = word[: rng.randint(3, max(3, len(word) - 1))]
+        search_queries.append(word)
+    prefixes = [title[: rng.randint(2, 6)] for title in rng.choices(titles, k=queries)]
+    return events, search_queries, prefixes
+
+
+def _summary(name: str, latencies: list[float]) -> str:
+    cuts = statistics.quantiles(latencies, n=100)
+    return (
+        f"{name:<28} p50 {cuts[49]:7.3f} ms  p95 {cuts[94]:7.3f} ms  p99 {cuts[98]:7.3f} ms"
+        f"  {len(latencies) / (sum(latencies) / 1000):8.0f} q/s"
+    )
+
+
+async def _timed(call, arguments: list) -> list[float]:
+    latencies = []
+    for argument in arguments:
+        started = time.perf_counter()
+        await call(argument)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def bench_memory(events: list[dict], queries: list[str], prefixes: list[str]):
+    # Heap from a traced build; the build time from an untraced one (tracing slows it down)
+    tracemalloc.start()
+    traced = MemoryBackend()
+    traced.apply(events, INDEXED_EVENTS)
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    started = time.perf_counter()
+    backend = MemoryBackend()
+    backend.apply(events, INDEXED_EVENTS)
+    built = time.perf_counter() - started
+    print(f"memory: indexed {len(events)} docs in {built:.1f} s, heap {heap / 2**20:.0f} MiB")
+
+    await _timed(lambda q: backend.search("books", q, 10), queries[:50])  # warm-up
+    print(
+        _summary("memory search", await _timed(lambda q: backend.search("books", q, 10), queries))
+    )
+    print(
+        _summary(
+            "memory suggest",
+            await _timed(lambda p: backend.suggest(p, ("books",), 5), prefixes),
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        backend.snapshot_dir = Path(directory)
+        started = time.perf_counter()
+        backend.save()
+        saved = time.perf_counter() - started
+        size = sum(path.stat().st_size for path in Path(directory).rglob("*") if path.is_file())
+
+        restored = MemoryBackend(directory)
+        started = time.perf_counter()
+        await restored.start()
+        loaded = time.perf_counter() - started
+        print(
+            f"memory snapshot: {size / 2**20:.0f} MiB on disk, save {saved:.2f} s,"
+            f" load {loaded:.2f} s (vs. {built:.1f} s to index from events)"
+        )
+        print(
+            _summary(
+                "memory search (mmap)",
+                await _timed(lambda q: restored.search("books", q, 10), queries),
+            )
+        )
+
+
+async def bench_elasticsearch(events: list[dict], queries: list[str], prefixes: list[str]):
+    es = AsyncElasticsearch(settings.ELASTIC_URL, request_timeout=120)
+    try:
+        await es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+        await es.indices.create(
+            index=BENCH_INDEX,
+            settings={"analysis": ANALYSIS, "refresh_interval": "-1", "number_of_replicas": 0},
+            mappings=INDEX_MAPPINGS["books"],
+        )
+        started = time.perf_counter()
+        for start in range(0, len(events), 5000):
+            operations = []
+            for event in events[start : start + 5000]:
+                document = dict(event["data"])
+                operations.append({"index": {"_index": BENCH_INDEX, "_id": document.pop("_id")}})
+                operations.append(document)
+            await es.bulk(operations=operations)
+        await es.indices.refresh(index=BENCH_INDEX)
+        await es.indices.forcemerge(index=BENCH_INDEX, max_num_segments=1)
+        built = time.perf_counter() - started
+
+        stats = await es.indices.stats(index=BENCH_INDEX, metric="store,segments")
+        primaries = stats["_all"]["primaries"]
+        print(
+            f"elasticsearch: indexed {len(events)} docs in {built:.1f} s,"
+            f" store {primaries['store']['size_in_bytes'] / 2**20:.0f} MiB"
+        )
+
+        async def search(query):
+            await es.search(index=BENCH_INDEX, query=build_query(query), size=10)
+
+        async def suggest(prefix):
+            await es.search(
+                index=BENCH_INDEX,
+                suggest={
+                    "s": {"prefix": prefix, "completion": {"field": "title.suggest", "size": 5}}
+                },
+                size=0,
+            )
+
+        await _timed(search, queries[:50])  # warm-up
+        print(_summary("elasticsearch search", await _timed(search, queries)))
+        print(_summary("elasticsearch suggest", await _timed(suggest, prefixes)))
+    finally:
+        await es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+        await es.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--elasticsearch", action="store_true", help="also run against ELASTIC_URL")
+    args = parser.parse_args()
+
+    events, queries, prefixes = corpus(args.docs, args.queries, args.seed)
+    await bench_memory(events, queries, prefixes)
+    if args.elasticsearch:
+        await bench_elasticsearch(events, queries, prefixes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Compare event body formats: bytes per message and encode/decode time.
+
+Runs offline (no Kafka needed): encodes synthetic book events the way core_service
+does and decodes them the way the consumer does, for every EVENT_CONTENT_TYPE /
+EVENT_COMPRESSION combination, plus the old ``json.dumps``/``json.loads`` baseline.
+
+    cd search_service
+    python -m benchmarks.event_codecs --events 50000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from app.events import JSON, MSGPACK, ZLIB, content_headers, decode_event, envelope, serializer
+
+WORDS = ["war", "peace", "anna", "karenina", "idiot", "demons", "brothers", "crime", "fathers"]
+
+
+def _event(rng: random.Random, n: int) -> dict:
+    return envelope(
+        "book_created",
+        {
+            "_id": f"{n:024x}",
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))),
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))),
+            "year": rng.randint(1800, 2024),
+            "author_ids": [f"{rng.getrandbits(96):024x}" for _ in range(rng.randint(1, 3))],
+            "version": 1,
+        },
+        time.time(),
+    )
+
+
+def _measure(name: str, events: list[dict], encode, decode) -> str:
+    started = time.perf_counter()
+    payloads = [encode(event) for event in events]
+    encoded = time.perf_counter()
+    for payload in payloads:
+        decode(payload)
+    decoded = time.perf_counter()
+
+    per_event = 1_000_000 / len(events)
+    return (
+        f"{name:<28} {sum(map(len, payloads)) / len(events):8.0f} B/event"
+        f"  encode {(encoded - started) * per_event:6.2f} µs"
+        f"  decode {(decoded - encoded) * per_event:6.2f} µs"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    events = [_event(rng, n) for n in range(args.events)]
+
+    print(
+        _measure(
+            "json (stdlib, before)",
+            events,
+            lambda event: json.dumps(event).encode("utf-8"),
+            lambda payload: json.loads(payload.decode("utf-8")),
+        )
+    )
+    for content_type in (JSON, MSGPACK):
+        for compression in (None, ZLIB):
+            headers = content_headers(content_type, compression)
+            print(
+                _measure(
+                    f"{content_type.split('/')[1]}{'+' + compression if compression else ''}",
+                    events,
+                    serializer(content_type, compression),
+                    lambda payload, headers=headers: decode_event(payload, headers),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
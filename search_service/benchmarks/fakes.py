@@ -0,0 +1,206 @@
+"""In-memory stand-ins for Elasticsearch and Kafka used by ``benchmarks/load.py``.
+
+``FakeElasticsearch`` implements the calls the consumer and ``ElasticsearchBackend``
+make (``bulk``, ``index``, ``mget``, ``update_by_query``, ``search``, ``msearch``) on top
+of a ``MemoryBackend``, so versions, partial updates and author names behave as they do
+in the real indexes. ``FakeConsumer`` replays a fixed list of records from one partition.
+Every call that is awaited costs ``latency_ms`` first, standing in for the network and
+the server.
+"""
+
+import asyncio
+
+from aiokafka import TopicPartition
+from elasticsearch import ConflictError, NotFoundError
+
+from app.backends import MemoryBackend
+
+
+async def _pause(latency_ms: float):
+    await asyncio.sleep(latency_ms / 1000)
+
+
+def _query_text(query: dict) -> str:
+    """The user's query inside ``build_query``'s bool/should: the full-text multi_match clause."""
+    for clause in query["bool"]["should"]:
+        if "multi_match" in clause:
+            return clause["multi_match"]["query"]
+    raise ValueError("FakeElasticsearch only understands queries from app.queries.build_query")
+
+
+def _hit(doc: dict) -> dict:
+    hit = {"_source": {key: value for key, value in doc.items() if key != "_highlight"}}
+    if "_highlight" in doc:
+        hit["highlight"] = doc["_highlight"]
+    return hit
+
+
+class FakeElasticsearch:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.store = MemoryBackend()
+
+    def options(self, **kwargs) -> "FakeElasticsearch":
+        return self
+
+    async def ping(self) -> bool:
+        await _pause(self.latency_ms)
+        return True
+
+    async def close(self):
+        pass
+
+    def _apply(self, index: str, action: str, doc_id: str, data: dict) -> bool:
+        event_type = f"{index}_{action}"
+        event = {"event": event_type, "data": {**data, "_id": doc_id}}
+        return self.store.apply([event], {event_type: index}) == 1
+
+    def _exists(self, index: str, doc_id: str) -> bool:
+        found = self.store.indices.get(index)
+        return found is not None and found.get(doc_id) is not None
+
+    # --- Writes ---
+
+    async def bulk(self, operations: list[dict], **kwargs) -> dict:
+        await _pause(self.latency_ms)
+        items = []
+        operations = iter(operations)
+        for action in operations:
+            ((op, meta),) = action.items()
+            index, doc_id = meta["_index"], str(meta["_id"])
+            result = {"_index": index, "_id": doc_id, "status": 200}
+            if op == "delete":
+                if not self._apply(index, "deleted", doc_id, {}):
+                    result["status"] = 404
+            elif op == "update":
+                params = next(operations)["script"]["params"]
+                if not self._exists(index, doc_id):
+                    result["status"] = 404
+                    result["error"] = {"type": "document_missing_exception"}
+                else:
+                    self._apply(
+                        index,
+                        "updated",
+                        doc_id,
+                        {**params["changes"], "version": params["version"]},
+                    )
+            elif not self._apply(index, "created", doc_id, next(operations)):
+                result["status"] = 409
+                result["error"] = {"type": "version_conflict_engine_exception"}
+            items.append({op: result})
+        return {
+            "errors": any("error" in next(iter(item.values())) for item in items),
+            "items": items,
+        }
+
+    async def index(self, index: str, id: str, document: dict, **kwargs) -> dict:
+        await _pause(self.latency_ms)
+        if not self._apply(index, "created", str(id), document):
+            raise ConflictError(409, "version_conflict_engine_exception", body={})
+        return {"_index": index, "_id": id, "result": "created"}
+
+    async def mget(self, index: str, ids: list[str], **kwargs) -> dict:
+        await _pause(self.latency_ms)
+        found = self.store.indices.get(index)
+        docs = []
+        for doc_id in ids:
+            source = found.get(doc_id) if found is not None else None
+            docs.append({"_id": doc_id, "found": source is not None, "_source": source or {}})
+        return {"docs": docs}
+
+    async def update_by_query(self, index: str, script: dict, **kwargs) -> dict:
+        # MemoryBackend already re-indexed the books of renamed authors; only count them
+        await _pause(self.latency_ms)
+        names = script["params"]["names"]
+        updated = sum(len(self.store.books_by_author.get(aid, ())) for aid in names)
+        return {"updated": updated}
+
+    # --- Reads ---
+
+    async def _search(self, index: str, body: dict) -> dict:
+        source = body.get("source") or {}
+        found = await self.store.search(
+            index,
+            _query_text(body["query"]),
+            body.get("size", 10),
+            source.get("includes"),
+            source.get("excludes"),
+            "highlight" in body,
+        )
+        if found is None:
+            raise NotFoundError(404, "index_not_found_exception", body={})
+        return {"hits": {"total": found["total"], "hits": [_hit(d) for d in found["documents"]]}}
+
+    async def search(self, index: str, **body) -> dict:
+        await _pause(self.latency_ms)
+        return await self._search(index, body)
+
+    async def msearch(self, searches: list[dict], **kwargs) -> dict:
+        await _pause(self.latency_ms)
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2], strict=True):
+            index = header["index"]
+            if "suggest" in body:
+                suggester = body["suggest"]["suggestions"]
+                size = suggester["completion"]["size"]
+                options = (await self.store.suggest(suggester["prefix"], (index,), size))[index]
+                responses.append({"suggest": {"suggestions": [{"options": options}]}})
+                continue
+            try:
+                responses.append(await self._search(index, body))
+            except NotFoundError:
+                responses.append({"error": {"type": "index_not_found_exception"}})
+        return {"responses": responses}
+
+
+class FakeConsumer:
+    """Stands in for ``AIOKafkaConsumer``: hands out ``records`` once, then waits."""
+
+    def __init__(self, records: list, latency_ms: float = 0.0, **config):
+        self.records = records
+        self.latency_ms = latency_ms
+        self.position = 0
+        self.committed = 0
+        self.listener = None
+        # Set once every record has been handed out and the consumer asks for more
+        self.drained = asyncio.Event()
+
+    def subscribe(self, topics: list[str], listener=None):
+        self.partition = TopicPartition(topics[0], 0)
+        self.listener = listener
+
+    async def start(self):
+        if self.listener is not None:
+            await self.listener.on_partitions_assigned({self.partition})
+
+    async def stop(self):
+        pass
+
+    async def seek_to_beginning(self, *partitions):
+        self.position = 0
+
+    async def commit(self):
+        await _pause(self.latency_ms)
+        self.committed = self.position
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int | None = None) -> dict:
+        await _pause(self.latency_ms)
+        if self.position >= len(self.records):
+            self.drained.set()
+            await asyncio.sleep(timeout_ms / 1000)
+            return {}
+        end = len(self.records) if max_records is None else self.position + max_records
+        batch = self.records[self.position : end]
+        self.position += len(batch)
+        return {self.partition: batch}
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.position >= len(self.records):
+            self.drained.set()
+            await asyncio.Event().wait()
+        await _pause(self.latency_ms)
+        self.position += 1
+        return self.records[self.position - 1]
@@ -0,0 +1,251 @@
+"""Load-test search_service without Kafka or Elasticsearch: consumer throughput and query latency.
+
+The real consumer loop (``consume_events``) reads from ``FakeConsumer`` and writes to
+``FakeElasticsearch`` (or to a ``MemoryBackend`` with ``--backend memory``), both with
+an injectable per-call latency (benchmarks/fakes.py). Then the API is driven through
+ASGI with a mix of /search/, /search/all/ and /suggest/ requests built from the
+indexed titles. Reports events/s through the consumer, p50/p95/p99 per endpoint and
+peak RSS; ``--out`` saves them as JSON and ``--baseline`` compares with a saved run.
+
+Events are either synthetic (``--authors``/``--books``/``--updates``) or the messages
+core_service produced in its own load test (``--events``), so both halves of the
+pipeline can run on the same catalog:
+
+    cd core_service && python -m benchmarks.load --books 10000 --events-out ../events.jsonl
+    cd search_service
+    python -m benchmarks.load --events ../events.jsonl --out load-search.json
+    python -m benchmarks.load --books 10000 --backend memory --baseline load-search.json
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import random
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from aiokafka.structs import ConsumerRecord
+from benchmarks.fakes import FakeConsumer, FakeElasticsearch
+from benchmarks.report import compare, latency_summary, peak_rss_mib, save
+from httpx import ASGITransport, AsyncClient
+
+from app.backends import ElasticsearchBackend, MemoryBackend
+from app.cache import query_cache
+from app.config import settings
+from app.events import JSON, content_headers, envelope, serializer
+from app.kafka_consumer import EVENTS_TOPIC, consume_events
+from app.main import app
+
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)
+    )
+
+
+def _record(offset: int, key: str | None, value: bytes, headers: list) -> ConsumerRecord:
+    key_bytes = key.encode() if key is not None else None
+    return ConsumerRecord(
+        EVENTS_TOPIC,
+        partition=0,
+        offset=offset,
+        timestamp=0,
+        timestamp_type=0,
+        key=key_bytes,
+        value=value,
+        checksum=None,
+        serialized_key_size=len(key_bytes or b""),
+        serialized_value_size=len(value),
+        headers=tuple(headers),
+    )
+
+
+def synthetic_records(authors: int, books: int, updates: float, seed: int) -> list:
+    """The events core_service would produce for such a catalog, encoded as it encodes them."""
+    rng = random.Random(seed)
+    encode, headers = serializer(JSON), content_headers(JSON)
+    events = []
+    author_ids = [f"a{n:023x}" for n in range(authors)]
+    for author_id in author_ids:
+        events.append(("author_created", {"_id": author_id, "name": _words(rng, 2), "version": 1}))
+    book_ids = [f"b{n:023x}" for n in range(books)]
+    for book_id in book_ids:
+        book = {
+            "_id": book_id,
+            "title": _words(rng, rng.randint(2, 5)),
+            "description": _words(rng, rng.randint(15, 40)),
+            "author_ids": rng.sample(author_ids, k=min(authors, rng.randint(1, 3))),
+            "version": 1,
+        }
+        events.append(("book_created", book))
+    for book_id in rng.sample(book_ids, k=int(books * updates)):
+        events.append(("book_updated", {"_id": book_id, "title": _words(rng, 3), "version": 2}))
+
+    now = time.time()
+    return [
+        _record(offset, data["_id"], encode(envelope(event_type, data, now)), headers)
+        for offset, (event_type, data) in enumerate(events)
+    ]
+
+
+def recorded_records(path: str) -> list:
+    """Messages saved by ``core_service/benchmarks/load.py --events-out``."""
+    records = []
+    with open(path) as file:
+        for offset, line in enumerate(file):
+            message = json.loads(line)
+            headers = [(name, base64.b64decode(raw)) for name, raw in message["headers"]]
+            value = base64.b64decode(message["value"])
+            records.append(_record(offset, message["key"], value, headers))
+    return records
+
+
+async def consume(consumer: FakeConsumer) -> dict:
+    """Run the consumer until it has handed out every record, then stop it (it flushes on the way out)."""
+    started = time.perf_counter()
+    task = asyncio.create_task(consume_events())
+    drained = asyncio.create_task(consumer.drained.wait())
+    await asyncio.wait({task, drained}, return_when=asyncio.FIRST_COMPLETED)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    drained.cancel()
+    elapsed = time.perf_counter() - started
+    return {
+        "count": len(consumer.records),
+        "per_second": round(len(consumer.records) / elapsed, 1),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def queries(titles: list[str], count: int, rng: random.Random) -> tuple[list[str], list[str]]:
+    """Search queries (whole word / one-letter typo / prefix) and completion prefixes."""
+    words = [
+        word for title in rng.sample(titles, k=min(len(titles), count)) for word in title.split()
+    ]
+    searches = []
+    for word in rng.choices(words, k=count):
+        kind = rng.randrange(3)
+        if kind == 1 and len(word) > 5:
+            position = rng.randrange(len(word))
+            word = word[:position] + rng.choice("aeiou") + word[position + 1 :]
+        elif kind == 2:
+            word = word[: rng.randint(3, max(3, len(word) - 1))]
+        searches.append(word)
+    prefixes = [title[: rng.randint(2, 6)] for title in rng.choices(titles, k=count)]
+    return searches, prefixes
+
+
+async def timed(client: AsyncClient, path: str, params: list[dict], concurrency: int) -> dict:
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(query_params):
+        async with slots:
+            started = time.perf_counter()
+            response = await client.get(path, params=query_params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(query_params) for query_params in params))
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", help="JSON Lines from core_service's load test")
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--updates", type=float, default=0.2, help="share of books updated")
+    parser.add_argument(
+        "--backend", choices=["elasticsearch", "memory"], default=settings.SEARCH_BACKEND
+    )
+    parser.add_argument(
+        "--batch", action=argparse.BooleanOptionalAction, default=settings.CONSUMER_BATCH_ENABLED
+    )
+    parser.add_argument(
+        "--cache", action=argparse.BooleanOptionalAction, default=settings.SEARCH_CACHE_ENABLED
+    )
+    parser.add_argument("--es-latency-ms", type=float, default=2.0)
+    parser.add_argument("--kafka-latency-ms", type=float, default=1.0)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    if args.events:
+        records = recorded_records(args.events)
+    else:
+        records = synthetic_records(args.authors, args.books, args.updates, args.seed)
+    consumer = FakeConsumer(records, args.kafka_latency_ms)
+    es = FakeElasticsearch(args.es_latency_ms)
+    backend = MemoryBackend() if args.backend == "memory" else ElasticsearchBackend()
+    store = backend if args.backend == "memory" else es.store
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(settings, "SEARCH_BACKEND", args.backend))
+        stack.enter_context(patch.object(settings, "CONSUMER_BATCH_ENABLED", args.batch))
+        stack.enter_context(patch.object(query_cache, "enabled", args.cache))
+        stack.enter_context(patch("app.kafka_consumer.AIOKafkaConsumer", lambda **_: consumer))
+        for module in ("app.backends", "app.kafka_consumer"):
+            stack.enter_context(patch(f"{module}.es_client", es))
+        for module in ("app.main", "app.kafka_consumer"):
+            stack.enter_context(patch(f"{module}.search_backend", backend))
+        # The consumer logs every batch; that output has no place in the report
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        results = {"consumer": await consume(consumer), "documents": store.stats()}
+
+        await query_cache.clear()
+        titles = [source["title"] for source in store.indices["books"].sources if source]
+        searches, prefixes = queries(titles, args.queries, random.Random(args.seed))
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            concurrency = args.concurrency
+            search_params = [{"query": query} for query in searches]
+            results["search"] = await timed(client, "/search/", search_params, concurrency)
+            results["search_all"] = await timed(
+                client, "/search/all/", search_params[: len(searches) // 4], concurrency
+            )
+            results["suggest"] = await timed(
+                client, "/suggest/", [{"prefix": prefix} for prefix in prefixes], concurrency
+            )
+        results["cache"] = query_cache.stats()
+
+    results["peak_rss_mib"] = peak_rss_mib()
+
+    consumed = results["consumer"]
+    print(
+        f"{'consumer':<12} {consumed['count']:>7} events in {consumed['seconds']:.2f} s"
+        f"  {consumed['per_second']:>9} events/s"
+    )
+    for name in ("search", "search_all", "suggest"):
+        step = results[name]
+        print(
+            f"{name:<12} {step['count']:>7} requests  {step['per_second']:>9} req/s"
+            f"  p50 {step['p50_ms']:7.2f} ms  p95 {step['p95_ms']:7.2f} ms"
+            f"  p99 {step['p99_ms']:7.2f} ms"
+        )
+    print(f"indexed {results['documents']}")
+    print(
+        f"cache hit ratio {results['cache']['hit_ratio']}, peak RSS {results['peak_rss_mib']} MiB"
+    )
+
+    if args.out:
+        save(args.out, "search_service.load", vars(args), results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
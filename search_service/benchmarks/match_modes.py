@@ -0,0 +1,116 @@
+"""Compare the ``wildcard`` and ``ngram`` search modes on a synthetic corpus.
+
+Needs a running Elasticsearch (ELASTIC_URL). Builds a throwaway index with the
+production analysis and books mapping, fills it with random titles/descriptions
+and fires the same partial-word queries in both modes.
+
+    cd search_service
+    python -m benchmarks.match_modes --docs 200000 --queries 500 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from elasticsearch import AsyncElasticsearch
+
+from app.config import settings
+from app.indices import ANALYSIS, INDEX_MAPPINGS
+from app.queries import build_query
+
+BENCH_INDEX = "bench_match_modes"
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _document(rng: random.Random) -> dict:
+    return {
+        "title": " ".join(_word(rng) for _ in range(rng.randint(2, 5))),
+        "description": " ".join(_word(rng) for _ in range(rng.randint(15, 40))),
+    }
+
+
+async def build_corpus(es: AsyncElasticsearch, docs: int, seed: int) -> list[str]:
+    """Create and fill the benchmark index; return query strings (word prefixes)."""
+    await es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+    await es.indices.create(
+        index=BENCH_INDEX,
+        settings={"analysis": ANALYSIS, "refresh_interval": "-1", "number_of_replicas": 0},
+        mappings=INDEX_MAPPINGS["books"],
+    )
+
+    rng = random.Random(seed)
+    prefixes = []
+    for start in range(0, docs, 5000):
+        operations = []
+        for _ in range(min(5000, docs - start)):
+            doc = _document(rng)
+            operations.append({"index": {"_index": BENCH_INDEX}})
+            operations.append(doc)
+            word = rng.choice(doc["title"].split())
+            prefixes.append(word[: rng.randint(3, max(3, len(word) - 1))])
+        await es.bulk(operations=operations)
+
+    await es.indices.refresh(index=BENCH_INDEX)
+    await es.indices.forcemerge(index=BENCH_INDEX, max_num_segments=1)
+    return prefixes
+
+
+async def run_mode(es: AsyncElasticsearch, mode: str, queries: list[str], concurrency: int):
+    latencies = []
+    took = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(query: str):
+        async with slots:
+            started = time.perf_counter()
+            response = await es.search(index=BENCH_INDEX, query=build_query(query, mode=mode))
+            latencies.append((time.perf_counter() - started) * 1000)
+            took.append(response["took"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "max_ms": round(latencies[-1], 2),
+        "es_took_avg_ms": round(statistics.mean(took), 2),
+        "qps": round(len(queries) / wall, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-index", action="store_true")
+    args = parser.parse_args()
+
+    es = AsyncElasticsearch(settings.ELASTIC_URL, request_timeout=120)
+    try:
+        print(f"Indexing {args.docs} synthetic books into '{BENCH_INDEX}'...")
+        prefixes = await build_corpus(es, args.docs, args.seed)
+        queries = random.Random(args.seed).choices(prefixes, k=args.queries)
+
+        for mode in ("wildcard", "ngram"):
+            await run_mode(es, mode, queries[:20], args.concurrency)  # warm-up
+            print(await run_mode(es, mode, queries, args.concurrency))
+    finally:
+        if not args.keep_index:
+            await es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+        await es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
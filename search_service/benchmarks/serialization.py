@@ -0,0 +1,154 @@
+"""Serialization share of search request time for 1000-document result pages.
+
+Two ways to answer /search/all/ with the same hits:
+
+    encoder - FastAPI's default, jsonable_encoder over every hit and then json
+              (FAST_JSON_RESPONSES=false)
+    orjson  - the hits handed to orjson as they are (FAST_JSON_RESPONSES=true)
+
+For each, building the response on its own and the whole request through ASGI are
+timed; the serialization share is the median of the first over the median of the
+second. The backend is a stub that returns a fixed page after ``--backend-latency-ms``,
+so neither Elasticsearch nor Kafka is needed.
+
+    cd search_service
+    python -m benchmarks.serialization --page 1000 --requests 200 --out serialization.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from benchmarks.report import compare, latency_summary, save
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.cache import query_cache
+from app.config import settings
+from app.main import app
+from app.responses import FastJSONResponse
+
+SYLLABLES = ["ka", "ro", "mi", "tol", "sto", "an", "na", "ver", "el", "pus", "kin", "dos", "ev"]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)
+    )
+
+
+def hits(count: int, rng: random.Random) -> list[dict]:
+    """Book sources as the books index stores them (authors denormalized by the consumer)."""
+    return [
+        {
+            "_id": f"b{n:023x}",
+            "title": _words(rng, rng.randint(2, 5)),
+            "description": _words(rng, rng.randint(15, 40)),
+            "author_ids": [f"a{rng.randrange(count):023x}" for _ in range(rng.randint(1, 3))],
+            "authors": [_words(rng, 2) for _ in range(rng.randint(1, 3))],
+            "version": rng.randint(1, 5),
+        }
+        for n in range(count)
+    ]
+
+
+class PageBackend:
+    """Answers every /search/all/ with the same page, after a pause standing in for the backend."""
+
+    name = "elasticsearch"
+
+    def __init__(self, page: list[dict], latency_ms: float):
+        self.page = page
+        self.latency_ms = latency_ms
+
+    async def search_all(self, query: str, indices: tuple[str, ...]) -> dict[str, list[dict]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return {"books": self.page, "authors": []}
+
+
+def encoder_response(content) -> JSONResponse:
+    # What FastAPI does with a returned dict when there is no response_model
+    return JSONResponse(jsonable_encoder(content))
+
+
+# Path -> (response builder, FAST_JSON_RESPONSES)
+PATHS = {
+    "encoder": (encoder_response, False),
+    "orjson": (FastJSONResponse, True),
+}
+
+
+def serialize_ms(build, content, repeat: int) -> float:
+    """Median time to build the response, body included, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build(content)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def request_ms(client: AsyncClient, requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for n in range(requests):
+        request_started = time.perf_counter()
+        response = await client.get("/search/all/", params={"query": f"q{n}"})
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        response.raise_for_status()
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", type=int, default=1000, help="documents per page")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--backend-latency-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    backend = PageBackend(hits(args.page, random.Random(args.seed)), args.backend_latency_ms)
+    content = {"books": backend.page, "authors": []}
+
+    results = {}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, (build, fast) in PATHS.items():
+            with (
+                patch.object(settings, "FAST_JSON_RESPONSES", fast),
+                # Every request has to reach the backend and be serialized again
+                patch.object(query_cache, "enabled", False),
+                patch("app.main.search_backend", backend),
+            ):
+                assert json.loads(build(content).body) == content
+                serialize = serialize_ms(build, content, repeat=max(args.requests // 4, 5))
+                request = await request_ms(client, args.requests)
+            results[name] = {
+                "serialize_ms": round(serialize, 3),
+                "request": request,
+                "serialization_share": round(serialize / request["p50_ms"], 3),
+            }
+
+    for name, step in results.items():
+        request = step["request"]
+        print(
+            f"{name:<8} serialize {step['serialize_ms']:7.2f} ms"
+            f"  request p50 {request['p50_ms']:7.2f} ms  p95 {request['p95_ms']:7.2f} ms"
+            f"  {request['per_second']:>7} req/s  share {step['serialization_share']:.0%}"
+        )
+
+    if args.out:
+        save(args.out, "search_service.serialization", vars(args), results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,58 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from elasticsearch import NotFoundError
 from httpx import ASGITransport, AsyncClient
 
 
+@pytest.fixture(autouse=True)
+async def cancel_delayed_invalidations():
+    yield
+    # Second invalidations (app/cache_sync.py) must not outlive the test's event loop
+    from app import cache_sync
+
+    for task in cache_sync.delayed:
+        task.cancel()
+    await asyncio.gather(*cache_sync.delayed, return_exceptions=True)
+
+
 @pytest.fixture
 def mock_es_client():
     mock = MagicMock()
     mock.search = AsyncMock()
+    mock.msearch = AsyncMock()
+    mock.open_point_in_time = AsyncMock(return_value={"id": "pit-1"})
+    mock.close_point_in_time = AsyncMock()
     mock.index = AsyncMock()
+    mock.mget = AsyncMock(return_value={"docs": []})
+    mock.update_by_query = AsyncMock(return_value={"updated": 0})
+    mock.bulk = AsyncMock(return_value={"errors": False, "items": []})
+    mock.open = AsyncMock()
     mock.close = AsyncMock()
+    mock.ping = AsyncMock(return_value=True)
+    # es_client.options(request_timeout=...) returns a client with the same methods
+    mock.options = MagicMock(return_value=mock)
+
+    mock.indices = MagicMock()
+    mock.indices.get_alias = AsyncMock(
+        side_effect=NotFoundError(404, "aliases_not_found_exception", body={})
+    )
+    mock.indices.get = AsyncMock(return_value={})
+    mock.indices.exists = AsyncMock(return_value=False)
+    for method in (
+        "create",
+        "put_alias",
+        "put_index_template",
+        "put_settings",
+        "refresh",
+        "forcemerge",
+        "update_aliases",
+        "delete",
+    ):
+        setattr(mock.indices, method, AsyncMock())
+    mock.cluster = MagicMock()
+    mock.cluster.health = AsyncMock(return_value={"status": "green", "timed_out": False})
     return mock
 
 
@@ -17,11 +60,20 @@ def mock_es_client():
 async def client(mock_es_client):
     with (
         patch("app.database.es_client", mock_es_client),
-        patch("app.main.es_client", mock_es_client),
+        patch("app.backends.es_client", mock_es_client),
+        patch("app.kafka_consumer.es_client", mock_es_client),
+        patch("app.indices.es_client", mock_es_client),
+        patch("app.reindex.es_client", mock_es_client),
         patch("app.main.consume_events", new_callable=AsyncMock),
+        # Lag is read from Kafka; tests set measure.return_value / side_effect themselves
+        patch("app.main.lag_monitor.measure", new_callable=AsyncMock, return_value={}),
     ):
+        from app.cache import query_cache
         from app.main import app
 
+        await query_cache.clear()
+        query_cache.hits = query_cache.misses = query_cache.invalidations = 0
+
         async with AsyncClient(
             transport=ASGITransport(app=app), base_url="http://test"
         ) as ac:
@@ -0,0 +1,65 @@
+"""
+The backend tests of tests/unit/test_memory_backend.py, run against a live Elasticsearch
+(ELASTICSEARCH_URL). The seed documents carry a per-run suffix and are deleted afterwards.
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.backends import ElasticsearchBackend
+from app.database import ElasticsearchClient
+from app.kafka_consumer import index_batch
+from tests.unit.test_memory_backend import (
+    SEED_EVENTS,
+    _event,
+    test_backend_pages_through_all_matches,
+    test_backend_search_all_and_suggest,
+    test_backend_search_by_title_typo_prefix_and_author,
+    test_backend_search_missing_index_is_empty,
+    test_backend_search_projection_highlight_and_total,
+)
+
+pytestmark = pytest.mark.integration
+
+__all__ = [
+    "test_backend_pages_through_all_matches",
+    "test_backend_search_all_and_suggest",
+    "test_backend_search_by_title_typo_prefix_and_author",
+    "test_backend_search_missing_index_is_empty",
+    "test_backend_search_projection_highlight_and_total",
+]
+
+
+@pytest.fixture
+async def backend_client():
+    """API client over Elasticsearch seeded with SEED_EVENTS, the way the consumer feeds it."""
+    from app.cache import query_cache
+    from app.main import app
+
+    es = ElasticsearchClient()  # opened by backend.start()
+    backend = ElasticsearchBackend()
+
+    with (
+        patch("app.backends.es_client", es),
+        patch("app.indices.es_client", es),
+        patch("app.kafka_consumer.es_client", es),
+        patch("app.main.search_backend", backend),
+        patch("app.main.consume_events", new_callable=AsyncMock),
+    ):
+        await backend.start()
+        try:
+            assert await index_batch(SEED_EVENTS) == []
+            await es.indices.refresh(index="books,authors")
+            await query_cache.clear()
+
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+                yield ac
+        finally:
+            deletes = [
+                _event(e["event"].replace("created", "deleted"), e["data"]["_id"])
+                for e in SEED_EVENTS
+            ]
+            await index_batch(deletes)
+            await es.close()
@@ -9,6 +9,16 @@ CORE_URL = "http://localhost:8000"
 SEARCH_URL = "http://localhost:8001"
 
 
+async def _reindex_and_wait(search: httpx.AsyncClient) -> dict:
+    resp = await search.post("/reindex/")
+    assert resp.status_code in (202, 409)
+    while True:
+        status = (await search.get("/reindex/status")).json()
+        if status["status"] != "running":
+            return status
+        await asyncio.sleep(0.5)
+
+
 async def test_root():
     async with httpx.AsyncClient(base_url=SEARCH_URL) as client:
         resp = await client.get("/")
@@ -30,8 +40,8 @@ async def test_reindex_and_search():
         )
 
     async with httpx.AsyncClient(base_url=SEARCH_URL) as search:
-        resp = await search.post("/reindex/")
-        assert resp.status_code == 200
+        status = await _reindex_and_wait(search)
+        assert status["status"] == "completed"
 
         # Give ES a moment to index
         await asyncio.sleep(1)
@@ -44,7 +54,7 @@ async def test_reindex_and_search():
 
 async def test_search_all_indices():
     async with httpx.AsyncClient(base_url=SEARCH_URL) as search:
-        await search.post("/reindex/")
+        await _reindex_and_wait(search)
         await asyncio.sleep(1)
 
         resp = await search.get("/search/all/", params={"query": "Search Test"})
@@ -52,3 +62,39 @@ async def test_search_all_indices():
         data = resp.json()
         assert "books" in data
         assert "authors" in data
+
+
+async def _wait_for(search: httpx.AsyncClient, query: str, present: bool, timeout: float = 15.0):
+    """Ждет, пока книга под названием query появится в поиске (или пропадет из него)."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        resp = await search.get("/search/", params={"query": query})
+        found = any(query in r.get("title", "") for r in resp.json())
+        if found == present:
+            return
+        assert asyncio.get_running_loop().time() < deadline, f"{query!r} present={found}"
+        await asyncio.sleep(0.5)
+
+
+async def test_deleted_book_leaves_search_after_author_rename():
+    # Переименование автора переписывает книгу через update_by_query, и _version книги
+    # обгоняет ее version: удаление все равно должно пройти
+    title = "Renamedauthor Deletable Book"
+    async with httpx.AsyncClient(base_url=CORE_URL) as core:
+        author = (await core.post("/authors/", json={"name": "Before Rename"})).json()
+        book = (
+            await core.post(
+                "/books/",
+                json={"title": title, "description": "Desc", "author_ids": [author["_id"]]},
+            )
+        ).json()
+        async with httpx.AsyncClient(base_url=SEARCH_URL) as search:
+            await _wait_for(search, title, present=True)
+
+            resp = await core.patch(f"/authors/{author['_id']}", json={"name": "After Rename"})
+            assert resp.status_code == 200
+            await asyncio.sleep(2)
+
+            resp = await core.delete(f"/books/{book['_id']}")
+            assert resp.status_code == 204
+            await _wait_for(search, title, present=False)
@@ -0,0 +1,159 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import orjson
+
+from app import cache_sync
+from app.cache import LocalCacheBackend, QueryCache
+
+
+def _cache(max_entries=10, ttl=60.0):
+    return QueryCache(LocalCacheBackend(max_entries), ttl=ttl)
+
+
+def test_make_key_normalizes_query():
+    assert QueryCache.make_key("  War   and PEACE ", ("books",)) == QueryCache.make_key(
+        "war and peace", ("books",)
+    )
+    assert QueryCache.make_key("war", ("books",), page=2, size=10) == QueryCache.make_key(
+        "war", ("books",), size=10, page=2
+    )
+    assert QueryCache.make_key("war", ("books",)) != QueryCache.make_key("war", ("authors",))
+
+
+async def test_hit_and_miss_counters():
+    cache = _cache()
+    key = cache.make_key("war", ("books",))
+
+    assert await cache.get(key) is None
+    await cache.set(key, [{"title": "War and Peace"}])
+    assert await cache.get(key) == [{"title": "War and Peace"}]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["entries"] == 1
+
+
+async def test_empty_results_are_cached():
+    cache = _cache()
+    key = cache.make_key("nothing", ("books",))
+    await cache.set(key, [])
+    assert await cache.get(key) == []
+
+
+async def test_lru_eviction():
+    cache = _cache(max_entries=2)
+    a, b, c = (cache.make_key(q, ("books",)) for q in "abc")
+    await cache.set(a, ["a"])
+    await cache.set(b, ["b"])
+    await cache.get(a)  # a becomes most recently used
+    await cache.set(c, ["c"])
+
+    assert await cache.get(b) is None
+    assert await cache.get(a) == ["a"]
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_ttl_expiry():
+    cache = _cache(ttl=10)
+    key = cache.make_key("war", ("books",))
+    with patch("app.cache.time.monotonic", return_value=100.0):
+        await cache.set(key, ["x"])
+    with patch("app.cache.time.monotonic", return_value=111.0):
+        assert await cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+async def test_invalidate_drops_entries_of_touched_index_only():
+    cache = _cache()
+    books = cache.make_key("war", ("books",))
+    authors = cache.make_key("war", ("authors",))
+    both = cache.make_key("war", ("books", "authors"))
+    for key in (books, authors, both):
+        await cache.set(key, ["x"])
+
+    await cache.invalidate({"books"})
+
+    assert await cache.get(books) is None
+    assert await cache.get(both) is None
+    assert await cache.get(authors) == ["x"]
+    assert cache.stats()["invalidated_entries"] == 2
+
+
+async def test_disabled_cache_never_hits():
+    cache = QueryCache(LocalCacheBackend(10), ttl=60, enabled=False)
+    key = cache.make_key("war", ("books",))
+    await cache.set(key, ["x"])
+    assert await cache.get(key) is None
+    assert cache.stats()["hits"] == 0
+
+
+# --- Invalidation across processes (app/cache_sync.py) ---
+
+
+async def test_consumer_broadcasts_touched_indices():
+    cache = _cache()
+    key = cache.make_key("war", ("books",))
+    await cache.set(key, ["x"])
+    producer = AsyncMock()
+
+    with (
+        patch("app.cache_sync.query_cache", cache),
+        patch("app.cache_sync.broadcasting", True),
+        patch("app.cache_sync._get_producer", AsyncMock(return_value=producer)),
+    ):
+        await cache_sync.invalidate({"books", "authors"})
+
+    assert await cache.get(key) is None
+    producer.send_and_wait.assert_awaited_once_with(
+        "library.search.invalidations",
+        {"source": cache_sync.SOURCE_ID, "indices": ["authors", "books"]},
+    )
+
+
+async def test_written_indices_are_dropped_again_after_refresh():
+    cache = _cache()
+    key = cache.make_key("war", ("books",))
+
+    with (
+        patch("app.cache_sync.query_cache", cache),
+        patch("app.cache_sync.settings.INDEX_REFRESH_INTERVAL", "20ms"),
+    ):
+        await cache_sync.invalidate_written({"books"})
+        # A search before the refresh still sees the old index and caches it again
+        await cache.set(key, ["stale"])
+        assert await cache.get(key) == ["stale"]
+
+        await asyncio.gather(*cache_sync.delayed)
+        assert await cache.get(key) is None
+
+
+async def test_memory_backend_is_not_invalidated_twice():
+    with (
+        patch("app.cache_sync.settings.SEARCH_BACKEND", "memory"),
+        patch("app.cache_sync.query_cache.invalidate", new_callable=AsyncMock) as invalidate,
+    ):
+        await cache_sync.invalidate_written({"books"})
+
+    invalidate.assert_awaited_once_with(["books"])
+    assert not cache_sync.delayed
+
+
+async def test_api_process_applies_broadcasts_from_other_processes():
+    cache = _cache()
+    key = cache.make_key("war", ("books",))
+    await cache.set(key, ["x"])
+
+    with patch("app.cache_sync.query_cache", cache):
+        # Its own broadcast: these entries were already dropped before it was sent
+        await cache_sync.apply_invalidation(
+            orjson.dumps({"source": cache_sync.SOURCE_ID, "indices": ["books"]})
+        )
+        assert await cache.get(key) == ["x"]
+
+        await cache_sync.apply_invalidation(
+            orjson.dumps({"source": "search-consumer-1", "indices": ["books"]})
+        )
+        assert await cache.get(key) is None
@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from app.database import CoreClient, ElasticsearchClient
+from app.metrics import InstrumentedTransport
+
+
+def test_no_clients_created_at_import():
+    from app.database import core_client, es_client
+
+    assert not es_client.is_open
+    assert not core_client.is_open
+    with pytest.raises(RuntimeError):
+        es_client.search()
+
+
+async def test_elasticsearch_client_opens_pooled_client_once():
+    es = ElasticsearchClient()
+    with (
+        patch("app.database.settings.ES_MAX_CONNECTIONS", 64),
+        patch("app.database.AsyncElasticsearch") as es_cls,
+    ):
+        es_cls.return_value.close = AsyncMock()
+        await es.open()
+        await es.open()
+
+        es_cls.assert_called_once()
+        options = es_cls.call_args.kwargs
+        assert options["transport_class"] is InstrumentedTransport
+        assert options["connections_per_node"] == 64
+        assert options["request_timeout"] == 10.0
+        assert options["max_retries"] == 3
+
+        # Everything else goes to the open client
+        assert es.indices is es_cls.return_value.indices
+
+        await es.close()
+        es_cls.return_value.close.assert_awaited_once()
+        assert not es.is_open
+
+
+async def test_elasticsearch_pool_stats_report_in_flight():
+    es = ElasticsearchClient()
+    transport = object.__new__(InstrumentedTransport)
+    transport.node_pool = MagicMock()
+    transport.node_pool.all.return_value = ["node"]
+    es._client = MagicMock(transport=transport)
+
+    async def request(*args, **kwargs):
+        stats = es.pool_stats()
+        assert stats["in_flight"] == 1
+        assert stats["utilization"] == 0.5
+
+    with (
+        patch("app.database.settings.ES_MAX_CONNECTIONS", 2),
+        patch("elastic_transport.AsyncTransport.perform_request", side_effect=request),
+    ):
+        await transport.perform_request("GET", "/books/_search")
+        stats = es.pool_stats()
+
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 1
+
+
+async def test_core_client_shares_one_pool():
+    core = CoreClient()
+    with patch("app.database.settings.CORE_HTTP_MAX_CONNECTIONS", 7):
+        await core.open()
+    try:
+        pool = core._client._transport._pool
+        assert pool._max_connections == 7
+        assert core._client.timeout.connect == 5.0
+
+        handler = AsyncMock(return_value=httpx.Response(200, json=[]))
+        with patch.object(core._client, "get", handler):
+            resp = await core.get("http://core/books/", params={"limit": 1})
+        assert resp.json() == []
+        assert core.pool_stats()["peak_in_flight"] == 1
+        assert core.pool_stats()["in_flight"] == 0
+    finally:
+        await core.close()
+    assert not core.is_open
+
+
+async def test_pool_stats_endpoint(client):
+    with (
+        patch("app.main.es_client", ElasticsearchClient()),
+        patch("app.main.core_client", CoreClient()),
+    ):
+        resp = await client.get("/pools/stats")
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["elasticsearch"] == {"open": False, "max_connections_per_node": 32}
+    assert body["core_api"]["max_connections"] > 0
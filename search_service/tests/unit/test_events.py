@@ -0,0 +1,50 @@
+import json
+import zlib
+
+import msgpack
+import pytest
+
+from app.events import EventDecodeError, UnsupportedSchemaError, decode_event
+
+
+def test_message_without_headers_is_legacy_json():
+    payload = json.dumps({"event": "book_created", "data": {"_id": "b1"}}).encode()
+
+    assert decode_event(payload, []) == {"event": "book_created", "data": {"_id": "b1"}}
+
+
+def test_headers_select_format_and_compression():
+    message = {"schema_version": 1, "event": "author_created", "data": {"_id": "a1"}}
+    payload = zlib.compress(msgpack.packb(message))
+    headers = [
+        ("traceparent", b"00-x-y-01"),
+        ("Content-Type", b"application/msgpack"),
+        ("content-encoding", b"zlib"),
+    ]
+
+    assert decode_event(payload, headers) == message
+
+
+@pytest.mark.parametrize(
+    ("payload", "headers"),
+    [
+        (b"{broken", []),
+        (b"[1, 2]", []),
+        (b"{}", [("content-type", b"application/xml")]),
+        (b"{}", [("content-encoding", b"br")]),
+        (b"not zlib", [("content-encoding", b"zlib")]),
+        (None, []),
+    ],
+)
+def test_unreadable_payloads_raise_decode_error(payload, headers):
+    with pytest.raises(EventDecodeError):
+        decode_event(payload, headers)
+
+
+def test_newer_schema_version_is_rejected_with_the_message():
+    message = {"schema_version": 2, "event": "book_created", "data": {}}
+
+    with pytest.raises(UnsupportedSchemaError) as exc_info:
+        decode_event(json.dumps(message).encode())
+
+    assert exc_info.value.message == message
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from app import indices
+
+
+async def test_ensure_indices_creates_first_version_behind_alias(mock_es_client):
+    with patch("app.indices.es_client", mock_es_client):
+        await indices.ensure_indices()
+
+    created = {c.kwargs["index"]: c.kwargs for c in mock_es_client.indices.create.call_args_list}
+    assert set(created) == {"books_v1", "authors_v1"}
+    assert created["books_v1"]["settings"] == indices.live_settings()
+    mock_es_client.indices.put_alias.assert_any_call(index="books_v1", name="books")
+    mock_es_client.indices.put_alias.assert_any_call(index="authors_v1", name="authors")
+
+
+async def test_ensure_indices_keeps_existing_aliases(mock_es_client):
+    mock_es_client.indices.exists.return_value = True
+
+    with patch("app.indices.es_client", mock_es_client):
+        await indices.ensure_indices()
+
+    mock_es_client.indices.create.assert_not_called()
+
+
+async def test_next_version_skips_leftover_builds(mock_es_client):
+    mock_es_client.indices.get.return_value = {
+        "books_v1": {},
+        "books_v4": {},
+        "books_v2_backup": {},
+    }
+
+    with patch("app.indices.es_client", mock_es_client):
+        assert await indices.next_version("books") == 5
+
+
+async def test_ensure_indices_installs_templates_first(mock_es_client):
+    with patch("app.indices.es_client", mock_es_client):
+        await indices.ensure_indices()
+
+    templates = {
+        c.kwargs["name"]: c.kwargs for c in mock_es_client.indices.put_index_template.call_args_list
+    }
+    assert set(templates) == {"books_template", "authors_template"}
+    books = templates["books_template"]
+    assert books["index_patterns"] == ["books_v*"]
+    assert books["template"]["mappings"] == indices.INDEX_MAPPINGS["books"]
+    assert "prefix_ngram" in books["template"]["settings"]["analysis"]["analyzer"]
+
+
+def test_searchable_fields_have_ngram_subfields():
+    books = indices.INDEX_MAPPINGS["books"]["properties"]
+    authors = indices.INDEX_MAPPINGS["authors"]["properties"]
+    for field in (books["title"], books["description"], authors["name"]):
+        assert field["fields"]["ngram"]["analyzer"] == "prefix_ngram"
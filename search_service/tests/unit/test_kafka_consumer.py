@@ -1,20 +1,35 @@
 import asyncio
-from unittest.mock import AsyncMock, MagicMock, patch
+import contextlib
+import json
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import pytest
+
+from app.events import MSGPACK, content_headers, envelope, serializer
+
+
+def _legacy_message(value: dict) -> MagicMock:
+    """A message as core_service used to publish it: plain JSON without headers."""
+    msg = MagicMock()
+    msg.value = json.dumps(value).encode("utf-8")
+    msg.headers = []
+    return msg
 
 
 async def test_consume_book_created_event():
     mock_es = AsyncMock()
 
-    msg = MagicMock()
-    msg.value = {
-        "event": "book_created",
-        "data": {
-            "_id": "book123",
-            "title": "Test Book",
-            "description": "Desc",
-            "author_ids": [],
-        },
-    }
+    msg = _legacy_message(
+        {
+            "event": "book_created",
+            "data": {
+                "_id": "book123",
+                "title": "Test Book",
+                "description": "Desc",
+                "author_ids": [],
+            },
+        }
+    )
 
     mock_consumer = MagicMock()
     mock_consumer.start = AsyncMock()
@@ -28,6 +43,7 @@ async def test_consume_book_created_event():
     with (
         patch("app.kafka_consumer.AIOKafkaConsumer", return_value=mock_consumer),
         patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_ENABLED", False),
     ):
         from app.kafka_consumer import consume_events
 
@@ -48,12 +64,14 @@ async def test_consume_book_created_event():
 
 async def test_consume_author_created_event():
     mock_es = AsyncMock()
+    mock_es.update_by_query.return_value = {"updated": 0}
 
-    msg = MagicMock()
-    msg.value = {
-        "event": "author_created",
-        "data": {"_id": "author123", "name": "Test Author", "book_ids": []},
-    }
+    msg = _legacy_message(
+        {
+            "event": "author_created",
+            "data": {"_id": "author123", "name": "Test Author", "book_ids": []},
+        }
+    )
 
     mock_consumer = MagicMock()
     mock_consumer.start = AsyncMock()
@@ -67,6 +85,7 @@ async def test_consume_author_created_event():
     with (
         patch("app.kafka_consumer.AIOKafkaConsumer", return_value=mock_consumer),
         patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_ENABLED", False),
     ):
         from app.kafka_consumer import consume_events
 
@@ -88,8 +107,7 @@ async def test_consume_author_created_event():
 async def test_consume_unknown_event_ignores():
     mock_es = AsyncMock()
 
-    msg = MagicMock()
-    msg.value = {"event": "unknown_event", "data": {"foo": "bar"}}
+    msg = _legacy_message({"event": "unknown_event", "data": {"foo": "bar"}})
 
     mock_consumer = MagicMock()
     mock_consumer.start = AsyncMock()
@@ -103,6 +121,7 @@ async def test_consume_unknown_event_ignores():
     with (
         patch("app.kafka_consumer.AIOKafkaConsumer", return_value=mock_consumer),
         patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_ENABLED", False),
     ):
         from app.kafka_consumer import consume_events
 
@@ -115,3 +134,838 @@ async def test_consume_unknown_event_ignores():
             pass
 
     mock_es.index.assert_not_called()
+
+
+# --- Batch mode ---
+
+
+def _make_msg(event_type, data, content_type=MSGPACK, compression=None):
+    msg = MagicMock()
+    msg.value = serializer(content_type, compression)(envelope(event_type, data, 0.0))
+    msg.headers = content_headers(content_type, compression)
+    return msg
+
+
+def _make_batch_consumer(*batches):
+    mock_consumer = MagicMock()
+    mock_consumer.start = AsyncMock()
+    mock_consumer.stop = AsyncMock()
+    mock_consumer.commit = AsyncMock()
+
+    async def getmany(timeout_ms, max_records):
+        if batches_left:
+            return batches_left.pop(0)
+        await asyncio.sleep(timeout_ms / 1000)
+        return {}
+
+    batches_left = list(batches)
+    mock_consumer.getmany = AsyncMock(side_effect=getmany)
+    return mock_consumer
+
+
+async def _run_consumer_briefly(mock_consumer, mock_es):
+    with (
+        patch("app.kafka_consumer.AIOKafkaConsumer", return_value=mock_consumer),
+        patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_SIZE", 2),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_TIMEOUT_MS", 20),
+    ):
+        from app.kafka_consumer import consume_events
+
+        task = asyncio.create_task(consume_events())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def test_batch_mode_sends_single_bulk_and_commits():
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_es.update_by_query.return_value = {"updated": 0}
+    mock_consumer = _make_batch_consumer(
+        {
+            "tp0": [
+                _make_msg("book_created", {"_id": "b1", "title": "Book"}),
+                _make_msg("author_created", {"_id": "a1", "name": "Author"}),
+            ]
+        }
+    )
+
+    with patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 1):
+        await _run_consumer_briefly(mock_consumer, mock_es)
+
+    mock_es.bulk.assert_called_once_with(
+        operations=[
+            {"index": {"_index": "books", "_id": "b1"}},
+            {"title": "Book"},
+            {"index": {"_index": "authors", "_id": "a1"}},
+            {"name": "Author"},
+        ]
+    )
+    mock_es.index.assert_not_called()
+    mock_consumer.commit.assert_called_once()
+
+
+async def test_batch_mode_flushes_partial_batch_on_timeout():
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_consumer = _make_batch_consumer(
+        {"tp0": [_make_msg("book_created", {"_id": "b1", "title": "Book"})]}
+    )
+
+    await _run_consumer_briefly(mock_consumer, mock_es)
+
+    mock_es.bulk.assert_called_once()
+    mock_consumer.commit.assert_called_once()
+
+
+async def test_batch_mode_does_not_commit_when_bulk_fails():
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = ConnectionError("ES is down")
+    mock_consumer = _make_batch_consumer(
+        {"tp0": [_make_msg("book_created", {"_id": "b1", "title": "Book"})] * 2}
+    )
+
+    with pytest.raises(ConnectionError):
+        await _run_consumer_briefly(mock_consumer, mock_es)
+
+    mock_consumer.commit.assert_not_called()
+
+
+async def test_index_batch_reports_item_errors():
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {
+        "errors": True,
+        "items": [
+            {"index": {"_index": "books", "_id": "b1", "status": 201}},
+            {
+                "index": {
+                    "_index": "books",
+                    "_id": "b2",
+                    "status": 400,
+                    "error": {"type": "mapper_parsing_exception"},
+                }
+            },
+        ],
+    }
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_batch
+
+        errors = await index_batch(
+            [
+                {"event": "book_created", "data": {"_id": "b1", "title": "Ok"}},
+                {"event": "book_created", "data": {"_id": "b2", "title": "Bad"}},
+            ]
+        )
+
+    assert len(errors) == 1
+    assert errors[0]["_id"] == "b2"
+
+
+async def test_index_batch_skips_unknown_events():
+    mock_es = AsyncMock()
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_batch
+
+        errors = await index_batch([{"event": "unknown_event", "data": {"foo": "bar"}}])
+
+    assert errors == []
+    mock_es.bulk.assert_not_called()
+
+
+async def test_batch_mode_invalidates_cache_of_touched_indices():
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_consumer = _make_batch_consumer(
+        {"tp0": [_make_msg("book_created", {"_id": "b1", "title": "Book"})] * 2}
+    )
+
+    with (
+        patch("app.cache_sync.query_cache.invalidate", new_callable=AsyncMock) as invalidate,
+        patch("app.cache_sync.settings.INDEX_REFRESH_INTERVAL", "10ms"),
+    ):
+        await _run_consumer_briefly(mock_consumer, mock_es)
+
+    # Right after _bulk, and again once the refresh has made the books searchable
+    assert invalidate.call_args_list == [call(["books"]), call(["books"])]
+
+
+# --- Author names on book documents ---
+
+
+@pytest.fixture
+def fresh_author_names():
+    from app.kafka_consumer import AuthorNames
+
+    names = AuthorNames(max_entries=100)
+    with patch("app.kafka_consumer.author_names", names):
+        yield names
+
+
+async def test_author_names_cache_is_bounded():
+    from app.kafka_consumer import AuthorNames
+
+    names = AuthorNames(max_entries=2)
+    names.put("a1", "One")
+    names.put("a2", "Two")
+    names.get("a1")
+    names.put("a3", "Three")
+
+    assert names.get("a2") is None
+    assert names.get("a1") == "One"
+    assert len(names) == 2
+
+
+async def test_index_batch_embeds_author_names(fresh_author_names):
+    from app.kafka_consumer import index_batch
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_es.update_by_query.return_value = {"updated": 0}
+    mock_es.mget.return_value = {
+        "docs": [{"_id": "a2", "found": True, "_source": {"name": "Indexed Earlier"}}]
+    }
+
+    events = [
+        {"event": "author_created", "data": {"_id": "a1", "name": "Same Batch"}},
+        {"event": "book_created", "data": {"_id": "b1", "title": "B", "author_ids": ["a1", "a2"]}},
+    ]
+    with patch("app.kafka_consumer.es_client", mock_es):
+        await index_batch(events)
+
+    # Only the author that is neither in the batch nor cached is fetched from ES
+    mock_es.mget.assert_called_once_with(index="authors", ids=["a2"], source=["name"])
+    book = mock_es.bulk.call_args.kwargs["operations"][3]
+    assert book["authors"] == [
+        {"id": "a1", "name": "Same Batch"},
+        {"id": "a2", "name": "Indexed Earlier"},
+    ]
+    # The original event is left untouched
+    assert "authors" not in events[1]["data"]
+
+
+async def test_index_batch_skips_mget_for_cached_authors(fresh_author_names):
+    from app.kafka_consumer import index_batch
+
+    fresh_author_names.put("a1", "Cached")
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        await index_batch(
+            [{"event": "book_created", "data": {"_id": "b1", "title": "B", "author_ids": ["a1"]}}]
+        )
+
+    mock_es.mget.assert_not_called()
+    mock_es.update_by_query.assert_not_called()
+
+
+async def test_author_event_updates_existing_books(fresh_author_names):
+    from app.kafka_consumer import index_batch
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_es.update_by_query.return_value = {"updated": 3}
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        await index_batch(
+            [{"event": "author_created", "data": {"_id": "a1", "name": "Tolstoy"}}],
+            {"books": "books_v2", "authors": "authors_v2"},
+        )
+
+    kwargs = mock_es.update_by_query.call_args.kwargs
+    assert kwargs["index"] == "books_v2"
+    assert kwargs["query"] == {"terms": {"author_ids": ["a1"]}}
+    assert kwargs["script"]["params"] == {"names": {"a1": "Tolstoy"}}
+    assert kwargs["conflicts"] == "proceed"
+
+
+def test_author_events_invalidate_books_too():
+    from app.kafka_consumer import touched_indices
+
+    assert touched_indices([{"event": "author_created", "data": {}}]) == {"authors", "books"}
+    assert touched_indices([{"event": "book_created", "data": {}}]) == {"books"}
+
+
+# --- Updates, deletes and versioning ---
+
+
+def test_build_actions_created_with_version_uses_external_versioning():
+    from app.kafka_consumer import build_actions
+
+    ops = build_actions(
+        [{"event": "book_created", "data": {"_id": "b1", "title": "T", "version": 1}}]
+    )
+
+    assert ops == [
+        {"index": {"_index": "books", "_id": "b1", "version": 1, "version_type": "external"}},
+        {"title": "T", "version": 1},
+    ]
+
+
+def test_build_actions_update_sends_only_changed_fields():
+    from app.kafka_consumer import build_actions
+
+    ops = build_actions(
+        [{"event": "author_updated", "data": {"_id": "a1", "version": 4, "name": "New"}}],
+        {"authors": "authors_v2"},
+    )
+
+    assert ops[0] == {"update": {"_index": "authors_v2", "_id": "a1", "retry_on_conflict": 3}}
+    assert ops[1]["script"]["params"] == {"changes": {"name": "New"}, "version": 4}
+    assert "ctx.op = 'noop'" in ops[1]["script"]["source"]
+
+
+def test_build_actions_delete():
+    from app.kafka_consumer import build_actions
+
+    ops = build_actions([{"event": "book_deleted", "data": {"_id": "b1", "version": 7}}])
+
+    # Скрипт сравнивает с полем version, а не с _version: тот растет и от имен авторов
+    assert ops[0] == {"update": {"_index": "books", "_id": "b1", "retry_on_conflict": 3}}
+    assert ops[1]["script"]["params"] == {"version": 7}
+    assert "ctx._source.version < params.version" in ops[1]["script"]["source"]
+    assert "ctx.op = 'delete'" in ops[1]["script"]["source"]
+
+
+async def test_index_batch_counts_stale_delete_as_stale():
+    from app.kafka_consumer import index_batch
+
+    mock_es = AsyncMock()
+    # Повтор удаления: документа уже нет
+    mock_es.bulk.return_value = {
+        "errors": True,
+        "items": [
+            {
+                "update": {
+                    "_id": "b1",
+                    "status": 404,
+                    "error": {"type": "document_missing_exception"},
+                }
+            }
+        ],
+    }
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        errors = await index_batch([{"event": "book_deleted", "data": {"_id": "b1", "version": 3}}])
+
+    assert errors == []
+
+
+async def test_index_batch_ignores_stale_and_duplicate_events():
+    from app.kafka_consumer import index_batch
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {
+        "errors": True,
+        "items": [
+            {
+                "index": {
+                    "_id": "b1",
+                    "status": 409,
+                    "error": {"type": "version_conflict_engine_exception"},
+                }
+            },
+            {
+                "update": {
+                    "_id": "b2",
+                    "status": 404,
+                    "error": {"type": "document_missing_exception"},
+                }
+            },
+            {"index": {"_id": "b3", "status": 400, "error": {"type": "mapper_parsing_exception"}}},
+        ],
+    }
+    events = [
+        {"event": "book_created", "data": {"_id": "b1", "version": 1}},
+        {"event": "book_updated", "data": {"_id": "b2", "version": 2, "title": "T"}},
+        {"event": "book_created", "data": {"_id": "b3", "version": 1}},
+    ]
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        errors = await index_batch(events)
+
+    assert [e["_id"] for e in errors] == ["b3"]
+
+
+async def test_book_update_rebuilds_author_names(fresh_author_names):
+    from app.kafka_consumer import index_batch
+
+    fresh_author_names.put("a1", "Tolstoy")
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        await index_batch(
+            [{"event": "book_updated", "data": {"_id": "b1", "version": 2, "author_ids": ["a1"]}}]
+        )
+
+    changes = mock_es.bulk.call_args.kwargs["operations"][1]["script"]["params"]["changes"]
+    assert changes == {"author_ids": ["a1"], "authors": [{"id": "a1", "name": "Tolstoy"}]}
+
+
+async def test_consume_one_by_one_applies_updates_through_bulk():
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_consumer = MagicMock()
+    mock_consumer.start = AsyncMock()
+    mock_consumer.stop = AsyncMock()
+
+    async def mock_aiter(self):
+        yield _make_msg("book_deleted", {"_id": "b1", "version": 3})
+
+    mock_consumer.__aiter__ = mock_aiter
+
+    with (
+        patch("app.kafka_consumer.AIOKafkaConsumer", return_value=mock_consumer),
+        patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_ENABLED", False),
+    ):
+        from app.kafka_consumer import consume_events
+
+        task = asyncio.create_task(consume_events())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    mock_es.index.assert_not_called()
+    mock_es.bulk.assert_called_once()
+    update, script = mock_es.bulk.call_args.kwargs["operations"]
+    assert update == {"update": {"_index": "books", "_id": "b1", "retry_on_conflict": 3}}
+    assert script["script"]["params"] == {"version": 3}
+
+
+# --- Worker pool and rebalancing ---
+
+
+def test_shard_of_is_stable_per_document():
+    from app.kafka_consumer import shard_of
+
+    event = {"event": "book_updated", "data": {"_id": "b42"}}
+    shards = {shard_of({**event, "data": {"_id": "b42", "version": v}}, 8) for v in range(5)}
+    assert shards == {shard_of(event, 8)}
+    assert 0 <= shard_of(event, 8) < 8
+
+
+async def test_index_sharded_embeds_author_names_across_shards(fresh_author_names):
+    from app.kafka_consumer import index_sharded, shard_of
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    mock_es.mget.return_value = {"docs": []}
+    mock_es.update_by_query.return_value = {"updated": 0}
+    author = {"event": "author_created", "data": {"_id": "a1", "name": "Leo"}}
+    book = {"event": "book_created", "data": {"_id": "b1", "title": "B", "author_ids": ["a1"]}}
+    assert shard_of(author, 4) != shard_of(book, 4)
+
+    with (
+        patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 4),
+    ):
+        await index_sharded([author, book])
+
+    documents = [
+        ops[1]
+        for ops in (c.kwargs["operations"] for c in mock_es.bulk.call_args_list)
+        if ops[0].get("index", {}).get("_id") == "b1"
+    ]
+    assert documents[0]["authors"] == [{"id": "a1", "name": "Leo"}]
+
+
+async def test_index_sharded_runs_bulks_concurrently_and_keeps_order():
+    from app.kafka_consumer import index_sharded
+
+    in_flight = 0
+    peak = 0
+    bulks = []
+
+    async def bulk(operations):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        bulks.append(operations)
+        return {"errors": False, "items": []}
+
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = bulk
+    events = [
+        {"event": "book_created", "data": {"_id": f"b{i % 10}", "title": f"v{i}"}}
+        for i in range(40)
+    ]
+
+    with (
+        patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 4),
+    ):
+        await index_sharded(events)
+
+    assert 1 < len(bulks) <= 4
+    assert peak == len(bulks)
+    # Every document lives in exactly one bulk, with its versions in the original order
+    for doc in (f"b{i}" for i in range(10)):
+        holders = [ops for ops in bulks if {"index": {"_index": "books", "_id": doc}} in ops]
+        assert len(holders) == 1
+        titles = [
+            ops[i + 1]["title"]
+            for ops in holders
+            for i in range(0, len(ops), 2)
+            if ops[i]["index"]["_id"] == doc
+        ]
+        assert titles == sorted(titles, key=lambda t: int(t[1:]))
+
+
+async def test_revoked_partitions_flush_pending_batch():
+    from app.kafka_consumer import BatchProcessor, FlushOnRevoke
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {"errors": False, "items": []}
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    processor = BatchProcessor(consumer)
+    processor.buffer = [_make_msg("book_created", {"_id": "b1", "title": "Book"})]
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        await FlushOnRevoke(processor).on_partitions_revoked({"tp0"})
+
+    mock_es.bulk.assert_called_once()
+    consumer.commit.assert_called_once()
+    assert processor.buffer == []
+
+
+async def test_batch_consumer_subscribes_with_rebalance_listener():
+    from app.kafka_consumer import FlushOnRevoke
+
+    mock_es = AsyncMock()
+    mock_consumer = _make_batch_consumer()
+
+    await _run_consumer_briefly(mock_consumer, mock_es)
+
+    args, kwargs = mock_consumer.subscribe.call_args
+    assert args == (["library.events"],)
+    assert isinstance(kwargs["listener"], FlushOnRevoke)
+    mock_consumer.stop.assert_called_once()
+
+
+async def test_standalone_consumer_entry_point():
+    import app.consumer as consumer_module
+
+    mock_es = AsyncMock()
+    with (
+        patch("app.consumer.es_client", mock_es),
+        patch("app.consumer.ensure_indices", new_callable=AsyncMock) as ensure,
+        patch("app.consumer.consume_events", new_callable=AsyncMock) as consume,
+        patch("app.consumer.start_http_server") as metrics_server,
+    ):
+        await consumer_module.main()
+
+    ensure.assert_called_once()
+    consume.assert_called_once()
+    metrics_server.assert_called_once_with(9100)
+    mock_es.close.assert_called_once()
+
+
+# --- Retries and dead-letter queue ---
+
+
+@pytest.fixture
+def resilient_env():
+    """Fresh adaptive bulk size, no backoff sleeps and a captured DLQ."""
+    from app.retry import AdaptiveLimit
+
+    limit = AdaptiveLimit(8)
+    with (
+        patch("app.kafka_consumer.bulk_limit", limit),
+        patch("app.kafka_consumer.backoff_delay", return_value=0),
+        patch("app.kafka_consumer.settings.CONSUMER_RETRY_MAX_ATTEMPTS", 3),
+        patch("app.kafka_consumer.send_to_dlq", new_callable=AsyncMock) as send_to_dlq,
+    ):
+        yield limit, send_to_dlq
+
+
+def _created(*ids):
+    return [{"event": "book_created", "data": {"_id": i, "title": i}} for i in ids]
+
+
+def _bulk_response(*statuses):
+    items = []
+    for doc_id, status, error_type in statuses:
+        result = {"_index": "books", "_id": doc_id, "status": status}
+        if error_type:
+            result["error"] = {"type": error_type, "reason": "test"}
+        items.append({"index": result})
+    return {"errors": any(error for _, _, error in statuses), "items": items}
+
+
+def _bulk_ids(call):
+    ops = call.kwargs["operations"]
+    return [ops[i]["index"]["_id"] for i in range(0, len(ops), 2)]
+
+
+async def test_poison_document_goes_to_dlq_and_batch_continues(resilient_env):
+    _, send_to_dlq = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = _bulk_response(
+        ("b1", 201, None), ("b2", 400, "mapper_parsing_exception"), ("b3", 201, None)
+    )
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        dead = await index_resilient(_created("b1", "b2", "b3"))
+
+    mock_es.bulk.assert_called_once()
+    assert [error["_id"] for error in dead] == ["b2"]
+    (failures, _, topic), _ = send_to_dlq.call_args
+    assert [event["data"]["_id"] for event, _ in failures] == ["b2"]
+    assert failures[0][1]["error"]["type"] == "mapper_parsing_exception"
+    assert topic == "library.events"
+
+
+async def test_rejected_items_are_retried_with_smaller_bulks(resilient_env):
+    limit, send_to_dlq = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = [
+        _bulk_response(
+            ("b1", 201, None),
+            ("b2", 429, "es_rejected_execution_exception"),
+            ("b3", 429, "es_rejected_execution_exception"),
+        ),
+        _bulk_response(("b2", 201, None), ("b3", 201, None)),
+    ]
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        dead = await index_resilient(_created("b1", "b2", "b3"))
+
+    assert dead == []
+    assert [_bulk_ids(call) for call in mock_es.bulk.call_args_list] == [
+        ["b1", "b2", "b3"],
+        ["b2", "b3"],
+    ]
+    send_to_dlq.assert_not_called()
+    # Shrunk after the 429s, grew back after the successful retry
+    assert limit.value == 8
+
+
+async def test_overloaded_cluster_gets_smaller_bulks(resilient_env):
+    from elasticsearch import ApiError
+
+    from tests.unit.test_retry import es_error
+
+    limit, _ = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = [
+        es_error(ApiError, 429, "es_rejected_execution_exception"),
+        es_error(ApiError, 429, "es_rejected_execution_exception"),
+        {"errors": False, "items": []},
+        {"errors": False, "items": []},
+        {"errors": False, "items": []},
+    ]
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        await index_resilient(_created(*[f"b{i}" for i in range(1, 11)]))
+
+    # Halved on every 429, doubled again after every accepted bulk
+    assert [len(_bulk_ids(call)) for call in mock_es.bulk.call_args_list] == [8, 4, 2, 4, 4]
+    assert limit.value == 8
+
+
+async def test_exhausted_retries_propagate_without_dlq(resilient_env):
+    from elasticsearch import ConnectionTimeout
+
+    _, send_to_dlq = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = ConnectionTimeout("ES is overloaded")
+
+    with patch("app.kafka_consumer.es_client", mock_es), pytest.raises(ConnectionTimeout):
+        from app.kafka_consumer import index_resilient
+
+        await index_resilient(_created("b1"))
+
+    assert mock_es.bulk.call_count == 3
+    send_to_dlq.assert_not_called()
+
+
+async def test_items_still_rejected_after_retries_go_to_dlq(resilient_env):
+    _, send_to_dlq = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = _bulk_response(("b1", 429, "es_rejected_execution_exception"))
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        dead = await index_resilient(_created("b1"))
+
+    assert mock_es.bulk.call_count == 3
+    assert [error["_id"] for error in dead] == ["b1"]
+    assert send_to_dlq.call_args.args[1] == 3
+
+
+async def test_rejected_request_is_bisected_to_find_poison_event(resilient_env):
+    from elasticsearch import BadRequestError
+
+    from tests.unit.test_retry import es_error
+
+    _, send_to_dlq = resilient_env
+
+    async def bulk(operations):
+        if any(op.get("title") == "b3" for op in operations):
+            raise es_error(BadRequestError, 400, "x_content_parse_exception")
+        return {"errors": False, "items": []}
+
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = bulk
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        dead = await index_resilient(_created("b1", "b2", "b3", "b4"))
+
+    (failures, _, _), _ = send_to_dlq.call_args
+    assert send_to_dlq.call_count == 1
+    assert [event["data"]["_id"] for event, _ in failures] == ["b3"]
+    assert dead[0]["error"]["type"] == "x_content_parse_exception"
+    applied = [i for call in mock_es.bulk.call_args_list for i in _bulk_ids(call)]
+    assert {"b1", "b2", "b4"} <= set(applied)
+
+
+async def test_bulk_size_recovers_after_poison_event_is_isolated(resilient_env):
+    from elasticsearch import BadRequestError
+
+    from tests.unit.test_retry import es_error
+
+    async def bulk(operations):
+        if any(op.get("title") == "b3" for op in operations):
+            raise es_error(BadRequestError, 400, "x_content_parse_exception")
+        return {"errors": False, "items": []}
+
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = bulk
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_resilient
+
+        await index_resilient(_created(*[f"b{i}" for i in range(1, 21)]))
+
+    # Bisection finds b3, then the remaining events go in full bulks again, not one by one
+    sizes = [len(_bulk_ids(call)) for call in mock_es.bulk.call_args_list]
+    assert sizes == [8, 4, 2, 8, 4, 2, 1, 8, 8, 1]
+
+
+async def test_batch_with_poison_document_is_still_committed(resilient_env):
+    _, send_to_dlq = resilient_env
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = _bulk_response(
+        ("b1", 201, None), ("b2", 400, "mapper_parsing_exception")
+    )
+    mock_consumer = _make_batch_consumer(
+        {
+            "tp0": [
+                _make_msg("book_created", {"_id": "b1", "title": "Ok"}),
+                _make_msg("book_created", {"_id": "b2", "title": "Bad"}),
+            ]
+        }
+    )
+
+    with (
+        patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 1),
+        patch("app.kafka_consumer.stop_dlq_producer", new_callable=AsyncMock) as stop_dlq,
+    ):
+        await _run_consumer_briefly(mock_consumer, mock_es)
+
+    send_to_dlq.assert_called_once()
+    mock_consumer.commit.assert_called_once()
+    stop_dlq.assert_called_once()
+
+
+async def test_index_batch_records_bulk_size_and_event_latency():
+    from prometheus_client import REGISTRY
+
+    def sample(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = {
+        "errors": True,
+        "items": [
+            {"index": {"_index": "books", "_id": "b1", "status": 201}},
+            {"index": {"_index": "books", "_id": "b2", "status": 400, "error": {"type": "x"}}},
+        ],
+    }
+    bulks = sample("search_bulk_size_count")
+    bulk_docs = sample("search_bulk_size_sum")
+    latencies = sample("search_event_latency_seconds_count", {"index": "books"})
+
+    with patch("app.kafka_consumer.es_client", mock_es):
+        from app.kafka_consumer import index_batch
+
+        await index_batch(
+            [
+                {"event": "book_created", "data": {"_id": "b1"}, "produced_at": 1.0},
+                {"event": "book_created", "data": {"_id": "b2"}, "produced_at": 1.0},
+            ]
+        )
+
+    assert sample("search_bulk_size_count") == bulks + 1
+    assert sample("search_bulk_size_sum") == bulk_docs + 2
+    # Only the document that was actually indexed counts towards freshness
+    assert sample("search_event_latency_seconds_count", {"index": "books"}) == latencies + 1
+
+
+# --- Event formats ---
+
+
+async def test_batch_reads_legacy_json_and_binary_events_side_by_side(resilient_env):
+    mock_es = AsyncMock()
+    mock_es.bulk.return_value = _bulk_response(
+        ("b1", 201, None), ("b2", 201, None), ("b3", 201, None)
+    )
+    mock_consumer = _make_batch_consumer(
+        {
+            "tp0": [
+                _legacy_message({"event": "book_created", "data": {"_id": "b1", "title": "Old"}}),
+                _make_msg("book_created", {"_id": "b2", "title": "Packed"}),
+                _make_msg("book_created", {"_id": "b3", "title": "Zipped"}, compression="zlib"),
+            ]
+        }
+    )
+
+    with (
+        patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 1),
+        patch("app.kafka_consumer.settings.CONSUMER_BATCH_SIZE", 3),
+    ):
+        await _run_consumer_briefly(mock_consumer, mock_es)
+
+    assert _bulk_ids(mock_es.bulk.call_args) == ["b1", "b2", "b3"]
+    mock_consumer.commit.assert_called_once()
+
+
+async def test_unreadable_and_future_events_go_to_dlq(resilient_env):
+    from app.kafka_consumer import decode_messages
+
+    _, send_to_dlq = resilient_env
+    garbage = MagicMock(
+        value=b"\xc1 not msgpack", headers=[("content-type", b"application/msgpack")]
+    )
+    future = _legacy_message({"schema_version": 99, "event": "book_created", "data": {"_id": "b9"}})
+    good = _make_msg("book_created", {"_id": "b1", "title": "Ok"})
+
+    decoded = await decode_messages([garbage, future, good])
+
+    assert [msg for msg, _ in decoded] == [good]
+    (failures, attempts, topic), _ = send_to_dlq.call_args
+    assert (attempts, topic) == (1, "library.events")
+    (raw_event, raw_error), (future_event, future_error) = failures
+    assert raw_event["headers"] == {"content-type": "application/msgpack"}
+    assert raw_error["type"] == future_error["type"] == "event_decode_error"
+    # A newer envelope is kept as is, so it can be replayed once the consumer understands it
+    assert future_event["schema_version"] == 99
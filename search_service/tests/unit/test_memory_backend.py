@@ -0,0 +1,282 @@
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import orjson
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.backends import MemoryBackend
+from app.events import envelope
+from app.kafka_consumer import INDEXED_EVENTS, BatchProcessor, commit_offsets
+from app.memory_index import InvertedIndex, TermTrie
+
+
+def _event(event_type, doc_id, version=1, **data):
+    return {"event": event_type, "data": {"_id": doc_id, "version": version, **data}}
+
+
+# --- Index ---
+
+
+def test_bm25_prefers_denser_match():
+    index = InvertedIndex()
+    index.put("long", {"title": "war", "description": "peace " * 30})
+    index.put("short", {"title": "war and war"})
+    index.put("other", {"title": "peace"})
+
+    slots, scores = index.score(index.expand("war"))
+    ranked = index.top(slots, scores, 10)
+
+    assert [index.ids[slot] for slot, _ in ranked] == ["short", "long"]
+
+
+def test_query_words_match_typos_and_prefixes():
+    index = InvertedIndex()
+    index.put("b1", {"title": "Tolstoy"})
+    index.put("b2", {"title": "Dostoevsky"})
+
+    for query in ("tolstoi", "tols", "TOLSTOY"):
+        slots, scores = index.score(index.expand(query))
+        assert [index.ids[slot] for slot, _ in index.top(slots, scores, 10)] == ["b1"]
+
+
+def test_trie_lookups():
+    trie = TermTrie()
+    for term in ("war", "warlock", "ward", "peace"):
+        trie.add(term)
+
+    assert trie.with_prefix("war", 10) == ["war", "ward", "warlock"]
+    assert trie.with_prefix("war", 2) == ["war", "ward"]
+    assert trie.within("wad", 1) == {"war": 1, "ward": 1}
+
+
+def test_deleted_documents_stop_matching_until_compacted_away():
+    index = InvertedIndex()
+    index.put("b1", {"title": "war"})
+    index.put("b1", {"title": "peace"})
+    index.delete("missing")
+
+    slots, _ = index.score(index.expand("war"))
+    assert len(slots) == 0
+    assert index.dead == 1
+
+    index.compact()
+    assert index.dead == 0
+    assert index.get("b1") == {"title": "peace"}
+
+
+# --- Events ---
+
+
+def test_apply_follows_versions_like_elasticsearch():
+    backend = MemoryBackend()
+    backend.apply(
+        [
+            _event("book_created", "b1", title="War", description="Old"),
+            _event("book_updated", "b1", version=3, title="War and Peace"),
+            _event("book_updated", "b1", version=2, title="Stale"),
+            _event("book_created", "b1", version=1, title="Replayed"),
+            _event("book_updated", "b2", version=2, title="Never created"),
+        ],
+        INDEXED_EVENTS,
+    )
+
+    book = backend.indices["books"].get("b1")
+    assert book["title"] == "War and Peace"
+    assert book["description"] == "Old"
+    assert book["version"] == 3
+    assert backend.indices["books"].get("b2") is None
+
+
+async def test_books_follow_their_authors_names():
+    backend = MemoryBackend()
+    backend.apply(
+        [
+            _event("book_created", "b1", title="Anna Karenina", author_ids=["a1"]),
+            _event("author_created", "a1", name="Leo Tolstoy"),
+            _event("author_updated", "a1", version=2, name="Lev Tolstoy"),
+        ],
+        INDEXED_EVENTS,
+    )
+
+    found = await backend.search("books", "lev", 10)
+
+    assert found["documents"][0]["authors"] == [{"id": "a1", "name": "Lev Tolstoy"}]
+
+    backend.apply([_event("book_deleted", "b1")], INDEXED_EVENTS)
+    assert backend.books_by_author["a1"] == set()
+
+
+async def test_snapshot_restores_indexes_from_mapped_files(tmp_path):
+    backend = MemoryBackend(str(tmp_path))
+    backend.apply(
+        [
+            _event("author_created", "a1", name="Leo Tolstoy"),
+            _event("book_created", "b1", title="War and Peace", author_ids=["a1"]),
+            _event("book_created", "b2", title="Warlock"),
+            _event("book_deleted", "b2"),
+        ],
+        INDEXED_EVENTS,
+    )
+    backend.save()
+    backend.save()  # older generations are removed
+
+    restored = MemoryBackend(str(tmp_path))
+    await restored.start()
+
+    assert restored.restored
+    assert len(list(tmp_path.glob("gen-*"))) == 1
+    assert isinstance(restored.indices["books"].postings["war"].slots, np.memmap)
+    assert [d["title"] for d in (await restored.search("books", "war", 10))["documents"]] == [
+        "War and Peace"
+    ]
+    assert await restored.suggest("war", ("books",), 5) == {
+        "books": [{"text": "War and Peace", "_id": "b1"}]
+    }
+
+    # Mapped postings are read-only: new events go to copies
+    restored.apply(
+        [
+            _event("book_created", "b3", title="War Stories"),
+            _event("author_updated", "a1", version=2, name="Lev Tolstoy"),
+        ],
+        INDEXED_EVENTS,
+    )
+    found = await restored.search("books", "war", 10)
+    assert {d["title"] for d in found["documents"]} == {"War and Peace", "War Stories"}
+    assert restored.indices["books"].get("b1")["authors"][0]["name"] == "Lev Tolstoy"
+
+
+async def test_start_without_snapshot_builds_from_events(tmp_path):
+    backend = MemoryBackend(str(tmp_path))
+    await backend.start()
+
+    assert not backend.restored
+    assert backend.indices == {}
+
+
+# --- Consumer in memory mode ---
+
+
+def _message(offset):
+    msg = MagicMock()
+    msg.value = orjson.dumps(
+        envelope("book_created", {"_id": f"b{offset}", "title": "War", "version": 1}, 1.0)
+    )
+    msg.headers = [("content-type", b"application/json")]
+    msg.partition, msg.offset = 0, offset
+    return msg
+
+
+async def test_memory_mode_feeds_backend_and_commits_with_snapshots(tmp_path, mock_es_client):
+    backend = MemoryBackend(str(tmp_path))
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    processor = BatchProcessor(consumer)
+    processor.buffer = [_message(1), _message(2)]
+
+    with (
+        patch("app.kafka_consumer.settings.SEARCH_BACKEND", "memory"),
+        patch("app.kafka_consumer.search_backend", backend),
+        patch("app.kafka_consumer.es_client", mock_es_client),
+    ):
+        await processor.flush()
+        consumer.commit.assert_not_called()  # no snapshot yet: offsets stay where they were
+
+        await commit_offsets(consumer, final=True)
+
+    mock_es_client.bulk.assert_not_called()
+    assert len(backend.indices["books"]) == 2
+    consumer.commit.assert_awaited_once()
+    assert (tmp_path / "CURRENT").exists()
+
+
+# --- The same endpoint tests for both backends ---
+
+RUN = uuid.uuid4().hex[:8]
+BOOK_ID, OTHER_BOOK_ID, AUTHOR_ID = f"book-{RUN}", f"other-{RUN}", f"author-{RUN}"
+SEED_EVENTS = [
+    _event("author_created", AUTHOR_ID, name="Ottoline Quarrington"),
+    _event(
+        "book_created",
+        BOOK_ID,
+        title="Zephyrine Chronicles",
+        description="Winds over the Zephyrine marshes",
+        author_ids=[AUTHOR_ID],
+    ),
+    _event("book_created", OTHER_BOOK_ID, title="Zephyrine Cookbook", description="Recipes"),
+]
+
+
+@pytest.fixture
+async def backend_client():
+    """
+    API client over a memory backend seeded with SEED_EVENTS, the way the consumer feeds it.
+    tests/integration/test_backend_integration.py runs the same tests against Elasticsearch.
+    """
+    from app.cache import query_cache
+    from app.main import app
+
+    backend = MemoryBackend()
+    backend.apply(SEED_EVENTS, INDEXED_EVENTS)
+
+    with (
+        patch("app.main.search_backend", backend),
+        patch("app.main.consume_events", new_callable=AsyncMock),
+    ):
+        await query_cache.clear()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            yield ac
+
+
+async def test_backend_search_by_title_typo_prefix_and_author(backend_client):
+    for query in ("zephyrine", "zephyrina", "zephy", "quarrington"):
+        resp = await backend_client.get("/search/", params={"query": query})
+
+        assert resp.status_code == 200
+        assert "Zephyrine Chronicles" in [doc["title"] for doc in resp.json()], query
+
+
+async def test_backend_search_projection_highlight_and_total(backend_client):
+    resp = await backend_client.get(
+        "/search/",
+        params={"query": "marshes", "fields": "title", "highlight": "true"},
+    )
+
+    doc = next(d for d in resp.json() if d["title"] == "Zephyrine Chronicles")
+    assert set(doc) == {"title", "_highlight"}
+    assert "<em>marshes</em>" in doc["_highlight"]["description"][0]
+    assert int(resp.headers["X-Total-Count"]) >= 1
+
+
+async def test_backend_search_missing_index_is_empty(backend_client):
+    resp = await backend_client.get("/search/", params={"query": "zephyrine", "index": "series"})
+
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+async def test_backend_pages_through_all_matches(backend_client):
+    titles, cursor = [], None
+    for _ in range(10):
+        params = {"query": "zephyrine", "size": 1, "paginate": "true"}
+        if cursor:
+            params["cursor"] = cursor
+        resp = await backend_client.get("/search/", params=params)
+        titles += [doc["title"] for doc in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert {"Zephyrine Chronicles", "Zephyrine Cookbook"} <= set(titles)
+    assert len(titles) == len(set(titles))
+
+
+async def test_backend_search_all_and_suggest(backend_client):
+    found = (await backend_client.get("/search/all/", params={"query": "quarrington"})).json()
+    assert "Ottoline Quarrington" in [doc["name"] for doc in found["authors"]]
+    assert "Zephyrine Chronicles" in [doc["title"] for doc in found["books"]]
+
+    resp = await backend_client.get("/suggest/", params={"prefix": "zephyr", "index": "books"})
+    assert {"Zephyrine Chronicles", "Zephyrine Cookbook"} <= {s["text"] for s in resp.json()}
@@ -0,0 +1,85 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiokafka import TopicPartition
+from aiokafka.structs import OffsetAndMetadata
+from elastic_transport import AsyncTransport
+from prometheus_client import REGISTRY
+
+from app.metrics import InstrumentedTransport, LagMonitor, endpoint_of, observe_indexed
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_endpoint_of_uses_last_underscore_segment():
+    assert endpoint_of("/_bulk") == "_bulk"
+    assert endpoint_of("/books/_search?size=10") == "_search"
+    assert endpoint_of("/books/_doc/b1") == "_doc"
+    assert endpoint_of("/books_v2") == "index"
+
+
+async def test_transport_times_every_request_including_failures():
+    transport = object.__new__(InstrumentedTransport)
+    before = _sample("search_es_request_seconds_count", {"endpoint": "_msearch"})
+
+    with patch.object(AsyncTransport, "perform_request", AsyncMock(side_effect=[{}, TimeoutError])):
+        await transport.perform_request("POST", "/_msearch")
+        with pytest.raises(TimeoutError):
+            await transport.perform_request("POST", "/_msearch")
+
+    assert _sample("search_es_request_seconds_count", {"endpoint": "_msearch"}) == before + 2
+
+
+def test_observe_indexed_skips_events_without_producer_timestamp():
+    before = _sample("search_event_latency_seconds_count", {"index": "authors"})
+
+    with patch("app.metrics.time.time", return_value=1010.0):
+        observe_indexed(
+            [
+                {"event": "author_created", "data": {}, "produced_at": 1000.0},
+                {"event": "author_created", "data": {}},
+            ],
+            {"author_created": "authors"},
+        )
+
+    assert _sample("search_event_latency_seconds_count", {"index": "authors"}) == before + 1
+
+
+def _lag_monitor(end_offsets, committed):
+    monitor = LagMonitor("library.events", "search_group")
+    monitor._admin = MagicMock()
+    monitor._admin.list_consumer_group_offsets = AsyncMock(return_value=committed)
+    monitor._offsets = MagicMock()
+    monitor._offsets.topics = AsyncMock()
+    monitor._offsets.partitions_for_topic = MagicMock(return_value={0, 1, 2})
+    monitor._offsets.end_offsets = AsyncMock(return_value=end_offsets)
+    return monitor
+
+
+async def test_lag_monitor_compares_committed_and_end_offsets():
+    tps = [TopicPartition("library.events", p) for p in range(3)]
+    monitor = _lag_monitor(
+        {tps[0]: 100, tps[1]: 50, tps[2]: 7},
+        # Partition 2 was never committed by the group
+        {tps[0]: OffsetAndMetadata(90, ""), tps[1]: OffsetAndMetadata(50, "")},
+    )
+
+    lag = await monitor.measure()
+
+    assert lag == {0: 10, 1: 0, 2: 7}
+    assert REGISTRY.get_sample_value("search_consumer_lag", {"partition": "0"}) == 10
+    monitor._admin.list_consumer_group_offsets.assert_called_once_with("search_group")
+
+
+async def test_lag_monitor_reuses_recent_measurement():
+    tp = TopicPartition("library.events", 0)
+    monitor = _lag_monitor({tp: 5}, {tp: OffsetAndMetadata(5, "")})
+    monitor._offsets.partitions_for_topic.return_value = {0}
+
+    with patch("app.metrics.settings.HEALTH_LAG_CACHE_SECONDS", 60):
+        await monitor.measure()
+        await monitor.measure()
+
+    monitor._offsets.end_offsets.assert_called_once()
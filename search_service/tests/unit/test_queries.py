@@ -0,0 +1,104 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.queries import (
+    build_query,
+    decode_cursor,
+    document,
+    encode_cursor,
+    msearch_body,
+    result_size,
+    search_request,
+    split_msearch,
+)
+
+
+def test_build_query_wildcard_mode():
+    query = build_query("war", mode="wildcard")
+    multi_match, substring = query["bool"]["should"]
+    assert multi_match["multi_match"]["query"] == "war"
+    assert substring["query_string"]["query"] == "*war*"
+    assert query["bool"]["minimum_should_match"] == 1
+
+
+def test_build_query_ngram_mode_avoids_wildcards():
+    query = build_query("tols war", mode="ngram")
+    _, partial = query["bool"]["should"]
+    assert "query_string" not in partial
+    assert partial["multi_match"]["fields"] == [
+        "title.ngram",
+        "description.ngram",
+        "name.ngram",
+        "authors.name.ngram",
+    ]
+    assert partial["multi_match"]["query"] == "tols war"
+
+
+def test_build_query_uses_configured_mode():
+    with patch("app.queries.settings.SEARCH_MATCH_MODE", "wildcard"):
+        assert "query_string" in build_query("war")["bool"]["should"][1]
+    with patch("app.queries.settings.SEARCH_MATCH_MODE", "ngram"):
+        assert "multi_match" in build_query("war")["bool"]["should"][1]
+
+
+def test_result_size_per_index():
+    with (
+        patch("app.queries.settings.SEARCH_DEFAULT_SIZE", 10),
+        patch("app.queries.settings.SEARCH_SIZE_PER_INDEX", {"authors": 5}),
+    ):
+        assert result_size("books") == 10
+        assert result_size("authors") == 5
+
+
+def test_msearch_body_pairs_header_and_body():
+    searches = msearch_body("war", ("books", "authors"))
+    assert searches[0] == {"index": "books"}
+    assert searches[2] == {"index": "authors"}
+    assert searches[1]["query"] == searches[3]["query"] == build_query("war")
+    assert "size" in searches[1]
+
+
+def test_split_msearch_keeps_partial_results():
+    response = {
+        "responses": [
+            {"error": {"type": "search_phase_execution_exception"}, "status": 500},
+            {"hits": {"hits": [{"_source": {"name": "Tolstoy"}}]}},
+        ]
+    }
+    assert split_msearch(("books", "authors"), response) == {
+        "books": [],
+        "authors": [{"name": "Tolstoy"}],
+    }
+
+
+def test_search_request_projection_and_highlight():
+    request = search_request(
+        "war", 20, includes=["title"], excludes=["description"], highlight=True
+    )
+    assert request["size"] == 20
+    assert request["source"] == {"includes": ["title"], "excludes": ["description"]}
+    assert set(request["highlight"]["fields"]) == {"title", "description", "name", "authors.name"}
+    assert isinstance(request["track_total_hits"], int)
+
+
+def test_search_request_defaults_return_full_source():
+    request = search_request("war", 10)
+    assert "source" not in request
+    assert "highlight" not in request
+
+
+def test_document_attaches_highlight():
+    hit = {"_source": {"title": "War"}, "highlight": {"title": ["<em>War</em>"]}}
+    assert document(hit) == {"title": "War", "_highlight": {"title": ["<em>War</em>"]}}
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("pit-1", [1.5, 42])
+    assert decode_cursor(cursor) == ("pit-1", [1.5, 42])
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor("pit", [1])[:-4], "e30="])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
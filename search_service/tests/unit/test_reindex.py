@@ -1,51 +1,392 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
+import pytest
 
-async def test_reindex_indexes_books_and_authors(client, mock_es_client):
-    books_resp = MagicMock()
-    books_resp.status_code = 200
-    books_resp.json.return_value = [
-        {"_id": "b1", "title": "Book 1", "description": "D1", "author_ids": []},
-        {"_id": "b2", "title": "Book 2", "description": "D2", "author_ids": []},
-    ]
+import app.reindex as reindex_module
+from app.events import MSGPACK, content_headers, envelope, serializer
 
-    authors_resp = MagicMock()
-    authors_resp.status_code = 200
-    authors_resp.json.return_value = [
-        {"_id": "a1", "name": "Author 1", "book_ids": []},
-    ]
 
-    mock_http = AsyncMock()
-    mock_http.get = AsyncMock(side_effect=[books_resp, authors_resp])
+@pytest.fixture(autouse=True)
+def reset_reindex_job():
+    reindex_module.current_job = None
+    reindex_module._job_task = None
+    with patch("app.reindex.settings.REINDEX_REPLAY_EVENTS", False):
+        yield
+    reindex_module.current_job = None
 
-    with patch("httpx.AsyncClient") as mock_cls:
-        mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-        mock_cls.return_value.__aexit__ = AsyncMock()
 
-        resp = await client.post("/reindex/")
+def _response(payload, status_code=200):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = payload
+    if status_code >= 400:
+        resp.raise_for_status.side_effect = httpx.HTTPStatusError(
+            "error", request=MagicMock(), response=resp
+        )
+    return resp
 
-    assert resp.status_code == 200
-    data = resp.json()
-    assert data["indexed"]["books"] == 2
-    assert data["indexed"]["authors"] == 1
-    assert mock_es_client.index.call_count == 3
 
+def _core_api(pages):
+    """Fake Core Service: returns consecutive pages per path, then an empty page."""
+    remaining = {path: list(path_pages) for path, path_pages in pages.items()}
+    calls = []
 
-async def test_reindex_handles_core_service_error(client, mock_es_client):
-    error_resp = MagicMock()
-    error_resp.status_code = 500
+    async def get(url, params=None):
+        path = url.removeprefix(reindex_module.settings.CORE_API_URL)
+        calls.append((path, dict(params or {})))
+        path_pages = remaining.get(path, [])
+        return path_pages.pop(0) if path_pages else _response([])
 
     mock_http = AsyncMock()
-    mock_http.get = AsyncMock(return_value=error_resp)
+    mock_http.get = AsyncMock(side_effect=get)
+    mock_http.calls = calls
+    return mock_http
 
-    with patch("httpx.AsyncClient") as mock_cls:
-        mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-        mock_cls.return_value.__aexit__ = AsyncMock()
 
+async def _run_job(client, mock_http):
+    with patch("app.reindex.core_client", mock_http):
         resp = await client.post("/reindex/")
+        await reindex_module._job_task
+    return resp
 
-    assert resp.status_code == 200
-    data = resp.json()
-    assert data["indexed"]["books"] == 0
-    assert data["indexed"]["authors"] == 0
+
+async def test_reindex_runs_in_background(client, mock_es_client):
+    mock_http = _core_api(
+        {
+            "/books/": [
+                _response(
+                    [
+                        {"_id": "b1", "title": "Book 1", "description": "D1", "author_ids": []},
+                        {"_id": "b2", "title": "Book 2", "description": "D2", "author_ids": []},
+                    ]
+                )
+            ],
+            "/authors/": [_response([{"_id": "a1", "name": "Author 1", "book_ids": []}])],
+        }
+    )
+
+    resp = await _run_job(client, mock_http)
+
+    assert resp.status_code == 202
+    assert resp.json()["status"] == "running"
+
+    status = (await client.get("/reindex/status")).json()
+    assert status["status"] == "completed"
+    assert status["indexed"] == {"books": 2, "authors": 1}
+    assert status["docs_per_second"] > 0
+    assert mock_es_client.bulk.call_count == 2
     mock_es_client.index.assert_not_called()
+
+
+async def test_reindex_pages_with_cursor(client, mock_es_client):
+    with patch("app.reindex.settings.REINDEX_PAGE_SIZE", 2):
+        mock_http = _core_api(
+            {
+                "/books/": [
+                    _response([{"_id": "b1", "title": "B1"}, {"_id": "b2", "title": "B2"}]),
+                    _response([{"_id": "b3", "title": "B3"}]),
+                ],
+            }
+        )
+        await _run_job(client, mock_http)
+
+    book_calls = [params for path, params in mock_http.calls if path == "/books/"]
+    assert book_calls == [{"limit": 2}, {"limit": 2, "after": "b2"}]
+    assert reindex_module.job_status()["indexed"]["books"] == 3
+
+
+async def test_reindex_limits_bulk_requests_in_flight(client, mock_es_client):
+    active = 0
+    peak = 0
+
+    async def slow_bulk(operations):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return {"errors": False, "items": []}
+
+    mock_es_client.bulk.side_effect = slow_bulk
+    pages = [_response([{"_id": f"b{i}", "title": "B"}]) for i in range(10)]
+
+    with (
+        patch("app.reindex.settings.REINDEX_PAGE_SIZE", 1),
+        patch("app.reindex.settings.REINDEX_MAX_IN_FLIGHT", 3),
+    ):
+        await _run_job(client, _core_api({"/books/": pages}))
+
+    assert peak == 3
+    assert reindex_module.job_status()["indexed"]["books"] == 10
+
+
+async def test_reindex_counts_item_errors(client, mock_es_client):
+    mock_es_client.bulk.return_value = {
+        "errors": True,
+        "items": [
+            {"index": {"_index": "books", "_id": "b1", "status": 201}},
+            {"index": {"_index": "books", "_id": "b2", "status": 400, "error": {"type": "x"}}},
+        ],
+    }
+    mock_http = _core_api(
+        {"/books/": [_response([{"_id": "b1", "title": "B1"}, {"_id": "b2", "title": "B2"}])]}
+    )
+
+    await _run_job(client, mock_http)
+
+    status = reindex_module.job_status()
+    assert status["indexed"]["books"] == 1
+    assert status["errors"] == 1
+    # The aliases stay on the previous index, which still has b2
+    assert status["status"] == "failed"
+    mock_es_client.indices.update_aliases.assert_not_called()
+
+
+async def test_reindex_retries_rejected_items(client, mock_es_client):
+    mock_es_client.bulk.side_effect = [
+        {
+            "errors": True,
+            "items": [
+                {"index": {"_index": "books", "_id": "b1", "status": 201}},
+                {
+                    "index": {
+                        "_index": "books",
+                        "_id": "b2",
+                        "status": 429,
+                        "error": {"type": "es_rejected_execution_exception"},
+                    }
+                },
+            ],
+        },
+        {"errors": False, "items": [{"index": {"_index": "books", "_id": "b2", "status": 201}}]},
+    ]
+    mock_http = _core_api(
+        {"/books/": [_response([{"_id": "b1", "title": "B1"}, {"_id": "b2", "title": "B2"}])]}
+    )
+
+    with patch("app.reindex.backoff_delay", return_value=0):
+        await _run_job(client, mock_http)
+
+    status = reindex_module.job_status()
+    assert status["status"] == "completed"
+    assert status["indexed"]["books"] == 2
+    assert status["errors"] == 0
+    retried = mock_es_client.bulk.call_args_list[1].kwargs["operations"]
+    assert retried[0]["index"]["_id"] == "b2"
+    mock_es_client.indices.update_aliases.assert_called_once()
+
+
+async def test_reindex_handles_core_service_error(client, mock_es_client):
+    mock_http = _core_api({"/books/": [_response({"detail": "boom"}, status_code=500)]})
+
+    await _run_job(client, mock_http)
+
+    status = (await client.get("/reindex/status")).json()
+    assert status["status"] == "failed"
+    assert status["indexed"] == {"books": 0, "authors": 0}
+    mock_es_client.bulk.assert_not_called()
+    # The half-built indices are dropped and the aliases are left alone
+    mock_es_client.indices.update_aliases.assert_not_called()
+    deleted = {c.kwargs["index"] for c in mock_es_client.indices.delete.call_args_list}
+    assert deleted == {"books_v1", "authors_v1"}
+
+
+async def test_reindex_fails_when_a_bulk_page_fails(client, mock_es_client):
+    mock_es_client.bulk.side_effect = [
+        RuntimeError("bulk rejected"),
+        {"errors": False, "items": []},
+    ]
+    mock_http = _core_api(
+        {
+            "/authors/": [
+                _response([{"_id": "a1", "name": "A1"}]),
+                _response([{"_id": "a2", "name": "A2"}]),
+            ]
+        }
+    )
+    fetch = mock_http.get.side_effect
+
+    async def slow_get(url, params=None):
+        # The failed page finishes while the next one is still being fetched
+        await asyncio.sleep(0.01)
+        return await fetch(url, params)
+
+    mock_http.get.side_effect = slow_get
+
+    with patch("app.reindex.settings.REINDEX_PAGE_SIZE", 1):
+        await _run_job(client, mock_http)
+
+    status = (await client.get("/reindex/status")).json()
+    assert status["status"] == "failed"
+    assert "bulk rejected" in status["error"]
+    # The aliases stay on the previous, complete index
+    mock_es_client.indices.update_aliases.assert_not_called()
+
+
+async def test_reindex_fails_when_replicas_are_not_allocated(client, mock_es_client):
+    mock_es_client.cluster.health.return_value = {"status": "yellow", "timed_out": True}
+    mock_http = _core_api({"/books/": [_response([{"_id": "b1", "title": "B1"}])]})
+
+    await _run_job(client, mock_http)
+
+    status = (await client.get("/reindex/status")).json()
+    assert status["status"] == "failed"
+    assert "yellow" in status["error"]
+    mock_es_client.indices.update_aliases.assert_not_called()
+
+
+async def test_reindex_rejects_concurrent_job(client):
+    reindex_module.current_job = {
+        "job_id": "busy",
+        "status": "running",
+        "phase": "loading",
+        "targets": {},
+        "replayed": 0,
+        "started_at": 0.0,
+        "finished_at": None,
+        "indexed": {"books": 0, "authors": 0},
+        "errors": 0,
+        "error": None,
+    }
+    resp = await client.post("/reindex/")
+    assert resp.status_code == 409
+    assert resp.json()["detail"]["job_id"] == "busy"
+
+
+async def test_reindex_status_without_job(client):
+    resp = await client.get("/reindex/status")
+    assert resp.status_code == 404
+
+
+# --- Blue/green ---
+
+
+async def test_reindex_builds_new_versions_and_swaps_aliases(client, mock_es_client):
+    mock_es_client.indices.get.side_effect = lambda index: {
+        "books_v*": {"books_v1": {}, "books_v2": {}},
+        "authors_v*": {"authors_v1": {}},
+    }[index]
+    mock_es_client.indices.get_alias.side_effect = lambda name: {
+        "books": {"books_v2": {}},
+        "authors": {"authors_v1": {}},
+    }[name]
+    mock_http = _core_api(
+        {
+            "/books/": [_response([{"_id": "b1", "title": "B1"}])],
+            "/authors/": [_response([{"_id": "a1", "name": "A1"}])],
+        }
+    )
+
+    await _run_job(client, mock_http)
+
+    status = reindex_module.job_status()
+    assert status["status"] == "completed"
+    assert status["targets"] == {"books": "books_v3", "authors": "authors_v2"}
+
+    # New versions are created with bulk-load settings...
+    created = {c.kwargs["index"]: c.kwargs for c in mock_es_client.indices.create.call_args_list}
+    assert created["books_v3"]["settings"] == {"refresh_interval": "-1", "number_of_replicas": 0}
+    # ...and documents go to them, not to the live aliases
+    bulk_indices = {
+        op["index"]["_index"]
+        for call in mock_es_client.bulk.call_args_list
+        for op in call.kwargs["operations"]
+        if "index" in op
+    }
+    assert bulk_indices == {"books_v3", "authors_v2"}
+
+    # Live settings are restored and segments merged before the swap
+    restored = {c.kwargs["index"] for c in mock_es_client.indices.put_settings.call_args_list}
+    assert restored == {"books_v3", "authors_v2"}
+    assert mock_es_client.indices.forcemerge.call_count == 2
+    # ...with a timeout long enough for the merge, and the replicas are allocated
+    mock_es_client.options.assert_any_call(
+        request_timeout=reindex_module.settings.REINDEX_FINALIZE_TIMEOUT
+    )
+    healthy = {c.kwargs["index"] for c in mock_es_client.cluster.health.call_args_list}
+    assert healthy == {"books_v3", "authors_v2"}
+    assert mock_es_client.cluster.health.call_args.kwargs["wait_for_status"] == "green"
+
+    mock_es_client.indices.update_aliases.assert_called_once_with(
+        actions=[
+            {"remove": {"index": "authors_v1", "alias": "authors"}},
+            {"add": {"index": "authors_v2", "alias": "authors"}},
+            {"remove": {"index": "books_v2", "alias": "books"}},
+            {"add": {"index": "books_v3", "alias": "books"}},
+        ]
+    )
+    deleted = {c.kwargs["index"] for c in mock_es_client.indices.delete.call_args_list}
+    assert deleted == {"books_v2", "authors_v1"}
+
+
+async def test_reindex_replaces_legacy_concrete_index(client, mock_es_client):
+    mock_es_client.indices.exists.side_effect = lambda index: index == "books"
+
+    await _run_job(client, _core_api({}))
+
+    actions = mock_es_client.indices.update_aliases.call_args.kwargs["actions"]
+    assert {"remove_index": {"index": "books"}} in actions
+    assert {"add": {"index": "books_v1", "alias": "books"}} in actions
+
+
+def _make_replay_consumer(end_offsets, records):
+    tp = reindex_module.TopicPartition(reindex_module.EVENTS_TOPIC, 0)
+    consumer = MagicMock()
+    consumer.start = AsyncMock()
+    consumer.stop = AsyncMock()
+    consumer.topics = AsyncMock()
+    consumer.partitions_for_topic.return_value = {0}
+    consumer.end_offsets = AsyncMock(side_effect=[{tp: offset} for offset in end_offsets])
+    position = {"value": 0}
+
+    def seek(tp, offset):
+        position["value"] = offset
+
+    async def getmany(*partitions, timeout_ms, max_records):
+        batch = [m for m in records if m.offset >= position["value"]]
+        if batch:
+            position["value"] = batch[-1].offset + 1
+        return {tp: batch}
+
+    async def get_position(tp):
+        return position["value"]
+
+    consumer.seek.side_effect = seek
+    consumer.getmany = AsyncMock(side_effect=getmany)
+    consumer.position = AsyncMock(side_effect=get_position)
+    return consumer
+
+
+def _record(offset, event_type, data):
+    record = MagicMock()
+    record.offset = offset
+    record.value = serializer(MSGPACK)(envelope(event_type, data, 0.0))
+    record.headers = content_headers(MSGPACK)
+    return record
+
+
+async def test_reindex_replays_events_published_during_build(client, mock_es_client):
+    records = [
+        _record(5, "book_created", {"_id": "b-old", "title": "Already in Mongo"}),
+        _record(6, "book_created", {"_id": "b-new", "title": "Created during build"}),
+    ]
+    # Offsets: 6 at start, 7 before the first replay, 7 after the swap
+    consumer = _make_replay_consumer([6, 7, 7], records)
+
+    with (
+        patch("app.reindex.settings.REINDEX_REPLAY_EVENTS", True),
+        patch("app.reindex.AIOKafkaConsumer", return_value=consumer),
+    ):
+        await _run_job(client, _core_api({}))
+
+    status = reindex_module.job_status()
+    assert status["status"] == "completed"
+    assert status["replayed"] == 1
+    replay_ops = mock_es_client.bulk.call_args.kwargs["operations"]
+    assert replay_ops == [
+        {"index": {"_index": "books_v1", "_id": "b-new"}},
+        {"title": "Created during build"},
+    ]
+    consumer.stop.assert_called_once()
@@ -0,0 +1,104 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError, BadRequestError, ConnectionTimeout
+
+from app.retry import (
+    AdaptiveLimit,
+    backoff_delay,
+    is_transient,
+    is_transient_item,
+    retry_transient,
+    supervise,
+)
+
+
+def es_error(cls, status, error_type):
+    meta = ApiResponseMeta(
+        status=status,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 9200),
+    )
+    return cls(error_type, meta=meta, body={"error": {"type": error_type, "reason": "test"}})
+
+
+def test_transient_errors_are_classified():
+    assert is_transient(ConnectionTimeout("timed out"))
+    assert is_transient(es_error(ApiError, 429, "es_rejected_execution_exception"))
+    assert is_transient(es_error(ApiError, 503, "unavailable_shards_exception"))
+    assert not is_transient(es_error(BadRequestError, 400, "mapper_parsing_exception"))
+    assert not is_transient(ValueError("bug"))
+
+
+def test_transient_bulk_items_are_classified():
+    assert is_transient_item({"status": 429, "error": {"type": "es_rejected_execution_exception"}})
+    assert is_transient_item({"status": 500, "error": {"type": "circuit_breaking_exception"}})
+    assert not is_transient_item({"status": 400, "error": {"type": "mapper_parsing_exception"}})
+
+
+def test_backoff_grows_exponentially_with_jitter_and_is_capped():
+    with (
+        patch("app.retry.settings.CONSUMER_RETRY_BASE_DELAY", 1.0),
+        patch("app.retry.settings.CONSUMER_RETRY_MAX_DELAY", 8.0),
+    ):
+        for attempt, full in ((1, 1.0), (2, 2.0), (3, 4.0), (10, 8.0)):
+            delays = {backoff_delay(attempt) for _ in range(20)}
+            assert all(full / 2 <= delay <= full for delay in delays)
+            assert len(delays) > 1
+
+
+def test_adaptive_limit_halves_and_recovers():
+    limit = AdaptiveLimit(8)
+    assert [limit.shrink() for _ in range(5)] == [4, 2, 1, 1, 1]
+    assert [limit.grow() for _ in range(5)] == [2, 4, 8, 8, 8]
+
+
+async def test_retry_transient_retries_until_success():
+    call = AsyncMock(side_effect=[ConnectionTimeout("t"), ConnectionTimeout("t"), "ok"])
+    with patch("app.retry.backoff_delay", return_value=0):
+        assert await retry_transient(call, 1, key="v") == "ok"
+    assert call.call_count == 3
+    call.assert_called_with(1, key="v")
+
+
+async def test_retry_transient_gives_up_after_max_attempts():
+    call = AsyncMock(side_effect=ConnectionTimeout("t"))
+    with (
+        patch("app.retry.backoff_delay", return_value=0),
+        patch("app.retry.settings.CONSUMER_RETRY_MAX_ATTEMPTS", 3),
+        pytest.raises(ConnectionTimeout),
+    ):
+        await retry_transient(call)
+    assert call.call_count == 3
+
+
+async def test_retry_transient_does_not_retry_permanent_errors():
+    call = AsyncMock(side_effect=es_error(BadRequestError, 400, "mapper_parsing_exception"))
+    with pytest.raises(BadRequestError):
+        await retry_transient(call)
+    call.assert_called_once()
+
+
+async def test_supervise_restarts_crashed_task():
+    task = AsyncMock(side_effect=[RuntimeError("boom"), RuntimeError("boom"), None])
+    with patch("app.retry.backoff_delay", return_value=0):
+        await supervise("test", task)
+    assert task.call_count == 3
+
+
+async def test_supervise_lets_cancellation_through():
+    started = asyncio.Event()
+
+    async def forever():
+        started.set()
+        await asyncio.sleep(3600)
+
+    task = asyncio.create_task(supervise("test", forever))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
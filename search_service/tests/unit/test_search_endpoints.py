@@ -1,3 +1,6 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
 from elasticsearch import NotFoundError
 
 
@@ -40,13 +43,59 @@ async def test_search_not_found_returns_empty(client, mock_es_client):
     assert resp.json() == []
 
 
-async def test_search_all_returns_both_indices(client, mock_es_client):
+def _msearch_response(*items):
+    return {"responses": list(items)}
+
+
+def _hits(*sources):
+    return {"hits": {"hits": [{"_source": source} for source in sources]}}
+
+
+async def test_search_all_uses_single_msearch(client, mock_es_client):
+    mock_es_client.msearch.return_value = _msearch_response(
+        _hits({"title": "Book 1"}), _hits({"name": "Author 1"})
+    )
+
+    resp = await client.get("/search/all/", params={"query": "test"})
+    assert resp.status_code == 200
+    assert resp.json() == {"books": [{"title": "Book 1"}], "authors": [{"name": "Author 1"}]}
+    mock_es_client.msearch.assert_called_once()
+    mock_es_client.search.assert_not_called()
+
+    searches = mock_es_client.msearch.call_args.kwargs["searches"]
+    assert [header["index"] for header in searches[::2]] == ["books", "authors"]
+
+
+async def test_search_all_msearch_handles_missing_index(client, mock_es_client):
+    mock_es_client.msearch.return_value = _msearch_response(
+        {"error": {"type": "index_not_found_exception"}, "status": 404},
+        _hits({"name": "Author 1"}),
+    )
+
+    resp = await client.get("/search/all/", params={"query": "test"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["books"] == []
+    assert len(data["authors"]) == 1
+
+
+async def test_search_all_uses_configured_indices(client, mock_es_client):
+    mock_es_client.msearch.return_value = _msearch_response(_hits(), _hits(), _hits())
+
+    with patch("app.main.settings.SEARCH_ALL_INDICES", ["books", "authors", "series"]):
+        resp = await client.get("/search/all/", params={"query": "test"})
+
+    assert set(resp.json()) == {"books", "authors", "series"}
+
+
+async def test_search_all_gather_returns_both_indices(client, mock_es_client):
     mock_es_client.search.side_effect = [
         {"hits": {"hits": [{"_source": {"title": "Book 1"}}]}},
         {"hits": {"hits": [{"_source": {"name": "Author 1"}}]}},
     ]
 
-    resp = await client.get("/search/all/", params={"query": "test"})
+    with patch("app.main.settings.SEARCH_ALL_STRATEGY", "gather"):
+        resp = await client.get("/search/all/", params={"query": "test"})
     assert resp.status_code == 200
     data = resp.json()
     assert len(data["books"]) == 1
@@ -54,14 +103,273 @@ async def test_search_all_returns_both_indices(client, mock_es_client):
     assert mock_es_client.search.call_count == 2
 
 
-async def test_search_all_handles_missing_index(client, mock_es_client):
+async def test_search_all_gather_handles_missing_index(client, mock_es_client):
     mock_es_client.search.side_effect = [
         NotFoundError(404, "index_not_found_exception", body={}),
         {"hits": {"hits": [{"_source": {"name": "Author 1"}}]}},
     ]
 
-    resp = await client.get("/search/all/", params={"query": "test"})
+    with patch("app.main.settings.SEARCH_ALL_STRATEGY", "gather"):
+        resp = await client.get("/search/all/", params={"query": "test"})
     assert resp.status_code == 200
     data = resp.json()
     assert data["books"] == []
     assert len(data["authors"]) == 1
+
+
+# --- Paging, projection, highlighting ---
+
+
+def _page(*ids, total=3):
+    return {
+        "pit_id": "pit-1",
+        "hits": {
+            "total": {"value": total, "relation": "eq"},
+            "hits": [{"_source": {"title": i}, "sort": [1.0, n]} for n, i in enumerate(ids)],
+        },
+    }
+
+
+async def test_search_passes_size_projection_and_highlight(client, mock_es_client):
+    mock_es_client.search.return_value = {
+        "hits": {
+            "total": {"value": 10000, "relation": "gte"},
+            "hits": [{"_source": {"title": "War"}, "highlight": {"title": ["<em>War</em>"]}}],
+        }
+    }
+
+    resp = await client.get(
+        "/search/",
+        params={"query": "war", "size": 25, "fields": "title, author_ids", "highlight": "true"},
+    )
+
+    kwargs = mock_es_client.search.call_args.kwargs
+    assert kwargs["size"] == 25
+    assert kwargs["source"] == {"includes": ["title", "author_ids"]}
+    assert "highlight" in kwargs
+    assert resp.json() == [{"title": "War", "_highlight": {"title": ["<em>War</em>"]}}]
+    assert resp.headers["X-Total-Count"] == "10000"
+    assert resp.headers["X-Total-Relation"] == "gte"
+
+
+async def test_search_rejects_oversized_page(client):
+    resp = await client.get("/search/", params={"query": "war", "size": 100000})
+    assert resp.status_code == 422
+
+
+async def test_search_paginates_with_point_in_time(client, mock_es_client):
+    mock_es_client.search.side_effect = [_page("A", "B"), _page("C")]
+
+    first = await client.get("/search/", params={"query": "war", "size": 2, "paginate": "true"})
+    assert [d["title"] for d in first.json()] == ["A", "B"]
+    mock_es_client.open_point_in_time.assert_called_once()
+    first_call = mock_es_client.search.call_args.kwargs
+    assert first_call["pit"]["id"] == "pit-1"
+    assert "index" not in first_call
+    assert "search_after" not in first_call
+
+    cursor = first.headers["X-Next-Cursor"]
+    second = await client.get("/search/", params={"query": "war", "size": 2, "cursor": cursor})
+    assert [d["title"] for d in second.json()] == ["C"]
+    assert mock_es_client.search.call_args.kwargs["search_after"] == [1.0, 1]
+
+    # Last page: no further cursor and the point in time is released
+    assert "X-Next-Cursor" not in second.headers
+    mock_es_client.close_point_in_time.assert_called_once_with(id="pit-1")
+
+
+async def test_fast_json_responses_keep_body_and_headers(client, mock_es_client):
+    mock_es_client.search.side_effect = [_page("Война", "B"), _page("C")]
+    mock_es_client.msearch.return_value = _msearch_response(
+        _hits({"title": "Book 1"}), _hits({"name": "Author 1"})
+    )
+
+    with patch("app.responses.settings.FAST_JSON_RESPONSES", True):
+        first = await client.get("/search/", params={"query": "war", "size": 2, "paginate": "1"})
+        second = await client.get(
+            "/search/", params={"query": "war", "size": 2, "cursor": first.headers["X-Next-Cursor"]}
+        )
+        both = await client.get("/search/all/", params={"query": "test"})
+
+    assert first.headers["content-type"] == "application/json"
+    assert [d["title"] for d in first.json()] == ["Война", "B"]
+    assert first.headers["X-Total-Count"] == "3"
+    assert [d["title"] for d in second.json()] == ["C"]
+    assert "X-Next-Cursor" not in second.headers
+    assert both.json() == {"books": [{"title": "Book 1"}], "authors": [{"name": "Author 1"}]}
+
+
+async def test_search_rejects_invalid_cursor(client):
+    resp = await client.get("/search/", params={"query": "war", "cursor": "nope"})
+    assert resp.status_code == 400
+
+
+async def test_search_expired_cursor(client, mock_es_client):
+    from app.queries import encode_cursor
+
+    mock_es_client.search.side_effect = NotFoundError(404, "search_context_missing_exception", {})
+
+    resp = await client.get(
+        "/search/", params={"query": "war", "cursor": encode_cursor("pit-old", [1.0, 5])}
+    )
+    assert resp.status_code == 410
+
+
+async def test_paginated_search_is_not_cached(client, mock_es_client):
+    mock_es_client.search.return_value = _page("A")
+
+    for _ in range(2):
+        await client.get("/search/", params={"query": "war", "paginate": "true"})
+
+    assert mock_es_client.search.call_count == 2
+
+
+# --- Result cache ---
+
+
+async def test_search_serves_repeated_query_from_cache(client, mock_es_client):
+    mock_es_client.search.return_value = {"hits": {"hits": [{"_source": {"title": "Book"}}]}}
+
+    first = await client.get("/search/", params={"query": "War"})
+    second = await client.get("/search/", params={"query": "  war "})
+
+    assert first.json() == second.json() == [{"title": "Book"}]
+    assert mock_es_client.search.call_count == 1
+
+    stats = (await client.get("/cache/stats")).json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+async def test_search_cache_is_per_index(client, mock_es_client):
+    mock_es_client.search.return_value = {"hits": {"hits": []}}
+
+    await client.get("/search/", params={"query": "war", "index": "books"})
+    await client.get("/search/", params={"query": "war", "index": "authors"})
+
+    assert mock_es_client.search.call_count == 2
+
+
+async def test_search_does_not_cache_missing_index(client, mock_es_client):
+    mock_es_client.search.side_effect = [
+        NotFoundError(404, "index_not_found_exception", body={}),
+        {"hits": {"hits": [{"_source": {"title": "Book"}}]}},
+    ]
+
+    await client.get("/search/", params={"query": "test"})
+    resp = await client.get("/search/", params={"query": "test"})
+
+    assert resp.json() == [{"title": "Book"}]
+
+
+async def test_search_all_cached_until_invalidated(client, mock_es_client):
+    from app.cache import query_cache
+
+    mock_es_client.msearch.return_value = _msearch_response(_hits(), _hits())
+
+    await client.get("/search/all/", params={"query": "test"})
+    await client.get("/search/all/", params={"query": "test"})
+    assert mock_es_client.msearch.call_count == 1
+
+    await query_cache.invalidate({"authors"})
+    await client.get("/search/all/", params={"query": "test"})
+    assert mock_es_client.msearch.call_count == 2
+
+
+# --- Metrics and readiness ---
+
+
+async def test_metrics_exposes_prometheus_text(client):
+    from app.main import lag_monitor
+
+    resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "search_es_request_seconds" in resp.text
+    assert "search_event_latency_seconds" in resp.text
+    lag_monitor.measure.assert_called_once()
+
+
+async def test_health_ready_when_caught_up(client):
+    from app.main import lag_monitor
+
+    lag_monitor.measure.return_value = {0: 3, 1: 0}
+
+    resp = await client.get("/health/ready")
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "ready"
+    assert body["consumer_lag"]["max"] == 3
+    assert body["consumer_lag"]["total"] == 3
+    assert body["consumer_lag"]["partitions"] == {"0": 3, "1": 0}
+
+
+async def test_health_degraded_when_lag_above_threshold(client):
+    from app.main import lag_monitor
+
+    lag_monitor.measure.return_value = {0: 5000}
+
+    with patch("app.main.settings.HEALTH_MAX_LAG", 1000):
+        resp = await client.get("/health/ready")
+
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "degraded"
+
+
+async def test_health_degraded_when_lag_unknown(client):
+    from app.main import lag_monitor
+
+    lag_monitor.measure.side_effect = ConnectionError("Kafka is down")
+
+    resp = await client.get("/health/ready")
+
+    assert resp.json()["status"] == "degraded"
+    assert resp.json()["consumer_lag"]["max"] is None
+
+
+async def test_health_unavailable_without_elasticsearch(client, mock_es_client):
+    mock_es_client.ping.return_value = False
+
+    resp = await client.get("/health/ready")
+
+    assert resp.status_code == 503
+    assert resp.json()["status"] == "unavailable"
+
+
+# --- Lifespan ---
+
+
+async def test_lifespan_leaves_indexing_to_standalone_consumer(mock_es_client):
+    from app.main import app, lifespan
+
+    with (
+        patch("app.backends.es_client", mock_es_client),
+        patch("app.backends.ensure_indices", new_callable=AsyncMock),
+        patch("app.main.consume_events", new_callable=AsyncMock) as consume,
+        patch("app.main.settings.CONSUMER_IN_PROCESS", False),
+        patch("app.main.cache_sync.watch_invalidations", new_callable=AsyncMock) as watch,
+    ):
+        async with lifespan(app):
+            await asyncio.sleep(0)
+
+    consume.assert_not_called()
+    # Writes of the standalone consumer reach this process's cache through the topic
+    watch.assert_awaited_once()
+    mock_es_client.close.assert_called_once()
+
+
+async def test_lifespan_disables_cache_without_invalidation_topic(mock_es_client):
+    from app.cache import query_cache
+    from app.main import app, lifespan
+
+    with (
+        patch("app.backends.es_client", mock_es_client),
+        patch("app.backends.ensure_indices", new_callable=AsyncMock),
+        patch("app.main.settings.CONSUMER_IN_PROCESS", False),
+        patch("app.main.settings.SEARCH_CACHE_INVALIDATION_TOPIC", None),
+        patch.object(query_cache, "enabled", True),
+    ):
+        async with lifespan(app):
+            assert query_cache.enabled is False
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+from elasticsearch import ConnectionTimeout
+
+from app.suggest import RequestCoalescer, SupersededError, split_suggestions, suggest_body
+
+
+def _suggest_response(*texts):
+    options = [{"text": text, "_id": f"id-{i}", "_score": 1.0} for i, text in enumerate(texts)]
+    return {"suggest": {"suggestions": [{"text": "pre", "options": options}]}}
+
+
+def test_suggest_body_uses_completion_field_per_index():
+    searches = suggest_body("war", ("books", "authors"), 5)
+    assert searches[0] == {"index": "books"}
+    assert searches[1]["suggest"]["suggestions"]["completion"]["field"] == "title.suggest"
+    assert searches[3]["suggest"]["suggestions"]["completion"]["field"] == "name.suggest"
+    assert searches[1]["suggest"]["suggestions"]["prefix"] == "war"
+    assert searches[1]["size"] == 0
+
+
+def test_split_suggestions_tolerates_missing_index():
+    response = {
+        "responses": [
+            {"error": {"type": "index_not_found_exception"}, "status": 404},
+            _suggest_response("Tolstoy"),
+        ]
+    }
+    assert split_suggestions(("books", "authors"), response) == {
+        "books": [],
+        "authors": [{"text": "Tolstoy", "_id": "id-0"}],
+    }
+
+
+async def test_coalescer_cancels_superseded_request():
+    coalescer = RequestCoalescer()
+    release = asyncio.Event()
+    cancelled = []
+
+    async def slow():
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "old"
+
+    async def fast():
+        return "new"
+
+    first = asyncio.create_task(coalescer.run("client-1", slow()))
+    await asyncio.sleep(0.01)
+    second = await coalescer.run("client-1", fast())
+
+    with pytest.raises(SupersededError):
+        await first
+    assert second == "new"
+    assert cancelled == [True]
+    assert coalescer.in_flight() == 0
+
+
+async def test_coalescer_keeps_clients_independent():
+    coalescer = RequestCoalescer()
+
+    async def value(v):
+        await asyncio.sleep(0.01)
+        return v
+
+    results = await asyncio.gather(
+        coalescer.run("a", value(1)),
+        coalescer.run("b", value(2)),
+    )
+    assert results == [1, 2]
+
+
+async def test_suggest_endpoint_returns_completions(client, mock_es_client):
+    mock_es_client.msearch.return_value = {
+        "responses": [_suggest_response("War and Peace", "Warlock"), _suggest_response()]
+    }
+
+    resp = await client.get("/suggest/", params={"prefix": "war"})
+
+    assert resp.status_code == 200
+    assert [s["text"] for s in resp.json()["books"]] == ["War and Peace", "Warlock"]
+    assert resp.json()["authors"] == []
+    mock_es_client.options.assert_called_with(request_timeout=0.1)
+
+
+async def test_suggest_endpoint_single_index(client, mock_es_client):
+    mock_es_client.msearch.return_value = {"responses": [_suggest_response("Tolstoy")]}
+
+    resp = await client.get("/suggest/", params={"prefix": "tol", "index": "authors", "size": 3})
+
+    assert resp.json() == [{"text": "Tolstoy", "_id": "id-0"}]
+    searches = mock_es_client.msearch.call_args.kwargs["searches"]
+    assert searches[0] == {"index": "authors"}
+    assert searches[1]["suggest"]["suggestions"]["completion"]["size"] == 3
+
+
+async def test_suggest_endpoint_rejects_unknown_index(client):
+    resp = await client.get("/suggest/", params={"prefix": "tol", "index": "series"})
+    assert resp.status_code == 400
+
+
+async def test_suggest_endpoint_is_cached(client, mock_es_client):
+    mock_es_client.msearch.return_value = {"responses": [_suggest_response("Tolstoy")]}
+
+    for _ in range(3):
+        await client.get("/suggest/", params={"prefix": "tol", "index": "authors"})
+
+    assert mock_es_client.msearch.call_count == 1
+
+
+async def test_suggest_endpoint_timeout_returns_empty(client, mock_es_client):
+    mock_es_client.msearch.side_effect = ConnectionTimeout("timed out")
+
+    resp = await client.get("/suggest/", params={"prefix": "tol", "index": "authors"})
+
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+async def test_suggest_endpoint_drops_superseded_keystroke(client, mock_es_client):
+    release = asyncio.Event()
+
+    async def msearch(searches):
+        if searches[1]["suggest"]["suggestions"]["prefix"] == "t":
+            await release.wait()
+        return {"responses": [_suggest_response("Tolstoy")]}
+
+    mock_es_client.msearch.side_effect = msearch
+    headers = {"X-Client-Id": "tab-1"}
+
+    stale = asyncio.create_task(
+        client.get("/suggest/", params={"prefix": "t", "index": "authors"}, headers=headers)
+    )
+    await asyncio.sleep(0.05)
+    latest = await client.get(
+        "/suggest/", params={"prefix": "to", "index": "authors"}, headers=headers
+    )
+
+    assert latest.status_code == 200
+    assert (await stale).status_code == 204
@@ -0,0 +1,115 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app.tracing import consume_spans, setup_tracing, shutdown_tracing, span
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+TRACEPARENT = f"00-{TRACE_ID}-b7ad6b7169203331-01"
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemorySpanExporter()
+    setup_tracing(exporter, sample_rate=1.0, batch=False)
+    yield exporter
+    shutdown_tracing()
+
+
+def _msg(event_type, headers=()):
+    """A (message, decoded event) pair as the consumer hands it to consume_spans."""
+    msg = MagicMock()
+    msg.headers = tuple(headers)
+    msg.partition = 0
+    msg.offset = 42
+    return msg, {"event": event_type, "data": {"_id": "b1", "title": "Book"}}
+
+
+def _record(event_type, headers=()):
+    """The raw Kafka record behind _msg (JSON body, as the consumer receives it)."""
+    msg, event = _msg(event_type, headers)
+    msg.value = json.dumps(event).encode()
+    return msg
+
+
+def _trace_id(finished):
+    return f"{finished.context.trace_id:032x}"
+
+
+def test_consume_spans_continue_the_producer_trace(spans):
+    traced = _msg("book_created", [("traceparent", TRACEPARENT.encode())])
+    untraced = _msg("author_created")
+
+    with consume_spans([traced, untraced]), span("inside batch"):
+        pass
+
+    by_name = {s.name: s for s in spans.get_finished_spans()}
+    assert set(by_name) == {"index book_created", "consume batch", "inside batch"}
+    # The message span belongs to the trace started in core_service
+    assert _trace_id(by_name["index book_created"]) == TRACE_ID
+    assert by_name["index book_created"].attributes["messaging.offset"] == 42
+    # Work done while indexing hangs off the batch span, which links to the message
+    assert by_name["inside batch"].parent.span_id == by_name["consume batch"].context.span_id
+    assert [_trace_id(link) for link in by_name["consume batch"].links] == [TRACE_ID]
+
+
+def test_consume_spans_respect_unsampled_producer_decision(spans):
+    unsampled = _msg("book_created", [("traceparent", TRACEPARENT[:-2].encode() + b"00")])
+
+    with consume_spans([unsampled]):
+        pass
+
+    assert [s.name for s in spans.get_finished_spans()] == ["consume batch"]
+
+
+def test_consume_spans_mark_failures(spans):
+    traced = _msg("book_created", [("traceparent", TRACEPARENT.encode())])
+
+    with pytest.raises(RuntimeError), consume_spans([traced]):
+        raise RuntimeError("ES is down")
+
+    message_span = next(s for s in spans.get_finished_spans() if s.name == "index book_created")
+    assert not message_span.status.is_ok
+    assert message_span.events[0].name == "exception"
+
+
+async def test_batch_flush_traces_elasticsearch_calls(spans):
+    from app.kafka_consumer import BatchProcessor
+    from app.metrics import InstrumentedTransport
+
+    transport = object.__new__(InstrumentedTransport)
+
+    async def bulk(operations):
+        await transport.perform_request("PUT", "/_bulk")
+        return {"errors": False, "items": []}
+
+    mock_es = AsyncMock()
+    mock_es.bulk.side_effect = bulk
+    consumer = MagicMock()
+    consumer.commit = AsyncMock()
+    processor = BatchProcessor(consumer)
+    processor.buffer = [_record("book_created", [("traceparent", TRACEPARENT.encode())])]
+
+    with (
+        patch("app.kafka_consumer.es_client", mock_es),
+        patch("app.kafka_consumer.settings.CONSUMER_WORKERS", 1),
+        patch("elastic_transport.AsyncTransport.perform_request", AsyncMock()),
+    ):
+        await processor.flush()
+
+    by_name = {s.name: s for s in spans.get_finished_spans()}
+    assert by_name["elasticsearch _bulk"].parent.span_id == by_name["consume batch"].context.span_id
+    assert _trace_id(by_name["index book_created"]) == TRACE_ID
+
+
+async def test_search_request_gets_server_span_and_timing(client, mock_es_client, spans):
+    mock_es_client.search.return_value = {"hits": {"hits": [], "total": {"value": 0}}}
+
+    resp = await client.get("/search/", params={"q": "war"}, headers={"traceparent": TRACEPARENT})
+
+    assert resp.headers["Server-Timing"].startswith("app;dur=")
+    server = next(s for s in spans.get_finished_spans() if s.kind.name == "SERVER")
+    assert server.name == "GET /search/"
+    assert _trace_id(server) == TRACE_ID